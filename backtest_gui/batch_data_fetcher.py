@@ -0,0 +1,479 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+批量行情获取器
+- 接收(代码, 级别, 日期区间)任务列表
+- 在有限数量的子进程中并行获取行情，避免GIL锁
+- 获取结果交给单一写入线程按顺序写入数据库
+- 每个任务失败或未返回数据时按指数退避重试，并汇总整体吞吐量；只有返回了数据的任务区间记入覆盖索引
+- 可由新写入的1分钟K线增量合成其他级别，只需获取一次1分钟数据
+可在命令行中无界面运行:
+    python -m backtest_gui.batch_data_fetcher --symbols 510300,159920 --levels 1min,day --start 20240101
+    python -m backtest_gui.batch_data_fetcher --symbols 510300 --levels 1min --derive 5min,15min,day
+"""
+
+import os
+import sys
+import time
+import heapq
+import queue
+import argparse
+import threading
+import traceback
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import pandas as pd
+
+# 添加父级目录到系统路径，以便在命令行中直接运行
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+if parent_dir not in sys.path:
+    sys.path.append(parent_dir)
+
+from backtest_gui.utils.symbol_utils import normalize_symbol, to_pure_code, get_market
+from backtest_gui.data.data_source import create_data_source
+from backtest_gui.utils.data_coverage import TradingCalendar
+from backtest_gui.utils.quote_writer import QuoteWriter
+from backtest_gui.utils.bar_resampler import BarResampler
+from backtest_gui.db.migrations import ensure_schema
+
+# 子进程中的行情数据源，每个进程只初始化一次
+_process_source = None
+
+
+def _init_fetch_process(source_kind=None, source_options=None):
+    """子进程初始化：创建并连接行情数据源
+
+    Args:
+        source_kind: 数据源类型，为None时使用settings.DATA_SOURCE
+        source_options: 传给数据源构造函数的参数
+    """
+    global _process_source
+    try:
+        source = create_data_source(source_kind, **(source_options or {}))
+        _process_source = source if source.connect() else None
+    except Exception as e:
+        print(f"子进程 {os.getpid()} 初始化行情数据源失败: {str(e)}")
+        _process_source = None
+
+
+def fetch_bars(symbol, data_level, start_date, end_date):
+    """在子进程中获取一个任务的K线数据
+
+    Args:
+        symbol: 带市场后缀的代码
+        data_level: 数据级别
+        start_date: 开始日期，格式"YYYYMMDD"
+        end_date: 结束日期，格式"YYYYMMDD"
+
+    Returns:
+        DataFrame: K线数据(可能为空)
+
+    Raises:
+        RuntimeError: 数据源不可用
+    """
+    if _process_source is None:
+        raise RuntimeError("行情数据源未初始化，请确认QMT已安装并启动或更换数据源")
+    return _process_source.fetch_bars(symbol, data_level, start_date, end_date)
+
+
+class FetchJob:
+    """批量获取任务"""
+
+    def __init__(self, symbol, data_level, start_date, end_date):
+        """初始化任务
+
+        Args:
+            symbol: 证券代码
+            data_level: 数据级别
+            start_date: 开始日期，格式"YYYYMMDD"
+            end_date: 结束日期，格式"YYYYMMDD"
+        """
+        self.symbol = normalize_symbol(symbol)
+        self.data_level = data_level
+        self.start_date = start_date
+        self.end_date = end_date
+        self.attempts = 0
+        self.status = 'pending'  # pending, running, done, failed
+        self.rows = 0
+        self.error = None
+        self.elapsed = 0.0
+        self.started_at = None
+
+    @property
+    def key(self):
+        return f"{self.symbol} {self.data_level} {self.start_date}-{self.end_date}"
+
+    def __repr__(self):
+        return f"<FetchJob {self.key} {self.status}>"
+
+
+class BatchFetchStats:
+    """批量获取的吞吐量统计"""
+
+    def __init__(self, total_jobs):
+        self.total_jobs = total_jobs
+        self.done_jobs = 0
+        self.failed_jobs = 0
+        self.retries = 0
+        self.rows_fetched = 0
+        self.rows_written = 0
+        self.start_time = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        """线程安全地累加计数"""
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def to_dict(self):
+        """转换为字典，用于进度回调和最终汇总"""
+        elapsed = self.elapsed
+        return {
+            'total_jobs': self.total_jobs,
+            'done_jobs': self.done_jobs,
+            'failed_jobs': self.failed_jobs,
+            'retries': self.retries,
+            'rows_fetched': self.rows_fetched,
+            'rows_written': self.rows_written,
+            'elapsed': elapsed,
+            'rows_per_second': self.rows_written / elapsed if elapsed > 0 else 0.0,
+            'jobs_per_minute': self.done_jobs * 60.0 / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def summary(self):
+        """生成可读的汇总文本"""
+        s = self.to_dict()
+        return (f"完成 {s['done_jobs']}/{s['total_jobs']} 个任务，失败 {s['failed_jobs']}，重试 {s['retries']} 次，"
+                f"获取 {s['rows_fetched']} 条，写入 {s['rows_written']} 条，耗时 {s['elapsed']:.1f}秒，"
+                f"{s['rows_per_second']:.0f} 条/秒，{s['jobs_per_minute']:.1f} 任务/分钟")
+
+
+class BatchDataFetcher:
+    """批量行情获取流水线
+
+    获取在ProcessPoolExecutor子进程中进行，结果通过队列交给单一写入线程，
+    保证同一时间只有一个连接在写stock_quotes。
+    """
+
+    def __init__(self, max_workers=4, max_retries=3, backoff_base=2.0, backoff_max=60.0,
+                 incremental=True, db_connector=None, fetch_func=None, progress_callback=None,
+                 source_kind=None, source_options=None, derive_levels=None):
+        """初始化批量获取器
+
+        Args:
+            max_workers: 获取子进程数量
+            max_retries: 每个任务的最大重试次数
+            backoff_base: 退避基数(秒)，第n次重试等待backoff_base * 2^(n-1)秒
+            backoff_max: 最大退避时间(秒)
+            incremental: 是否根据覆盖索引只获取缺失区间
+            db_connector: 数据库连接器
+            fetch_func: 子进程中执行的获取函数，签名同fetch_bars
+            progress_callback: 进度回调，参数为(message, stats_dict)
+            source_kind: 行情数据源类型，'xtdata'、'local'或'synthetic'
+            source_options: 传给数据源构造函数的参数
+            derive_levels: 1分钟数据写入后需要增量合成的级别列表
+        """
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.incremental = incremental
+        self.fetch_func = fetch_func or fetch_bars
+        self.progress_callback = progress_callback
+        self.source_kind = source_kind
+        self.source_options = source_options or {}
+        self.writer = QuoteWriter(db_connector)
+        self.coverage = self.writer.coverage
+        self.derive_levels = list(derive_levels or [])
+        self.resampler = BarResampler(self.writer.db_connector) if self.derive_levels else None
+        self._stop_event = threading.Event()
+        # 交易日历使用与获取进程相同的数据源(xtdata/本地文件的交易日)，按市场缓存
+        self._calendar_source = None
+        self._calendars = {}
+        self._calendar_lock = threading.Lock()
+
+    def stop(self):
+        """请求停止，已提交的任务完成后退出"""
+        self._stop_event.set()
+
+    def _report(self, message, stats):
+        """输出进度"""
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
+        if self.progress_callback:
+            try:
+                self.progress_callback(message, stats.to_dict())
+            except Exception as e:
+                print(f"进度回调出错: {str(e)}")
+
+    def get_calendar(self, symbol):
+        """获取证券所在市场的交易日历，交易日取自本获取器的数据源，数据源不可用时为工作日日历
+
+        Args:
+            symbol: 带市场后缀的代码
+
+        Returns:
+            TradingCalendar: 交易日历
+        """
+        market = get_market(symbol)
+        with self._calendar_lock:
+            calendar = self._calendars.get(market)
+            if calendar is None:
+                if self._calendar_source is None:
+                    try:
+                        source = create_data_source(self.source_kind, **self.source_options)
+                        self._calendar_source = source if source.connect() else False
+                    except Exception as e:
+                        print(f"初始化交易日历数据源失败，使用工作日日历: {str(e)}")
+                        self._calendar_source = False
+                calendar = TradingCalendar(self._calendar_source or None, market=market)
+                self._calendars[market] = calendar
+            return calendar
+
+    def expand_jobs(self, jobs):
+        """根据覆盖索引把任务拆分为缺失区间，已完整的任务直接跳过
+
+        Args:
+            jobs: FetchJob列表
+
+        Returns:
+            list: 需要实际获取的FetchJob列表
+        """
+        if not self.incremental:
+            return list(jobs)
+
+        expanded = []
+        for job in jobs:
+            calendar = self.get_calendar(job.symbol)
+            ranges = self.coverage.find_missing_ranges(
+                to_pure_code(job.symbol), job.data_level, job.start_date, job.end_date, calendar
+            )
+            if not ranges:
+                print(f"{job.key} 数据已完整，跳过")
+                continue
+            for range_start, range_end in ranges:
+                expanded.append(FetchJob(job.symbol, job.data_level, range_start, range_end))
+        return expanded
+
+    def _writer_loop(self, write_queue, stats):
+        """写入线程：按提交顺序依次写入数据库
+
+        队列中只有返回了数据的任务，任务区间内没有数据的交易日记为已检查
+        """
+        while True:
+            item = write_queue.get()
+            if item is None:
+                break
+            job, df = item
+            try:
+                calendar = self.get_calendar(job.symbol)
+                checked_days = calendar.get_trading_days(job.start_date, job.end_date)
+                written = self.writer.write(to_pure_code(job.symbol), job.data_level, df, checked_days)
+                if written is None:
+                    job.status = 'failed'
+                    job.error = "写入数据库失败"
+                    stats.add(failed_jobs=1)
+                else:
+                    job.status = 'done'
+                    stats.add(done_jobs=1, rows_written=written)
+                    if self.resampler and job.data_level == '1min' and written > 0:
+                        self.resampler.update_incremental(to_pure_code(job.symbol), df, self.derive_levels)
+                self._report(f"{job.key} 写入 {written or 0} 条记录 | {stats.summary()}", stats)
+            except Exception as e:
+                job.status = 'failed'
+                job.error = str(e)
+                stats.add(failed_jobs=1)
+                print(f"写入 {job.key} 出错: {str(e)}")
+                traceback.print_exc()
+
+    def _backoff_delay(self, attempts):
+        """计算第attempts次失败后的等待时间"""
+        return min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+
+    def run(self, jobs):
+        """执行批量获取
+
+        Args:
+            jobs: FetchJob列表，或(symbol, data_level, start_date, end_date)元组列表
+
+        Returns:
+            dict: 统计信息，另含jobs键为所有任务
+        """
+        jobs = [job if isinstance(job, FetchJob) else FetchJob(*job) for job in jobs]
+        jobs = self.expand_jobs(jobs)
+        stats = BatchFetchStats(len(jobs))
+        self._report(f"开始批量获取，共 {len(jobs)} 个任务，{self.max_workers} 个获取进程", stats)
+
+        write_queue = queue.Queue(maxsize=self.max_workers * 2)
+        writer_thread = threading.Thread(target=self._writer_loop, args=(write_queue, stats), daemon=True)
+        writer_thread.start()
+
+        # 待执行队列: (可执行时间, 序号, 任务)
+        ready = [(0.0, i, job) for i, job in enumerate(jobs)]
+        heapq.heapify(ready)
+        seq = len(jobs)
+        running = {}
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_fetch_process,
+                                     initargs=(self.source_kind, self.source_options)) as executor:
+                while (ready or running) and not self._stop_event.is_set():
+                    # 提交已到执行时间的任务，保持在途任务数不超过进程数
+                    now = time.time()
+                    while ready and ready[0][0] <= now and len(running) < self.max_workers:
+                        _, _, job = heapq.heappop(ready)
+                        job.status = 'running'
+                        job.attempts += 1
+                        job.started_at = time.time()
+                        future = executor.submit(self.fetch_func, job.symbol, job.data_level,
+                                                 job.start_date, job.end_date)
+                        running[future] = job
+
+                    if not running:
+                        # 只剩等待退避的任务
+                        time.sleep(max(0.0, min(1.0, ready[0][0] - time.time())))
+                        continue
+
+                    timeout = max(0.0, ready[0][0] - time.time()) if ready else None
+                    done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        job = running.pop(future)
+                        job.elapsed += time.time() - job.started_at
+                        try:
+                            df = future.result()
+                            if df is None or len(df) == 0:
+                                # 没有数据可能是数据源暂时不可用，按失败重试，不把区间记为已检查
+                                raise ValueError("未返回数据")
+                            job.rows = len(df)
+                            stats.add(rows_fetched=len(df))
+                            write_queue.put((job, df))
+                        except Exception as e:
+                            job.error = str(e)
+                            if job.attempts <= self.max_retries:
+                                delay = self._backoff_delay(job.attempts)
+                                job.status = 'pending'
+                                stats.add(retries=1)
+                                heapq.heappush(ready, (time.time() + delay, seq, job))
+                                seq += 1
+                                self._report(f"{job.key} 第{job.attempts}次获取失败: {str(e)}，{delay:.0f}秒后重试", stats)
+                            else:
+                                job.status = 'failed'
+                                stats.add(failed_jobs=1)
+                                self._report(f"{job.key} 获取失败，已放弃: {str(e)}", stats)
+        finally:
+            write_queue.put(None)
+            writer_thread.join()
+
+        self._report(f"批量获取结束: {stats.summary()}", stats)
+        result = stats.to_dict()
+        result['jobs'] = jobs
+        return result
+
+
+def build_jobs(symbols, levels, start_date=None, end_date=None):
+    """根据代码列表和级别列表生成任务
+
+    Args:
+        symbols: 代码列表
+        levels: 数据级别列表
+        start_date: 开始日期，默认10年前
+        end_date: 结束日期，默认昨天
+
+    Returns:
+        list: FetchJob列表
+    """
+    if start_date is None:
+        start_date = (datetime.now() - timedelta(days=365 * 10)).strftime('%Y%m%d')
+    if end_date is None:
+        end_date = (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
+    return [FetchJob(symbol, level, start_date, end_date) for symbol in symbols for level in levels]
+
+
+def load_jobs_file(path):
+    """从CSV文件读取任务，列为symbol,data_level,start_date,end_date
+
+    Args:
+        path: CSV文件路径
+
+    Returns:
+        list: FetchJob列表
+    """
+    jobs_df = pd.read_csv(path, dtype=str).fillna('')
+    default_end = (datetime.now() - timedelta(days=1)).strftime('%Y%m%d')
+    jobs = []
+    for row in jobs_df.itertuples(index=False):
+        jobs.append(FetchJob(
+            row.symbol,
+            row.data_level,
+            getattr(row, 'start_date', '') or '20100101',
+            getattr(row, 'end_date', '') or default_end,
+        ))
+    return jobs
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='批量获取行情数据并写入数据库')
+
+    parser.add_argument('--symbols', type=str, help='逗号分隔的代码列表，如510300,159920.SZ')
+    parser.add_argument('--levels', type=str, default='day', help='逗号分隔的数据级别，如1min,day')
+    parser.add_argument('--start', type=str, help='开始日期YYYYMMDD，默认10年前')
+    parser.add_argument('--end', type=str, help='结束日期YYYYMMDD，默认昨天')
+    parser.add_argument('--jobs-file', type=str, help='任务CSV文件(symbol,data_level,start_date,end_date)')
+    parser.add_argument('--workers', type=int, default=4, help='获取进程数')
+    parser.add_argument('--retries', type=int, default=3, help='每个任务的最大重试次数')
+    parser.add_argument('--full', action='store_true', help='忽略覆盖索引，获取完整区间')
+    parser.add_argument('--source', type=str, choices=['xtdata', 'local', 'synthetic'],
+                        help='行情数据源，默认使用settings.DATA_SOURCE')
+    parser.add_argument('--data-dir', type=str, help='本地数据源的数据目录')
+    parser.add_argument('--derive', type=str, help='由1分钟数据合成的级别，逗号分隔，如5min,15min,day')
+
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+
+    if args.jobs_file:
+        jobs = load_jobs_file(args.jobs_file)
+    elif args.symbols:
+        symbols = [s.strip() for s in args.symbols.split(',') if s.strip()]
+        levels = [l.strip() for l in args.levels.split(',') if l.strip()]
+        jobs = build_jobs(symbols, levels, args.start, args.end)
+    else:
+        print("请通过 --symbols 或 --jobs-file 指定任务")
+        return 1
+
+    # 启动时应用一次数据库结构迁移
+    if not ensure_schema():
+        return 1
+
+    source_options = {'root_dir': args.data_dir} if args.source == 'local' and args.data_dir else {}
+    fetcher = BatchDataFetcher(
+        max_workers=args.workers,
+        max_retries=args.retries,
+        incremental=not args.full,
+        source_kind=args.source,
+        source_options=source_options,
+        derive_levels=[l.strip() for l in args.derive.split(',') if l.strip()] if args.derive else None
+    )
+    result = fetcher.run(jobs)
+
+    for job in result['jobs']:
+        if job.status != 'done':
+            print(f"未完成: {job.key} 状态={job.status} 错误={job.error}")
+
+    return 0 if result['failed_jobs'] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
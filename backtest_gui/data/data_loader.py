@@ -3,7 +3,6 @@
 """
 数据加载器模块 - 用于从数据库加载历史行情数据
 """
-import psycopg2
 import pandas as pd
 import datetime
 import numpy as np
@@ -11,6 +10,8 @@ from PyQt5.QtCore import QThread, pyqtSignal
 from concurrent.futures import ThreadPoolExecutor
 import traceback
 
+from backtest_gui.utils.connection_pool import get_pool
+
 
 class DataLoader(QThread):
     """数据加载线程，用于异步加载历史行情数据"""
@@ -77,15 +78,11 @@ class DataLoader(QThread):
         Returns:
             最早的日期，格式为datetime对象
         """
+        db_pool = get_pool(self.db_config)
+        conn = None
         try:
-            # 连接数据库
-            conn = psycopg2.connect(
-                host=self.db_config['host'],
-                port=self.db_config['port'],
-                dbname=self.db_config['dbname'],
-                user=self.db_config['user'],
-                password=self.db_config['password']
-            )
+            # 从共享连接池获取连接
+            conn = db_pool.getconn()
             
             # 创建表名
             table_name = f"stock_1min_{stock_code.split('.')[0]}"
@@ -96,15 +93,15 @@ class DataLoader(QThread):
                     f"SELECT MIN(time) FROM {table_name}"
                 )
                 earliest_date = cur.fetchone()[0]
-                
-            # 关闭数据库连接
-            conn.close()
             
             return earliest_date
             
         except Exception as e:
             print(f"获取最早日期错误: {str(e)}")
             return datetime.datetime.now() - datetime.timedelta(days=365)  # 默认返回一年前
+        finally:
+            if conn:
+                db_pool.putconn(conn)
             
     def load_all_data(self):
         """一次性加载所有数据
@@ -112,6 +109,8 @@ class DataLoader(QThread):
         Returns:
             加载的所有数据，pandas DataFrame对象
         """
+        db_pool = get_pool(self.db_config)
+        conn = None
         try:
             # 检查参数是否设置
             if not all([self.stock_code, self.start_date, self.end_date]):
@@ -120,14 +119,8 @@ class DataLoader(QThread):
             
             print(f"开始加载数据: 股票={self.stock_code}, 开始={self.start_date}, 结束={self.end_date}")
             
-            # 连接数据库
-            conn = psycopg2.connect(
-                host=self.db_config['host'],
-                port=self.db_config['port'],
-                dbname=self.db_config['dbname'],
-                user=self.db_config['user'],
-                password=self.db_config['password']
-            )
+            # 从共享连接池获取连接
+            conn = db_pool.getconn()
             
             # 创建表名
             table_name = f"stock_1min_{self.stock_code.split('.')[0]}"
@@ -185,15 +178,15 @@ class DataLoader(QThread):
             else:
                 print("警告: 查询结果为空")
             
-            # 关闭数据库连接
-            conn.close()
-            
             return df
             
         except Exception as e:
             print(f"加载所有数据错误: {str(e)}")
             traceback.print_exc()
             return None
+        finally:
+            if conn:
+                db_pool.putconn(conn)
     
     def preprocess_data_batch(self, batch_df):
         """预处理数据批次以提高性能
@@ -295,7 +288,7 @@ class DataLoader(QThread):
 
 
 class DBConnector:
-    """数据库连接器，用于管理数据库连接池和执行查询"""
+    """数据库连接器，从进程内共享的连接池获取连接并执行查询"""
     
     def __init__(self, db_config=None):
         """初始化数据库连接器
@@ -310,51 +303,30 @@ class DBConnector:
             'user': 'postgres',
             'password': 'huice'
         }
-        self.connection_pool = []
+        self.connection_pool = None
         self._init_connection_pool()
         
     def _init_connection_pool(self):
-        """初始化连接池"""
+        """获取共享连接池"""
         try:
-            # 清空现有连接池
-            self.close_all()
-            self.connection_pool = []
-            
-            # 创建新连接
-            for _ in range(5):  # 创建5个连接
-                try:
-                    conn = psycopg2.connect(
-                        host=self.db_config['host'],
-                        port=self.db_config['port'],
-                        dbname=self.db_config['dbname'],
-                        user=self.db_config['user'],
-                        password=self.db_config['password']
-                    )
-                    self.connection_pool.append(conn)
-                except Exception as e:
-                    print(f"创建数据库连接失败: {str(e)}")
-            
-            print(f"数据库连接池初始化完成，连接数: {len(self.connection_pool)}")
+            self.connection_pool = get_pool(self.db_config)
         except Exception as e:
             print(f"初始化连接池失败: {str(e)}")
             traceback.print_exc()
             
-    def get_connection(self):
-        """获取一个数据库连接
+    def get_connection(self, timeout=None):
+        """获取一个数据库连接，连接池耗尽时阻塞等待
         
+        Args:
+            timeout: 等待超时时间(秒)，None使用默认值
+            
         Returns:
             connection: 数据库连接对象
         """
         try:
-            # 如果连接池为空，初始化连接池
-            if not self.connection_pool:
+            if self.connection_pool is None:
                 self._init_connection_pool()
-            
-            # 从连接池获取一个连接
-            if self.connection_pool:
-                return self.connection_pool.pop()
-            else:
-                return None
+            return self.connection_pool.getconn(timeout)
         except Exception as e:
             print(f"获取数据库连接失败: {str(e)}")
             return None
@@ -446,16 +418,11 @@ class DBConnector:
         Args:
             conn: 要归还的数据库连接
         """
-        if conn and not conn.closed:
-            self.connection_pool.append(conn)
+        if conn and self.connection_pool is not None:
+            self.connection_pool.putconn(conn)
     
     def close_all(self):
-        """关闭所有连接"""
-        for conn in self.connection_pool:
-            try:
-                if not conn.closed:
-                    conn.close()
-            except Exception as e:
-                print(f"关闭连接失败: {str(e)}")
-        
-        self.connection_pool = [] 
\ No newline at end of file
+        """关闭共享连接池中的所有连接"""
+        if self.connection_pool is not None:
+            self.connection_pool.closeall()
+
@@ -0,0 +1,488 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+行情数据源模块 - 统一QMT xtdata、本地文件和模拟数据的访问接口
+
+数据源方法与xtdata保持同名同参数(download_history_data、get_market_data_ex等)，
+现有代码中的xtdata模块可以直接替换为数据源对象。
+"""
+import os
+import zlib
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from backtest_gui import settings
+from backtest_gui.utils.symbol_utils import to_qmt_period
+from backtest_gui.utils.time_utils import convert_timestamps_to_datetime, convert_datetimes_to_timestamps
+
+BAR_FIELDS = ['time', 'open', 'high', 'low', 'close', 'volume', 'amount']
+
+# A股交易时段(北京时间)，用于生成模拟分钟线
+SESSIONS = [('09:30', '11:30'), ('13:00', '15:00')]
+
+# QMT周期对应的分钟数
+PERIOD_MINUTES = {'1m': 1, '5m': 5, '15m': 15, '30m': 30, '60m': 60}
+
+
+def _parse_time(value, end=False):
+    """解析xtdata格式的时间参数('YYYYMMDD'或'YYYYMMDDHHMMSS')
+
+    Args:
+        value: 时间字符串，空字符串表示不限制
+        end: 是否为结束时间，只有日期时取当天最后一刻
+
+    Returns:
+        pd.Timestamp: 北京时间(不带时区)，不限制时返回None
+    """
+    if value is None or value == '':
+        return None
+    text = str(value)
+    ts = pd.to_datetime(text, format='%Y%m%d%H%M%S' if len(text) == 14 else '%Y%m%d')
+    if end and len(text) == 8:
+        ts = ts + pd.Timedelta(days=1) - pd.Timedelta(milliseconds=1)
+    return ts
+
+
+def _local_to_ms(dates):
+    """北京时间datetime64转换为毫秒时间戳"""
+    return np.asarray(convert_datetimes_to_timestamps(dates), dtype=np.int64)
+
+
+def _ms_to_local(times):
+    """毫秒时间戳转换为北京时间(不带时区)"""
+    return convert_timestamps_to_datetime(np.asarray(times, dtype=np.int64), naive=True)
+
+
+def _format_frame(df, fields):
+    """按xtdata的格式整理返回数据：索引为'YYYYMMDDHHMMSS'字符串，列为请求的字段"""
+    fields = list(fields) if fields else BAR_FIELDS
+    index = _ms_to_local(df['time'].values).strftime('%Y%m%d%H%M%S')
+    out = df.reindex(columns=fields).copy()
+    out.index = index
+    return out
+
+
+class MarketDataSource:
+    """行情数据源接口"""
+
+    name = 'base'
+
+    def connect(self):
+        """连接数据源
+
+        Returns:
+            bool: 是否连接成功
+        """
+        return True
+
+    def download_history_data(self, stock_code, period='1d', start_time='', end_time='', incrementally=None):
+        """下载历史数据到数据源本地缓存，本地数据源无需下载"""
+        return None
+
+    def subscribe_quote(self, stock_code, period='1d', start_time='', end_time='', count=0, callback=None):
+        """订阅行情，本地数据源无需订阅"""
+        return 0
+
+    def get_market_data_ex(self, field_list=None, stock_list=None, period='1d', start_time='', end_time='',
+                           count=-1, dividend_type='none', fill_data=True):
+        """获取K线数据
+
+        Args:
+            field_list: 字段列表，为空时返回全部字段
+            stock_list: 代码列表
+            period: 周期，支持QMT格式(1m/1d)和界面格式(1min/day)
+            start_time: 开始时间
+            end_time: 结束时间
+            count: 返回最后count条，-1表示不限制
+
+        Returns:
+            dict: {代码: DataFrame}
+        """
+        result = {}
+        for symbol in stock_list or []:
+            df = self._load_bars(symbol, to_qmt_period(period), start_time, end_time)
+            if df is None:
+                continue
+            if count is not None and count > 0:
+                df = df.tail(count)
+            result[symbol] = _format_frame(df, field_list)
+        return result
+
+    def get_trading_dates(self, market, start_time='', end_time='', count=-1):
+        """获取交易日列表，默认使用工作日
+
+        Returns:
+            list: 毫秒时间戳列表
+        """
+        start = _parse_time(start_time) or pd.Timestamp('2005-01-01')
+        end = _parse_time(end_time) or pd.Timestamp.now().normalize()
+        days = pd.bdate_range(start.normalize(), end.normalize())
+        times = _local_to_ms(days).tolist()
+        return times[-count:] if count is not None and count > 0 else times
+
+    def get_instrument_detail(self, stock_code):
+        """获取合约信息"""
+        return {'InstrumentID': stock_code, 'InstrumentName': stock_code}
+
+    def get_stock_list_in_sector(self, sector_name):
+        """获取板块成分，本地数据源返回空列表"""
+        return []
+
+    def fetch_bars(self, symbol, data_level, start_date, end_date):
+        """下载并获取一个区间的K线数据
+
+        Args:
+            symbol: 带市场后缀的代码
+            data_level: 数据级别
+            start_date: 开始日期，格式"YYYYMMDD"
+            end_date: 结束日期，格式"YYYYMMDD"
+
+        Returns:
+            DataFrame: 包含time及OHLCV列的数据，没有数据时为空DataFrame
+        """
+        period = to_qmt_period(data_level)
+        self.download_history_data(symbol, period=period, start_time=start_date, end_time=end_date,
+                                   incrementally=True)
+        data = self.get_market_data_ex(BAR_FIELDS, [symbol], period=period,
+                                       start_time=start_date, end_time=end_date)
+        if not data or symbol not in data:
+            return pd.DataFrame(columns=BAR_FIELDS)
+        return pd.DataFrame(data[symbol]).reset_index(drop=True)
+
+    def _load_bars(self, symbol, period, start_time, end_time):
+        """加载原始K线，子类实现
+
+        Returns:
+            DataFrame: 按time升序、包含BAR_FIELDS列的数据，没有数据时返回None
+        """
+        raise NotImplementedError
+
+
+class XtDataSource(MarketDataSource):
+    """QMT xtdata数据源，方法调用直接转发给xtdata模块"""
+
+    name = 'xtdata'
+
+    def __init__(self):
+        self._xtdata = None
+
+    def connect(self):
+        """查找QMT路径并连接行情服务"""
+        if self._xtdata is not None:
+            return True
+        try:
+            from backtest_gui.utils.qmt_path_finder import find_qmt_path
+            qmt_path = find_qmt_path()
+            if not qmt_path:
+                print("未找到QMT路径，请确保QMT已安装")
+                return False
+
+            from xtquant import xtdata
+            if hasattr(xtdata, 'enable_hello'):
+                xtdata.enable_hello = False  # 不显示登录欢迎信息
+            if hasattr(xtdata, 'enable_reconnect'):
+                xtdata.enable_reconnect = True  # 启用自动重连
+
+            xtdata.connect()
+            time.sleep(1)
+            self._xtdata = xtdata
+            return True
+        except Exception as e:
+            print(f"初始化xtdata模块异常: {str(e)}")
+            traceback.print_exc()
+            return False
+
+    def __getattr__(self, name):
+        # 未显式封装的xtdata函数(如get_full_tick)直接转发
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if self._xtdata is None and not self.connect():
+            raise AttributeError(f"xtdata不可用，无法调用 {name}")
+        return getattr(self._xtdata, name)
+
+    def download_history_data(self, stock_code, period='1d', start_time='', end_time='', incrementally=None):
+        return self.__getattr__('download_history_data')(
+            stock_code, period=to_qmt_period(period), start_time=start_time, end_time=end_time,
+            incrementally=incrementally
+        )
+
+    def subscribe_quote(self, stock_code, period='1d', start_time='', end_time='', count=0, callback=None):
+        return self.__getattr__('subscribe_quote')(
+            stock_code, period=to_qmt_period(period), start_time=start_time, end_time=end_time,
+            count=count, callback=callback
+        )
+
+    def get_market_data_ex(self, field_list=None, stock_list=None, period='1d', start_time='', end_time='',
+                           count=-1, dividend_type='none', fill_data=True):
+        return self.__getattr__('get_market_data_ex')(
+            field_list or [], stock_list or [], period=to_qmt_period(period), start_time=start_time,
+            end_time=end_time, count=count, dividend_type=dividend_type, fill_data=fill_data
+        )
+
+    def get_trading_dates(self, market, start_time='', end_time='', count=-1):
+        return self.__getattr__('get_trading_dates')(market, start_time, end_time, count)
+
+    def get_instrument_detail(self, stock_code):
+        return self.__getattr__('get_instrument_detail')(stock_code)
+
+    def get_stock_list_in_sector(self, sector_name):
+        return self.__getattr__('get_stock_list_in_sector')(sector_name)
+
+
+class LocalFileDataSource(MarketDataSource):
+    """本地文件数据源
+
+    文件按 <root_dir>/<周期>/<代码>.parquet 或 .csv 存放，例如 data/bars/1m/510300.SH.parquet，
+    列为time(毫秒时间戳)、open、high、low、close、volume、amount。
+    """
+
+    name = 'local'
+
+    def __init__(self, root_dir=None, file_format='parquet'):
+        """初始化本地文件数据源
+
+        Args:
+            root_dir: 数据根目录，默认使用settings.LOCAL_DATA_DIR
+            file_format: 写入文件时使用的格式，'parquet'或'csv'
+        """
+        self.root_dir = root_dir or getattr(settings, 'LOCAL_DATA_DIR', './data/bars')
+        self.file_format = file_format
+        self._cache = {}
+
+    def _find_file(self, symbol, period):
+        """查找代码和周期对应的文件，优先parquet"""
+        for ext in ('parquet', 'csv'):
+            path = os.path.join(self.root_dir, period, f"{symbol}.{ext}")
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _read_file(self, path):
+        """读取文件并缓存，文件修改后自动重新读取"""
+        mtime = os.path.getmtime(path)
+        cached = self._cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        if path.endswith('.parquet'):
+            df = pd.read_parquet(path)
+        else:
+            df = pd.read_csv(path)
+
+        if 'time' not in df.columns and 'date' in df.columns:
+            df['time'] = _local_to_ms(pd.to_datetime(df['date']))
+        df = df.reindex(columns=BAR_FIELDS)
+        df['time'] = df['time'].astype(np.int64)
+        df = df.sort_values('time').reset_index(drop=True)
+        self._cache[path] = (mtime, df)
+        return df
+
+    def _load_bars(self, symbol, period, start_time, end_time):
+        path = self._find_file(symbol, period)
+        if path is None:
+            return None
+        df = self._read_file(path)
+
+        start = _parse_time(start_time)
+        end = _parse_time(end_time, end=True)
+        mask = np.ones(len(df), dtype=bool)
+        if start is not None:
+            mask &= df['time'].values >= _local_to_ms([start])[0]
+        if end is not None:
+            mask &= df['time'].values <= _local_to_ms([end])[0]
+        return df[mask]
+
+    def get_trading_dates(self, market, start_time='', end_time='', count=-1):
+        """优先使用本地日线文件中出现过的日期作为交易日"""
+        day_dir = os.path.join(self.root_dir, '1d')
+        if not os.path.isdir(day_dir):
+            return super().get_trading_dates(market, start_time, end_time, count)
+
+        times = set()
+        for name in os.listdir(day_dir):
+            symbol, _ = os.path.splitext(name)
+            if not symbol.endswith('.' + market):
+                continue
+            df = self._load_bars(symbol, '1d', start_time, end_time)
+            if df is not None:
+                days = _ms_to_local(df['time'].values).normalize()
+                times.update(_local_to_ms(days).tolist())
+
+        if not times:
+            return super().get_trading_dates(market, start_time, end_time, count)
+        times = sorted(times)
+        return times[-count:] if count is not None and count > 0 else times
+
+    def get_instrument_detail(self, stock_code):
+        detail = super().get_instrument_detail(stock_code)
+        df = self._load_bars(stock_code, '1d', '', '')
+        if df is not None and len(df) > 0:
+            detail['OpenDate'] = _ms_to_local(df['time'].values[:1])[0].strftime('%Y%m%d')
+        return detail
+
+    def get_stock_list_in_sector(self, sector_name):
+        """返回本地存在数据文件的代码"""
+        symbols = set()
+        if os.path.isdir(self.root_dir):
+            for period in os.listdir(self.root_dir):
+                period_dir = os.path.join(self.root_dir, period)
+                if os.path.isdir(period_dir):
+                    symbols.update(os.path.splitext(name)[0] for name in os.listdir(period_dir))
+        return sorted(symbols)
+
+    def save_bars(self, symbol, period, df):
+        """保存K线到本地文件，与已有文件按time合并
+
+        Args:
+            symbol: 带市场后缀的代码
+            period: 周期，支持QMT格式和界面格式
+            df: 包含time及OHLCV列的数据
+
+        Returns:
+            str: 文件路径
+        """
+        period = to_qmt_period(period)
+        path = self._find_file(symbol, period)
+        bars = df.reindex(columns=BAR_FIELDS)
+        if path is not None:
+            bars = pd.concat([self._read_file(path), bars], ignore_index=True)
+        else:
+            os.makedirs(os.path.join(self.root_dir, period), exist_ok=True)
+            path = os.path.join(self.root_dir, period, f"{symbol}.{self.file_format}")
+
+        bars = bars.drop_duplicates(subset=['time'], keep='last').sort_values('time').reset_index(drop=True)
+        if path.endswith('.parquet'):
+            bars.to_parquet(path, index=False)
+        else:
+            bars.to_csv(path, index=False)
+        self._cache.pop(path, None)
+        return path
+
+
+class SyntheticDataSource(MarketDataSource):
+    """模拟数据源
+
+    按A股交易时段生成几何布朗运动K线。同一代码、周期和日期每次生成的数据相同，
+    可用于在没有QMT的机器上测试入库吞吐、增量同步和回测。
+    """
+
+    name = 'synthetic'
+
+    def __init__(self, seed=0, start_price=1.0, annual_volatility=0.25, base_volume=1000000):
+        """初始化模拟数据源
+
+        Args:
+            seed: 随机种子
+            start_price: 2000-01-01的起始价格
+            annual_volatility: 年化波动率
+            base_volume: 每分钟平均成交量
+        """
+        self.seed = seed
+        self.start_price = start_price
+        self.annual_volatility = annual_volatility
+        self.base_volume = base_volume
+
+    def _day_rng(self, symbol, day):
+        key = f"{self.seed}|{symbol}|{day:%Y%m%d}".encode('utf-8')
+        return np.random.default_rng(zlib.crc32(key))
+
+    def _day_open_price(self, symbol, day):
+        """每日开盘价由按日确定的随机游走得到，保证不同区间请求的结果一致"""
+        rng = np.random.default_rng(zlib.crc32(f"{self.seed}|{symbol}".encode('utf-8')))
+        drift = rng.normal(0.0, 0.00005)
+        days = (day - pd.Timestamp('2000-01-01')).days
+        # 长周期趋势加正弦波动，使网格策略有来回震荡可交易
+        return self.start_price * np.exp(drift * days + 0.15 * np.sin(days / 40.0))
+
+    def _minute_bars(self, symbol, day):
+        """生成一个交易日的1分钟K线"""
+        minutes = pd.DatetimeIndex(np.concatenate([
+            pd.date_range(f"{day:%Y-%m-%d} {start}", f"{day:%Y-%m-%d} {end}", freq='1min',
+                          inclusive='right').values
+            for start, end in SESSIONS
+        ]))
+        rng = self._day_rng(symbol, day)
+        sigma = self.annual_volatility / np.sqrt(252 * 240)
+        returns = rng.normal(0.0, sigma, len(minutes))
+        close = self._day_open_price(symbol, day) * np.exp(np.cumsum(returns))
+        open_ = np.concatenate([[self._day_open_price(symbol, day)], close[:-1]])
+        spread = np.abs(rng.normal(0.0, sigma, len(minutes))) * close
+        volume = rng.poisson(self.base_volume, len(minutes)).astype(float)
+        return pd.DataFrame({
+            'time': _local_to_ms(minutes),
+            'open': open_,
+            'high': np.maximum(open_, close) + spread,
+            'low': np.minimum(open_, close) - spread,
+            'close': close,
+            'volume': volume,
+            'amount': volume * close,
+        })
+
+    def _load_bars(self, symbol, period, start_time, end_time):
+        start = _parse_time(start_time) or pd.Timestamp.now().normalize() - pd.Timedelta(days=30)
+        end = _parse_time(end_time, end=True) or pd.Timestamp.now()
+        days = pd.bdate_range(start.normalize(), end.normalize())
+        if len(days) == 0:
+            return None
+
+        minute_df = pd.concat([self._minute_bars(symbol, day) for day in days], ignore_index=True)
+
+        if period == '1m':
+            df = minute_df
+        else:
+            dates = _ms_to_local(minute_df['time'].values)
+            if period in PERIOD_MINUTES:
+                # 分钟K线按交易时段内的序号分组，午休不会产生跨时段K线
+                minutes_per_bar = PERIOD_MINUTES[period]
+                slot = minute_df.groupby(dates.normalize()).cumcount().values // minutes_per_bar
+                keys = [dates.normalize(), slot]
+            elif period == '1d':
+                keys = [dates.normalize()]
+            elif period == '1w':
+                keys = [dates.to_period('W').start_time]
+            else:
+                keys = [dates.to_period('M').start_time]
+            grouped = minute_df.groupby(keys, sort=True)
+            df = pd.DataFrame({
+                'time': grouped['time'].last().values,
+                'open': grouped['open'].first().values,
+                'high': grouped['high'].max().values,
+                'low': grouped['low'].min().values,
+                'close': grouped['close'].last().values,
+                'volume': grouped['volume'].sum().values,
+                'amount': grouped['amount'].sum().values,
+            })
+            if period in ('1d', '1w', '1mon'):
+                # 日线及以上的time为当日零点，与QMT一致
+                df['time'] = _local_to_ms(_ms_to_local(df['time'].values).normalize())
+
+        mask = (df['time'].values >= _local_to_ms([start])[0]) & (df['time'].values <= _local_to_ms([end])[0])
+        return df[mask].reset_index(drop=True)
+
+    def get_instrument_detail(self, stock_code):
+        detail = super().get_instrument_detail(stock_code)
+        detail['OpenDate'] = '20150105'
+        return detail
+
+
+def create_data_source(kind=None, **kwargs):
+    """创建行情数据源
+
+    Args:
+        kind: 'xtdata'、'local'或'synthetic'，为None时依次读取环境变量HUICE_DATA_SOURCE和settings.DATA_SOURCE
+        **kwargs: 传给数据源构造函数的参数
+
+    Returns:
+        MarketDataSource: 数据源实例
+    """
+    kind = kind or os.environ.get('HUICE_DATA_SOURCE') or getattr(settings, 'DATA_SOURCE', 'xtdata')
+    if kind == 'xtdata':
+        return XtDataSource(**kwargs)
+    if kind == 'local':
+        return LocalFileDataSource(**kwargs)
+    if kind == 'synthetic':
+        return SyntheticDataSource(**kwargs)
+    raise ValueError(f"未知的数据源类型: {kind}")
@@ -1,12 +1,14 @@
 import os
 import time
 import psycopg2
-import psycopg2.pool
 import psycopg2.extras
 import traceback
 import pandas as pd
 from datetime import datetime
 
+from backtest_gui.utils.connection_pool import get_pool
+from backtest_gui.db.migrations import ensure_schema
+
 class Database:
     def __init__(self, host='localhost', port=5432, user='postgres', password='postgres', database='huice'):
         """初始化数据库连接参数"""
@@ -19,39 +21,16 @@ class Database:
         self._init_connection_pool()
     
     def _init_connection_pool(self):
-        """初始化数据库连接池"""
+        """获取进程内共享的数据库连接池"""
         try:
-            # 检查连接池是否已经存在
-            if hasattr(self, 'pool') and self.pool:
-                # 尝试检查连接池状态
-                try:
-                    conn = self.pool.getconn()
-                    if conn:
-                        # 连接池存在且能获取连接，直接返回
-                        self.pool.putconn(conn)
-                        return True
-                except Exception:
-                    # 连接池存在问题，需要重新创建
-                    pass
-            
-            # 创建新的连接池
-            self.pool = psycopg2.pool.SimpleConnectionPool(
-                minconn=1,
-                maxconn=20,
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database
-            )
-            
-            # 测试连接
-            conn = self.pool.getconn()
-            if conn:
-                self.pool.putconn(conn)
-                print(f"数据库连接池初始化完成，连接数: {self.pool.maxconn}")
-                return True
-            return False
+            self.pool = get_pool({
+                'host': self.host,
+                'port': self.port,
+                'user': self.user,
+                'password': self.password,
+                'dbname': self.database
+            })
+            return True
         except Exception as e:
             print(f"初始化数据库连接池失败: {str(e)}")
             return False
@@ -84,12 +63,16 @@ class Database:
             traceback.print_exc()
             return False
             
-    def get_connection(self):
-        """获取数据库连接"""
+    def get_connection(self, timeout=None):
+        """获取数据库连接，连接池耗尽时阻塞等待
+
+        Args:
+            timeout: 等待超时时间(秒)，None使用默认值
+        """
         try:
             if not self.pool:
                 self._init_connection_pool()
-            return self.pool.getconn()
+            return self.pool.getconn(timeout)
         except Exception as e:
             print(f"获取数据库连接失败: {str(e)}")
             return None
@@ -132,40 +115,8 @@ class Database:
                 self.release_connection(conn)
                 
     def init_tables(self):
-        """初始化数据库表结构"""
-        try:
-            # 创建行情数据表
-            create_market_data_table = """
-            CREATE TABLE IF NOT EXISTS market_data (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(32) NOT NULL,
-                date TIMESTAMP NOT NULL,
-                open FLOAT NOT NULL,
-                high FLOAT NOT NULL,
-                low FLOAT NOT NULL,
-                close FLOAT NOT NULL,
-                volume BIGINT NOT NULL,
-                amount FLOAT,
-                freq VARCHAR(10) NOT NULL
-            );
-            """
-            self.execute_query(create_market_data_table)
-            
-            # 添加索引
-            create_market_data_index = """
-            CREATE INDEX IF NOT EXISTS idx_market_data_symbol ON market_data (symbol);
-            CREATE INDEX IF NOT EXISTS idx_market_data_date ON market_data (date);
-            CREATE INDEX IF NOT EXISTS idx_market_data_symbol_date ON market_data (symbol, date);
-            CREATE INDEX IF NOT EXISTS idx_market_data_symbol_freq ON market_data (symbol, freq);
-            """
-            self.execute_query(create_market_data_index)
-            
-            print("数据库表结构已更新")
-            return True
-        except Exception as e:
-            print(f"初始化表结构失败: {str(e)}")
-            traceback.print_exc()
-            return False
+        """确保数据库结构已迁移到最新版本(每个进程只执行一次)"""
+        return ensure_schema(self)
             
     def save_market_data(self, df, symbol=None, freq=None):
         """保存行情数据到数据库"""
@@ -214,25 +165,10 @@ class Database:
                     df = df.dropna(subset=['time'])
                     print(f"删除NaN后剩余记录数: {len(df)}")
                 
-                # 逐行转换时间戳，避免批量处理可能的错误
-                print("开始逐行转换时间戳...")
-                from backtest_gui.utils.time_utils import convert_timestamp_to_datetime
-                dates = []
-                for i, ts in enumerate(df['time']):
-                    try:
-                        date = convert_timestamp_to_datetime(ts)
-                        if date is None:
-                            print(f"警告: 第{i}行时间戳 {ts} 转换结果为None")
-                            # 使用当前时间作为默认值
-                            date = pd.Timestamp.now()
-                        dates.append(date)
-                    except Exception as e:
-                        print(f"警告: 第{i}行时间戳 {ts} 转换失败: {str(e)}")
-                        # 使用当前时间作为默认值
-                        dates.append(pd.Timestamp.now())
-                
-                # 将转换后的日期添加到DataFrame
-                df['date'] = dates
+                # 批量转换时间戳，无法转换的值为NaT，在下方统一过滤
+                print("开始批量转换时间戳...")
+                from backtest_gui.utils.time_utils import convert_timestamps_to_datetime
+                df['date'] = convert_timestamps_to_datetime(df['time'])
                 print(f"时间戳转换完成，date列前5个值: {[str(d) for d in df['date'].head().tolist()]}")
             
             # 检查是否有无效数据
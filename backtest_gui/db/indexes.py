@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+stock_quotes索引管理模块
+
+回测加载数据的查询形如:
+    SELECT date, open, high, low, close, volume, amount FROM stock_quotes
+    WHERE fund_code = %s AND data_level = %s AND date BETWEEN %s AND %s ORDER BY date
+唯一约束(fund_code, data_level, date)只能定位记录，每行仍需回表读取价格。这里维护:
+- 覆盖索引: (fund_code, data_level, date) INCLUDE (open, high, low, close, volume, amount)，
+  配合VACUUM维护的可见性映射，回测区间加载可以走Index Only Scan
+- BRIN索引: 分钟级别分区的date列按写入顺序基本有序，BRIN索引体积很小，适合跨基金的按日期扫描
+- EXPLAIN校验: 检查回测区间查询的实际执行计划
+
+命令行用法:
+    python -m backtest_gui.db.indexes create
+    python -m backtest_gui.db.indexes verify 510300 1min 2024-01-01 2024-12-31 --analyze
+    python -m backtest_gui.db.indexes status
+"""
+import os
+import sys
+import json
+import argparse
+import traceback
+
+# 添加父级目录到系统路径，以便在命令行中直接运行
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(os.path.dirname(current_dir))
+if project_dir not in sys.path:
+    sys.path.append(project_dir)
+
+from backtest_gui.db.partitioning import (
+    QUOTES_TABLE, LEGACY_TABLE, LEGACY_INDEX_RENAMES, MINUTE_LEVELS, partition_name, table_exists,
+    index_exists, is_partitioned
+)
+
+COVERING_INDEX = 'idx_stock_quotes_range_covering'
+COVERING_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+BRIN_PAGES_PER_RANGE = 64
+
+# 被覆盖索引取代的旧索引(与唯一约束重复)
+REDUNDANT_INDEXES = ['idx_stock_quotes_fund_date']
+
+BACKTEST_RANGE_QUERY = """
+SELECT date, open, high, low, close, volume, amount
+FROM stock_quotes
+WHERE fund_code = %s AND data_level = %s AND date BETWEEN %s AND %s
+ORDER BY date
+"""
+
+
+def brin_index_name(table_name):
+    """获取表的date列BRIN索引名"""
+    return f"idx_{table_name}_date_brin"
+
+
+def quote_index_definitions(cursor):
+    """根据当前表结构生成stock_quotes应有的索引定义
+
+    Args:
+        cursor: 数据库游标
+
+    Returns:
+        list: [(索引名, 表名, 创建语句)]
+    """
+    definitions = [(
+        COVERING_INDEX, QUOTES_TABLE,
+        f"CREATE INDEX {{concurrently}} IF NOT EXISTS {COVERING_INDEX} ON {QUOTES_TABLE} "
+        f"(fund_code, data_level, date) INCLUDE ({', '.join(COVERING_COLUMNS)})"
+    )]
+
+    # 分区表只在分钟级别分区上建BRIN，普通表直接建在整表上
+    if is_partitioned(cursor, QUOTES_TABLE):
+        brin_tables = [partition_name(level) for level in MINUTE_LEVELS
+                       if table_exists(cursor, partition_name(level))]
+    else:
+        brin_tables = [QUOTES_TABLE]
+
+    for table_name in brin_tables:
+        index_name = brin_index_name(table_name)
+        definitions.append((
+            index_name, table_name,
+            f"CREATE INDEX {{concurrently}} IF NOT EXISTS {index_name} ON {table_name} "
+            f"USING BRIN (date) WITH (pages_per_range = {BRIN_PAGES_PER_RANGE})"
+        ))
+    return definitions
+
+
+def _collect_plan_nodes(plan, nodes):
+    nodes.append(plan)
+    for child in plan.get('Plans', []):
+        _collect_plan_nodes(child, nodes)
+    return nodes
+
+
+def explain_query(cursor, query, params=None, analyze=False):
+    """获取查询的执行计划
+
+    Args:
+        cursor: 数据库游标
+        query: SQL查询
+        params: 查询参数
+        analyze: 是否实际执行(EXPLAIN ANALYZE)
+
+    Returns:
+        dict: {'plan': 原始JSON计划, 'node_types': 节点类型列表, 'indexes': 使用的索引,
+               'index_only': 是否全部为Index Only Scan, 'heap_fetches': 回表次数(仅analyze时)}
+    """
+    options = "FORMAT JSON, ANALYZE, BUFFERS" if analyze else "FORMAT JSON"
+    cursor.execute(f"EXPLAIN ({options}) {query}", params)
+    raw = cursor.fetchone()[0]
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+    nodes = _collect_plan_nodes(plan[0]['Plan'], [])
+
+    scan_nodes = [n for n in nodes if 'Scan' in n['Node Type']]
+    return {
+        'plan': plan,
+        'node_types': [n['Node Type'] for n in nodes],
+        'indexes': sorted({n['Index Name'] for n in nodes if 'Index Name' in n}),
+        'index_only': bool(scan_nodes) and all(n['Node Type'] == 'Index Only Scan' for n in scan_nodes),
+        'heap_fetches': sum(n.get('Heap Fetches', 0) for n in scan_nodes) if analyze else None,
+    }
+
+
+class QuoteIndexManager:
+    """stock_quotes索引管理器"""
+
+    def __init__(self, db_connector=None):
+        """初始化索引管理器
+
+        Args:
+            db_connector: 提供get_connection/release_connection的数据库连接器
+        """
+        if db_connector is None:
+            from backtest_gui.utils.db_connector import DBConnector
+            db_connector = DBConnector()
+        self.db_connector = db_connector
+
+    def ensure_indexes(self, drop_redundant=True, vacuum=True):
+        """创建缺失的覆盖索引和BRIN索引
+
+        普通表使用CREATE INDEX CONCURRENTLY，不阻塞写入；分区表父表不支持CONCURRENTLY，
+        在父表上创建索引会自动在每个分区上建立。
+
+        Args:
+            drop_redundant: 是否删除被覆盖索引取代的旧索引
+            vacuum: 是否在建索引后执行VACUUM ANALYZE，更新可见性映射以启用Index Only Scan
+
+        Returns:
+            list: 新创建的索引名，失败返回None
+        """
+        conn = None
+        old_autocommit = None
+        try:
+            conn = self.db_connector.get_connection()
+            old_autocommit = conn.autocommit
+            conn.autocommit = True
+            cursor = conn.cursor()
+
+            partitioned = is_partitioned(cursor, QUOTES_TABLE)
+            created = []
+            for index_name, table_name, create_sql in quote_index_definitions(cursor):
+                # 只看目标表上的索引，分区迁移后旧表上可能留有同名索引
+                if index_exists(cursor, table_name, index_name):
+                    continue
+                if table_exists(cursor, index_name):
+                    # 索引名在同一schema内唯一: 旧版本切换后留在旧表上的索引先改名
+                    legacy_name = dict(LEGACY_INDEX_RENAMES).get(index_name)
+                    if legacy_name and index_exists(cursor, LEGACY_TABLE, index_name):
+                        print(f"旧表上的索引 {index_name} 改名为 {legacy_name}")
+                        cursor.execute(f"ALTER INDEX {index_name} RENAME TO {legacy_name}")
+                    else:
+                        print(f"索引名 {index_name} 已被其他表使用，跳过")
+                        continue
+                concurrently = '' if partitioned else 'CONCURRENTLY'
+                print(f"创建索引 {index_name} ON {table_name} ...")
+                cursor.execute(create_sql.format(concurrently=concurrently))
+                created.append(index_name)
+
+            if drop_redundant:
+                for index_name in REDUNDANT_INDEXES:
+                    if index_exists(cursor, QUOTES_TABLE, index_name):
+                        print(f"删除重复索引 {index_name}")
+                        cursor.execute(f"DROP INDEX {'' if partitioned else 'CONCURRENTLY'} IF EXISTS {index_name}")
+
+            if vacuum and created:
+                print(f"执行 VACUUM ANALYZE {QUOTES_TABLE} ...")
+                cursor.execute(f"VACUUM (ANALYZE) {QUOTES_TABLE}")
+
+            cursor.close()
+            return created
+        except Exception as e:
+            print(f"创建行情索引失败: {str(e)}")
+            traceback.print_exc()
+            return None
+        finally:
+            if conn:
+                if old_autocommit is not None:
+                    conn.autocommit = old_autocommit
+                self.db_connector.release_connection(conn)
+
+    def verify_backtest_plan(self, fund_code, data_level, start_date, end_date, analyze=False):
+        """用EXPLAIN检查回测区间加载查询是否走Index Only Scan
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            data_level: 数据级别
+            start_date: 开始时间
+            end_date: 结束时间
+            analyze: 是否实际执行查询以获取回表次数
+
+        Returns:
+            dict: explain_query的结果，失败返回None
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            result = explain_query(cursor, BACKTEST_RANGE_QUERY,
+                                   (fund_code, data_level, start_date, end_date), analyze)
+            conn.rollback()
+            cursor.close()
+
+            status = "Index Only Scan" if result['index_only'] else "未使用Index Only Scan"
+            print(f"回测区间查询计划: {status}，节点 {result['node_types']}，索引 {result['indexes']}")
+            if analyze and result['heap_fetches']:
+                print(f"回表次数 {result['heap_fetches']}，可执行 VACUUM ANALYZE {QUOTES_TABLE} 更新可见性映射")
+            return result
+        except Exception as e:
+            print(f"检查执行计划失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return None
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def status(self):
+        """列出stock_quotes及其分区上的索引和大小
+
+        Returns:
+            list: [(表名, 索引名, 字节数)]
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+            SELECT tablename, indexname, pg_relation_size(to_regclass(indexname))
+            FROM pg_indexes
+            WHERE tablename = %s OR tablename LIKE %s
+            ORDER BY tablename, indexname
+            """, (QUOTES_TABLE, QUOTES_TABLE + '_p_%'))
+            rows = cursor.fetchall()
+            conn.rollback()
+            cursor.close()
+            return rows
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='stock_quotes索引管理')
+
+    parser.add_argument('command', choices=['create', 'verify', 'status'],
+                        help='create创建索引，verify检查回测查询计划，status列出索引')
+    parser.add_argument('fund_code', nargs='?', help='verify时使用的基金代码')
+    parser.add_argument('data_level', nargs='?', default='1min', help='verify时使用的数据级别')
+    parser.add_argument('start_date', nargs='?', default='2000-01-01', help='verify时使用的开始日期')
+    parser.add_argument('end_date', nargs='?', default='2100-01-01', help='verify时使用的结束日期')
+    parser.add_argument('--analyze', action='store_true', help='verify时实际执行查询')
+    parser.add_argument('--keep-redundant', action='store_true', help='create时保留重复的旧索引')
+
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    manager = QuoteIndexManager()
+
+    if args.command == 'create':
+        created = manager.ensure_indexes(drop_redundant=not args.keep_redundant)
+        print(f"新建索引: {created}")
+        return 0 if created is not None else 1
+    if args.command == 'verify':
+        if not args.fund_code:
+            print("请指定基金代码")
+            return 1
+        result = manager.verify_backtest_plan(args.fund_code, args.data_level, args.start_date,
+                                              args.end_date, args.analyze)
+        return 0 if result and result['index_only'] else 1
+    for table_name, index_name, size in manager.status():
+        print(f"{table_name}.{index_name}: {size / 1024 / 1024:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据库结构迁移模块
+
+所有建表、加列、建索引都登记为带版本号的迁移，已应用的版本记录在schema_version表。
+每个进程启动时调用一次ensure_schema，在一个事务中按版本顺序应用尚未执行的迁移，
+多个进程同时启动时用advisory锁串行执行。之后的读写路径不再执行DDL或查询information_schema。
+
+新增结构变更时在MIGRATIONS末尾追加一个新版本，不要修改已发布的迁移。
+
+命令行用法:
+    python -m backtest_gui.db.migrations status
+    python -m backtest_gui.db.migrations upgrade
+"""
+import os
+import sys
+import argparse
+import threading
+import traceback
+from datetime import datetime
+
+# 添加父级目录到系统路径，以便在命令行中直接运行
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(os.path.dirname(current_dir))
+if project_dir not in sys.path:
+    sys.path.append(project_dir)
+
+from backtest_gui.utils.fund_catalog import ensure_catalog, install_triggers
+from backtest_gui.utils.data_coverage import FUND_DATA_COVERAGE_DDL
+from backtest_gui.db.partitioning import QUOTES_TABLE, create_partitioned_table, is_partitioned
+from backtest_gui.db.indexes import quote_index_definitions
+from backtest_gui.utils.xirr_batch import install_trades_version_triggers
+from backtest_gui.utils.backtest_stats import install_stats_triggers
+
+BACKTEST_SCHEMA_FILE = os.path.join(os.path.dirname(current_dir), 'utils', 'db_schema.sql')
+
+# 新建行情分区表时预建的分钟级别年份分区: 当前年份之前的年数和之后的年数
+QUOTE_PARTITION_YEARS_BACK = 10
+QUOTE_PARTITION_YEARS_AHEAD = 1
+
+# advisory锁键，保证同一时间只有一个进程执行迁移
+MIGRATION_LOCK_KEY = 7324001
+
+SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+)
+"""
+
+
+def _backtest_schema(cursor):
+    """回测结果、策略和网格配置表(db_schema.sql)"""
+    with open(BACKTEST_SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        cursor.execute(f.read())
+
+
+def _backtest_result_columns(cursor):
+    """回测结果的买卖信号数量列和配对交易的剩余份额、卖出收益率列"""
+    cursor.execute("""
+    ALTER TABLE backtest_results
+        ADD COLUMN IF NOT EXISTS buy_count INTEGER,
+        ADD COLUMN IF NOT EXISTS sell_count INTEGER
+    """)
+    cursor.execute("""
+    ALTER TABLE backtest_paired_trades
+        ADD COLUMN IF NOT EXISTS remaining_shares INTEGER,
+        ADD COLUMN IF NOT EXISTS sell_band_profit_rate NUMERIC(10, 4)
+    """)
+
+
+def _stock_quotes(cursor):
+    """统一行情表及回测区间加载用的索引
+
+    新数据库直接创建分区表(见partitioning模块)，并创建覆盖索引、分钟分区的BRIN索引和目录维护触发器。
+    已有的行情表保持不变: 表可能很大，在迁移事务中建索引会长时间阻塞写入，
+    覆盖索引由QuoteIndexManager用CREATE INDEX CONCURRENTLY创建(python -m backtest_gui.db.indexes create)，
+    分区通过在线迁移完成(python -m backtest_gui.db.partitioning migrate)
+    """
+    cursor.execute("SELECT to_regclass('stock_quotes') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        this_year = datetime.now().year
+        years = range(this_year - QUOTE_PARTITION_YEARS_BACK, this_year + QUOTE_PARTITION_YEARS_AHEAD + 1)
+        create_partitioned_table(cursor, QUOTES_TABLE, years)
+        # 空表上直接建索引，不需要CONCURRENTLY
+        for _, _, create_sql in quote_index_definitions(cursor):
+            cursor.execute(create_sql.format(concurrently=''))
+        install_triggers(cursor)
+        return
+
+    if not is_partitioned(cursor, QUOTES_TABLE):
+        print("stock_quotes已存在，覆盖索引请执行 python -m backtest_gui.db.indexes create 在线创建，"
+              "分区请执行 python -m backtest_gui.db.partitioning migrate")
+
+
+def _fund_data_coverage(cursor):
+    """行情覆盖索引表"""
+    cursor.execute(FUND_DATA_COVERAGE_DDL)
+
+
+def _fund_data_ranges(cursor):
+    """基金数据目录表及其维护触发器"""
+    ensure_catalog(cursor)
+
+
+def _fund_tables(cursor):
+    """基金表、基金信息表，并把旧的fund_strategy_mapping绑定迁移到fund_strategy_bindings"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS funds (
+        id SERIAL PRIMARY KEY,
+        symbol VARCHAR(20) NOT NULL UNIQUE,
+        name VARCHAR(100),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS fund_info (
+        id SERIAL PRIMARY KEY,
+        fund_code VARCHAR(20) NOT NULL UNIQUE,
+        fund_name VARCHAR(100) NOT NULL,
+        listing_date DATE,
+        fund_type VARCHAR(50),
+        manager VARCHAR(100),
+        company VARCHAR(100),
+        description TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    cursor.execute("SELECT to_regclass('fund_strategy_mapping') IS NOT NULL")
+    if cursor.fetchone()[0]:
+        cursor.execute("""
+        INSERT INTO fund_strategy_bindings (fund_code, strategy_id, is_default, created_at)
+        SELECT m.fund_code, m.strategy_id, FALSE, COALESCE(m.created_at, NOW())
+        FROM fund_strategy_mapping m
+        WHERE NOT EXISTS (
+            SELECT 1 FROM fund_strategy_bindings b
+            WHERE b.fund_code = m.fund_code AND b.strategy_id = m.strategy_id
+        )
+        """)
+
+
+def _market_data(cursor):
+    """通用行情表(db.database.Database使用)"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS market_data (
+        id SERIAL PRIMARY KEY,
+        symbol VARCHAR(32) NOT NULL,
+        date TIMESTAMP NOT NULL,
+        open FLOAT NOT NULL,
+        high FLOAT NOT NULL,
+        low FLOAT NOT NULL,
+        close FLOAT NOT NULL,
+        volume BIGINT NOT NULL,
+        amount FLOAT,
+        freq VARCHAR(10) NOT NULL
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_market_data_symbol ON market_data (symbol);
+    CREATE INDEX IF NOT EXISTS idx_market_data_date ON market_data (date);
+    CREATE INDEX IF NOT EXISTS idx_market_data_symbol_date ON market_data (symbol, date);
+    CREATE INDEX IF NOT EXISTS idx_market_data_symbol_freq ON market_data (symbol, freq);
+    """)
+
+
+def _backtest_xirr_upsert(cursor):
+    """统一backtest_xirr表结构(db_schema.sql与create_xirr_table.py两种来源)，
+    每个回测只保留最新一条记录并建立唯一索引，以便批量计算结果用一条语句upsert"""
+    cursor.execute("""
+    ALTER TABLE backtest_xirr
+        ADD COLUMN IF NOT EXISTS xirr NUMERIC(15, 4),
+        ADD COLUMN IF NOT EXISTS xirr_value NUMERIC(10, 4),
+        ADD COLUMN IF NOT EXISTS xirr_type VARCHAR(20) NOT NULL DEFAULT 'trades_only',
+        ADD COLUMN IF NOT EXISTS total_buy_value NUMERIC(15, 4),
+        ADD COLUMN IF NOT EXISTS total_sell_value NUMERIC(15, 4),
+        ADD COLUMN IF NOT EXISTS remaining_shares INTEGER,
+        ADD COLUMN IF NOT EXISTS remaining_value NUMERIC(15, 4),
+        ADD COLUMN IF NOT EXISTS total_cash_flow NUMERIC(15, 4),
+        ADD COLUMN IF NOT EXISTS calculation_time TIMESTAMP DEFAULT NOW(),
+        ADD COLUMN IF NOT EXISTS has_incomplete_trades BOOLEAN NOT NULL DEFAULT FALSE,
+        ADD COLUMN IF NOT EXISTS notes TEXT
+    """)
+    cursor.execute("""
+    DELETE FROM backtest_xirr a
+    USING backtest_xirr b
+    WHERE a.backtest_id = b.backtest_id
+      AND (COALESCE(a.calculation_time, '-infinity'), a.ctid) < (COALESCE(b.calculation_time, '-infinity'), b.ctid)
+    """)
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_backtest_xirr_backtest_id ON backtest_xirr(backtest_id)
+    """)
+
+
+def _backtest_xirr_input_hash(cursor):
+    """backtest_xirr记录计算所用输入(配对交易、估值价格、计算方式)的内容哈希，
+    哈希不一致的结果视为过期，已有记录哈希为空，首次读取时重新计算"""
+    cursor.execute("""
+    ALTER TABLE backtest_xirr
+        ADD COLUMN IF NOT EXISTS input_hash VARCHAR(32)
+    """)
+
+
+def _backtest_stats(cursor):
+    """每个回测的预计算统计(交易次数、成本价、最高占用资金、回撤、换手率、XIRR)，保存回测时填充"""
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS backtest_stats (
+        backtest_id INTEGER PRIMARY KEY REFERENCES backtest_results(id) ON DELETE CASCADE,
+        buy_count INTEGER NOT NULL DEFAULT 0,
+        sell_count INTEGER NOT NULL DEFAULT 0,
+        completed_trades INTEGER NOT NULL DEFAULT 0,
+        open_trades INTEGER NOT NULL DEFAULT 0,
+        total_buy_value NUMERIC(18, 4) NOT NULL DEFAULT 0,
+        total_sell_value NUMERIC(18, 4) NOT NULL DEFAULT 0,
+        remaining_shares BIGINT NOT NULL DEFAULT 0,
+        avg_cost NUMERIC(12, 4) NOT NULL DEFAULT 0,
+        max_capital_used NUMERIC(18, 4) NOT NULL DEFAULT 0,
+        max_drawdown NUMERIC(10, 4),
+        turnover NUMERIC(12, 4),
+        xirr_value NUMERIC(10, 4),
+        updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+    )
+    """)
+
+
+def _paired_trades_keyset_index(cursor):
+    """配对交易按回测过滤并按(buy_time, id)倒序分页时使用的索引"""
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_backtest_paired_trades_keyset
+        ON backtest_paired_trades(backtest_id, buy_time, id)
+    """)
+
+
+def _backtest_results_job_key(cursor):
+    """回测结果记录持久化任务键，重放同一任务时不会重复写入"""
+    cursor.execute("""
+    ALTER TABLE backtest_results
+        ADD COLUMN IF NOT EXISTS job_key VARCHAR(32)
+    """)
+    cursor.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_backtest_results_job_key ON backtest_results(job_key)
+    """)
+
+
+def _paired_trades_version(cursor):
+    """回测结果记录配对交易版本号，由backtest_paired_trades上的语句级触发器在增删改时加一；
+    XIRR输入哈希改用版本号，读取缓存时不再扫描配对交易，已保存的哈希随之失效并在首次读取时重新计算"""
+    cursor.execute("""
+    ALTER TABLE backtest_results
+        ADD COLUMN IF NOT EXISTS trades_version BIGINT NOT NULL DEFAULT 0
+    """)
+    install_trades_version_triggers(cursor)
+
+
+def _backtest_stats_invalidation(cursor):
+    """配对交易或净值被增删改时删除对应的回测统计，回测汇总查询发现统计缺失后补算"""
+    install_stats_triggers(cursor)
+
+
+# 迁移登记表: (版本号, 名称, 执行函数)，按版本号顺序应用
+MIGRATIONS = [
+    (1, 'backtest_schema', _backtest_schema),
+    (2, 'backtest_result_columns', _backtest_result_columns),
+    (3, 'stock_quotes', _stock_quotes),
+    (4, 'fund_data_coverage', _fund_data_coverage),
+    (5, 'fund_data_ranges', _fund_data_ranges),
+    (6, 'fund_tables', _fund_tables),
+    (7, 'market_data', _market_data),
+    (8, 'backtest_xirr_upsert', _backtest_xirr_upsert),
+    (9, 'backtest_xirr_input_hash', _backtest_xirr_input_hash),
+    (10, 'backtest_stats', _backtest_stats),
+    (11, 'paired_trades_keyset_index', _paired_trades_keyset_index),
+    (12, 'backtest_results_job_key', _backtest_results_job_key),
+    (13, 'paired_trades_version', _paired_trades_version),
+    (14, 'backtest_stats_invalidation', _backtest_stats_invalidation),
+]
+
+
+def applied_versions(cursor):
+    """获取已应用的迁移版本
+
+    Args:
+        cursor: 数据库游标
+
+    Returns:
+        dict: {版本号: 应用时间}
+    """
+    cursor.execute("SELECT version, applied_at FROM schema_version")
+    return dict(cursor.fetchall())
+
+
+def apply_migrations(cursor):
+    """在当前事务中应用尚未执行的迁移，不提交
+
+    Args:
+        cursor: 数据库游标
+
+    Returns:
+        list: 本次应用的迁移名称
+    """
+    cursor.execute(SCHEMA_VERSION_DDL)
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+
+    applied = applied_versions(cursor)
+    names = []
+    for version, name, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        print(f"应用数据库迁移 {version:03d}_{name} ...")
+        migration(cursor)
+        cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+        names.append(name)
+    return names
+
+
+def migrate(db_connector=None):
+    """应用所有尚未执行的迁移
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器，None时创建DBConnector
+
+    Returns:
+        list: 本次应用的迁移名称，失败返回None
+    """
+    if db_connector is None:
+        from backtest_gui.utils.db_connector import DBConnector
+        db_connector = DBConnector()
+
+    conn = None
+    try:
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        names = apply_migrations(cursor)
+        conn.commit()
+        cursor.close()
+        if names:
+            print(f"数据库结构已更新到版本 {MIGRATIONS[-1][0]}，本次应用: {', '.join(names)}")
+        return names
+    except Exception as e:
+        print(f"数据库迁移失败: {str(e)}")
+        traceback.print_exc()
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
+
+
+_migrated_pid = None
+_migrate_lock = threading.Lock()
+
+
+def ensure_schema(db_connector=None):
+    """每个进程只执行一次迁移，之后的调用直接返回
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器
+
+    Returns:
+        bool: 数据库结构是否已是最新
+    """
+    global _migrated_pid
+    if _migrated_pid == os.getpid():
+        return True
+    with _migrate_lock:
+        if _migrated_pid == os.getpid():
+            return True
+        if migrate(db_connector) is None:
+            return False
+        _migrated_pid = os.getpid()
+        return True
+
+
+def status(db_connector=None):
+    """列出所有迁移及其应用时间
+
+    Returns:
+        list: [(版本号, 名称, 应用时间或None)]
+    """
+    if db_connector is None:
+        from backtest_gui.utils.db_connector import DBConnector
+        db_connector = DBConnector()
+
+    conn = None
+    try:
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+        applied = applied_versions(cursor) if cursor.fetchone()[0] else {}
+        conn.rollback()
+        cursor.close()
+        return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='数据库结构迁移')
+    parser.add_argument('command', choices=['status', 'upgrade'], nargs='?', default='upgrade',
+                        help='status列出迁移状态，upgrade应用尚未执行的迁移')
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    if args.command == 'status':
+        for version, name, applied_at in status():
+            print(f"{version:03d}_{name}: {applied_at if applied_at else '未应用'}")
+        return 0
+    names = migrate()
+    if names is None:
+        return 1
+    print(f"本次应用迁移: {names if names else '无'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,658 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+stock_quotes分区管理模块
+
+将stock_quotes转换为按data_level列表分区、分钟级别再按年份范围分区的分区表：
+    stock_quotes
+    ├── stock_quotes_p_1min            (LIST data_level='1min', 按date RANGE再分区)
+    │   ├── stock_quotes_p_1min_2023
+    │   ├── stock_quotes_p_1min_2024
+    │   └── stock_quotes_p_1min_default
+    ├── ...
+    ├── stock_quotes_p_day             (日/周/月数据量小，不再分区)
+    └── stock_quotes_p_default
+
+按基金和级别查询时可以裁剪分区，删除或重新加载一个级别只需TRUNCATE/DROP对应分区。
+
+在线迁移步骤(不停止写入):
+    1. 创建分区表stock_quotes_part，并在旧表上安装触发器，把迁移期间的写入同步到新表
+    2. 按(fund_code, data_level, date)键集分页批量复制旧数据，每批单独提交
+    3. 在一致性快照中核对各级别记录数(不加锁)，之后的写入由触发器在同一事务中同步到新表
+    4. 短暂锁定旧表，确认同步触发器一直有效，将旧表改名为stock_quotes_legacy、新表改名为stock_quotes
+
+命令行用法:
+    python -m backtest_gui.db.partitioning status
+    python -m backtest_gui.db.partitioning migrate --batch-size 50000
+    python -m backtest_gui.db.partitioning ensure-years --years-ahead 1
+    python -m backtest_gui.db.partitioning drop-legacy
+"""
+import os
+import sys
+import time
+import argparse
+import traceback
+from datetime import datetime
+
+# 添加父级目录到系统路径，以便在命令行中直接运行
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(os.path.dirname(current_dir))
+if project_dir not in sys.path:
+    sys.path.append(project_dir)
+
+QUOTES_TABLE = 'stock_quotes'
+MIGRATION_TABLE = 'stock_quotes_part'
+LEGACY_TABLE = 'stock_quotes_legacy'
+PARTITION_PREFIX = 'stock_quotes_p'
+MIRROR_FUNCTION = 'stock_quotes_mirror_to_part'
+MIRROR_TRIGGER = 'stock_quotes_mirror_trg'
+
+# 切换时随旧表一起改名的索引，新表上的同名索引由QuoteIndexManager重新创建
+LEGACY_INDEX_RENAMES = [
+    ('idx_stock_quotes_fund_date', 'idx_stock_quotes_legacy_fund_date'),
+    ('idx_stock_quotes_range_covering', 'idx_stock_quotes_legacy_range_covering'),
+    ('idx_stock_quotes_date_brin', 'idx_stock_quotes_legacy_date_brin'),
+]
+
+# 切换表名时等待排他锁的最长时间，超时则放弃，避免排在长事务之后阻塞所有读写
+SWAP_LOCK_TIMEOUT = '5s'
+
+# 按年份再分区的分钟级别，其余级别只按data_level分区
+MINUTE_LEVELS = ['1min', '5min', '15min', '30min', '60min']
+OTHER_LEVELS = ['day', 'week', 'month']
+
+QUOTE_COLUMNS = ['fund_code', 'data_level', 'date', 'time', 'open', 'high', 'low', 'close',
+                 'volume', 'amount', 'created_at']
+
+CREATE_PARTITIONED_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+    id BIGSERIAL,
+    fund_code VARCHAR(20) NOT NULL,
+    data_level VARCHAR(10) NOT NULL,
+    date TIMESTAMP NOT NULL,
+    time BIGINT,
+    open FLOAT,
+    high FLOAT,
+    low FLOAT,
+    close FLOAT,
+    volume FLOAT,
+    amount FLOAT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (fund_code, data_level, date)
+) PARTITION BY LIST (data_level)
+"""
+
+MIRROR_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM {target}
+        WHERE fund_code = OLD.fund_code AND data_level = OLD.data_level AND date = OLD.date;
+        IF TG_OP = 'DELETE' THEN
+            RETURN OLD;
+        END IF;
+    END IF;
+    INSERT INTO {target} ({columns})
+    VALUES (NEW.fund_code, NEW.data_level, NEW.date, NEW.time, NEW.open, NEW.high, NEW.low,
+            NEW.close, NEW.volume, NEW.amount, NEW.created_at)
+    ON CONFLICT (fund_code, data_level, date) DO UPDATE SET
+        time = EXCLUDED.time, open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+        close = EXCLUDED.close, volume = EXCLUDED.volume, amount = EXCLUDED.amount,
+        created_at = EXCLUDED.created_at;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+BACKFILL_BATCH_SQL = """
+WITH batch AS (
+    SELECT {columns}
+    FROM {source}
+    WHERE (fund_code, data_level, date) > (%s, %s, %s)
+    ORDER BY fund_code, data_level, date
+    LIMIT %s
+), copied AS (
+    INSERT INTO {target} ({columns})
+    SELECT {columns} FROM batch
+    ON CONFLICT (fund_code, data_level, date) DO NOTHING
+)
+SELECT fund_code, data_level, date, (SELECT COUNT(*) FROM batch)
+FROM batch
+ORDER BY fund_code DESC, data_level DESC, date DESC
+LIMIT 1
+"""
+
+
+def partition_name(data_level, year=None, prefix=PARTITION_PREFIX):
+    """获取分区表名
+
+    Args:
+        data_level: 数据级别
+        year: 年份，None表示级别分区，'default'表示默认分区
+        prefix: 分区名前缀
+
+    Returns:
+        str: 分区表名，如stock_quotes_p_1min_2024
+    """
+    name = f"{prefix}_{data_level}"
+    return name if year is None else f"{name}_{year}"
+
+
+def table_exists(cursor, table_name):
+    """检查表是否存在"""
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+    return cursor.fetchone()[0]
+
+
+def index_exists(cursor, table_name, index_name):
+    """检查指定表上是否有该名称的索引(同名索引在其他表上不算)"""
+    cursor.execute("""
+    SELECT EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE schemaname = current_schema() AND tablename = %s AND indexname = %s
+    )
+    """, (table_name, index_name))
+    return cursor.fetchone()[0]
+
+
+def is_partitioned(cursor, table_name=QUOTES_TABLE):
+    """检查表是否为分区表"""
+    cursor.execute("""
+    SELECT EXISTS (
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = %s
+    )
+    """, (table_name,))
+    return cursor.fetchone()[0]
+
+
+def _year_bounds(year):
+    return f"{year}-01-01", f"{year + 1}-01-01"
+
+
+def create_partitioned_table(cursor, table_name, years, prefix=PARTITION_PREFIX):
+    """创建分区表及全部级别分区和年份分区
+
+    Args:
+        cursor: 数据库游标
+        table_name: 分区表名
+        years: 需要创建的年份分区
+        prefix: 分区名前缀
+    """
+    cursor.execute(CREATE_PARTITIONED_TABLE_SQL.format(table=table_name))
+
+    for level in MINUTE_LEVELS:
+        level_table = partition_name(level, prefix=prefix)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {level_table} PARTITION OF {table_name} "
+            f"FOR VALUES IN (%s) PARTITION BY RANGE (date)", (level,)
+        )
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(level, 'default', prefix)} "
+            f"PARTITION OF {level_table} DEFAULT"
+        )
+
+    for level in OTHER_LEVELS:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(level, prefix=prefix)} PARTITION OF {table_name} "
+            f"FOR VALUES IN (%s)", (level,)
+        )
+
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {partition_name('default', prefix=prefix)} "
+                   f"PARTITION OF {table_name} DEFAULT")
+
+    ensure_year_partitions(cursor, years, prefix=prefix)
+
+
+def ensure_year_partitions(cursor, years, levels=None, prefix=PARTITION_PREFIX):
+    """确保分钟级别的年份分区存在
+
+    如果默认分区中已有该年份的数据，会先分离默认分区，创建年份分区后把数据移入，再重新挂载默认分区。
+
+    Args:
+        cursor: 数据库游标
+        years: 年份列表
+        levels: 数据级别列表，默认全部分钟级别
+        prefix: 分区名前缀
+
+    Returns:
+        list: 新创建的分区表名
+    """
+    created = []
+    for level in levels or MINUTE_LEVELS:
+        level_table = partition_name(level, prefix=prefix)
+        default_table = partition_name(level, 'default', prefix)
+        for year in sorted(set(int(y) for y in years)):
+            child = partition_name(level, year, prefix)
+            if table_exists(cursor, child):
+                continue
+
+            start, end = _year_bounds(year)
+            cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {default_table} WHERE date >= %s AND date < %s)",
+                           (start, end))
+            has_default_rows = cursor.fetchone()[0]
+
+            if has_default_rows:
+                cursor.execute(f"ALTER TABLE {level_table} DETACH PARTITION {default_table}")
+            cursor.execute(
+                f"CREATE TABLE {child} PARTITION OF {level_table} FOR VALUES FROM (%s) TO (%s)",
+                (start, end)
+            )
+            if has_default_rows:
+                cursor.execute(f"""
+                WITH moved AS (
+                    DELETE FROM {default_table} WHERE date >= %s AND date < %s RETURNING *
+                )
+                INSERT INTO {level_table} SELECT * FROM moved
+                """, (start, end))
+                cursor.execute(f"ALTER TABLE {level_table} ATTACH PARTITION {default_table} DEFAULT")
+            created.append(child)
+    return created
+
+
+def delete_quotes(cursor, fund_code, data_level, table_name=QUOTES_TABLE, prefix=PARTITION_PREFIX):
+    """删除一个基金一个级别的行情数据
+
+    表已分区且该级别分区中只有这一个基金时，直接TRUNCATE级别分区；否则执行DELETE，
+    由于按data_level分区，DELETE也只会扫描对应级别的分区。
+
+    Args:
+        cursor: 数据库游标
+        fund_code: 基金代码(不带市场后缀)
+        data_level: 数据级别
+        table_name: 行情表名
+        prefix: 分区名前缀
+
+    Returns:
+        str: 'truncate'或'delete'
+    """
+    level_table = partition_name(data_level, prefix=prefix)
+    if is_partitioned(cursor, table_name) and table_exists(cursor, level_table):
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {level_table} WHERE fund_code <> %s)", (fund_code,))
+        if not cursor.fetchone()[0]:
+            cursor.execute(f"TRUNCATE TABLE {level_table}")
+            return 'truncate'
+
+    cursor.execute(f"DELETE FROM {table_name} WHERE fund_code = %s AND data_level = %s",
+                   (fund_code, data_level))
+    return 'delete'
+
+
+def drop_year_partition(cursor, data_level, year, prefix=PARTITION_PREFIX):
+    """删除一个分钟级别某一年的全部数据(DROP分区)
+
+    Args:
+        cursor: 数据库游标
+        data_level: 数据级别
+        year: 年份
+        prefix: 分区名前缀
+
+    Returns:
+        bool: 分区是否存在并已删除
+    """
+    child = partition_name(data_level, year, prefix)
+    if not table_exists(cursor, child):
+        return False
+    cursor.execute(f"DROP TABLE {child}")
+    return True
+
+
+def _level_counts(cursor, table_name):
+    cursor.execute(f"SELECT data_level, COUNT(*) FROM {table_name} GROUP BY data_level")
+    return dict(cursor.fetchall())
+
+
+def _mirror_trigger_enabled(cursor):
+    """旧表上的同步触发器是否存在且未被禁用"""
+    cursor.execute("""
+    SELECT tgenabled <> 'D' FROM pg_trigger
+    WHERE tgname = %s AND tgrelid = to_regclass(%s)
+    """, (MIRROR_TRIGGER, QUOTES_TABLE))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+class StockQuotesPartitionMigrator:
+    """stock_quotes在线分区迁移工具"""
+
+    def __init__(self, db_connector=None, batch_size=50000, years_ahead=1):
+        """初始化迁移工具
+
+        Args:
+            db_connector: 提供get_connection/release_connection的数据库连接器
+            batch_size: 每批复制的记录数
+            years_ahead: 额外预建的未来年份分区数
+        """
+        if db_connector is None:
+            from backtest_gui.utils.db_connector import DBConnector
+            db_connector = DBConnector()
+        self.db_connector = db_connector
+        self.batch_size = batch_size
+        self.years_ahead = years_ahead
+
+    def status(self):
+        """查看分区状态
+
+        Returns:
+            dict: partitioned/migration_in_progress/legacy_exists/partitions
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            info = {
+                'partitioned': is_partitioned(cursor, QUOTES_TABLE),
+                'migration_in_progress': table_exists(cursor, MIGRATION_TABLE),
+                'legacy_exists': table_exists(cursor, LEGACY_TABLE),
+            }
+            cursor.execute("""
+            SELECT c.relname, pg_total_relation_size(c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE c.relname LIKE %s
+            ORDER BY c.relname
+            """, (PARTITION_PREFIX + '%',))
+            info['partitions'] = cursor.fetchall()
+            conn.rollback()
+            cursor.close()
+            return info
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def _year_range(self, cursor):
+        cursor.execute(f"SELECT MIN(date), MAX(date) FROM {QUOTES_TABLE}")
+        min_date, max_date = cursor.fetchone()
+        this_year = datetime.now().year
+        first = min_date.year if min_date else this_year
+        last = max(max_date.year if max_date else this_year, this_year) + self.years_ahead
+        return list(range(first, last + 1))
+
+    def prepare(self):
+        """创建迁移用分区表并安装同步触发器
+
+        Returns:
+            bool: 是否成功
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+
+            if is_partitioned(cursor, QUOTES_TABLE):
+                print(f"{QUOTES_TABLE} 已经是分区表，无需迁移")
+                conn.rollback()
+                return False
+
+            years = self._year_range(cursor)
+            print(f"创建分区表 {MIGRATION_TABLE}，年份分区 {years[0]}-{years[-1]}")
+            create_partitioned_table(cursor, MIGRATION_TABLE, years)
+
+            columns = ', '.join(QUOTE_COLUMNS)
+            cursor.execute(MIRROR_FUNCTION_SQL.format(function=MIRROR_FUNCTION, target=MIGRATION_TABLE,
+                                                      columns=columns))
+            cursor.execute(f"DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {QUOTES_TABLE}")
+            cursor.execute(f"""
+            CREATE TRIGGER {MIRROR_TRIGGER}
+            AFTER INSERT OR UPDATE OR DELETE ON {QUOTES_TABLE}
+            FOR EACH ROW EXECUTE FUNCTION {MIRROR_FUNCTION}()
+            """)
+            conn.commit()
+            print("已安装同步触发器，迁移期间的写入会同步到新表")
+            return True
+        except Exception as e:
+            print(f"准备分区迁移失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def backfill(self, start_key=None):
+        """按键集分页把旧表数据批量复制到分区表，每批单独提交，可重复执行
+
+        Args:
+            start_key: 起始键(fund_code, data_level, date)，用于中断后继续
+
+        Returns:
+            int: 复制的记录数(含已存在而跳过的记录)，失败返回None
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            columns = ', '.join(QUOTE_COLUMNS)
+            query = BACKFILL_BATCH_SQL.format(columns=columns, source=QUOTES_TABLE, target=MIGRATION_TABLE)
+
+            last_key = tuple(start_key) if start_key else ('', '', datetime(1900, 1, 1))
+            total = 0
+            started = time.time()
+            while True:
+                cursor.execute(query, (*last_key, self.batch_size))
+                row = cursor.fetchone()
+                conn.commit()
+                if row is None:
+                    break
+                last_key = row[:3]
+                total += row[3]
+                elapsed = time.time() - started
+                print(f"已复制 {total} 条记录，当前位置 {last_key[0]} {last_key[1]} {last_key[2]}，"
+                      f"速度 {total / elapsed if elapsed > 0 else 0:.0f} 条/秒")
+                if row[3] < self.batch_size:
+                    break
+            return total
+        except Exception as e:
+            print(f"复制行情数据失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return None
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def verify_counts(self):
+        """在同一个快照中核对新旧表各级别记录数，不加排他锁(只阻塞DDL，不阻塞读写)
+
+        Returns:
+            dict: 各级别记录数，不一致或失败返回None
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            conn.rollback()
+            cursor = conn.cursor()
+            # 两张表的计数取自同一快照，快照之后的写入由触发器同时作用于两张表
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            if not _mirror_trigger_enabled(cursor):
+                print(f"{QUOTES_TABLE} 上没有有效的同步触发器，请重新执行迁移")
+                return None
+            old_counts = _level_counts(cursor, QUOTES_TABLE)
+            new_counts = _level_counts(cursor, MIGRATION_TABLE)
+            conn.rollback()
+            cursor.close()
+            if old_counts != new_counts:
+                print(f"记录数不一致，取消切换: 旧表 {old_counts}，新表 {new_counts}")
+                return None
+            return new_counts
+        except Exception as e:
+            print(f"核对记录数失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return None
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def swap(self):
+        """核对记录数后短暂锁定旧表并切换表名
+
+        记录数在加锁前核对；核对之后的写入由同步触发器在同一事务中写入新表，
+        加锁后只需确认触发器仍然有效，排他锁只在改名期间持有。
+
+        Returns:
+            bool: 是否成功
+        """
+        counts = self.verify_counts()
+        if counts is None:
+            return False
+
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"SET LOCAL lock_timeout = '{SWAP_LOCK_TIMEOUT}'")
+            cursor.execute(f"LOCK TABLE {QUOTES_TABLE} IN ACCESS EXCLUSIVE MODE")
+
+            if not _mirror_trigger_enabled(cursor):
+                print("同步触发器在核对后被删除或禁用，取消切换")
+                conn.rollback()
+                return False
+
+            cursor.execute(f"DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {QUOTES_TABLE}")
+            cursor.execute(f"DROP FUNCTION IF EXISTS {MIRROR_FUNCTION}()")
+            # 旧表的索引改为旧表专用的名称，释放原名称给新表
+            for index_name, legacy_name in LEGACY_INDEX_RENAMES:
+                if index_exists(cursor, QUOTES_TABLE, index_name):
+                    cursor.execute(f"ALTER INDEX {index_name} RENAME TO {legacy_name}")
+            cursor.execute(f"ALTER TABLE {QUOTES_TABLE} RENAME TO {LEGACY_TABLE}")
+            cursor.execute(f"ALTER TABLE {MIGRATION_TABLE} RENAME TO {QUOTES_TABLE}")
+
+            # 基金数据目录触发器随旧表改名，需要在新表上重新安装
+            from backtest_gui.utils.fund_catalog import install_triggers
+            install_triggers(cursor)
+            conn.commit()
+            print(f"切换完成，核对时各级别记录数: {counts}，旧表保留为 {LEGACY_TABLE}")
+            return True
+        except Exception as e:
+            print(f"切换分区表失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def run(self):
+        """执行完整的在线迁移
+
+        Returns:
+            bool: 是否成功
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            in_progress = table_exists(cursor, MIGRATION_TABLE)
+            conn.rollback()
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+        if in_progress:
+            print(f"{MIGRATION_TABLE} 已存在，继续上次的迁移")
+        elif not self.prepare():
+            return False
+
+        if self.backfill() is None:
+            return False
+        if not self.swap():
+            return False
+
+        # 在新表上创建覆盖索引和分钟分区的BRIN索引
+        from backtest_gui.db.indexes import QuoteIndexManager
+        QuoteIndexManager(self.db_connector).ensure_indexes()
+        return True
+
+    def ensure_years(self):
+        """预建当前年份及未来年份的分区
+
+        Returns:
+            list: 新创建的分区表名
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            if not is_partitioned(cursor, QUOTES_TABLE):
+                print(f"{QUOTES_TABLE} 不是分区表，请先执行迁移")
+                conn.rollback()
+                return []
+            this_year = datetime.now().year
+            created = ensure_year_partitions(cursor, range(this_year, this_year + self.years_ahead + 1))
+            conn.commit()
+            return created
+        except Exception as e:
+            print(f"创建年份分区失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return []
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def drop_legacy(self):
+        """删除迁移后保留的旧表
+
+        Returns:
+            bool: 是否成功
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {LEGACY_TABLE}")
+            conn.commit()
+            print(f"已删除 {LEGACY_TABLE}")
+            return True
+        except Exception as e:
+            print(f"删除旧表失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='stock_quotes分区迁移与维护')
+
+    parser.add_argument('command', choices=['status', 'migrate', 'ensure-years', 'drop-legacy'],
+                        help='status查看状态，migrate在线迁移，ensure-years预建年份分区，drop-legacy删除旧表')
+    parser.add_argument('--batch-size', type=int, default=50000, help='迁移时每批复制的记录数')
+    parser.add_argument('--years-ahead', type=int, default=1, help='预建的未来年份分区数')
+
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    migrator = StockQuotesPartitionMigrator(batch_size=args.batch_size, years_ahead=args.years_ahead)
+
+    if args.command == 'status':
+        info = migrator.status()
+        print(f"分区表: {info['partitioned']}, 迁移中: {info['migration_in_progress']}, "
+              f"旧表存在: {info['legacy_exists']}")
+        for name, size in info['partitions']:
+            print(f"  {name}: {size / 1024 / 1024:.1f} MB")
+        return 0
+    if args.command == 'migrate':
+        return 0 if migrator.run() else 1
+    if args.command == 'ensure-years':
+        created = migrator.ensure_years()
+        print(f"新建分区: {created}")
+        return 0
+    return 0 if migrator.drop_legacy() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,7 +26,10 @@ import requests
 import psycopg2
 from psycopg2 import extras  # 用于优化批量数据操作
 from PyQt5.QtCore import QThread, pyqtSignal, QObject
-from backtest_gui.utils.time_utils import convert_timestamp_to_datetime
+from backtest_gui.utils.time_utils import convert_timestamps_to_datetime
+from backtest_gui.utils.data_coverage import DataCoverageIndex, TradingCalendar
+from backtest_gui.utils.symbol_utils import normalize_symbol, to_pure_code, get_market
+from backtest_gui.data.data_source import create_data_source
 
 # 创建日志目录
 def setup_logger():
@@ -105,7 +108,7 @@ import traceback
 import json
 from datetime import datetime, timedelta
 import pandas as pd
-from backtest_gui.utils.time_utils import convert_timestamp_to_datetime
+from backtest_gui.utils.time_utils import convert_timestamps_to_datetime
 
 def find_qmt_path():
     \"\"\"寻找QMT的安装路径\"\"\"
@@ -299,36 +302,27 @@ class FundDataWorker(QThread):
         self.save_to_db = save_to_db
         self.start_date = None
         self.end_date = None
+        self.missing_ranges = None  # 需要获取的缺失区间，None表示获取完整区间
+        self.fetched_ranges = []  # 本次返回了数据的区间，只有这些区间的交易日记为已检查
+        self.failed_ranges = []  # 本次获取失败或没有返回数据的区间，不记入覆盖索引，下次增量获取时重试
         self._xtdata = None
         self._initialize_xtdata()
         
     def _initialize_xtdata(self):
-        """初始化xtdata模块"""
+        """初始化行情数据源(默认QMT xtdata，可在settings.DATA_SOURCE中切换为本地文件或模拟数据)"""
         try:
-            # 查找QMT路径
-            qmt_path = find_qmt_path()
-            if not qmt_path:
-                self.error_signal.emit("未找到QMT路径，请确保QMT已安装")
-                return False
-            
-            # 导入xtquant库
-            from xtquant import xtdata
-            
-            # 设置参数
-            if hasattr(xtdata, 'enable_hello'):
-                xtdata.enable_hello = False  # 不显示登录欢迎信息
-            
-            if hasattr(xtdata, 'enable_reconnect'):
-                xtdata.enable_reconnect = True  # 启用自动重连
+            if self._xtdata is not None:
+                return True
             
-            # 连接服务器
-            xtdata.connect()
-            time.sleep(1)
+            source = create_data_source()
+            if not source.connect():
+                self.error_signal.emit(f"连接行情数据源 {source.name} 失败，请确保QMT已安装")
+                return False
             
-            self._xtdata = xtdata
+            self._xtdata = source
             return True
         except Exception as e:
-            error_msg = f"初始化xtdata模块异常: {str(e)}"
+            error_msg = f"初始化行情数据源异常: {str(e)}"
             print(error_msg)
             traceback.print_exc()
             self.error_signal.emit(error_msg)
@@ -564,6 +558,79 @@ class FundDataWorker(QThread):
         self.start_date = start_date
         self.end_date = end_date
     
+    def set_missing_ranges(self, ranges):
+        """设置需要获取的缺失区间
+        
+        Args:
+            ranges: [(开始日期, 结束日期), ...]，日期格式"YYYYMMDD"
+        """
+        self.missing_ranges = ranges
+    
+    def _fetch_by_level(self):
+        """按数据级别获取当前start_date-end_date区间的数据"""
+        if self.data_level in ['day', '1d', 'week', 'month']:
+            # 日线级别数据直接获取
+            return self._get_daily_data()
+        # 分钟级别数据通过单独进程获取，避免GIL锁
+        return self._get_minute_data_via_subprocess()
+    
+    def _fetch_missing_ranges(self):
+        """逐个获取缺失区间的数据并合并
+        
+        返回了数据的区间记入fetched_ranges，获取失败、出错或没有数据的区间记入failed_ranges
+        
+        Returns:
+            DataFrame: 合并后的数据，全部失败时返回None
+        """
+        full_start, full_end = self.start_date, self.end_date
+        frames = []
+        try:
+            for i, (range_start, range_end) in enumerate(self.missing_ranges):
+                self.progress_signal.emit(20, 100, f"获取缺失区间 {i+1}/{len(self.missing_ranges)}: {range_start} - {range_end}")
+                self.start_date, self.end_date = range_start, range_end
+                try:
+                    df = self._fetch_by_level()
+                except Exception as e:
+                    print(f"获取缺失区间 {range_start} - {range_end} 异常: {str(e)}")
+                    traceback.print_exc()
+                    df = None
+                if df is not None and len(df) > 0:
+                    frames.append(df)
+                    self.fetched_ranges.append((range_start, range_end))
+                else:
+                    self.failed_ranges.append((range_start, range_end))
+        finally:
+            self.start_date, self.end_date = full_start, full_end
+        
+        if not frames:
+            return None
+        
+        df = pd.concat(frames, ignore_index=True)
+        if 'time' in df.columns:
+            df = df.drop_duplicates(subset=['time']).reset_index(drop=True)
+        return df
+    
+    def _update_coverage(self, df):
+        """数据入库后更新覆盖索引
+        
+        Args:
+            df: 已保存的数据
+        """
+        try:
+            if 'date' not in df.columns:
+                return
+            
+            # 成功返回数据的区间内没有数据的交易日记为已检查；获取失败的区间不记录，下次增量获取时重试
+            calendar = TradingCalendar(self._xtdata, market=get_market(self.symbol))
+            checked_days = []
+            for range_start, range_end in self.fetched_ranges:
+                checked_days.extend(calendar.get_trading_days(range_start, range_end))
+            
+            DataCoverageIndex().record(to_pure_code(self.symbol), self.data_level, df['date'], checked_days)
+        except Exception as e:
+            print(f"更新数据覆盖索引失败: {str(e)}")
+            traceback.print_exc()
+    
     def run(self):
         """线程执行的主要方法"""
         try:
@@ -574,17 +641,27 @@ class FundDataWorker(QThread):
                 self.error_signal.emit(f"初始化行情API失败")
                 return
             
-            # 根据数据级别获取数据
-            if self.data_level in ['day', '1d', 'week', 'month']:
-                # 日线级别数据直接获取
-                df = self._get_daily_data()
+            # 根据数据级别获取数据，有缺失区间时只获取缺失部分
+            self.fetched_ranges = []
+            self.failed_ranges = []
+            if self.missing_ranges:
+                df = self._fetch_missing_ranges()
             else:
-                # 分钟级别数据通过单独进程获取，避免GIL锁
-                df = self._get_minute_data_via_subprocess()
+                df = self._fetch_by_level()
+                if df is not None and len(df) > 0:
+                    self.fetched_ranges.append((self.start_date, self.end_date))
                 
             if df is None or len(df) == 0:
                 self.error_signal.emit(f"未获取到 {self.symbol} 的 {self.data_level} 数据")
                 return
+            
+            # 部分区间获取失败时提示用户，这些区间不计入覆盖索引
+            failed_note = ""
+            if self.failed_ranges:
+                summary = ", ".join(f"{s}-{e}" for s, e in self.failed_ranges[:5])
+                more = f" 等{len(self.failed_ranges)}个区间" if len(self.failed_ranges) > 5 else ""
+                failed_note = f"；以下区间获取失败，下次获取时重试: {summary}{more}"
+                print(f"{self.symbol} 的 {self.data_level} 数据部分区间获取失败: {summary}{more}")
                 
             # 保存数据
             print("\n" + "*"*50)
@@ -597,8 +674,9 @@ class FundDataWorker(QThread):
                     print(f"准备调用_save_data方法保存 {self.symbol} 的数据...")
                     result = self._save_data(df)
                     if result:
-                        self.progress_signal.emit(100, 100, f"成功获取并保存 {self.symbol} 的 {self.data_level} 数据，共 {len(df)} 条记录")
-                        self.completed_signal.emit(True, f"成功获取并保存数据，共{len(df)}条记录", df)
+                        self._update_coverage(df)
+                        self.progress_signal.emit(100, 100, f"成功获取并保存 {self.symbol} 的 {self.data_level} 数据，共 {len(df)} 条记录{failed_note}")
+                        self.completed_signal.emit(True, f"成功获取并保存数据，共{len(df)}条记录{failed_note}", df)
                         return
                     else:
                         # 保存失败，但仍然返回数据
@@ -615,8 +693,8 @@ class FundDataWorker(QThread):
                     return
             
             # 如果没有保存到数据库，直接返回数据
-            self.progress_signal.emit(100, 100, f"成功获取 {self.symbol} 的 {self.data_level} 数据，共 {len(df)} 条记录")
-            self.completed_signal.emit(True, f"成功获取数据，共{len(df)}条记录", df)
+            self.progress_signal.emit(100, 100, f"成功获取 {self.symbol} 的 {self.data_level} 数据，共 {len(df)} 条记录{failed_note}")
+            self.completed_signal.emit(True, f"成功获取数据，共{len(df)}条记录{failed_note}", df)
             
         except Exception as e:
             error_msg = f"获取 {self.symbol} 数据异常: {str(e)}"
@@ -700,12 +778,9 @@ class FundDataWorker(QThread):
                         
                         # 添加正确的日期列
                         if 'time' in df.columns:
-                            if isinstance(df['time'].iloc[0], (int, float)):
-                                # 时间戳格式转换为datetime，注意QMT返回的时间戳是毫秒级的
-                                # 将毫秒时间戳转换为秒级，再转换为datetime
-                                correct_dates = convert_timestamp_to_datetime(df['time'])
-                                # 确保直接赋值给date列
-                                df['date'] = correct_dates
+                            if pd.api.types.is_numeric_dtype(df['time']):
+                                # 时间戳格式批量转换为datetime，注意QMT返回的时间戳是毫秒级的
+                                df['date'] = convert_timestamps_to_datetime(df['time'])
                                 print(f"转换时间戳示例: {df['time'].iloc[0]} -> {df['date'].iloc[0]}")
                         
                         self.progress_signal.emit(100, 100, f"成功获取 {self.symbol} 的数据，共 {len(df)} 条记录")
@@ -742,10 +817,9 @@ class FundDataWorker(QThread):
                         
                         # 添加正确的日期列
                         if 'time' in df.columns:
-                            if isinstance(df['time'].iloc[0], (int, float)):
-                                # 时间戳格式转换为datetime，注意QMT返回的时间戳是毫秒级的
-                                # 将毫秒时间戳转换为秒级，再转换为datetime
-                                df['date'] = convert_timestamp_to_datetime(df['time'])
+                            if pd.api.types.is_numeric_dtype(df['time']):
+                                # 时间戳格式批量转换为datetime，注意QMT返回的时间戳是毫秒级的
+                                df['date'] = convert_timestamps_to_datetime(df['time'])
                                 print(f"转换时间戳示例: {df['time'].iloc[0]} -> {df['date'].iloc[0]}")
                         
                         self.progress_signal.emit(80, 100, f"成功获取 {self.symbol} 的 {self.data_level} 数据，共 {len(df)} 条记录")
@@ -884,10 +958,9 @@ class FundDataWorker(QThread):
                         
                         # 添加正确的日期列
                         if 'time' in df.columns:
-                            if isinstance(df['time'].iloc[0], (int, float)):
-                                # 时间戳格式转换为datetime，注意QMT返回的时间戳是毫秒级的
-                                # 将毫秒时间戳转换为秒级，再转换为datetime
-                                df['date'] = convert_timestamp_to_datetime(df['time'])
+                            if pd.api.types.is_numeric_dtype(df['time']):
+                                # 时间戳格式批量转换为datetime，注意QMT返回的时间戳是毫秒级的
+                                df['date'] = convert_timestamps_to_datetime(df['time'])
                                 print(f"转换时间戳示例: {df['time'].iloc[0]} -> {df['date'].iloc[0]}")
                         
                         self.progress_signal.emit(80, 100, f"成功获取 {self.symbol} 的 {self.data_level} 数据，共 {len(df)} 条记录")
@@ -1091,58 +1164,17 @@ class FundDataWorker(QThread):
                     df = df.dropna(subset=['time'])
                     print(f"删除NaN后剩余记录数: {len(df)}")
                 
-                # 批量向量化处理时间戳，提高性能
+                # 批量向量化处理时间戳，一次完成秒/毫秒检测和时区换算
                 print("开始批量转换时间戳...")
                 start_time = time.time()
                 
-                try:
-                    # 尝试直接使用pandas向量化操作
-                    # 时间戳通常是毫秒级，转换为秒级
-                    seconds = df['time'] / 1000
-                    # 使用pd.to_datetime进行批量转换
-                    df['date'] = pd.to_datetime(seconds, unit='s', utc=True).dt.tz_convert('Asia/Shanghai')
-                    
-                    # 如果数据量超过10万条，使用分批处理提高内存效率
-                    if len(df) > 100000:
-                        print(f"数据量超过10万条({len(df)}条)，使用分批处理...")
-                        batch_size = 50000
-                        total_batches = (len(df) + batch_size - 1) // batch_size
-                        dates = []
-                        
-                        for i in range(total_batches):
-                            start_idx = i * batch_size
-                            end_idx = min((i + 1) * batch_size, len(df))
-                            print(f"处理批次 {i+1}/{total_batches} ({start_idx}-{end_idx})...")
-                            
-                            batch_seconds = df['time'].iloc[start_idx:end_idx] / 1000
-                            batch_dates = pd.to_datetime(batch_seconds, unit='s', utc=True).dt.tz_convert('Asia/Shanghai')
-                            dates.append(batch_dates)
-                        
-                        df['date'] = pd.concat(dates)
-                except Exception as e:
-                    print(f"批量转换时间戳失败，回退到逐行处理: {str(e)}")
-                    traceback.print_exc()
-                    
-                    # 回退到逐行处理，但使用更高效的方式
-                    dates = []
-                    # 预先定义转换函数，避免重复查找
-                    convert_func = convert_timestamp_to_datetime
-                    # 提前获取列表，避免重复索引
-                    time_values = df['time'].tolist()
-                    
-                    for ts in time_values:
-                        try:
-                            date = convert_func(ts)
-                            if date is None:
-                                # 使用当前时间作为默认值
-                                date = pd.Timestamp.now()
-                            dates.append(date)
-                        except Exception:
-                            # 使用当前时间作为默认值
-                            dates.append(pd.Timestamp.now())
-                    
-                    # 批量赋值
-                    df['date'] = dates
+                df['date'] = convert_timestamps_to_datetime(df['time'])
+                
+                # 丢弃无法转换的时间戳，不再回退到逐行处理
+                invalid_dates = df['date'].isna().sum()
+                if invalid_dates > 0:
+                    print(f"警告: {invalid_dates} 个时间戳无法转换，已丢弃")
+                    df = df.dropna(subset=['date'])
                 
                 end_time = time.time()
                 print(f"时间戳转换完成，耗时: {end_time - start_time:.2f}秒")
@@ -1569,18 +1601,8 @@ class FundDataFetcher(QObject):
             if self._worker.isRunning():
                 self.close()
                 
-        # 规范化symbol
-        if len(symbol) == 6:
-            # 如果只有6位数字，尝试根据第一位判断添加SH/SZ前缀
-            first_digit = symbol[0]
-            if first_digit in ['5', '6', '9']:
-                full_symbol = symbol + '.SH'  
-            elif first_digit in ['0', '1', '2', '3']:
-                full_symbol = symbol + '.SZ' 
-            else:
-                full_symbol = symbol
-        else:
-            full_symbol = symbol
+        # 规范化symbol，6位代码根据首位添加SH/SZ后缀
+        full_symbol = normalize_symbol(symbol)
             
         # 创建工作线程
         self._worker = FundDataWorker(
@@ -1610,6 +1632,15 @@ class FundDataFetcher(QObject):
         # 设置日期范围
         self._worker.set_date_range(start_date, end_date)
         
+        # 根据覆盖索引只获取缺失的区间
+        if save_to_db:
+            missing_ranges = self._get_missing_ranges(full_symbol, data_level, start_date, end_date)
+            if missing_ranges is not None and len(missing_ranges) == 0:
+                self.progress_signal.emit(100, 100, f"{full_symbol} 的 {data_level} 数据在 {start_date} - {end_date} 已完整，无需获取")
+                self.completed_signal.emit(True, "数据已完整，无需获取", None)
+                return full_symbol
+            self._worker.set_missing_ranges(missing_ranges)
+        
         # 连接信号
         self._worker.progress_signal.connect(self._on_progress)
         self._worker.completed_signal.connect(self._on_completed)
@@ -1621,6 +1652,34 @@ class FundDataFetcher(QObject):
         
         return full_symbol
     
+    def _get_missing_ranges(self, full_symbol, data_level, start_date, end_date):
+        """根据覆盖索引计算缺失的日期区间
+        
+        Args:
+            full_symbol: 带市场后缀的基金代码
+            data_level: 数据级别
+            start_date: 开始日期，格式"YYYYMMDD"
+            end_date: 结束日期，格式"YYYYMMDD"
+            
+        Returns:
+            list: 缺失区间列表，出错时返回None(获取完整区间)
+        """
+        try:
+            calendar = TradingCalendar(self._worker._xtdata, market=get_market(full_symbol))
+            
+            missing_ranges = DataCoverageIndex().find_missing_ranges(
+                to_pure_code(full_symbol), data_level, start_date, end_date, calendar
+            )
+            if missing_ranges:
+                summary = ", ".join(f"{s}-{e}" for s, e in missing_ranges[:5])
+                more = f" 等{len(missing_ranges)}个区间" if len(missing_ranges) > 5 else ""
+                self.progress_signal.emit(18, 100, f"{full_symbol} 缺失区间: {summary}{more}")
+            return missing_ranges
+        except Exception as e:
+            print(f"计算缺失区间失败，将获取完整区间: {str(e)}")
+            traceback.print_exc()
+            return None
+    
     def _on_progress(self, current, total, message):
         """进度更新处理"""
         self.progress_signal.emit(current, total, message)
@@ -2016,14 +2075,9 @@ class FundDataFetcher(QObject):
             # 处理数据，统一格式化时间列
             if 'time' in data.columns:
                 # 检查时间格式，转换为datetime
-                if isinstance(data['time'].iloc[0], (int, float)):
-                    # 时间戳格式转换为日期时间，QMT返回的是毫秒级时间戳
-                    # 将毫秒时间戳转换为秒级，再转换为datetime
-                    data['date'] = convert_timestamp_to_datetime(data['time'])
-                    print(f"转换时间戳示例: {data['time'].iloc[0]} -> {data['date'].iloc[0]}")
-                else:
-                    # 尝试直接转换，确保正确处理时间戳
-                    data['date'] = convert_timestamp_to_datetime(data['time'])
+                # 时间戳批量转换为日期时间，QMT返回的是毫秒级时间戳
+                data['date'] = convert_timestamps_to_datetime(data['time'])
+                print(f"转换时间戳示例: {data['time'].iloc[0]} -> {data['date'].iloc[0]}")
                 
                 # 转换为所需格式的字符串
                 if self.data_level in ['1d', 'day', 'DAY']:
@@ -2068,23 +2122,9 @@ class FundDataFetcher(QObject):
             # 初始化数据库
             db = Database()
             
-            # 优化：确保连接池设置足够处理多线程操作
-            # 重新配置连接池以提高性能
-            if hasattr(db, 'pool') and db.pool:
-                # 关闭旧连接池
-                db.pool.closeall()
-                
-                # 创建更大的连接池
-                db.pool = psycopg2.pool.SimpleConnectionPool(
-                    minconn=5,      # 最小连接数
-                    maxconn=32,     # 最大连接数 - 支持更多并发
-                    host=db.host,
-                    port=db.port,
-                    user=db.user,
-                    password=db.password,
-                    database=db.database
-                )
-                print(f"已优化数据库连接池设置: 最小连接数=5, 最大连接数=32")
+            # 共享连接池是线程安全的，连接耗尽时保存线程阻塞等待
+            if db.pool:
+                print(f"数据库连接池最大连接数: {db.pool.maxconn}")
             
             # 记录当前时间，用于计算性能
             start_time_total = time.time()
@@ -2259,58 +2299,17 @@ class FundDataFetcher(QObject):
                     df = df.dropna(subset=['time'])
                     print(f"删除NaN后剩余记录数: {len(df)}")
                 
-                # 批量向量化处理时间戳，提高性能
+                # 批量向量化处理时间戳，一次完成秒/毫秒检测和时区换算
                 print("开始批量转换时间戳...")
                 start_time = time.time()
                 
-                try:
-                    # 尝试直接使用pandas向量化操作
-                    # 时间戳通常是毫秒级，转换为秒级
-                    seconds = df['time'] / 1000
-                    # 使用pd.to_datetime进行批量转换
-                    df['date'] = pd.to_datetime(seconds, unit='s', utc=True).dt.tz_convert('Asia/Shanghai')
-                    
-                    # 如果数据量超过10万条，使用分批处理提高内存效率
-                    if len(df) > 100000:
-                        print(f"数据量超过10万条({len(df)}条)，使用分批处理...")
-                        batch_size = 50000
-                        total_batches = (len(df) + batch_size - 1) // batch_size
-                        dates = []
-                        
-                        for i in range(total_batches):
-                            start_idx = i * batch_size
-                            end_idx = min((i + 1) * batch_size, len(df))
-                            print(f"处理批次 {i+1}/{total_batches} ({start_idx}-{end_idx})...")
-                            
-                            batch_seconds = df['time'].iloc[start_idx:end_idx] / 1000
-                            batch_dates = pd.to_datetime(batch_seconds, unit='s', utc=True).dt.tz_convert('Asia/Shanghai')
-                            dates.append(batch_dates)
-                        
-                        df['date'] = pd.concat(dates)
-                except Exception as e:
-                    print(f"批量转换时间戳失败，回退到逐行处理: {str(e)}")
-                    traceback.print_exc()
-                    
-                    # 回退到逐行处理，但使用更高效的方式
-                    dates = []
-                    # 预先定义转换函数，避免重复查找
-                    convert_func = convert_timestamp_to_datetime
-                    # 提前获取列表，避免重复索引
-                    time_values = df['time'].tolist()
-                    
-                    for ts in time_values:
-                        try:
-                            date = convert_func(ts)
-                            if date is None:
-                                # 使用当前时间作为默认值
-                                date = pd.Timestamp.now()
-                            dates.append(date)
-                        except Exception:
-                            # 使用当前时间作为默认值
-                            dates.append(pd.Timestamp.now())
-                    
-                    # 批量赋值
-                    df['date'] = dates
+                df['date'] = convert_timestamps_to_datetime(df['time'])
+                
+                # 丢弃无法转换的时间戳，不再回退到逐行处理
+                invalid_dates = df['date'].isna().sum()
+                if invalid_dates > 0:
+                    print(f"警告: {invalid_dates} 个时间戳无法转换，已丢弃")
+                    df = df.dropna(subset=['date'])
                 
                 end_time = time.time()
                 print(f"时间戳转换完成，耗时: {end_time - start_time:.2f}秒")
@@ -16,6 +16,8 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtCore import Qt, pyqtSignal, pyqtSlot
 
+from backtest_gui.utils.fund_catalog import get_catalog, get_range
+
 class FundSelectorWidget(QWidget):
     """基金选择器组件"""
     
@@ -89,70 +91,24 @@ class FundSelectorWidget(QWidget):
             # 清空表格
             self.fund_table.setRowCount(0)
             
-            # 从stock_quotes表中查询基金数据
-            query = """
-            SELECT DISTINCT fund_code, data_level 
-            FROM stock_quotes 
-            ORDER BY fund_code, data_level
-            """
+            # 从基金数据目录读取基金、级别和数据范围，目录由stock_quotes上的触发器在入库时维护
             cursor = self.db_connection.cursor()
-            cursor.execute(query)
             
             # 处理结果
             fund_data_levels = {}  # 用于存储每个基金的数据级别
             fund_data_ranges = {}  # 用于存储每个基金每个级别的数据范围
             fund_names = {}        # 用于存储基金名称
             
-            for row in cursor.fetchall():
-                fund_code = row[0]
-                data_level = row[1]
-                
+            for fund_code, data_level, start_date, end_date, count in get_catalog(cursor):
                 # 记录基金的数据级别
-                if fund_code not in fund_data_levels:
-                    fund_data_levels[fund_code] = []
-                if data_level not in fund_data_levels[fund_code]:
-                    fund_data_levels[fund_code].append(data_level)
+                fund_data_levels.setdefault(fund_code, []).append(data_level)
                 
-                # 查询该基金该级别的数据范围
-                range_query = """
-                SELECT MIN(date), MAX(date), COUNT(*) 
-                FROM stock_quotes 
-                WHERE fund_code = %s AND data_level = %s
-                """
-                cursor.execute(range_query, (fund_code, data_level))
-                range_result = cursor.fetchone()
-                
-                if range_result and range_result[0] and range_result[1]:
-                    start_date = range_result[0]
-                    end_date = range_result[1]
-                    count = range_result[2]
-                    
-                    # 更新或插入fund_data_ranges表
-                    try:
-                        upsert_query = """
-                        INSERT INTO fund_data_ranges (fund_code, data_level, start_date, end_date, record_count, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, NOW())
-                        ON CONFLICT (fund_code, data_level) 
-                        DO UPDATE SET 
-                            start_date = EXCLUDED.start_date,
-                            end_date = EXCLUDED.end_date,
-                            record_count = EXCLUDED.record_count,
-                            updated_at = NOW()
-                        """
-                        cursor.execute(upsert_query, (fund_code, data_level, start_date, end_date, count))
-                        self.db_connection.commit()
-                    except Exception as e:
-                        print(f"更新数据范围失败: {str(e)}")
-                    
-                    # 保存到本地字典
-                    if fund_code not in fund_data_ranges:
-                        fund_data_ranges[fund_code] = {}
-                    
-                    fund_data_ranges[fund_code][data_level] = {
-                        'start_date': start_date,
-                        'end_date': end_date,
-                        'count': count
-                    }
+                # 保存到本地字典
+                fund_data_ranges.setdefault(fund_code, {})[data_level] = {
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'count': count
+                }
             
             # 查询所有基金的名称
             name_query = """
@@ -292,55 +248,18 @@ class FundSelectorWidget(QWidget):
             count = range_data.get('count', 0)
             date_range = f"{start_date} 至 {end_date} ({count}条)"
         else:
-            # 如果内存中没有，尝试从数据库查询
+            # 如果内存中没有，从基金数据目录查询
             try:
                 if self.db_connection:
                     cursor = self.db_connection.cursor()
-                    query = """
-                    SELECT start_date, end_date, record_count 
-                    FROM fund_data_ranges 
-                    WHERE fund_code = %s AND data_level = %s
-                    """
-                    cursor.execute(query, (pure_code, level))
-                    result = cursor.fetchone()
+                    result = get_range(cursor, pure_code, level)
                     
                     if result and result[0] and result[1]:
                         start_date = result[0].strftime("%Y-%m-%d")
                         end_date = result[1].strftime("%Y-%m-%d")
                         count = result[2]
                         date_range = f"{start_date} 至 {end_date} ({count}条)"
-                    else:
-                        # 如果fund_data_ranges表中没有，直接查询stock_quotes表
-                        query = """
-                        SELECT MIN(date), MAX(date), COUNT(*) 
-                        FROM stock_quotes 
-                        WHERE fund_code = %s AND data_level = %s
-                        """
-                        cursor.execute(query, (pure_code, level))
-                        result = cursor.fetchone()
                         
-                        if result and result[0] and result[1]:
-                            start_date = result[0].strftime("%Y-%m-%d")
-                            end_date = result[1].strftime("%Y-%m-%d")
-                            count = result[2]
-                            date_range = f"{start_date} 至 {end_date} ({count}条)"
-                            
-                            # 更新fund_data_ranges表
-                            try:
-                                upsert_query = """
-                                INSERT INTO fund_data_ranges (fund_code, data_level, start_date, end_date, record_count, updated_at)
-                                VALUES (%s, %s, %s, %s, %s, NOW())
-                                ON CONFLICT (fund_code, data_level) 
-                                DO UPDATE SET 
-                                    start_date = EXCLUDED.start_date,
-                                    end_date = EXCLUDED.end_date,
-                                    record_count = EXCLUDED.record_count,
-                                    updated_at = NOW()
-                                """
-                                cursor.execute(upsert_query, (pure_code, level, result[0], result[1], count))
-                                self.db_connection.commit()
-                            except Exception as e:
-                                print(f"更新数据范围失败: {str(e)}")
             except Exception as e:
                 print(f"查询时间范围失败: {str(e)}")
                 
@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+表格模型组件 - 按列存储数据的只读表格模型
+
+数据按列保存在列表中，单元格的显示文本和颜色在视图绘制时才按列定义计算，
+只有可见行会被格式化；追加行通过beginInsertRows增量通知视图，不重建表格。
+排序和筛选经过TableFilterProxyModel完成，排序在源模型中按列整体完成(pandas稳定排序)，
+不逐对比较单元格；排序会改变行号，需要按记录更新行时用key_field指定的字段查找当前行号。
+关键字筛选比较每行缓存的小写文本，行数据不变时只格式化一次，输入框通过延时定时器触发筛选。
+"""
+import pandas as pd
+
+from PyQt5.QtWidgets import QTableView, QHeaderView
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, QTimer
+from PyQt5.QtGui import QColor, QBrush
+
+# 涨跌和状态颜色(与原表格一致: 红涨绿跌)
+RED = QBrush(QColor("red"))
+GREEN = QBrush(QColor("green"))
+BLUE = QBrush(QColor("blue"))
+ORANGE = QBrush(QColor("orange"))
+
+# 筛选输入停止多久后再筛选(毫秒)
+FILTER_DELAY_MS = 250
+
+
+def is_missing(value):
+    """判断单元格值是否为空(None、NaN、NaT)"""
+    if value is None:
+        return True
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def time_format(pattern="%Y-%m-%d %H:%M:%S"):
+    """日期时间格式化函数"""
+    return lambda value: value.strftime(pattern) if hasattr(value, 'strftime') else str(value)
+
+
+def number_format(decimals=2, thousands=False, suffix=""):
+    """数值格式化函数
+
+    Args:
+        decimals: 小数位数
+        thousands: 是否使用千分位
+        suffix: 后缀，如"%"
+    """
+    pattern = f"{{:{',' if thousands else ''}.{decimals}f}}{suffix}"
+    return lambda value: pattern.format(float(value))
+
+
+def signed_color(value):
+    """非负为红色，负数为绿色"""
+    return RED if float(value) >= 0 else GREEN
+
+
+class TableColumn:
+    """表格列定义"""
+
+    def __init__(self, title, key, formatter=str, color=None, empty=""):
+        """初始化列定义
+
+        Args:
+            title: 表头文字
+            key: 数据字段名
+            formatter: 把非空值转换为显示文本的函数
+            color: 根据非空值返回前景色QBrush(或None)的函数
+            empty: 值为空时显示的文本
+        """
+        self.title = title
+        self.key = key
+        self.formatter = formatter
+        self.color = color
+        self.empty = empty
+
+
+class ColumnarTableModel(QAbstractTableModel):
+    """按列存储数据的只读表格模型"""
+
+    # 排序和筛选使用的原始值
+    RAW_ROLE = Qt.UserRole
+
+    def __init__(self, columns, extra_keys=(), key_field=None, parent=None):
+        """初始化表格模型
+
+        Args:
+            columns: TableColumn列表
+            extra_keys: 不显示但需要保存的字段名(如记录ID)
+            key_field: 唯一标识记录的字段名，指定后可用row_of按记录查找当前行号
+            parent: 父对象
+        """
+        super().__init__(parent)
+        self.columns = list(columns)
+        self.key_field = key_field
+        extra_keys = list(extra_keys) + ([key_field] if key_field else [])
+        self.keys = list(dict.fromkeys([column.key for column in self.columns] + extra_keys))
+        self._data = {key: [] for key in self.keys}
+        self._count = 0
+        # 记录键 -> 行号(指定key_field时维护)，以及各行筛选用的小写文本缓存(None表示未计算)
+        self._rows = {}
+        self._search = []
+
+    # ---- Qt模型接口 ----
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal and 0 <= section < len(self.columns):
+            return self.columns[section].title
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = self.columns[index.column()]
+        value = self._data[column.key][index.row()]
+        if role == Qt.DisplayRole:
+            return column.empty if is_missing(value) else column.formatter(value)
+        if role == Qt.ForegroundRole:
+            if column.color is None or is_missing(value):
+                return None
+            return column.color(value)
+        if role == self.RAW_ROLE:
+            return None if is_missing(value) else value
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """按列排序，整体重排各列数据"""
+        if not 0 <= column < len(self.columns) or self._count < 2:
+            return
+        values = pd.Series(self._data[self.columns[column].key], dtype=object)
+        ascending = order == Qt.AscendingOrder
+        try:
+            ordered = values.infer_objects().sort_values(ascending=ascending, kind='stable', na_position='last')
+        except TypeError:
+            # 混合类型的列按文本排序
+            ordered = values.map(lambda value: "" if is_missing(value) else str(value)).sort_values(
+                ascending=ascending, kind='stable')
+        positions = ordered.index.tolist()
+
+        self.layoutAboutToBeChanged.emit()
+        for key in self.keys:
+            data = self._data[key]
+            self._data[key] = [data[i] for i in positions]
+        self._search = [self._search[i] for i in positions]
+        self._rebuild_rows()
+        # 保持选中行等持久索引指向原来的记录
+        old_indexes = self.persistentIndexList()
+        if old_indexes:
+            new_rows = {old_row: new_row for new_row, old_row in enumerate(positions)}
+            self.changePersistentIndexList(old_indexes, [self.index(new_rows[index.row()], index.column())
+                                                         for index in old_indexes])
+        self.layoutChanged.emit()
+
+    # ---- 数据操作 ----
+
+    def clear(self):
+        """清空全部行"""
+        self.beginResetModel()
+        self._data = {key: [] for key in self.keys}
+        self._count = 0
+        self._reset_index()
+        self.endResetModel()
+
+    def set_rows(self, records):
+        """用记录列表(字典)替换全部行"""
+        self.beginResetModel()
+        self._data = {key: [record.get(key) for record in records] for key in self.keys}
+        self._count = len(records)
+        self._reset_index()
+        self.endResetModel()
+
+    def set_frame(self, frame):
+        """用DataFrame替换全部行，缺少的列为空"""
+        self.beginResetModel()
+        self._data = self._frame_columns(frame)
+        self._count = len(frame)
+        self._reset_index()
+        self.endResetModel()
+
+    def append_rows(self, records):
+        """在末尾追加记录列表(字典)"""
+        if not records:
+            return
+        self.beginInsertRows(QModelIndex(), self._count, self._count + len(records) - 1)
+        for key in self.keys:
+            self._data[key].extend(record.get(key) for record in records)
+        self._index_appended(self._count, len(records))
+        self._count += len(records)
+        self.endInsertRows()
+
+    def append_row(self, record):
+        """在末尾追加一条记录，返回行号"""
+        self.append_rows([record])
+        return self._count - 1
+
+    def append_frame(self, frame):
+        """在末尾追加DataFrame的各行"""
+        if frame is None or frame.empty:
+            return
+        columns = self._frame_columns(frame)
+        self.beginInsertRows(QModelIndex(), self._count, self._count + len(frame) - 1)
+        for key in self.keys:
+            self._data[key].extend(columns[key])
+        self._index_appended(self._count, len(frame))
+        self._count += len(frame)
+        self.endInsertRows()
+
+    def update_row(self, row, record):
+        """更新一行中record包含的字段，行号为当前行号(排序后用row_of查找)"""
+        for key, value in record.items():
+            if key in self._data and key != self.key_field:
+                self._data[key][row] = value
+        self._search[row] = None
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(self.columns) - 1))
+
+    def row_of(self, key):
+        """返回key_field等于key的记录的当前行号，不存在时返回None"""
+        return self._rows.get(key)
+
+    def row_record(self, row):
+        """返回一行的全部字段"""
+        return {key: self._data[key][row] for key in self.keys}
+
+    def display_text(self, row, column):
+        """返回单元格的显示文本"""
+        return self.data(self.index(row, column))
+
+    def search_text(self, row):
+        """返回一行各列显示文本拼接成的小写文本(筛选用)，首次访问时计算并缓存"""
+        text = self._search[row]
+        if text is None:
+            text = "\t".join(self.display_text(row, column) for column in range(len(self.columns))).casefold()
+            self._search[row] = text
+        return text
+
+    def to_frame(self):
+        """转换为DataFrame"""
+        return pd.DataFrame(self._data, columns=self.keys)
+
+    def _reset_index(self):
+        """整体替换数据后重建行号索引和筛选文本缓存"""
+        self._search = [None] * self._count
+        self._rebuild_rows()
+
+    def _rebuild_rows(self):
+        """按当前行顺序重建记录键 -> 行号索引"""
+        if self.key_field:
+            self._rows = {key: row for row, key in enumerate(self._data[self.key_field])}
+
+    def _index_appended(self, start, count):
+        """为末尾追加的count行登记行号并预留筛选文本缓存"""
+        self._search.extend([None] * count)
+        if self.key_field:
+            keys = self._data[self.key_field]
+            for row in range(start, start + count):
+                self._rows[keys[row]] = row
+
+    def _frame_columns(self, frame):
+        """按字段取出DataFrame的列，缺少的列填充None"""
+        count = len(frame)
+        return {key: frame[key].tolist() if key in frame.columns else [None] * count for key in self.keys}
+
+
+class TableFilterProxyModel(QSortFilterProxyModel):
+    """表格筛选代理模型
+
+    筛选: 任意一列显示文本包含关键字(不区分大小写)的行；排序: 交给源模型按列整体重排。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._filter_text = ""
+        self._pending_text = ""
+        self._row_filter = None
+        self._filter_timer = QTimer(self)
+        self._filter_timer.setSingleShot(True)
+        self._filter_timer.setInterval(FILTER_DELAY_MS)
+        self._filter_timer.timeout.connect(lambda: self.set_filter_text(self._pending_text))
+
+    def set_filter_text(self, text):
+        """设置关键字筛选，空字符串表示不筛选"""
+        self._filter_timer.stop()
+        self._filter_text = (text or "").strip().casefold()
+        self.invalidateFilter()
+
+    def schedule_filter_text(self, text):
+        """延时设置关键字筛选，连续输入时只在停止输入FILTER_DELAY_MS后筛选一次"""
+        self._pending_text = text
+        self._filter_timer.start()
+
+    def set_row_filter(self, predicate):
+        """设置按记录筛选的函数predicate(record) -> bool，None表示不筛选"""
+        self._row_filter = predicate
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        if self._row_filter is not None and not self._row_filter(model.row_record(source_row)):
+            return False
+        if not self._filter_text:
+            return True
+        if isinstance(model, ColumnarTableModel):
+            return self._filter_text in model.search_text(source_row)
+        return any(self._filter_text in str(model.index(source_row, column).data() or "").casefold()
+                   for column in range(model.columnCount()))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        model = self.sourceModel()
+        if isinstance(model, ColumnarTableModel):
+            # 源模型重排后代理按源行顺序映射，结果即为排序后的顺序
+            model.sort(column, order)
+        else:
+            super().sort(column, order)
+
+
+def create_table_view(model, parent=None, resize_mode=QHeaderView.ResizeToContents):
+    """创建显示表格模型的只读视图，经过TableFilterProxyModel，点击表头排序
+
+    Args:
+        model: ColumnarTableModel
+        parent: 父窗口
+        resize_mode: 列宽模式
+
+    Returns:
+        QTableView: 视图，代理模型为view.model()
+    """
+    proxy = TableFilterProxyModel(parent)
+    proxy.setSourceModel(model)
+
+    view = QTableView(parent)
+    view.setModel(proxy)
+    view.setEditTriggers(QTableView.NoEditTriggers)
+    view.setSelectionBehavior(QTableView.SelectRows)
+    view.setAlternatingRowColors(True)
+    view.verticalHeader().setVisible(False)
+    view.horizontalHeader().setSectionResizeMode(resize_mode)
+    # 初始不排序，保持数据原有顺序
+    view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+    view.setSortingEnabled(True)
+    return view
@@ -32,6 +32,10 @@ from backtest_gui.utils.qmt_path_finder import find_qmt_path
 
 # 导入新的数据获取模块
 from backtest_gui.fund_data_fetcher import FundDataFetcher
+from backtest_gui.utils.data_coverage import DataCoverageIndex
+from backtest_gui.db.partitioning import delete_quotes
+from backtest_gui.utils.fund_catalog import get_levels, get_range, remove_entry
+from backtest_gui.db.migrations import ensure_schema
 
 
 class BandStrategyEditor(QDialog):
@@ -597,15 +601,8 @@ class DataManageWindow(QMainWindow):
             self.conn = get_database_connection()
             if self.conn:
                 print("数据库连接成功")  # 使用print而非log，确保不依赖UI
-                # 确保数据库表结构存在
-                try:
-                    cursor = self.conn.cursor()
-                    self.ensure_tables_exist(cursor)
-                    self.conn.commit()
-                    print("数据库表结构已创建")
-                except Exception as e:
-                    print(f"创建数据库表结构时发生错误: {str(e)}")
-                    traceback.print_exc()
+                # 确保数据库结构已迁移到最新版本(每个进程只执行一次)
+                ensure_schema()
                 
                 # 设置数据获取器的数据库连接
                 if self.data_fetcher:
@@ -1014,16 +1011,8 @@ class DataManageWindow(QMainWindow):
             # 查询该基金的可用数据级别
             cursor = self.conn.cursor()
             
-            query = """
-            SELECT data_level FROM stock_quotes 
-            WHERE fund_code = %s
-            GROUP BY data_level
-            ORDER BY data_level
-            """
-            
             self.log(f"查询基金 {fund_code} 的数据级别...")
-            cursor.execute(query, (pure_code,))
-            available_data_levels = [row[0] for row in cursor.fetchall()]
+            available_data_levels = get_levels(cursor, pure_code)
             self.log(f"查询到基金 {fund_code} 的数据级别: {', '.join(available_data_levels) if available_data_levels else '无'}")
             
             # 获取当前选中的级别
@@ -1095,12 +1084,8 @@ class DataManageWindow(QMainWindow):
         # 验证该基金是否真的有这个数据级别
         try:
             cursor = self.conn.cursor()
-            query = """
-            SELECT COUNT(*) FROM stock_quotes 
-            WHERE fund_code = %s AND data_level = %s
-            """
-            cursor.execute(query, (pure_code, data_level))
-            count = cursor.fetchone()[0]
+            data_range = get_range(cursor, pure_code, data_level)
+            count = data_range[2] if data_range else 0
             
             if count > 0:
                 # 如果确实存在这个数据级别，记录日志
@@ -1151,12 +1136,8 @@ class DataManageWindow(QMainWindow):
             cursor = self.conn.cursor()
             
             # 验证该数据级别是否存在
-            validate_query = """
-            SELECT COUNT(*) FROM stock_quotes 
-            WHERE fund_code = %s AND data_level = %s
-            """
-            cursor.execute(validate_query, (pure_code, data_level))
-            count = cursor.fetchone()[0]
+            data_range = get_range(cursor, pure_code, data_level)
+            count = data_range[2] if data_range else 0
             
             if count == 0:
                 QMessageBox.information(self, "提示", f"未找到{fund_code}的{data_level}级别数据")
@@ -1172,38 +1153,25 @@ class DataManageWindow(QMainWindow):
             if reply != QMessageBox.Yes:
                 return
                 
-            # 查询要删除的数据数量
-            count_query = """
-            SELECT COUNT(*) FROM stock_quotes 
-            WHERE fund_code = %s AND data_level = %s
-            """
-            cursor.execute(count_query, (pure_code, data_level))
-            count_result = cursor.fetchone()
-            data_count = count_result[0] if count_result else 0
-            
-            if data_count == 0:
-                QMessageBox.information(self, "提示", f"未找到{fund_code}的{data_level}级别行情数据")
-                return
+            data_count = count
                 
             # 删除数据
             self.log(f"开始删除{fund_code}的{data_level}级别数据...")
-            delete_query = """
-            DELETE FROM stock_quotes 
-            WHERE fund_code = %s AND data_level = %s
-            """
-            cursor.execute(delete_query, (pure_code, data_level))
+            # 分区表中该级别只有这一个基金时直接清空分区，否则按基金删除
+            delete_method = delete_quotes(cursor, pure_code, data_level)
+            if delete_method == 'truncate':
+                self.log(f"{data_level}级别分区中只有{fund_code}的数据，已直接清空分区")
             
-            # 删除fund_data_ranges表中的对应记录
+            # 删除fund_data_ranges表中的对应记录(TRUNCATE分区不会触发目录触发器)
             try:
-                range_delete_query = """
-                DELETE FROM fund_data_ranges 
-                WHERE fund_code = %s AND data_level = %s
-                """
-                cursor.execute(range_delete_query, (pure_code, data_level))
+                remove_entry(cursor, pure_code, data_level)
                 self.log(f"已删除{fund_code}的{data_level}级别数据范围信息")
             except Exception as e_range:
                 self.log(f"删除数据范围信息失败，但不影响主要删除操作: {str(e_range)}")
             
+            # 删除覆盖索引，下次获取时重新下载这些交易日
+            DataCoverageIndex().clear(pure_code, data_level, cursor)
+            
             # 提交事务
             self.conn.commit()
             
@@ -1273,12 +1241,8 @@ class DataManageWindow(QMainWindow):
         # 检查该基金是否已有该级别的数据
         try:
             cursor = self.conn.cursor()
-            query = """
-            SELECT COUNT(*) FROM stock_quotes 
-            WHERE fund_code = %s AND data_level = %s
-            """
-            cursor.execute(query, (pure_code, data_level))
-            count = cursor.fetchone()[0]
+            data_range = get_range(cursor, pure_code, data_level)
+            count = data_range[2] if data_range else 0
             
             if count > 0:
                 # 如果已有数据，询问是否要更新
@@ -1368,35 +1332,16 @@ class DataManageWindow(QMainWindow):
                     # 获取纯代码（去掉.SH或.SZ后缀）
                     pure_code = fund_code.split('.')[0] if '.' in fund_code else fund_code
                     
-                    # 查询该基金该级别的数据范围
+                    # 入库时触发器已更新基金数据目录，这里只读取目录中的数据范围
                     cursor = self.conn.cursor()
-                    range_query = """
-                    SELECT MIN(date), MAX(date), COUNT(*) 
-                    FROM stock_quotes 
-                    WHERE fund_code = %s AND data_level = %s
-                    """
-                    cursor.execute(range_query, (pure_code, data_level))
-                    range_result = cursor.fetchone()
+                    range_result = get_range(cursor, pure_code, data_level)
                     
                     if range_result and range_result[0] and range_result[1]:
                         start_date = range_result[0]
                         end_date = range_result[1]
                         count = range_result[2]
-                        
-                        # 更新或插入fund_data_ranges表
-                        upsert_query = """
-                        INSERT INTO fund_data_ranges (fund_code, data_level, start_date, end_date, record_count, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, NOW())
-                        ON CONFLICT (fund_code, data_level) 
-                        DO UPDATE SET 
-                            start_date = EXCLUDED.start_date,
-                            end_date = EXCLUDED.end_date,
-                            record_count = EXCLUDED.record_count,
-                            updated_at = NOW()
-                        """
-                        cursor.execute(upsert_query, (pure_code, data_level, start_date, end_date, count))
-                        self.conn.commit()
-                        self.log(f"已更新基金 {fund_code} 的 {data_level} 级别数据范围")
+                        self.log(f"基金 {fund_code} 的 {data_level} 级别数据范围: "
+                                 f"{start_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')}，共 {count} 条")
                         
                         # 查询基金名称
                         cursor.execute("SELECT fund_name FROM fund_info WHERE fund_code = %s", (pure_code,))
@@ -1404,7 +1349,7 @@ class DataManageWindow(QMainWindow):
                         if fund_info_result and fund_info_result[0]:
                             self.log(f"基金名称: {fund_info_result[0]}")
                 except Exception as e:
-                    self.log(f"更新数据范围失败: {str(e)}")
+                    self.log(f"读取数据范围失败: {str(e)}")
             
             # 更新基金列表
             self.fund_selector.load_funds()
@@ -1459,35 +1404,16 @@ class DataManageWindow(QMainWindow):
                     # 获取纯代码（去掉.SH或.SZ后缀）
                     pure_code = fund_code.split('.')[0] if '.' in fund_code else fund_code
                     
-                    # 查询该基金该级别的数据范围
+                    # 入库时触发器已更新基金数据目录，这里只读取目录中的数据范围
                     cursor = self.conn.cursor()
-                    range_query = """
-                    SELECT MIN(date), MAX(date), COUNT(*) 
-                    FROM stock_quotes 
-                    WHERE fund_code = %s AND data_level = %s
-                    """
-                    cursor.execute(range_query, (pure_code, data_level))
-                    range_result = cursor.fetchone()
+                    range_result = get_range(cursor, pure_code, data_level)
                     
                     if range_result and range_result[0] and range_result[1]:
                         start_date = range_result[0]
                         end_date = range_result[1]
                         count = range_result[2]
-                        
-                        # 更新或插入fund_data_ranges表
-                        upsert_query = """
-                        INSERT INTO fund_data_ranges (fund_code, data_level, start_date, end_date, record_count, updated_at)
-                        VALUES (%s, %s, %s, %s, %s, NOW())
-                        ON CONFLICT (fund_code, data_level) 
-                        DO UPDATE SET 
-                            start_date = EXCLUDED.start_date,
-                            end_date = EXCLUDED.end_date,
-                            record_count = EXCLUDED.record_count,
-                            updated_at = NOW()
-                        """
-                        cursor.execute(upsert_query, (pure_code, data_level, start_date, end_date, count))
-                        self.conn.commit()
-                        self.log(f"已更新基金 {fund_code} 的 {data_level} 级别数据范围")
+                        self.log(f"基金 {fund_code} 的 {data_level} 级别数据范围: "
+                                 f"{start_date.strftime('%Y-%m-%d')} 至 {end_date.strftime('%Y-%m-%d')}，共 {count} 条")
                         
                         # 查询基金名称
                         cursor.execute("SELECT fund_name FROM fund_info WHERE fund_code = %s", (pure_code,))
@@ -1510,7 +1436,7 @@ class DataManageWindow(QMainWindow):
                                 break
                             
                 except Exception as e:
-                    self.log(f"更新数据范围失败: {str(e)}")
+                    self.log(f"读取数据范围失败: {str(e)}")
             
             # 更新基金列表
             self.fund_selector.load_funds()
@@ -1628,7 +1554,7 @@ class DataManageWindow(QMainWindow):
             cursor.execute("DELETE FROM fund_strategy_bindings WHERE strategy_id = %s", (strategy['strategy_id'],))
             
             # 兼容旧表
-            cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'fund_strategy_mapping')")
+            cursor.execute("SELECT to_regclass('fund_strategy_mapping') IS NOT NULL")
             if cursor.fetchone()[0]:
                 cursor.execute("DELETE FROM fund_strategy_mapping WHERE strategy_id = %s", (strategy['strategy_id'],))
             
@@ -1667,9 +1593,6 @@ class DataManageWindow(QMainWindow):
             # 开始事务
             cursor = self.conn.cursor()
             
-            # 检查表是否存在，不存在则创建
-            self.ensure_tables_exist(cursor)
-            
             # 处理基金代码，移除.SH或.SZ后缀
             pure_fund_code = fund_code.split('.')[0] if '.' in fund_code else fund_code
             
@@ -1722,17 +1645,6 @@ class DataManageWindow(QMainWindow):
                     "INSERT INTO fund_strategy_bindings (fund_code, strategy_id, is_default, created_at) VALUES (%s, %s, TRUE, NOW())",
                     (pure_fund_code, strategy_id)
                 )
-                
-                # 兼容旧表
-                cursor.execute("SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'fund_strategy_mapping')")
-                if cursor.fetchone()[0]:
-                    try:
-                        cursor.execute(
-                            "INSERT INTO fund_strategy_mapping (fund_code, strategy_id, created_at) VALUES (%s, %s, NOW())",
-                            (pure_fund_code, strategy_id)
-                        )
-                    except Exception as e:
-                        self.log(f"插入到旧表失败，这是预期的: {str(e)}")
             
             # 提交事务
             self.conn.commit()
@@ -1749,129 +1661,6 @@ class DataManageWindow(QMainWindow):
             # 回滚事务
             self.conn.rollback()
     
-    def ensure_tables_exist(self, cursor):
-        """确保数据库表存在
-        
-        Args:
-            cursor: 数据库游标
-        """
-        try:
-            # 检查并创建基金表
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS funds (
-                id SERIAL PRIMARY KEY,
-                symbol VARCHAR(20) NOT NULL UNIQUE,
-                name VARCHAR(100),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-            
-            # 检查并创建基金信息表
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS fund_info (
-                id SERIAL PRIMARY KEY,
-                fund_code VARCHAR(20) NOT NULL UNIQUE,
-                fund_name VARCHAR(100) NOT NULL,
-                listing_date DATE,
-                fund_type VARCHAR(50),
-                manager VARCHAR(100),
-                company VARCHAR(100),
-                description TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-            
-            # 检查并创建基金数据时间范围表
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS fund_data_ranges (
-                id SERIAL PRIMARY KEY,
-                fund_code VARCHAR(20) NOT NULL,
-                data_level VARCHAR(10) NOT NULL,
-                start_date TIMESTAMP,
-                end_date TIMESTAMP,
-                record_count INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE (fund_code, data_level)
-            )
-            """)
-            
-            # 检查并创建策略表
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS band_strategies (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                description TEXT,
-                created_at TIMESTAMP NOT NULL,
-                updated_at TIMESTAMP NOT NULL
-            )
-            """)
-            
-            # 检查并创建网格级别表
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS grid_levels (
-                id SERIAL PRIMARY KEY,
-                strategy_id INTEGER NOT NULL,
-                level INTEGER NOT NULL,
-                grid_type VARCHAR(20) NOT NULL,
-                buy_price DECIMAL(10, 4) NOT NULL,
-                sell_price DECIMAL(10, 4) NOT NULL,
-                buy_shares INTEGER NOT NULL,
-                sell_shares INTEGER NOT NULL,
-                CONSTRAINT fk_strategy
-                    FOREIGN KEY(strategy_id)
-                    REFERENCES band_strategies(id)
-                    ON DELETE CASCADE
-            )
-            """)
-            
-            # 检查并创建基金策略绑定表
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS fund_strategy_bindings (
-                id SERIAL PRIMARY KEY,
-                fund_code VARCHAR(20) NOT NULL,
-                strategy_id INTEGER NOT NULL,
-                is_default BOOLEAN NOT NULL DEFAULT FALSE,
-                created_at TIMESTAMP NOT NULL,
-                CONSTRAINT fk_strategy_binding
-                    FOREIGN KEY(strategy_id)
-                    REFERENCES band_strategies(id)
-                    ON DELETE CASCADE
-            )
-            """)
-            
-            # 向前兼容性：检查旧表并迁移数据
-            cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'fund_strategy_mapping'
-            )
-            """)
-            
-            old_table_exists = cursor.fetchone()[0]
-            if old_table_exists:
-                # 检查新表中是否已有数据
-                cursor.execute("SELECT COUNT(*) FROM fund_strategy_bindings")
-                new_table_count = cursor.fetchone()[0]
-                
-                if new_table_count == 0:
-                    # 如果新表为空，迁移旧表数据
-                    try:
-                        cursor.execute("""
-                        INSERT INTO fund_strategy_bindings (fund_code, strategy_id, is_default, created_at)
-                        SELECT fund_code, strategy_id, FALSE, created_at FROM fund_strategy_mapping
-                        """)
-                        self.log("成功从旧表迁移数据到新表")
-                    except Exception as e:
-                        self.log(f"迁移数据失败: {str(e)}")
-            
-            self.log("数据库表结构已检查并创建")
-            
-        except Exception as e:
-            self.log(f"创建表结构错误: {str(e)}")
-            traceback.print_exc()
-    
     def log(self, message):
         """添加日志
         
@@ -18,7 +18,7 @@ from PyQt5.QtWidgets import (
     QPushButton, QComboBox, QDateEdit, QScrollArea, QTabWidget,
     QMessageBox, QLineEdit, QStatusBar, QFileDialog, QAction,
     QMenuBar, QMenu, QGridLayout, QToolBar, QSplitter, 
-    QSpacerItem, QSizePolicy, QApplication
+    QSpacerItem, QSizePolicy, QApplication, QCheckBox
 )
 from PyQt5.QtCore import Qt, QDateTime, QDate, pyqtSignal, pyqtSlot, QTimer, QSize, QThread
 from PyQt5.QtGui import QColor, QBrush, QDoubleValidator
@@ -32,6 +32,11 @@ from backtest_gui.utils.db_connector import DBConnector
 from backtest_gui.utils.backtest_data_manager import BacktestDataManager
 from backtest_gui.utils.backtest_engine import BacktestEngine
 from backtest_gui.utils.trade_executor import TradeExecutor
+from backtest_gui.utils.fund_catalog import get_fund_codes, get_levels, get_range
+from backtest_gui.db.migrations import ensure_schema
+from backtest_gui.utils.persistence_queue import (
+    get_persistence_queue, STATE_PENDING, STATE_SAVING, STATE_SAVED, STATE_FAILED
+)
 
 class MainWindow(QMainWindow):
     """波段交易回测系统主窗口"""
@@ -51,6 +56,9 @@ class MainWindow(QMainWindow):
         try:
             from backtest_gui.utils.db_connector import DBConnector
             self.db_connector = DBConnector()
+            
+            # 确保数据库结构已迁移到最新版本(每个进程只执行一次)
+            ensure_schema(self.db_connector)
         except Exception as e:
             print(f"初始化数据库连接器错误: {str(e)}")
             traceback.print_exc()
@@ -66,6 +74,17 @@ class MainWindow(QMainWindow):
         self.statusBar = QStatusBar()
         self.setStatusBar(self.statusBar)
         
+        # 回测结果后台持久化队列，保存状态按任务键通知到对应的回测模块
+        self.persist_modules = {}
+        self.persistence_queue = None
+        if self.db_connector:
+            try:
+                self.persistence_queue = get_persistence_queue(self.db_connector)
+                self.persistence_queue.state_signal.connect(self._on_backtest_persist_state)
+            except Exception as e:
+                print(f"初始化回测持久化队列错误: {str(e)}")
+                traceback.print_exc()
+        
         try:
             # 初始化UI
             self.init_ui()
@@ -223,6 +242,11 @@ class MainWindow(QMainWindow):
         # 添加弹性空间
         layout.addStretch(1)
         
+        # 强制重新回测，不复用相同输入的已有回测结果
+        force_rerun_check = QCheckBox("强制重新回测")
+        force_rerun_check.setToolTip("不复用基金、级别、日期范围、行情数据和网格配置都相同的已有回测结果")
+        layout.addWidget(force_rerun_check)
+        
         # 6. 添加策略按钮
         add_strategy_btn = QPushButton("添加策略")
         add_strategy_btn.setFixedWidth(100)
@@ -244,6 +268,7 @@ class MainWindow(QMainWindow):
         self.end_date_edit = end_date
         self.add_strategy_btn = add_strategy_btn
         self.start_backtest_btn = start_backtest_btn
+        self.force_rerun_check = force_rerun_check
         
         return panel
         
@@ -334,24 +359,20 @@ class MainWindow(QMainWindow):
                     conn = self.db_connector.get_connection()
                     cursor = conn.cursor()
                     
-                    # 查询基金列表 - 优先从fund_info表获取
+                    # 查询基金列表 - 从基金数据目录获取有行情数据的基金，名称优先从fund_info表获取
                     cursor.execute("""
                         SELECT DISTINCT fi.fund_code, fi.fund_name 
                         FROM fund_info fi
-                        JOIN stock_quotes sq ON fi.fund_code = sq.fund_code
+                        JOIN fund_data_ranges fdr ON fi.fund_code = fdr.fund_code
+                        WHERE fdr.record_count > 0
                         ORDER BY fi.fund_code
                     """)
                     
                     funds = cursor.fetchall()
                     
-                    # 如果fund_info表没有数据，则从stock_quotes表获取
+                    # 如果fund_info表没有数据，则只显示基金代码
                     if not funds:
-                        cursor.execute("""
-                            SELECT DISTINCT fund_code 
-                            FROM stock_quotes
-                            ORDER BY fund_code
-                        """)
-                        funds = [(row[0], row[0]) for row in cursor.fetchall()]
+                        funds = [(code, code) for code in get_fund_codes(cursor)]
                     
                     # 添加基金到下拉框
                     for fund_code, fund_name in funds:
@@ -474,15 +495,8 @@ class MainWindow(QMainWindow):
                     conn = self.db_connector.get_connection()
                     cursor = conn.cursor()
                     
-                    # 查询该基金的可用数据粒度
-                    cursor.execute("""
-                        SELECT DISTINCT data_level
-                        FROM stock_quotes
-                        WHERE fund_code = %s
-                        ORDER BY data_level
-                    """, (fund_code,))
-                    
-                    granularities = [row[0] for row in cursor.fetchall()]
+                    # 从基金数据目录查询该基金的可用数据粒度
+                    granularities = get_levels(cursor, fund_code)
                     
                     # 如果有数据粒度，添加到下拉框
                     if granularities:
@@ -544,17 +558,11 @@ class MainWindow(QMainWindow):
                     conn = self.db_connector.get_connection()
                     cursor = conn.cursor()
                     
-                    # 查询该基金在指定数据粒度下的日期范围
-                    cursor.execute("""
-                        SELECT MIN(date), MAX(date)
-                        FROM stock_quotes
-                        WHERE fund_code = %s AND data_level = %s
-                    """, (fund_code, data_level))
-                    
-                    result = cursor.fetchone()
+                    # 从基金数据目录查询该基金在指定数据粒度下的日期范围
+                    result = get_range(cursor, fund_code, data_level)
                     
                     if result and result[0] and result[1]:
-                        min_date, max_date = result
+                        min_date, max_date = result[0], result[1]
                         
                         # 设置开始日期为最早日期
                         start_date = QDate.fromString(min_date.strftime("%Y-%m-%d"), "yyyy-MM-dd")
@@ -612,6 +620,10 @@ class MainWindow(QMainWindow):
     def closeEvent(self, event):
         """窗口关闭事件处理"""
         try:
+            # 等待后台持久化完成，未完成的任务保留在日志中下次启动重放
+            if self.persistence_queue:
+                self.persistence_queue.stop()
+                
             # 关闭数据库连接
             if self.db_connector:
                 self.db_connector.close_all()
@@ -1278,14 +1290,25 @@ class MainWindow(QMainWindow):
             print(f"  - 模块大小: {module.size().width()}x{module.size().height()}")
             
             # 更新模块显示
-            module.result_text.setText(f"总收益率: {total_profit_rate:.2f}%, 总收益: {total_profit:.2f}")
-            
-            # 保存回测ID到模块
-            module.backtest_id = backtest_id
+            module.result_summary = f"总收益率: {total_profit_rate:.2f}%, 总收益: {total_profit:.2f}"
+            module.result_text.setText(module.result_summary)
             
-            # 启用查看详情按钮
+            # 保存回测ID到模块，后台保存完成前为None，查看详情按钮在保存完成后启用
+            module.backtest_id = backtest_id or None
             if hasattr(module, 'details_button'):
-                module.details_button.setEnabled(True)
+                module.details_button.setEnabled(bool(module.backtest_id))
+            
+            # 关联后台持久化任务，保存可能已在完成信号到达前结束
+            job_key = getattr(module.backtest_worker, 'persist_job_key', None)
+            module.persist_job_key = job_key
+            if getattr(module.backtest_worker, 'reused_backtest_id', None):
+                module.result_text.setText(f"{module.result_summary}  [复用已有回测 (ID: {backtest_id})]")
+            elif job_key and self.persistence_queue:
+                self.persist_modules[job_key] = module
+                state, saved_id = self.persistence_queue.get_state(job_key)
+                self._show_persist_state(module, state or STATE_PENDING, saved_id)
+            elif not module.backtest_id:
+                self._show_persist_state(module, STATE_FAILED, None, "未能提交后台保存")
             
             # 隐藏取消按钮
             if hasattr(module, 'cancel_button'):
@@ -1388,6 +1411,57 @@ class MainWindow(QMainWindow):
             if hasattr(module, 'cancel_button'):
                 module.cancel_button.setVisible(False)
     
+    def _on_backtest_persist_state(self, job_key, state, backtest_id, message):
+        """后台持久化状态变化回调
+        
+        Args:
+            job_key: 持久化任务键
+            state: 任务状态
+            backtest_id: 回测ID，保存完成时有效
+            message: 说明信息
+        """
+        try:
+            module = self.persist_modules.get(job_key)
+            if module is None:
+                # 完成信号尚未到达或是上次启动遗留的任务
+                if state == STATE_SAVED:
+                    self.statusBar.showMessage(f"回测结果已保存，ID: {backtest_id}")
+                elif state == STATE_FAILED:
+                    self.statusBar.showMessage(f"回测结果保存失败: {message}")
+                return
+            
+            self._show_persist_state(module, state, backtest_id, message)
+            if state in (STATE_SAVED, STATE_FAILED):
+                self.persist_modules.pop(job_key, None)
+        except Exception as e:
+            print(f"处理回测保存状态错误: {str(e)}")
+            traceback.print_exc()
+    
+    def _show_persist_state(self, module, state, backtest_id=None, message=''):
+        """在回测模块上显示保存状态
+        
+        Args:
+            module: 回测模块
+            state: 任务状态
+            backtest_id: 回测ID
+            message: 说明信息
+        """
+        summary = getattr(module, 'result_summary', '')
+        if state == STATE_SAVED:
+            module.backtest_id = backtest_id
+            if hasattr(module, 'details_button'):
+                module.details_button.setEnabled(True)
+            state_text = f"已保存 (ID: {backtest_id})"
+            self.statusBar.showMessage(f"回测结果已保存，ID: {backtest_id}")
+        elif state == STATE_FAILED:
+            state_text = "保存失败"
+            self.statusBar.showMessage(f"回测结果保存失败: {message}")
+        elif state == STATE_SAVING:
+            state_text = "正在保存..."
+        else:
+            state_text = "等待保存..."
+        module.result_text.setText(f"{summary}  [{state_text}]" if summary else state_text)
+    
     def _on_backtest_error(self, error_message):
         """回测错误回调"""
         QMessageBox.warning(self, "回测错误", error_message)
@@ -1797,7 +1871,8 @@ class MainWindow(QMainWindow):
                 start_date=start_date,
                 end_date=end_date,
                 strategy_id=strategy_id,
-                strategy_name=strategy_name
+                strategy_name=strategy_name,
+                force_rerun=self.force_rerun_check.isChecked()
             )
             
             # 连接信号
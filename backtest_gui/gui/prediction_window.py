@@ -10,16 +10,39 @@ import traceback
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
     QLabel, QComboBox, QPushButton, QDateEdit, 
-    QGroupBox, QSplitter, QTableWidget, QTableWidgetItem, 
+    QGroupBox, QSplitter,
     QHeaderView, QMessageBox, QDoubleSpinBox, QFormLayout, QStatusBar
 )
 from PyQt5.QtCore import Qt, QDateTime, QDate
-from PyQt5.QtGui import QIcon, QColor, QBrush
+from PyQt5.QtGui import QIcon
 
 from backtest_gui.gui.chart_widget import ChartWidget
+from backtest_gui.gui.components.table_models import (
+    ColumnarTableModel, TableColumn, create_table_view, time_format, number_format, signed_color
+)
 from backtest_gui.utils.backtest_data_manager import BacktestDataManager
 from backtest_gui.utils.db_connector import DBConnector
 
+# 波段收益预测表格的列，没有卖出记录时卖出列显示"--"
+PREDICTION_COLUMNS = [
+    TableColumn("档位级别", 'level_text'),
+    TableColumn("买入时间", 'buy_time', time_format("%Y-%m-%d %H:%M")),
+    TableColumn("买入价格", 'buy_price', number_format(4)),
+    TableColumn("买入数量", 'buy_amount'),
+    TableColumn("买入金额", 'buy_value', number_format(2)),
+    TableColumn("卖出时间", 'sell_time', time_format("%Y-%m-%d %H:%M"), empty="--"),
+    TableColumn("卖出价格", 'sell_price', number_format(4), empty="--"),
+    TableColumn("卖出数量", 'sell_amount', empty="--"),
+    TableColumn("卖出金额", 'sell_value', number_format(2), empty="--"),
+    TableColumn("剩余数量", 'remaining'),
+    TableColumn("原波段收益", 'original_band_profit', number_format(2), signed_color),
+    TableColumn("原波段收益率", 'original_band_profit_rate', number_format(2, suffix="%"), signed_color),
+    TableColumn("预测价格", 'predict_nav', number_format(4)),
+    TableColumn("预测波段收益", 'predicted_band_profit', number_format(2), signed_color),
+    TableColumn("预测波段收益率", 'predicted_band_profit_rate', number_format(2, suffix="%"), signed_color),
+    TableColumn("收益变化", 'profit_change', number_format(2), signed_color),
+]
+
 
 class PredictionWindow(QMainWindow):
     """基于已回测基金预测未来收益的窗口"""
@@ -193,21 +216,8 @@ class PredictionWindow(QMainWindow):
         table_panel = QGroupBox("波段收益预测")
         table_layout = QVBoxLayout(table_panel)
         
-        self.prediction_table = QTableWidget()
-        self.prediction_table.setColumnCount(16)
-        self.prediction_table.setHorizontalHeaderLabels([
-            "档位级别", 
-            "买入时间", "买入价格", "买入数量", "买入金额",
-            "卖出时间", "卖出价格", "卖出数量", "卖出金额",
-            "剩余数量", "原波段收益", "原波段收益率", 
-            "预测价格", "预测波段收益", "预测波段收益率", "收益变化"
-        ])
-        
-        # 设置表格属性
-        self.prediction_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
-        self.prediction_table.verticalHeader().setVisible(False)
-        self.prediction_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.prediction_table.setAlternatingRowColors(True)
+        self.prediction_model = ColumnarTableModel(PREDICTION_COLUMNS, parent=self)
+        self.prediction_table = create_table_view(self.prediction_model, self)
         
         table_layout.addWidget(self.prediction_table)
         
@@ -278,7 +288,7 @@ class PredictionWindow(QMainWindow):
                 
             # 清空图表和预测表格
             self.chart_widget.clear()
-            self.prediction_table.setRowCount(0)
+            self.prediction_model.clear()
             
             # 清空信息标签
             self.reset_info_labels()
@@ -391,7 +401,7 @@ class PredictionWindow(QMainWindow):
         predict_nav = float(self.predict_nav_spin.value())
         
         # 清空预测表格
-        self.prediction_table.setRowCount(0)
+        self.prediction_model.clear()
         
         try:
             # 预测总收益和总收益率
@@ -445,10 +455,10 @@ class PredictionWindow(QMainWindow):
             return
             
         # 清空预测表格
-        self.prediction_table.setRowCount(0)
+        self.prediction_model.clear()
             
         # 遍历所有配对交易记录
-        row = 0
+        records = []
         for key, pair in paired_trades.items():
             try:
                 buy_record = pair.get('buy')
@@ -508,88 +518,38 @@ class PredictionWindow(QMainWindow):
                 profit_change = predicted_band_profit - original_band_profit
                 
                 # 添加到表格
-                self.prediction_table.insertRow(row)
-                
-                # 档位级别
                 level_text = f"{level}" if level is not None else ""
                 if grid_type:
                     level_text += f" ({grid_type})"
-                self.prediction_table.setItem(row, 0, QTableWidgetItem(level_text))
+                records.append({
+                    'level_text': level_text,
+                    'buy_time': buy_time,
+                    'buy_price': buy_price,
+                    'buy_amount': buy_amount,
+                    'buy_value': buy_value,
+                    'sell_time': sell_time if sell_record else None,
+                    'sell_price': sell_price if sell_record else None,
+                    'sell_amount': sell_amount if sell_record else None,
+                    'sell_value': sell_value if sell_record else None,
+                    'remaining': remaining,
+                    'original_band_profit': original_band_profit,
+                    'original_band_profit_rate': original_band_profit_rate,
+                    'predict_nav': predict_nav,
+                    'predicted_band_profit': predicted_band_profit,
+                    'predicted_band_profit_rate': predicted_band_profit_rate,
+                    'profit_change': profit_change,
+                })
                 
-                # 买入信息
-                time_str = buy_time.strftime("%Y-%m-%d %H:%M") if hasattr(buy_time, 'strftime') else str(buy_time)
-                self.prediction_table.setItem(row, 1, QTableWidgetItem(time_str))
-                self.prediction_table.setItem(row, 2, QTableWidgetItem(f"{buy_price:.4f}"))
-                self.prediction_table.setItem(row, 3, QTableWidgetItem(f"{buy_amount}"))
-                self.prediction_table.setItem(row, 4, QTableWidgetItem(f"{buy_value:.2f}"))
-                
-                # 卖出信息
-                if sell_record:
-                    sell_time_str = sell_time.strftime("%Y-%m-%d %H:%M") if hasattr(sell_time, 'strftime') else str(sell_time)
-                    self.prediction_table.setItem(row, 5, QTableWidgetItem(sell_time_str))
-                    self.prediction_table.setItem(row, 6, QTableWidgetItem(f"{sell_price:.4f}"))
-                    self.prediction_table.setItem(row, 7, QTableWidgetItem(f"{sell_amount}"))
-                    self.prediction_table.setItem(row, 8, QTableWidgetItem(f"{sell_value:.2f}"))
-                else:
-                    self.prediction_table.setItem(row, 5, QTableWidgetItem("--"))
-                    self.prediction_table.setItem(row, 6, QTableWidgetItem("--"))
-                    self.prediction_table.setItem(row, 7, QTableWidgetItem("--"))
-                    self.prediction_table.setItem(row, 8, QTableWidgetItem("--"))
-                
-                # 剩余数量
-                self.prediction_table.setItem(row, 9, QTableWidgetItem(f"{remaining}"))
-                
-                # 原波段收益
-                original_profit_item = QTableWidgetItem(f"{original_band_profit:.2f}")
-                if original_band_profit >= 0:
-                    original_profit_item.setForeground(QBrush(QColor("red")))
-                else:
-                    original_profit_item.setForeground(QBrush(QColor("green")))
-                self.prediction_table.setItem(row, 10, original_profit_item)
-                
-                # 原波段收益率
-                original_rate_item = QTableWidgetItem(f"{original_band_profit_rate:.2f}%")
-                if original_band_profit_rate >= 0:
-                    original_rate_item.setForeground(QBrush(QColor("red")))
-                else:
-                    original_rate_item.setForeground(QBrush(QColor("green")))
-                self.prediction_table.setItem(row, 11, original_rate_item)
-                
-                # 预测价格
-                self.prediction_table.setItem(row, 12, QTableWidgetItem(f"{predict_nav:.4f}"))
-                
-                # 预测波段收益
-                predicted_profit_item = QTableWidgetItem(f"{predicted_band_profit:.2f}")
-                if predicted_band_profit >= 0:
-                    predicted_profit_item.setForeground(QBrush(QColor("red")))
-                else:
-                    predicted_profit_item.setForeground(QBrush(QColor("green")))
-                self.prediction_table.setItem(row, 13, predicted_profit_item)
-                
-                # 预测波段收益率
-                predicted_rate_item = QTableWidgetItem(f"{predicted_band_profit_rate:.2f}%")
-                if predicted_band_profit_rate >= 0:
-                    predicted_rate_item.setForeground(QBrush(QColor("red")))
-                else:
-                    predicted_rate_item.setForeground(QBrush(QColor("green")))
-                self.prediction_table.setItem(row, 14, predicted_rate_item)
-                
-                # 收益变化
-                change_item = QTableWidgetItem(f"{profit_change:.2f}")
-                if profit_change >= 0:
-                    change_item.setForeground(QBrush(QColor("red")))
-                else:
-                    change_item.setForeground(QBrush(QColor("green")))
-                self.prediction_table.setItem(row, 15, change_item)
-                
-                row += 1
             except Exception as e:
                 print(f"处理波段数据错误: {str(e)}")
                 traceback.print_exc()
                 continue
         
+        # 一次性替换表格数据
+        self.prediction_model.set_rows(records)
+        
         # 设置状态
-        self.statusBar.showMessage(f"预测完成，发现 {row} 个有剩余持仓的波段")
+        self.statusBar.showMessage(f"预测完成，发现 {len(records)} 个有剩余持仓的波段")
 
 
 if __name__ == "__main__":
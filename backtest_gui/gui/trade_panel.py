@@ -3,15 +3,60 @@
 """
 交易面板模块 - 用于显示交易记录和账户状态
 """
+from collections import deque
+
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel,
-    QGroupBox, QTableWidget, QTableWidgetItem, QHeaderView,
+    QGroupBox, QHeaderView,
     QSplitter, QTabWidget
 )
 from PyQt5.QtCore import Qt, QDateTime
-from PyQt5.QtGui import QColor, QBrush
 import traceback
 
+from backtest_gui.gui.components.table_models import (
+    ColumnarTableModel, TableColumn, create_table_view, time_format, number_format, signed_color,
+    RED, GREEN, BLUE, ORANGE
+)
+
+# 原始交易表格的列
+TRADE_COLUMNS = [
+    TableColumn("交易时间", 'time', time_format()),
+    TableColumn("交易类型", 'type', color=lambda value: RED if value == "买入" else GREEN),
+    TableColumn("档位级别", 'level_text'),
+    TableColumn("交易价格", 'price', number_format(4)),
+    TableColumn("交易数量", 'amount'),
+    TableColumn("交易金额", 'value', number_format(2)),
+    TableColumn("波段收益", 'band_profit', number_format(2), signed_color),
+    TableColumn("波段收益率", 'band_profit_rate', number_format(2, suffix="%"), signed_color),
+]
+
+# 配对交易表格的列
+PAIRED_TRADE_COLUMNS = [
+    TableColumn("档位级别", 'level_text'),
+    TableColumn("买入时间", 'buy_time', time_format()),
+    TableColumn("买入价格", 'buy_price', number_format(4)),
+    TableColumn("买入股数", 'buy_amount'),
+    TableColumn("买入金额", 'buy_value', number_format(2)),
+    TableColumn("卖出时间", 'sell_time', time_format()),
+    TableColumn("卖出价格", 'sell_price', number_format(4)),
+    TableColumn("卖出股数", 'sell_amount'),
+    TableColumn("卖出金额", 'sell_value', number_format(2)),
+    TableColumn("剩余份额", 'remaining_shares'),
+    TableColumn("卖出收益率", 'sell_profit_rate', number_format(2, suffix="%"), signed_color),
+    TableColumn("卖出收益", 'band_profit', number_format(2), signed_color),
+    TableColumn("卖出收益率(%)", 'sell_band_profit_rate', number_format(2, suffix="%"), signed_color),
+    TableColumn("状态", 'status', color=lambda value: BLUE if value == "已完成" else ORANGE),
+]
+
+
+def _level_text(level, grid_type):
+    """档位级别显示文本，如: 3 (normal)"""
+    level_text = f"{level}" if level is not None else ""
+    if grid_type:
+        level_text += f" ({grid_type})"
+    return level_text
+
+
 class TradePanel(QWidget):
     """交易面板，显示交易记录和账户状态"""
     
@@ -29,6 +74,9 @@ class TradePanel(QWidget):
         # 保存配对交易记录
         self.paired_trades = {}
         
+        # 各档位尚未卖出的配对(按买入顺序)
+        self.open_paired_keys = {}
+        
         # 保存交易执行器引用
         self.executor = None
         
@@ -109,16 +157,9 @@ class TradePanel(QWidget):
         group_box = QGroupBox("交易记录")
         layout = QVBoxLayout(group_box)
         
-        # 创建表格
-        self.trade_table = QTableWidget()
-        self.trade_table.setColumnCount(8)  # 增加档位级别列
-        self.trade_table.setHorizontalHeaderLabels(["交易时间", "交易类型", "档位级别", "交易价格", "交易数量", "交易金额", "波段收益", "波段收益率"])
-        
-        # 设置表格属性
-        self.trade_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        self.trade_table.verticalHeader().setVisible(False)
-        self.trade_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.trade_table.setAlternatingRowColors(True)
+        # 创建表格(包含档位级别列)
+        self.trade_model = ColumnarTableModel(TRADE_COLUMNS, parent=self)
+        self.trade_table = create_table_view(self.trade_model, self, QHeaderView.Stretch)
         
         layout.addWidget(self.trade_table)
         
@@ -130,19 +171,8 @@ class TradePanel(QWidget):
         layout = QVBoxLayout(group_box)
         
         # 创建表格
-        self.paired_trade_table = QTableWidget()
-        self.paired_trade_table.setColumnCount(14)
-        self.paired_trade_table.setHorizontalHeaderLabels([
-            "档位级别", "买入时间", "买入价格", "买入股数", "买入金额", 
-            "卖出时间", "卖出价格", "卖出股数", "卖出金额", 
-            "剩余份额", "卖出收益率", "卖出收益", "卖出收益率(%)", "状态"
-        ])
-        
-        # 设置表格属性
-        self.paired_trade_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
-        self.paired_trade_table.verticalHeader().setVisible(False)
-        self.paired_trade_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.paired_trade_table.setAlternatingRowColors(True)
+        self.paired_trade_model = ColumnarTableModel(PAIRED_TRADE_COLUMNS, key_field='pair_key', parent=self)
+        self.paired_trade_table = create_table_view(self.paired_trade_model, self)
         
         layout.addWidget(self.paired_trade_table)
         
@@ -210,151 +240,85 @@ class TradePanel(QWidget):
         }
         self.trades.append(trade_record)
         
-        # 更新交易记录表格
-        row = self.trade_table.rowCount()
-        self.trade_table.insertRow(row)
-        
-        # 设置单元格内容
-        self.trade_table.setItem(row, 0, QTableWidgetItem(trade_time.strftime("%Y-%m-%d %H:%M:%S")))
-        
-        type_item = QTableWidgetItem(trade_type)
-        if trade_type == "买入":
-            type_item.setForeground(QBrush(QColor("red")))
-        else:
-            type_item.setForeground(QBrush(QColor("green")))
-        self.trade_table.setItem(row, 1, type_item)
-        
-        # 添加档位级别
-        level_text = f"{level}" if level is not None else ""
-        if grid_type:
-            level_text += f" ({grid_type})"
-        self.trade_table.setItem(row, 2, QTableWidgetItem(level_text))
-        
-        self.trade_table.setItem(row, 3, QTableWidgetItem(f"{price:.4f}"))
-        self.trade_table.setItem(row, 4, QTableWidgetItem(f"{amount}"))
-        self.trade_table.setItem(row, 5, QTableWidgetItem(f"{trade_value:.2f}"))
-        
-        if band_profit is not None:
-            profit_item = QTableWidgetItem(f"{band_profit:.2f}")
-            if band_profit >= 0:
-                profit_item.setForeground(QBrush(QColor("red")))
-            else:
-                profit_item.setForeground(QBrush(QColor("green")))
-            self.trade_table.setItem(row, 6, profit_item)
-            
-            if band_profit_rate is not None:
-                rate_item = QTableWidgetItem(f"{band_profit_rate:.2f}%")
-                if band_profit_rate >= 0:
-                    rate_item.setForeground(QBrush(QColor("red")))
-                else:
-                    rate_item.setForeground(QBrush(QColor("green")))
-                self.trade_table.setItem(row, 7, rate_item)
-        
-        # 滚动到最新行
-        self.trade_table.scrollToItem(self.trade_table.item(row, 0))
+        # 追加到交易记录表格并滚动到最新行
+        self.trade_model.append_row(dict(trade_record, level_text=_level_text(level, grid_type)))
+        self.trade_table.scrollToBottom()
         
         # 更新配对交易记录
         if level is not None:
+            open_keys = self.open_paired_keys.setdefault((level, grid_type), deque())
             # 为每个买卖对创建唯一键，使用时间戳作为区分
             if trade_type == "买入":
                 key = f"{level}_{grid_type}_{trade_time.timestamp()}"
                 self.paired_trades[key] = {"buy": trade_record, "sell": None, "status": "进行中"}
+                open_keys.append(key)
+                self._update_paired_trade_table(key)
             else:  # 卖出
-                # 查找匹配的买入记录
+                # 同一档位最早买入且仍在进行中的配对
                 matched_key = None
-                for k, v in self.paired_trades.items():
-                    # 检查是否是同一档位且状态为进行中的买入记录
-                    if (k.startswith(f"{level}_{grid_type}_") and 
-                        v["buy"] is not None and 
-                        v["sell"] is None and
-                        v["status"] == "进行中"):
+                while open_keys:
+                    k = open_keys.popleft()
+                    v = self.paired_trades.get(k)
+                    if v is not None and v["sell"] is None and v["status"] == "进行中":
                         matched_key = k
                         break
                 
                 if matched_key:
                     self.paired_trades[matched_key]["sell"] = trade_record
                     self.paired_trades[matched_key]["status"] = "已完成"
-            
-            self._update_paired_trade_table()
+                    self._update_paired_trade_table(matched_key)
         
         # 更新账户状态显示
         self.update_account_display()
         
-    def _update_paired_trade_table(self):
-        """更新配对交易表格"""
-        # 清空表格
-        self.paired_trade_table.setRowCount(0)
+    def _update_paired_trade_table(self, key):
+        """更新配对交易表格中的一个配对，新配对追加到末尾，其余行不变
         
-        # 添加配对交易记录
-        for key, pair in self.paired_trades.items():
-            row = self.paired_trade_table.rowCount()
-            self.paired_trade_table.insertRow(row)
-            
-            buy_record = pair.get("buy")
-            sell_record = pair.get("sell")
-            
-            # 档位级别
-            level_parts = key.split("_")
-            level = level_parts[0]
-            grid_type = level_parts[1] if len(level_parts) > 1 else ""
-            level_text = f"{level}" if level else ""
-            if grid_type:
-                level_text += f" ({grid_type})"
-            self.paired_trade_table.setItem(row, 0, QTableWidgetItem(level_text))
+        Args:
+            key: 配对交易键
+        """
+        record = self._paired_trade_record(key, self.paired_trades[key])
+        # 点击表头排序后行号会变化，按配对键查找当前行
+        row = self.paired_trade_model.row_of(key)
+        if row is None:
+            self.paired_trade_model.append_row(dict(record, pair_key=key))
+        else:
+            self.paired_trade_model.update_row(row, record)
+    
+    def _paired_trade_record(self, key, pair):
+        """把配对交易转换为表格行"""
+        buy_record = pair.get("buy")
+        sell_record = pair.get("sell")
+        
+        # 档位级别
+        level_parts = key.split("_")
+        level = level_parts[0]
+        grid_type = level_parts[1] if len(level_parts) > 1 else ""
+        record = {'level_text': _level_text(level or None, grid_type), 'status': pair["status"]}
+        
+        # 买入信息
+        if buy_record:
+            record.update(buy_time=buy_record['time'], buy_price=buy_record['price'],
+                          buy_amount=buy_record['amount'], buy_value=buy_record['value'])
+        
+        # 卖出信息
+        if sell_record:
+            record.update(sell_time=sell_record['time'], sell_price=sell_record['price'],
+                          sell_amount=sell_record['amount'], sell_value=sell_record['value'])
             
-            # 买入信息
-            if buy_record:
-                self.paired_trade_table.setItem(row, 1, QTableWidgetItem(buy_record['time'].strftime("%Y-%m-%d %H:%M:%S")))
-                self.paired_trade_table.setItem(row, 2, QTableWidgetItem(f"{buy_record['price']:.4f}"))
-                self.paired_trade_table.setItem(row, 3, QTableWidgetItem(f"{buy_record['amount']}"))
-                self.paired_trade_table.setItem(row, 4, QTableWidgetItem(f"{buy_record['value']:.2f}"))
+            # 剩余份额
+            record['remaining_shares'] = sell_record.get(
+                'remaining_shares', buy_record['amount'] - sell_record['amount'] if buy_record else 0)
             
-            # 卖出信息
-            if sell_record:
-                self.paired_trade_table.setItem(row, 5, QTableWidgetItem(sell_record['time'].strftime("%Y-%m-%d %H:%M:%S")))
-                self.paired_trade_table.setItem(row, 6, QTableWidgetItem(f"{sell_record['price']:.4f}"))
-                self.paired_trade_table.setItem(row, 7, QTableWidgetItem(f"{sell_record['amount']}"))
-                self.paired_trade_table.setItem(row, 8, QTableWidgetItem(f"{sell_record['value']:.2f}"))
-                
-                # 剩余份额
-                remaining_shares = sell_record.get('remaining_shares', buy_record['amount'] - sell_record['amount'] if buy_record else 0)
-                self.paired_trade_table.setItem(row, 9, QTableWidgetItem(f"{remaining_shares}"))
-                
-                # 卖出收益率
-                if sell_record.get('sell_profit_rate') is not None:
-                    sell_profit_rate_item = QTableWidgetItem(f"{sell_record['sell_profit_rate']:.2f}%")
-                    if sell_record['sell_profit_rate'] >= 0:
-                        sell_profit_rate_item.setForeground(QBrush(QColor("red")))
-                    else:
-                        sell_profit_rate_item.setForeground(QBrush(QColor("green")))
-                    self.paired_trade_table.setItem(row, 10, sell_profit_rate_item)
-                
-                # 卖出收益
-                if sell_record['band_profit'] is not None:
-                    profit_item = QTableWidgetItem(f"{sell_record['band_profit']:.2f}")
-                    if sell_record['band_profit'] >= 0:
-                        profit_item.setForeground(QBrush(QColor("red")))
-                    else:
-                        profit_item.setForeground(QBrush(QColor("green")))
-                    self.paired_trade_table.setItem(row, 11, profit_item)
-                    
-                    # 卖出收益率(%)
-                    sell_band_profit_rate = sell_record.get('sell_band_profit_rate', sell_record.get('band_profit_rate'))
-                    if sell_band_profit_rate is not None:
-                        rate_item = QTableWidgetItem(f"{sell_band_profit_rate:.2f}%")
-                        if sell_band_profit_rate >= 0:
-                            rate_item.setForeground(QBrush(QColor("red")))
-                        else:
-                            rate_item.setForeground(QBrush(QColor("green")))
-                        self.paired_trade_table.setItem(row, 12, rate_item)
+            # 卖出收益率
+            record['sell_profit_rate'] = sell_record.get('sell_profit_rate')
             
-            # 状态
-            status_item = QTableWidgetItem(pair["status"])
-            if pair["status"] == "已完成":
-                status_item.setForeground(QBrush(QColor("blue")))
-            else:
-                status_item.setForeground(QBrush(QColor("orange")))
-            self.paired_trade_table.setItem(row, 13, status_item)
+            # 卖出收益和卖出收益率(%)
+            record['band_profit'] = sell_record['band_profit']
+            if sell_record['band_profit'] is not None:
+                record['sell_band_profit_rate'] = sell_record.get('sell_band_profit_rate',
+                                                                  sell_record.get('band_profit_rate'))
+        return record
         
     def update_position_value(self, current_price):
         """更新持仓市值
@@ -415,11 +379,8 @@ class TradePanel(QWidget):
     def clear(self):
         """清空交易面板数据"""
         # 清空交易记录表格
-        if self.trade_table:
-            self.trade_table.setRowCount(0)
-        
-        if self.paired_trade_table:
-            self.paired_trade_table.setRowCount(0)
+        self.trade_model.clear()
+        self.paired_trade_model.clear()
         
         # 重置账户状态
         self.current_capital = self.initial_capital
@@ -431,6 +392,7 @@ class TradePanel(QWidget):
         self.current_position_profit = 0.0
         self.trades = []
         self.paired_trades = {}
+        self.open_paired_keys = {}
         
         # 更新显示
         self.update_account_display()
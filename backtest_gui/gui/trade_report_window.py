@@ -12,12 +12,18 @@ from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
     QComboBox, QDateEdit, QTableWidget, QTableWidgetItem, QHeaderView,
     QGroupBox, QFormLayout, QMessageBox, QApplication, QSplitter,
-    QFileDialog
+    QFileDialog, QDialog, QLineEdit
 )
 from PyQt5.QtCore import Qt, QDate, pyqtSlot
 from PyQt5.QtGui import QCursor
 
+from backtest_gui import settings
+from backtest_gui.gui.components.table_models import (
+    ColumnarTableModel, TableColumn, create_table_view, time_format, number_format
+)
 from backtest_gui.utils.trade_query import TradeQuery
+from backtest_gui.utils.xirr_batch import get_trades_only_xirr_values
+from backtest_gui.utils.xirr_series import compute_backtest_xirr_series, FREQ_MONTH, FREQ_TRADE
 # 使用不依赖scipy的XIRR计算器
 try:
     from backtest_gui.utils.xirr_calculator import XIRRCalculator
@@ -32,6 +38,26 @@ except ImportError:
     XIRRCalculatorTradesOnly = None
 
 
+# 配对交易表格的列
+TRADE_COLUMNS = [
+    TableColumn("交易ID", 'id'),
+    TableColumn("级别", 'level'),
+    TableColumn("网格类型", 'grid_type'),
+    TableColumn("买入时间", 'buy_time', time_format()),
+    TableColumn("买入价格", 'buy_price', number_format(4)),
+    TableColumn("买入数量", 'buy_amount', lambda value: f"{int(value):,}"),
+    TableColumn("买入金额", 'buy_value', number_format(2, thousands=True)),
+    TableColumn("卖出时间", 'sell_time', time_format()),
+    TableColumn("卖出价格", 'sell_price', number_format(4)),
+    TableColumn("卖出数量", 'sell_amount', lambda value: f"{int(value):,}"),
+    TableColumn("卖出金额", 'sell_value', number_format(2, thousands=True)),
+    TableColumn("剩余份额", 'remaining_shares', lambda value: f"{int(value):,}"),
+    TableColumn("卖出收益", 'band_profit', number_format(2, thousands=True)),
+    TableColumn("卖出收益率(%)", 'sell_band_profit_rate', number_format(2, suffix="%")),
+    TableColumn("状态", 'status'),
+]
+
+
 class TradeReportWindow(QMainWindow):
     """交易报告窗口"""
     
@@ -163,13 +189,16 @@ class TradeReportWindow(QMainWindow):
         # 创建配对交易表格
         trades_group = QGroupBox("配对交易记录")
         trades_layout = QVBoxLayout()
-        self.trades_table = QTableWidget()
-        self.trades_table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.trades_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.trades_table.setAlternatingRowColors(True)
-        self.trades_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.trades_model = ColumnarTableModel(TRADE_COLUMNS, extra_keys=['backtest_id'], parent=self)
+        self.trades_table = create_table_view(self.trades_model, self)
         self.trades_table.horizontalHeader().setStretchLastSection(True)
-        self.trades_table.verticalHeader().setVisible(False)
+        # 滚动到底部时加载下一页
+        self.trades_table.verticalScrollBar().valueChanged.connect(self.on_trades_scrolled)
+        
+        # 分页状态: 当前过滤条件、下一页的翻页键
+        self.trades_filters = {}
+        self.trades_next_key = None
+        self.trades_total = 0
         
         # 添加按钮布局
         buttons_layout = QHBoxLayout()
@@ -183,11 +212,31 @@ class TradeReportWindow(QMainWindow):
         self.export_excel_button.setEnabled(True)  # 修改：默认启用
         self.export_excel_button.clicked.connect(self.on_export_excel_clicked)
         
+        # XIRR走势(按月末或按交易日)
+        self.xirr_series_freq_combo = QComboBox()
+        self.xirr_series_freq_combo.addItem("按月末", FREQ_MONTH)
+        self.xirr_series_freq_combo.addItem("按交易日", FREQ_TRADE)
+        self.xirr_series_button = QPushButton("XIRR走势")
+        self.xirr_series_button.clicked.connect(self.on_xirr_series_clicked)
+        
         buttons_layout.addWidget(self.xirr_button)
         # 移除交易专用XIRR按钮
+        buttons_layout.addWidget(self.xirr_series_freq_combo)
+        buttons_layout.addWidget(self.xirr_series_button)
         buttons_layout.addWidget(self.export_excel_button)
         buttons_layout.addStretch()
         
+        self.trades_filter_edit = QLineEdit()
+        self.trades_filter_edit.setPlaceholderText("筛选已加载的交易")
+        self.trades_filter_edit.textChanged.connect(self.trades_table.model().schedule_filter_text)
+        self.trades_count_label = QLabel("")
+        self.load_more_button = QPushButton("加载更多")
+        self.load_more_button.setEnabled(False)
+        self.load_more_button.clicked.connect(self.load_more_trades)
+        buttons_layout.addWidget(self.trades_filter_edit)
+        buttons_layout.addWidget(self.trades_count_label)
+        buttons_layout.addWidget(self.load_more_button)
+        
         trades_layout.addWidget(self.trades_table)
         trades_layout.addLayout(buttons_layout)
         
@@ -384,16 +433,20 @@ class TradeReportWindow(QMainWindow):
             
             if summary_df is not None and not summary_df.empty:
                 # 设置表格列数
-                self.summary_table.setColumnCount(12)  # 增加了操作列
+                self.summary_table.setColumnCount(14)  # 增加了操作列
                 
                 # 设置表头
                 headers = ["回测ID", "基金代码", "基金名称", "策略名称", "开始日期", "结束日期", 
-                          "最高占用资金", "买入次数", "卖出次数", "成本价", "年化收益率(%)", "操作"]
+                          "最高占用资金", "买入次数", "卖出次数", "成本价", "年化收益率(%)",
+                          "最大回撤(%)", "换手率", "操作"]
                 self.summary_table.setHorizontalHeaderLabels(headers)
                 
                 # 设置行数
                 self.summary_table.setRowCount(len(summary_df))
                 
+                # 一次取出所有回测的交易专用XIRR，没有保存过的批量计算
+                xirr_values = get_trades_only_xirr_values(self.db_connector, summary_df['id'].tolist())
+                
                 # 填充数据
                 for i, (_, row) in enumerate(summary_df.iterrows()):
                     # 回测ID
@@ -418,53 +471,46 @@ class TradeReportWindow(QMainWindow):
                     end_date = row['end_date'].strftime("%Y-%m-%d") if pd.notna(row['end_date']) else ""
                     self.summary_table.setItem(i, 5, QTableWidgetItem(end_date))
                     
-                    # 最高占用资金 (计算为初始资金 - 最低现金)
-                    # 从交易记录中获取最高占用资金
-                    max_capital_used = self.trade_query.get_max_capital_used(row['id'])
+                    # 最高占用资金、买入卖出次数、成本价等统计都来自保存回测时预计算的backtest_stats
+                    max_capital_used = row['max_capital_used']
                     max_capital_used_str = f"{float(max_capital_used):,.2f}" if pd.notna(max_capital_used) else "0.00"
                     self.summary_table.setItem(i, 6, QTableWidgetItem(max_capital_used_str))
                     
                     # 买入次数
-                    buy_count = self.trade_query.get_buy_count(row['id'])
-                    self.summary_table.setItem(i, 7, QTableWidgetItem(str(buy_count)))
+                    self.summary_table.setItem(i, 7, QTableWidgetItem(str(int(row['buy_count']))))
                     
                     # 卖出次数
-                    sell_count = self.trade_query.get_sell_count(row['id'])
-                    self.summary_table.setItem(i, 8, QTableWidgetItem(str(sell_count)))
+                    self.summary_table.setItem(i, 8, QTableWidgetItem(str(int(row['sell_count']))))
                     
-                    # 成本价 (从持仓信息获取)
-                    avg_cost = self.trade_query.get_avg_cost(row['id'])
-                    avg_cost_str = f"{float(avg_cost):.4f}" if pd.notna(avg_cost) and avg_cost > 0 else "0.0000"
+                    # 成本价 (剩余底仓的平均买入价)
+                    avg_cost = float(row['avg_cost']) if pd.notna(row['avg_cost']) else 0.0
+                    avg_cost_str = f"{avg_cost:.4f}" if avg_cost > 0 else "0.0000"
                     self.summary_table.setItem(i, 9, QTableWidgetItem(avg_cost_str))
                     
                     # 年化收益率 (使用交易专用XIRR计算结果)
-                    xirr_value = self.trade_query.get_xirr_value(row['id'])
-                    if pd.notna(xirr_value) and xirr_value is not None:
+                    xirr_value = xirr_values.get(int(row['id']))
+                    if xirr_value is not None:
                         profit_rate = f"{float(xirr_value):.2f}%" if xirr_value != 0 else "0.00%"
                     else:
-                        # 如果没有计算过XIRR，尝试计算
-                        if not hasattr(self, 'trades_only_xirr_calculator') or self.trades_only_xirr_calculator is None:
-                            from backtest_gui.utils.xirr_calculator_trades_only import XIRRCalculatorTradesOnly
-                            self.trades_only_xirr_calculator = XIRRCalculatorTradesOnly(self.db_connector)
-                        
-                        try:
-                            print(f"数据库中没有回测ID={row['id']}的XIRR值，尝试计算...")
-                            result = self.trades_only_xirr_calculator.calculate_backtest_xirr(row['id'])
-                            if result and 'xirr_value' in result and result['xirr_value'] is not None:
-                                profit_rate = f"{float(result['xirr_value']):.2f}%"
-                            else:
-                                profit_rate = "未计算"
-                        except Exception as e:
-                            print(f"计算XIRR失败: {str(e)}")
-                            profit_rate = "计算错误"
+                        profit_rate = "未计算"
                     
                     self.summary_table.setItem(i, 10, QTableWidgetItem(profit_rate))
                     
+                    # 最大回撤 (没有净值时按成交价估值的权益曲线计算，没有成交的回测为空)
+                    max_drawdown = row['max_drawdown']
+                    max_drawdown_str = f"{float(max_drawdown):.2f}%" if pd.notna(max_drawdown) else ""
+                    self.summary_table.setItem(i, 11, QTableWidgetItem(max_drawdown_str))
+                    
+                    # 换手率 (买卖成交金额 / 初始资金)
+                    turnover = row['turnover']
+                    turnover_str = f"{float(turnover):.2f}" if pd.notna(turnover) else ""
+                    self.summary_table.setItem(i, 12, QTableWidgetItem(turnover_str))
+                    
                     # 添加操作按钮
                     export_button = QPushButton("导出XIRR")
                     export_button.setProperty("backtest_id", row['id'])
                     export_button.clicked.connect(self.on_export_xirr_clicked)
-                    self.summary_table.setCellWidget(i, 11, export_button)
+                    self.summary_table.setCellWidget(i, 13, export_button)
                     
                 # 调整列宽
                 self.summary_table.resizeColumnsToContents()
@@ -488,109 +534,72 @@ class TradeReportWindow(QMainWindow):
             QMessageBox.warning(self, "查询错误", f"加载回测汇总信息失败: {str(e)}")
             
     def load_paired_trades(self, fund_code=None, strategy_id=None, start_date=None, end_date=None, level=None, status=None, backtest_id=None):
-        """加载配对交易记录"""
+        """加载配对交易记录
+        
+        过滤在数据库中完成，只加载第一页(按买入时间倒序)，其余页在滚动到底部或点击"加载更多"时加载
+        """
         try:
-            # 查询配对交易记录
-            trades_df = self.trade_query.get_paired_trades(fund_code, strategy_id, start_date, end_date, level, status)
+            self.trades_filters = {
+                'fund_code': fund_code, 'strategy_id': strategy_id, 'start_date': start_date,
+                'end_date': end_date, 'level': level, 'status': status, 'backtest_id': backtest_id,
+            }
+            self.trades_next_key = None
+            self.trades_data = None
+            self.trades_model.clear()
+            
+            # 查询配对交易记录总数和第一页
+            self.trades_total = self.trade_query.count_paired_trades(**self.trades_filters) or 0
+            trades_df, self.trades_next_key = self.trade_query.get_paired_trades_page(
+                page_size=settings.TRADE_REPORT_PAGE_SIZE, **self.trades_filters)
             
             if trades_df is not None and not trades_df.empty:
-                # 如果指定了回测ID，过滤数据
-                if backtest_id:
-                    trades_df = trades_df[trades_df['backtest_id'] == backtest_id]
-                    
-                if trades_df.empty:
-                    # 清空表格
-                    self.trades_table.setRowCount(0)
-                    QMessageBox.information(self, "查询结果", "未查询到配对交易记录")
-                    return
-                
-                # 设置表格列数
-                self.trades_table.setColumnCount(15)
-                
-                # 设置表头
-                headers = ["交易ID", "级别", "网格类型", "买入时间", "买入价格", "买入数量", "买入金额",
-                          "卖出时间", "卖出价格", "卖出数量", "卖出金额", "剩余份额", "卖出收益", "卖出收益率(%)", "状态"]
-                self.trades_table.setHorizontalHeaderLabels(headers)
-                
-                # 设置行数
-                self.trades_table.setRowCount(len(trades_df))
-                
-                # 填充数据
-                for i, (_, row) in enumerate(trades_df.iterrows()):
-                    # 交易ID
-                    self.trades_table.setItem(i, 0, QTableWidgetItem(str(row['id'])))
-                    
-                    # 级别
-                    self.trades_table.setItem(i, 1, QTableWidgetItem(str(row['level'])))
-                    
-                    # 网格类型
-                    grid_type = row['grid_type'] if pd.notna(row['grid_type']) else ""
-                    self.trades_table.setItem(i, 2, QTableWidgetItem(grid_type))
-                    
-                    # 买入时间
-                    buy_time = row['buy_time'].strftime("%Y-%m-%d %H:%M:%S") if pd.notna(row['buy_time']) else ""
-                    self.trades_table.setItem(i, 3, QTableWidgetItem(buy_time))
-                    
-                    # 买入价格
-                    buy_price = f"{float(row['buy_price']):.4f}" if pd.notna(row['buy_price']) else ""
-                    self.trades_table.setItem(i, 4, QTableWidgetItem(buy_price))
-                    
-                    # 买入数量
-                    buy_amount = f"{int(row['buy_amount']):,}" if pd.notna(row['buy_amount']) else ""
-                    self.trades_table.setItem(i, 5, QTableWidgetItem(buy_amount))
-                    
-                    # 买入金额
-                    buy_value = f"{float(row['buy_value']):,.2f}" if pd.notna(row['buy_value']) else ""
-                    self.trades_table.setItem(i, 6, QTableWidgetItem(buy_value))
-                    
-                    # 卖出时间
-                    sell_time = row['sell_time'].strftime("%Y-%m-%d %H:%M:%S") if pd.notna(row['sell_time']) else ""
-                    self.trades_table.setItem(i, 7, QTableWidgetItem(sell_time))
-                    
-                    # 卖出价格
-                    sell_price = f"{float(row['sell_price']):.4f}" if pd.notna(row['sell_price']) else ""
-                    self.trades_table.setItem(i, 8, QTableWidgetItem(sell_price))
-                    
-                    # 卖出数量
-                    sell_amount = f"{int(row['sell_amount']):,}" if pd.notna(row['sell_amount']) else ""
-                    self.trades_table.setItem(i, 9, QTableWidgetItem(sell_amount))
-                    
-                    # 卖出金额
-                    sell_value = f"{float(row['sell_value']):,.2f}" if pd.notna(row['sell_value']) else ""
-                    self.trades_table.setItem(i, 10, QTableWidgetItem(sell_value))
-                    
-                    # 剩余份额
-                    remaining_shares = f"{int(row['remaining_shares']):,}" if pd.notna(row['remaining_shares']) else ""
-                    self.trades_table.setItem(i, 11, QTableWidgetItem(remaining_shares))
-                    
-                    # 卖出收益（波段收益）
-                    band_profit = f"{float(row['band_profit']):,.2f}" if pd.notna(row['band_profit']) else ""
-                    self.trades_table.setItem(i, 12, QTableWidgetItem(band_profit))
-                    
-                    # 卖出收益率
-                    sell_band_profit_rate = f"{float(row['sell_band_profit_rate']):.2f}%" if pd.notna(row['sell_band_profit_rate']) else ""
-                    self.trades_table.setItem(i, 13, QTableWidgetItem(sell_band_profit_rate))
-                    
-                    # 状态
-                    status = row['status'] if pd.notna(row['status']) else ""
-                    self.trades_table.setItem(i, 14, QTableWidgetItem(status))
-                    
-                # 调整列宽
-                self.trades_table.resizeColumnsToContents()
-                
-                # 存储完整数据
-                self.trades_data = trades_df
-                
+                self.append_trade_rows(trades_df)
             else:
                 # 清空表格
-                self.trades_table.setRowCount(0)
-                self.trades_data = None
+                self.update_trades_paging()
                 QMessageBox.information(self, "查询结果", "未查询到配对交易记录")
                 
         except Exception as e:
             print(f"加载配对交易记录失败: {str(e)}")
             traceback.print_exc()
             QMessageBox.warning(self, "查询错误", f"加载配对交易记录失败: {str(e)}")
+    
+    def load_more_trades(self):
+        """按当前过滤条件加载下一页配对交易"""
+        if self.trades_next_key is None:
+            return
+        try:
+            trades_df, self.trades_next_key = self.trade_query.get_paired_trades_page(
+                page_size=settings.TRADE_REPORT_PAGE_SIZE, after=self.trades_next_key, **self.trades_filters)
+            if trades_df is None:
+                self.update_trades_paging()
+                QMessageBox.warning(self, "查询错误", "加载下一页配对交易记录失败")
+                return
+            self.append_trade_rows(trades_df)
+        except Exception as e:
+            print(f"加载下一页配对交易记录失败: {str(e)}")
+            traceback.print_exc()
+            QMessageBox.warning(self, "查询错误", f"加载下一页配对交易记录失败: {str(e)}")
+    
+    def on_trades_scrolled(self, value):
+        """配对交易表格滚动到底部时自动加载下一页"""
+        if self.trades_next_key is not None and value >= self.trades_table.verticalScrollBar().maximum():
+            self.load_more_trades()
+    
+    def update_trades_paging(self):
+        """更新已加载条数和"加载更多"按钮状态"""
+        loaded = self.trades_model.rowCount()
+        self.trades_count_label.setText(f"已加载 {loaded} / 共 {self.trades_total} 条" if self.trades_total else "")
+        self.load_more_button.setEnabled(self.trades_next_key is not None)
+    
+    def append_trade_rows(self, trades_df):
+        """把一页配对交易追加到表格末尾，单元格在显示时才格式化"""
+        self.trades_model.append_frame(trades_df)
+        
+        # 存储已加载的数据
+        self.trades_data = trades_df if self.trades_data is None else pd.concat([self.trades_data, trades_df],
+                                                                                 ignore_index=True)
+        self.update_trades_paging()
             
     def on_summary_item_clicked(self, item):
         """点击回测汇总表格行事件"""
@@ -615,7 +624,7 @@ class TradeReportWindow(QMainWindow):
                 print(f"trades_data行数: {len(self.trades_data) if not self.trades_data.empty else 0}")
         
         # 检查表格行数
-        rows = self.trades_table.rowCount()
+        rows = self.trades_model.rowCount()
         print(f"配对交易表格行数: {rows}")
         
         # 强制启用按钮
@@ -710,6 +719,47 @@ class TradeReportWindow(QMainWindow):
             
             QMessageBox.critical(self, "计算错误", f"计算XIRR时出错: {error_msg}")
             
+    def on_xirr_series_clicked(self):
+        """点击XIRR走势按钮事件，显示各观察日的交易专用XIRR曲线"""
+        if not self.current_backtest_id:
+            QMessageBox.warning(self, "警告", "请先选择一个回测记录")
+            return
+            
+        freq = self.xirr_series_freq_combo.currentData()
+        try:
+            QApplication.setOverrideCursor(Qt.WaitCursor)
+            series = compute_backtest_xirr_series(self.db_connector, self.current_backtest_id, freq)
+        finally:
+            QApplication.restoreOverrideCursor()
+            
+        if series is None or series['xirr'].notna().sum() == 0:
+            QMessageBox.warning(self, "计算失败", "该回测没有可计算XIRR的交易记录")
+            return
+            
+        from backtest_gui.gui.chart_widget import ChartWidget
+        
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"交易专用XIRR走势 - 回测ID: {self.current_backtest_id}")
+        dialog.resize(900, 650)
+        layout = QVBoxLayout(dialog)
+        
+        chart = ChartWidget()
+        chart.showToolbar()
+        layout.addWidget(chart)
+        
+        valid = series['xirr'].dropna()
+        chart.price_ax.clear()
+        chart.price_ax.set_ylabel('XIRR(%)')
+        chart.price_ax.axhline(0, color='gray', linewidth=0.8)
+        chart.price_ax.grid(True)
+        chart.plot(valid.index, valid.values, color='blue')
+        chart.set_title(f"交易专用XIRR走势({self.xirr_series_freq_combo.currentText()})")
+        
+        last = valid.iloc[-1]
+        layout.addWidget(QLabel(f"观察日: {len(series)}，最后一个观察日 {valid.index[-1].strftime('%Y-%m-%d')} "
+                                f"XIRR: {last:.2f}%，持仓市值: {series['market_value'].iloc[-1]:,.2f}"))
+        dialog.exec_()
+        
     def on_trades_only_xirr_clicked(self):
         """点击计算交易专用XIRR按钮事件"""
         print("\n=============== 交易专用XIRR计算调试 ===============")
@@ -20,6 +20,7 @@ from PyQt5.QtCore import QCoreApplication, QTranslator, Qt
 from PyQt5.QtGui import QFont, QIcon
 
 from backtest_gui.gui.main_window import MainWindow
+from backtest_gui.db.migrations import ensure_schema
 from backtest_gui.gui.prediction_window import PredictionWindow
 
 
@@ -258,6 +259,9 @@ def main():
     # 创建应用程序
     app = QApplication(sys.argv)
     
+    # 启动时应用一次数据库结构迁移
+    ensure_schema()
+    
     # 创建并显示主应用窗口
     main_app = MainApplicationWindow()
     main_app.show()
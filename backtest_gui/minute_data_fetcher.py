@@ -16,8 +16,8 @@ import pandas as pd
 import numpy as np
 from PyQt5.QtCore import QThread, pyqtSignal
 from .db.database import StockDatabase
-from .utils.time_utils import convert_timestamp_to_datetime, is_valid_date
-from backtest_gui.utils.time_utils import convert_timestamp_to_datetime
+from .utils.time_utils import is_valid_date
+from .utils.data_coverage import DataCoverageIndex
 
 class MinuteDataFetcher(QThread):
     update_signal = pyqtSignal(str)
@@ -30,6 +30,7 @@ class MinuteDataFetcher(QThread):
         self.data_level = data_level
         self.start_date = start_date
         self.end_date = end_date
+        self.missing_ranges = None
         self.db = StockDatabase()
         
     def run(self):
@@ -64,40 +65,26 @@ class MinuteDataFetcher(QThread):
     
     def check_existing_data(self):
         """
-        检查数据库中是否已存在相同基金、级别和时间段的数据
+        根据覆盖索引检查指定时间段内是否还有缺失的交易日
+        
+        缺失区间保存在self.missing_ranges中，供后续获取使用
         
         Returns:
-            bool: 如果数据已存在返回True，否则返回False
+            bool: 如果所有交易日都已有数据返回True，否则返回False
         """
         try:
-            # 将日期字符串转换为datetime对象
-            start_dt = datetime.strptime(self.start_date, '%Y%m%d')
-            end_dt = datetime.strptime(self.end_date, '%Y%m%d')
-            
-            # 转换为时间戳范围
-            start_timestamp = int(start_dt.timestamp() * 1000)
-            end_timestamp = int(end_dt.timestamp() * 1000) + 24*60*60*1000  # 加上一天
-            
-            # 查询数据库中该基金代码和数据级别在指定时间范围内的记录数
-            query = f"""
-            SELECT COUNT(*) as count FROM stock_quotes 
-            WHERE fund_code = '{self.fund_code}' 
-            AND data_level = '{self.data_level}'
-            AND time >= {start_timestamp}
-            AND time <= {end_timestamp}
-            """
-            
-            result = self.db.execute_query(query)
-            if result and len(result) > 0:
-                count = result[0]['count']
-                # 如果记录数大于0，说明已有数据
-                return count > 0
-                
-            return False
+            pure_code = self.fund_code.split('.')[0]
+            self.missing_ranges = DataCoverageIndex().find_missing_ranges(
+                pure_code, self.data_level, self.start_date, self.end_date
+            )
+            if self.missing_ranges:
+                self.update_signal.emit(f"{self.fund_code} {self.data_level} 缺失 {len(self.missing_ranges)} 个区间，"
+                                        f"首个区间: {self.missing_ranges[0][0]} - {self.missing_ranges[0][1]}")
+            return not self.missing_ranges
         except Exception as e:
             self.update_signal.emit(f"检查现有数据时出错: {str(e)}")
             return False
-            
+    
     def fetch_1min_data(self):
         # 实现1分钟数据获取逻辑
         # ... 现有代码 ...
@@ -263,25 +250,10 @@ def fetch_minute_data(symbol, start_date, end_date, data_level, output_file):
                             df = df.dropna(subset=['time'])
                             print(f"删除NaN后剩余记录数: {len(df)}")
                         
-                        # 逐行转换时间戳，避免批量处理可能的错误
-                        print("开始逐行转换时间戳...")
-                        from backtest_gui.utils.time_utils import convert_timestamp_to_datetime
-                        dates = []
-                        for i, ts in enumerate(df['time']):
-                            try:
-                                date = convert_timestamp_to_datetime(ts)
-                                if date is None:
-                                    print(f"警告: 第{i}行时间戳 {ts} 转换结果为None")
-                                    # 使用当前时间作为默认值
-                                    date = pd.Timestamp.now()
-                                dates.append(date)
-                            except Exception as e:
-                                print(f"警告: 第{i}行时间戳 {ts} 转换失败: {str(e)}")
-                                # 使用当前时间作为默认值
-                                dates.append(pd.Timestamp.now())
-                        
-                        # 将转换后的日期添加到DataFrame
-                        df['date'] = dates
+                        # 批量转换时间戳，无法转换的值为NaT，在下方统一过滤
+                        print("开始批量转换时间戳...")
+                        from backtest_gui.utils.time_utils import convert_timestamps_to_datetime
+                        df['date'] = convert_timestamps_to_datetime(df['time'])
                         print(f"时间戳转换完成，date列前5个值: {[str(d) for d in df['date'].head().tolist()]}")
                     
                     # 添加symbol列
@@ -9,10 +9,32 @@ DB_NAME = 'huice'
 DB_USER = 'postgres'
 DB_PASSWORD = 'postgres'
 
+# 数据库连接池(进程内所有数据库客户端共享)
+DB_POOL_MIN_CONN = 1
+DB_POOL_MAX_CONN = 32
+DB_POOL_TIMEOUT = 30  # 获取连接的等待超时(秒)
+DB_POOL_HEALTH_CHECK_INTERVAL = 60  # 连接空闲超过该时间(秒)后取出前先检查
+
+# 回测结果后台持久化(写后队列)
+PERSIST_QUEUE_DIR = './data/persist_queue'  # 未完成任务的日志目录，启动时重放
+PERSIST_MAX_RETRIES = 5  # 暂时性数据库错误的最大重试次数
+PERSIST_RETRY_DELAY = 2  # 首次重试等待秒数，之后每次翻倍
+
+# 回测归档(Parquet列式归档文件，backtest_{id}.huice)
+BACKTEST_ARCHIVE_DIR = './data/archive'
+
+# 交易报告窗口每页加载的配对交易条数(按买入时间倒序分页)
+TRADE_REPORT_PAGE_SIZE = 500
+
 # 文件存储路径
 DATA_DIR = './data'
 LOG_DIR = './logs'
 
+# 行情数据源: 'xtdata'(QMT交易端), 'local'(本地CSV/Parquet文件), 'synthetic'(模拟数据)
+# 可通过环境变量HUICE_DATA_SOURCE覆盖
+DATA_SOURCE = 'xtdata'
+LOCAL_DATA_DIR = './data/bars'
+
 # 功能开关
 SAVE_TO_CSV = True
 SAVE_TO_DB = True
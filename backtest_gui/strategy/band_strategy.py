@@ -9,6 +9,8 @@ import psycopg2
 from datetime import datetime
 import traceback
 
+from backtest_gui.utils.bulk_writer import write_paired_trades
+
 
 class GridLevel:
     """网格级别配置"""
@@ -491,54 +493,9 @@ class BandStrategy:
                 
             cursor = conn.cursor()
             
-            # 获取所有配对交易
+            # 获取所有配对交易，按列整体转换后批量插入
             all_trades = self.get_all_paired_trades()
-            
-            # 保存到数据库
-            for trade in all_trades:
-                # 准备数据
-                level = trade.get('level', 0)
-                grid_type = trade.get('grid_type', 'UNKNOWN')
-                
-                # 处理时间，确保转换为数据库接受的格式
-                import pandas as pd
-                import numpy as np
-                
-                # 转换买入时间
-                buy_time = trade['buy_time']
-                if isinstance(buy_time, (np.datetime64, pd.Timestamp)):
-                    buy_time = pd.Timestamp(buy_time).to_pydatetime()
-                
-                # 转换卖出时间
-                sell_time = trade['sell_time']
-                if sell_time is not None and isinstance(sell_time, (np.datetime64, pd.Timestamp)):
-                    sell_time = pd.Timestamp(sell_time).to_pydatetime()
-                
-                buy_price = trade['buy_price']
-                buy_amount = trade['buy_amount']
-                buy_value = trade['buy_value']
-                sell_price = trade['sell_price']
-                sell_amount = trade['sell_amount']
-                sell_value = trade['sell_value']
-                remaining = trade['remaining']
-                remaining_shares = trade.get('remaining_shares', remaining)  # 使用新字段，如果没有则使用旧字段
-                band_profit = trade['band_profit']
-                band_profit_rate = trade['band_profit_rate']
-                sell_band_profit_rate = trade.get('sell_band_profit_rate', band_profit_rate)  # 使用新字段，如果没有则使用旧字段
-                status = trade['status']
-                
-                # 插入数据
-                cursor.execute("""
-                    INSERT INTO backtest_paired_trades 
-                    (backtest_id, level, grid_type, buy_time, buy_price, buy_amount, buy_value,
-                    sell_time, sell_price, sell_amount, sell_value, remaining, remaining_shares, 
-                    band_profit, band_profit_rate, sell_band_profit_rate, status)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    backtest_id, level, grid_type, buy_time, buy_price, buy_amount, buy_value,
-                    sell_time, sell_price, sell_amount, sell_value, remaining, remaining_shares,
-                    band_profit, band_profit_rate, sell_band_profit_rate, status
-                ))
+            write_paired_trades(cursor, backtest_id, all_trades)
             
             # 提交事务
             conn.commit()
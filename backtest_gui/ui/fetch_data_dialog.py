@@ -5,6 +5,7 @@ from PyQt5.QtCore import Qt, QDate
 from datetime import datetime
 from ..minute_data_fetcher import MinuteDataFetcher
 from ..db.database import StockDatabase
+from ..utils.data_coverage import DataCoverageIndex
 
 class FetchDataDialog(QDialog):
     """获取行情数据对话框"""
@@ -114,31 +115,23 @@ class FetchDataDialog(QDialog):
             return
             
         try:
-            # 将日期字符串转换为datetime对象
-            start_dt = datetime.strptime(start_date, '%Y%m%d')
-            end_dt = datetime.strptime(end_date, '%Y%m%d')
-            
-            # 转换为时间戳范围
-            start_timestamp = int(start_dt.timestamp() * 1000)
-            end_timestamp = int(end_dt.timestamp() * 1000) + 24*60*60*1000  # 加上一天
-            
-            # 查询数据库中该基金代码和数据级别在指定时间范围内的记录数
-            query = f"""
-            SELECT COUNT(*) as count FROM stock_quotes 
-            WHERE fund_code = '{fund_code}' 
-            AND data_level = '{data_level}'
-            AND time >= {start_timestamp}
-            AND time <= {end_timestamp}
-            """
+            # 根据覆盖索引统计已有交易日和缺失区间
+            pure_code = fund_code.split('.')[0]
+            summary = DataCoverageIndex().get_summary(pure_code, data_level, start_date, end_date)
             
-            result = self.db.execute_query(query)
-            if result and len(result) > 0:
-                count = result[0]['count']
-                # 如果记录数大于0，说明已有数据
-                if count > 0:
-                    QMessageBox.information(self, "数据检查", f"数据库中已存在 {fund_code} {data_level} 在指定时间段的数据，共 {count} 条记录。")
-                else:
-                    QMessageBox.information(self, "数据检查", f"数据库中不存在 {fund_code} {data_level} 在指定时间段的数据。")
+            if summary['covered_days'] == 0:
+                QMessageBox.information(self, "数据检查", f"数据库中不存在 {fund_code} {data_level} 在指定时间段的数据。")
+            elif not summary['missing_ranges']:
+                QMessageBox.information(self, "数据检查",
+                    f"数据库中已完整存在 {fund_code} {data_level} 在指定时间段的数据，"
+                    f"共 {summary['covered_days']} 个交易日，{summary['bar_count']} 条记录。")
+            else:
+                ranges_text = "\n".join(f"{s} - {e}" for s, e in summary['missing_ranges'][:10])
+                if len(summary['missing_ranges']) > 10:
+                    ranges_text += f"\n... 共 {len(summary['missing_ranges'])} 个区间"
+                QMessageBox.information(self, "数据检查",
+                    f"{fund_code} {data_level} 已有 {summary['covered_days']}/{summary['trading_days']} 个交易日，"
+                    f"共 {summary['bar_count']} 条记录。\n缺失区间:\n{ranges_text}")
         except Exception as e:
             QMessageBox.warning(self, "检查错误", f"检查现有数据时出错: {str(e)}")
         
@@ -5,8 +5,6 @@
 """
 import os
 import sys
-import traceback
-import psycopg2
 
 # 获取当前文件所在目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -32,50 +30,27 @@ except ImportError:
     DB_USER = 'postgres'
     DB_PASSWORD = 'postgres'
 
-# 获取utils目录中的db_schema.sql文件路径
-sql_file = os.path.join(current_dir, "utils", "db_schema.sql")
+from backtest_gui.utils.db_connector import DBConnector
+from backtest_gui.db.migrations import migrate
 
 def update_database_schema():
-    """更新数据库表结构"""
-    conn = None
-    try:
-        # 连接数据库
-        print(f"正在连接数据库: {DB_HOST}:{DB_PORT}/{DB_NAME}")
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            dbname=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD
-        )
-        
-        cursor = conn.cursor()
-        
-        # 读取SQL文件
-        if os.path.exists(sql_file):
-            print(f"读取SQL文件: {sql_file}")
-            with open(sql_file, 'r', encoding='utf-8') as f:
-                sql_script = f.read()
-                
-                # 执行SQL脚本
-                print("执行SQL脚本...")
-                cursor.execute(sql_script)
-                
-                # 提交事务
-                conn.commit()
-                print("数据库表结构已更新")
-        else:
-            print(f"错误: SQL文件不存在: {sql_file}")
-            
-    except Exception as e:
-        print(f"更新数据库表结构时出错: {str(e)}")
-        traceback.print_exc()
-        if conn:
-            conn.rollback()
-    finally:
-        if conn:
-            conn.close()
-            print("数据库连接已关闭")
+    """更新数据库表结构，应用所有尚未执行的迁移"""
+    db_connector = DBConnector({
+        'host': DB_HOST,
+        'port': DB_PORT,
+        'dbname': DB_NAME,
+        'user': DB_USER,
+        'password': DB_PASSWORD
+    })
+    print(f"正在连接数据库: {DB_HOST}:{DB_PORT}/{DB_NAME}")
+    names = migrate(db_connector)
+    if names is None:
+        print("更新数据库表结构失败")
+    elif names:
+        print(f"数据库表结构已更新，本次应用迁移: {', '.join(names)}")
+    else:
+        print("数据库表结构已是最新")
+    return names is not None
 
 if __name__ == "__main__":
-    update_database_schema() 
\ No newline at end of file
+    update_database_schema()
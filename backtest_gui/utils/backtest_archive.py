@@ -0,0 +1,599 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回测归档模块 - 将一次完整回测导出为单个列式归档文件，或从归档文件导入
+
+归档文件是一个不压缩的zip包(内部的Parquet文件已自带压缩)，包含:
+- metadata.json: 归档格式版本、回测结果记录和各表行数
+- paired_trades.parquet: 配对交易
+- trades.parquet: 交易记录
+- positions.parquet: 持仓信息
+- nav.parquet: 净值数据
+- signals.parquet: 由配对交易还原的买卖信号
+
+归档按backtest_{id}.huice存放在settings.BACKTEST_ARCHIVE_DIR，BacktestDataManager加载回测时
+若数据库中没有该回测记录、或归档元数据与数据库记录一致，则读取归档，不再逐表逐行查询数据库。
+归档后可以删除数据库中的回测记录，把旧回测移到冷存储。
+
+命令行用法:
+    python -m backtest_gui.utils.backtest_archive export 123 [--delete]
+    python -m backtest_gui.utils.backtest_archive import ./data/archive/backtest_123.huice
+    python -m backtest_gui.utils.backtest_archive list
+"""
+import io
+import os
+import sys
+import glob
+import json
+import zipfile
+import argparse
+import traceback
+from datetime import datetime
+
+import pandas as pd
+
+# 添加父级目录到系统路径，以便在命令行中直接运行
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(os.path.dirname(current_dir))
+if project_dir not in sys.path:
+    sys.path.append(project_dir)
+
+from backtest_gui import settings
+from backtest_gui.utils.backtest_stats import refresh_backtest_stats
+from backtest_gui.utils.bulk_writer import bulk_insert
+
+ARCHIVE_FORMAT_VERSION = 1
+ARCHIVE_SUFFIX = '.huice'
+METADATA_FILE = 'metadata.json'
+
+# 归档中的各表: 名称 -> (列名, 整数列, 浮点列, 时间列)
+RESULT_COLUMNS = ['id', 'stock_code', 'start_date', 'end_date', 'initial_capital', 'final_capital',
+                  'total_profit', 'total_profit_rate', 'backtest_time', 'strategy_id', 'strategy_name',
+                  'strategy_version_id', 'input_hash', 'buy_count', 'sell_count']
+
+TABLES = {
+    'paired_trades': (
+        ['level', 'grid_type', 'buy_time', 'buy_price', 'buy_amount', 'buy_value',
+         'sell_time', 'sell_price', 'sell_amount', 'sell_value', 'remaining', 'remaining_shares',
+         'band_profit', 'band_profit_rate', 'sell_band_profit_rate', 'status'],
+        ['level', 'buy_amount', 'sell_amount', 'remaining', 'remaining_shares'],
+        ['buy_price', 'buy_value', 'sell_price', 'sell_value', 'band_profit', 'band_profit_rate',
+         'sell_band_profit_rate'],
+        ['buy_time', 'sell_time'],
+    ),
+    'trades': (
+        ['trade_time', 'trade_type', 'price', 'amount', 'trade_value', 'level', 'grid_type',
+         'band_profit', 'band_profit_rate', 'remaining'],
+        ['amount', 'level', 'remaining'],
+        ['price', 'trade_value', 'band_profit', 'band_profit_rate'],
+        ['trade_time'],
+    ),
+    'positions': (
+        ['position_amount', 'position_cost', 'last_price', 'position_value'],
+        ['position_amount'],
+        ['position_cost', 'last_price', 'position_value'],
+        [],
+    ),
+    'nav': (
+        ['time', 'nav'],
+        [],
+        ['nav'],
+        ['time'],
+    ),
+}
+
+# 各表在数据库中的表名和排序
+TABLE_QUERIES = {
+    'paired_trades': ('backtest_paired_trades', 'buy_time, id'),
+    'trades': ('backtest_trades', 'trade_time, id'),
+    'positions': ('backtest_positions', 'id'),
+    'nav': ('backtest_nav', 'time'),
+}
+
+SIGNAL_COLUMNS = ['time', 'type', 'price', 'amount', 'level', 'grid_type']
+
+
+def get_archive_dir():
+    """获取归档目录"""
+    return getattr(settings, 'BACKTEST_ARCHIVE_DIR', './data/archive')
+
+
+def archive_path(backtest_id, archive_dir=None):
+    """获取回测ID对应的归档文件路径
+
+    Args:
+        backtest_id: 回测ID
+        archive_dir: 归档目录，None时使用settings.BACKTEST_ARCHIVE_DIR
+
+    Returns:
+        str: 归档文件路径
+    """
+    return os.path.join(archive_dir or get_archive_dir(), f"backtest_{int(backtest_id)}{ARCHIVE_SUFFIX}")
+
+
+def find_archive(backtest_id, archive_dir=None):
+    """查找回测ID对应的归档文件
+
+    Returns:
+        str: 归档文件路径，不存在时返回None
+    """
+    path = archive_path(backtest_id, archive_dir)
+    return path if os.path.exists(path) else None
+
+
+def _typed_frame(rows, name):
+    """按列构建DataFrame并统一列类型(NUMERIC转float64，整数列转可空Int64)"""
+    columns, int_columns, float_columns, time_columns = TABLES[name]
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    for column in int_columns:
+        frame[column] = pd.to_numeric(frame[column]).astype('Int64')
+    for column in float_columns:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce').astype('float64')
+    for column in time_columns:
+        frame[column] = pd.to_datetime(frame[column])
+    return frame
+
+
+def build_signals(paired_trades):
+    """由配对交易还原按时间排序的买卖信号
+
+    Args:
+        paired_trades: 配对交易DataFrame
+
+    Returns:
+        DataFrame: 列为time/type/price/amount/level/grid_type
+    """
+    if paired_trades is None or paired_trades.empty:
+        return pd.DataFrame(columns=SIGNAL_COLUMNS)
+
+    grid_type = paired_trades['grid_type'].fillna('UNKNOWN')
+    buys = pd.DataFrame({
+        'time': paired_trades['buy_time'],
+        'type': 'BUY',
+        'price': paired_trades['buy_price'],
+        'amount': paired_trades['buy_amount'],
+        'level': paired_trades['level'],
+        'grid_type': grid_type,
+    })
+    sold = paired_trades['sell_time'].notna()
+    sells = pd.DataFrame({
+        'time': paired_trades.loc[sold, 'sell_time'],
+        'type': 'SELL',
+        'price': paired_trades.loc[sold, 'sell_price'],
+        'amount': paired_trades.loc[sold, 'sell_amount'],
+        'level': paired_trades.loc[sold, 'level'],
+        'grid_type': grid_type[sold],
+    })
+    signals = pd.concat([buys, sells], ignore_index=True)
+    return signals.sort_values('time', kind='stable').reset_index(drop=True)
+
+
+def _json_value(value):
+    """将数据库值转换为可写入JSON的值"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'is_finite'):  # Decimal
+        return float(value)
+    return value
+
+
+def fetch_backtest(cursor, backtest_id):
+    """从数据库按列读取一次回测的全部数据
+
+    Args:
+        cursor: 数据库游标
+        backtest_id: 回测ID
+
+    Returns:
+        dict: {'results': 回测结果字典, 'paired_trades'/'trades'/'positions'/'nav': DataFrame}，
+            回测不存在时返回None
+    """
+    cursor.execute(f"SELECT {', '.join(RESULT_COLUMNS)} FROM backtest_results WHERE id = %s", (backtest_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+
+    bundle = {'results': dict(zip(RESULT_COLUMNS, row))}
+    for name, (table, order_by) in TABLE_QUERIES.items():
+        columns = TABLES[name][0]
+        cursor.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE backtest_id = %s ORDER BY {order_by}",
+            (backtest_id,)
+        )
+        bundle[name] = _typed_frame(cursor.fetchall(), name)
+    return bundle
+
+
+def write_bundle(bundle, path):
+    """将回测数据写入归档文件，先写临时文件再替换，避免留下不完整的归档
+
+    Args:
+        bundle: fetch_backtest返回的回测数据
+        path: 归档文件路径
+
+    Returns:
+        str: 归档文件路径
+    """
+    results = {key: _json_value(value) for key, value in bundle['results'].items()}
+    signals = build_signals(bundle['paired_trades'])
+    frames = {name: bundle[name] for name in TABLES}
+    frames['signals'] = signals
+
+    metadata = {
+        'format_version': ARCHIVE_FORMAT_VERSION,
+        'exported_at': datetime.now().isoformat(),
+        'backtest_id': results['id'],
+        'results': results,
+        'row_counts': {name: int(len(frame)) for name, frame in frames.items()},
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as archive:
+        archive.writestr(METADATA_FILE, json.dumps(metadata, ensure_ascii=False, indent=2))
+        for name, frame in frames.items():
+            buffer = io.BytesIO()
+            frame.to_parquet(buffer, index=False)
+            archive.writestr(f"{name}.parquet", buffer.getvalue())
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_metadata(path):
+    """只读取归档文件的元数据
+
+    Returns:
+        dict: 元数据
+    """
+    with zipfile.ZipFile(path, 'r') as archive:
+        return json.loads(archive.read(METADATA_FILE).decode('utf-8'))
+
+
+# 判断归档是否过期时比较的回测结果字段
+CURRENT_CHECK_COLUMNS = ['id', 'stock_code', 'backtest_time', 'final_capital', 'total_profit']
+
+
+def archive_is_current(path, results):
+    """判断归档是否与数据库中的回测结果记录一致
+
+    回测ID被复用或数据库记录被重新写入后，旧归档不能再代替数据库读取。
+
+    Args:
+        path: 归档文件路径
+        results: 数据库中的回测结果字典
+
+    Returns:
+        bool: 一致返回True
+    """
+    try:
+        archived = read_metadata(path)['results']
+    except Exception as e:
+        print(f"读取归档元数据失败 {path}: {str(e)}")
+        return False
+    return all(_json_value(results.get(column)) == archived.get(column) for column in CURRENT_CHECK_COLUMNS)
+
+
+def load_bundle(path):
+    """读取归档文件
+
+    Args:
+        path: 归档文件路径
+
+    Returns:
+        dict: {'metadata': 元数据, 'results': 回测结果字典,
+            'paired_trades'/'trades'/'positions'/'nav'/'signals': DataFrame}
+    """
+    with zipfile.ZipFile(path, 'r') as archive:
+        metadata = json.loads(archive.read(METADATA_FILE).decode('utf-8'))
+        if metadata.get('format_version', 0) > ARCHIVE_FORMAT_VERSION:
+            raise ValueError(f"不支持的归档格式版本: {metadata.get('format_version')}")
+        bundle = {'metadata': metadata}
+        for name in list(TABLES) + ['signals']:
+            bundle[name] = pd.read_parquet(io.BytesIO(archive.read(f"{name}.parquet")))
+
+    results = dict(metadata['results'])
+    for key in ('start_date', 'end_date', 'backtest_time'):
+        if results.get(key):
+            results[key] = datetime.fromisoformat(results[key])
+    bundle['results'] = results
+    return bundle
+
+
+def _records(frame):
+    """DataFrame转为字典列表，时间转为datetime，空值转为None"""
+    if frame is None or frame.empty:
+        return []
+    frame = frame.astype(object).where(frame.notna(), None)
+    records = frame.to_dict('records')
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, pd.Timestamp):
+                record[key] = value.to_pydatetime()
+    return records
+
+
+def bundle_to_backtest_data(bundle):
+    """将归档数据转换为BacktestDataManager.load_backtest_data的返回格式
+
+    Args:
+        bundle: load_bundle返回的归档数据
+
+    Returns:
+        dict: {'results', 'trades', 'paired_trades', 'position', 'nav_data'}
+    """
+    trades = [{
+        'time': row['trade_time'],
+        'type': row['trade_type'],
+        'price': row['price'],
+        'amount': row['amount'],
+        'value': row['trade_value'],
+        'level': row['level'],
+        'grid_type': row['grid_type'],
+        'band_profit': row['band_profit'],
+        'band_profit_rate': row['band_profit_rate'],
+        'remaining': row['remaining'],
+    } for row in _records(bundle['trades'])]
+
+    paired_trades = {}
+    for row in _records(bundle['paired_trades']):
+        key = f"{row['level']}_{row['grid_type']}_{row['buy_time'].timestamp()}"
+        sell_record = None
+        if row['sell_time']:
+            sell_record = {
+                'time': row['sell_time'],
+                'price': row['sell_price'],
+                'amount': row['sell_amount'],
+                'value': row['sell_value'],
+                'remaining': row['remaining'],
+                'remaining_shares': row['remaining_shares'],
+                'band_profit': row['band_profit'],
+                'band_profit_rate': row['band_profit_rate'],
+                'sell_band_profit_rate': row['sell_band_profit_rate'],
+                'level': row['level'],
+                'grid_type': row['grid_type'],
+            }
+        paired_trades[key] = {
+            'buy': {
+                'time': row['buy_time'],
+                'price': row['buy_price'],
+                'amount': row['buy_amount'],
+                'value': row['buy_value'],
+                'level': row['level'],
+                'grid_type': row['grid_type'],
+            },
+            'sell': sell_record,
+            'status': row['status'],
+        }
+
+    positions = _records(bundle['positions'])
+    nav = bundle['nav']
+    nav_data = nav.set_index('time') if nav is not None and not nav.empty else None
+
+    return {
+        'results': bundle['results'],
+        'trades': trades,
+        'paired_trades': paired_trades,
+        'position': positions[0] if positions else None,
+        'nav_data': nav_data,
+    }
+
+
+def export_backtest(db_connector, backtest_id, path=None):
+    """将数据库中的一次回测导出为归档文件
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器
+        backtest_id: 回测ID
+        path: 归档文件路径，None时使用archive_path(backtest_id)
+
+    Returns:
+        str: 归档文件路径，失败返回None
+    """
+    conn = None
+    try:
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        bundle = fetch_backtest(cursor, backtest_id)
+        conn.rollback()
+        cursor.close()
+        if bundle is None:
+            print(f"回测不存在，ID: {backtest_id}")
+            return None
+
+        path = write_bundle(bundle, path or archive_path(backtest_id))
+        print(f"回测 {backtest_id} 已导出到 {path}，配对交易 {len(bundle['paired_trades'])} 条")
+        return path
+    except Exception as e:
+        print(f"导出回测归档失败: {str(e)}")
+        traceback.print_exc()
+        return None
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
+
+
+def import_bundle(db_connector, path):
+    """将归档文件导入数据库，生成新的回测ID
+
+    归档目录中的归档导入后按新ID重写(backtest_{新ID}.huice)并删除旧文件，
+    避免回测列表中同一回测以旧ID和新ID各出现一次。
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器
+        path: 归档文件路径
+
+    Returns:
+        int: 新的回测ID，失败返回None
+    """
+    conn = None
+    try:
+        bundle = load_bundle(path)
+        results = bundle['results']
+
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        columns = [column for column in RESULT_COLUMNS if column != 'id']
+        cursor.execute(
+            f"INSERT INTO backtest_results ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) RETURNING id",
+            [results.get(column) for column in columns]
+        )
+        backtest_id = cursor.fetchone()[0]
+
+        for name, (table, _) in TABLE_QUERIES.items():
+            table_columns = [(column, column, None, None) for column in TABLES[name][0]]
+            bulk_insert(cursor, table, table_columns, bundle[name], [backtest_id], ['backtest_id'])
+        refresh_backtest_stats(cursor, [backtest_id])
+
+        conn.commit()
+        cursor.close()
+        print(f"归档 {path} 已导入，新回测ID: {backtest_id}")
+
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(get_archive_dir()):
+            _rekey_archive(bundle, path, backtest_id)
+        return backtest_id
+    except Exception as e:
+        print(f"导入回测归档失败: {str(e)}")
+        traceback.print_exc()
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
+
+
+def _rekey_archive(bundle, path, backtest_id):
+    """把已导入的归档按新回测ID重写，并删除旧ID的归档文件
+
+    Args:
+        bundle: load_bundle返回的归档数据
+        path: 原归档文件路径
+        backtest_id: 导入后的新回测ID
+    """
+    try:
+        bundle['results'] = dict(bundle['results'], id=backtest_id)
+        new_path = write_bundle(bundle, archive_path(backtest_id))
+        if os.path.abspath(new_path) != os.path.abspath(path):
+            os.remove(path)
+        print(f"归档已按新回测ID重写: {new_path}")
+    except Exception as e:
+        print(f"按新回测ID重写归档失败: {str(e)}")
+        traceback.print_exc()
+
+
+def archive_backtest(db_connector, backtest_id, delete=False):
+    """归档一次回测，可选地在归档校验通过后从数据库删除
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器
+        backtest_id: 回测ID
+        delete: 是否从数据库删除已归档的回测
+
+    Returns:
+        str: 归档文件路径，失败返回None
+    """
+    path = export_backtest(db_connector, backtest_id)
+    if not path or not delete:
+        return path
+
+    # 删除前重新读取一遍归档，确认文件完整
+    try:
+        load_bundle(path)
+    except Exception as e:
+        print(f"归档文件校验失败，保留数据库记录: {str(e)}")
+        return None
+
+    conn = None
+    try:
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        # 关联的交易、配对交易、持仓和净值通过外键级联删除
+        cursor.execute("DELETE FROM backtest_results WHERE id = %s", (backtest_id,))
+        conn.commit()
+        cursor.close()
+        print(f"回测 {backtest_id} 已从数据库移出")
+        return path
+    except Exception as e:
+        print(f"删除已归档回测失败: {str(e)}")
+        traceback.print_exc()
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
+
+
+def list_archives(stock_code=None, archive_dir=None):
+    """列出归档目录中的回测结果记录
+
+    Args:
+        stock_code: 只列出该基金的归档，None表示全部
+        archive_dir: 归档目录，None时使用settings.BACKTEST_ARCHIVE_DIR
+
+    Returns:
+        list: 回测结果字典列表，附带archive_path字段，按回测时间倒序
+    """
+    results = []
+    for path in glob.glob(os.path.join(archive_dir or get_archive_dir(), f"*{ARCHIVE_SUFFIX}")):
+        try:
+            result = dict(read_metadata(path)['results'])
+        except Exception as e:
+            print(f"读取归档元数据失败 {path}: {str(e)}")
+            continue
+        if stock_code is not None and result.get('stock_code') != stock_code:
+            continue
+        for key in ('start_date', 'end_date', 'backtest_time'):
+            if result.get(key):
+                result[key] = datetime.fromisoformat(result[key])
+        result['archive_path'] = path
+        results.append(result)
+    results.sort(key=lambda result: result.get('backtest_time') or datetime.min, reverse=True)
+    return results
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='回测归档导出/导入')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='导出回测为归档文件')
+    export_parser.add_argument('backtest_ids', type=int, nargs='+', help='回测ID')
+    export_parser.add_argument('--delete', action='store_true', help='归档后从数据库删除')
+
+    import_parser = subparsers.add_parser('import', help='从归档文件导入回测')
+    import_parser.add_argument('paths', nargs='+', help='归档文件路径')
+
+    list_parser = subparsers.add_parser('list', help='列出归档')
+    list_parser.add_argument('--stock', help='基金代码')
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    if args.command == 'list':
+        for result in list_archives(args.stock):
+            print(f"{result['id']}\t{result['stock_code']}\t{result['start_date']} 至 {result['end_date']}\t"
+                  f"收益率 {result['total_profit_rate']}\t{result['archive_path']}")
+        return 0
+
+    from backtest_gui.utils.db_connector import DBConnector
+    db_connector = DBConnector()
+    failed = 0
+    if args.command == 'export':
+        for backtest_id in args.backtest_ids:
+            if not archive_backtest(db_connector, backtest_id, delete=args.delete):
+                failed += 1
+    else:
+        for path in args.paths:
+            if import_bundle(db_connector, path) is None:
+                failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
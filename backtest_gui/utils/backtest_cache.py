@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回测结果缓存模块 - 按回测输入的内容哈希复用已有的回测结果
+
+回测输入指纹由以下内容计算SHA-256:
+- 基金代码、数据级别、开始和结束日期
+- 策略ID和初始资金
+- 数据版本: 区间内行情的最大created_at和记录数，重新导入或删除行情后指纹随之变化
+- 网格级别配置(按级别排序后序列化)
+指纹保存在backtest_results.input_hash列，相同指纹的回测直接复用已保存的结果和配对交易。
+"""
+import json
+import hashlib
+
+import pandas as pd
+
+# 回测算法变化时递增，使旧的缓存结果失效
+CACHE_VERSION = 2
+
+
+def serialize_grid_levels(grid_levels):
+    """将网格级别配置序列化为稳定的JSON字符串
+
+    Args:
+        grid_levels: GridLevel对象列表
+
+    Returns:
+        str: 按级别排序的JSON字符串
+    """
+    rows = sorted(
+        [int(grid.level), str(grid.grid_type), float(grid.buy_price), float(grid.sell_price),
+         float(grid.buy_shares), float(grid.sell_shares)]
+        for grid in (grid_levels or [])
+    )
+    return json.dumps(rows, separators=(',', ':'))
+
+
+def get_data_version(cursor, fund_code, data_level, start_date, end_date):
+    """获取回测区间行情数据的版本
+
+    Args:
+        cursor: 数据库游标
+        fund_code: 基金代码(不带市场后缀)
+        data_level: 数据级别
+        start_date: 开始日期
+        end_date: 结束日期
+
+    Returns:
+        str: 数据版本，格式为"最大created_at|记录数"
+    """
+    cursor.execute("""
+        SELECT MAX(created_at), COUNT(*)
+        FROM stock_quotes
+        WHERE fund_code = %s AND data_level = %s AND date BETWEEN %s AND %s
+    """, (fund_code, data_level, start_date, end_date))
+    max_created_at, count = cursor.fetchone()
+    return f"{max_created_at.isoformat() if max_created_at else ''}|{count}"
+
+
+def compute_fingerprint(fund_code, data_level, start_date, end_date, data_version, grid_levels,
+                        strategy_id=None, initial_capital=None):
+    """计算回测输入指纹
+
+    Args:
+        fund_code: 基金代码(不带市场后缀)
+        data_level: 数据级别
+        start_date: 开始日期
+        end_date: 结束日期
+        data_version: get_data_version返回的数据版本
+        grid_levels: GridLevel对象列表
+        strategy_id: 策略ID
+        initial_capital: 初始资金
+
+    Returns:
+        str: 64位十六进制SHA-256
+    """
+    payload = json.dumps({
+        'version': CACHE_VERSION,
+        'fund_code': str(fund_code),
+        'data_level': str(data_level),
+        'start_date': str(start_date),
+        'end_date': str(end_date),
+        'data_version': data_version,
+        'grid_levels': serialize_grid_levels(grid_levels),
+        'strategy_id': None if strategy_id is None else str(strategy_id),
+        'initial_capital': None if initial_capital is None else float(initial_capital),
+    }, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def find_cached_backtest(cursor, input_hash):
+    """查找相同输入指纹的最近一次回测
+
+    Args:
+        cursor: 数据库游标
+        input_hash: 回测输入指纹
+
+    Returns:
+        dict: {'id', 'total_profit', 'total_profit_rate', 'backtest_time'}，没有时返回None
+    """
+    cursor.execute("""
+        SELECT id, total_profit, total_profit_rate, backtest_time
+        FROM backtest_results
+        WHERE input_hash = %s
+        ORDER BY id DESC
+        LIMIT 1
+    """, (input_hash,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {
+        'id': row[0],
+        'total_profit': float(row[1]),
+        'total_profit_rate': float(row[2]),
+        'backtest_time': row[3],
+    }
+
+
+def load_cached_signals(cursor, backtest_id):
+    """从已保存的配对交易还原买卖信号
+
+    Args:
+        cursor: 数据库游标
+        backtest_id: 回测ID
+
+    Returns:
+        tuple: (买入信号列表, 卖出信号列表)，按时间排序，格式同BacktestWorker生成的信号
+    """
+    cursor.execute("""
+        SELECT level, grid_type, buy_time, buy_price, buy_amount,
+               sell_time, sell_price, sell_amount
+        FROM backtest_paired_trades
+        WHERE backtest_id = %s
+        ORDER BY buy_time, id
+    """, (backtest_id,))
+
+    buy_signals, sell_signals = [], []
+    for level, grid_type, buy_time, buy_price, buy_amount, sell_time, sell_price, sell_amount in cursor.fetchall():
+        grid_type = grid_type or 'UNKNOWN'
+        buy_signals.append({
+            'time': pd.Timestamp(buy_time),
+            'price': float(buy_price),
+            'amount': int(buy_amount),
+            'level': level,
+            'grid_type': grid_type
+        })
+        if sell_time is not None:
+            sell_signals.append({
+                'time': pd.Timestamp(sell_time),
+                'price': float(sell_price),
+                'amount': int(sell_amount),
+                'level': level,
+                'grid_type': grid_type
+            })
+
+    sell_signals.sort(key=lambda signal: signal['time'])
+    return buy_signals, sell_signals
@@ -7,10 +7,14 @@ import os
 import pandas as pd
 import numpy as np
 import psycopg2
-from psycopg2.extras import execute_values
 import traceback
 from datetime import datetime
 from backtest_gui.utils.db_connector import DBConnector
+from backtest_gui.db.migrations import ensure_schema
+from backtest_gui.utils.bulk_writer import write_trades, write_paired_trades, write_positions, write_nav
+from backtest_gui.utils.backtest_stats import refresh_backtest_stats
+from backtest_gui.utils.backtest_archive import (find_archive, archive_is_current, load_bundle,
+                                                 bundle_to_backtest_data, list_archives)
 
 
 class BacktestDataManager:
@@ -34,44 +38,8 @@ class BacktestDataManager:
         self._ensure_tables_exist()
         
     def _ensure_tables_exist(self):
-        """确保数据库表结构存在"""
-        conn = None
-        try:
-            conn = self.db_connector.get_connection()
-            cursor = conn.cursor()
-            
-            # 执行数据库表创建SQL脚本
-            try:
-                # 尝试导入SQL脚本
-                import os
-                from pathlib import Path
-                
-                # 获取当前文件所在目录
-                current_dir = Path(os.path.dirname(os.path.abspath(__file__)))
-                
-                # SQL脚本路径
-                sql_file = current_dir / 'db_schema.sql'
-                
-                if os.path.exists(sql_file):
-                    with open(sql_file, 'r', encoding='utf-8') as f:
-                        sql_script = f.read()
-                        cursor.execute(sql_script)
-                    
-                    conn.commit()
-                    print("数据库表结构已更新")
-                else:
-                    print(f"未找到SQL脚本文件: {sql_file}")
-                    
-            except Exception as e:
-                print(f"执行SQL脚本错误: {str(e)}")
-                traceback.print_exc()
-            
-        except Exception as e:
-            print(f"检查数据库表结构错误: {str(e)}")
-            traceback.print_exc()
-        finally:
-            if conn:
-                self.db_connector.release_connection(conn)
+        """确保数据库结构已迁移到最新版本(每个进程只执行一次)"""
+        ensure_schema(self.db_connector)
                 
     def _convert_numpy_types(self, value):
         """将NumPy类型转换为Python原生类型
@@ -101,8 +69,8 @@ class BacktestDataManager:
             final_capital: 最终资金
             total_profit: 总收益
             total_profit_rate: 总收益率
-            trades: 交易记录列表
-            positions: 持仓记录列表
+            trades: 交易记录列表，格式同save_trades
+            positions: 持仓记录列表，格式同bulk_writer.write_positions
             strategy_id: 策略ID
             strategy_name: 策略名称
             strategy_version_id: 策略版本ID
@@ -116,9 +84,6 @@ class BacktestDataManager:
                 conn = self.db_connector.get_connection()
                 cursor = conn.cursor()
                 
-                # 确保表结构存在
-                self._ensure_tables_exist()
-                
                 # 插入回测结果
                 cursor.execute(
                     """
@@ -136,32 +101,11 @@ class BacktestDataManager:
                 
                 backtest_id = cursor.fetchone()[0]
                 
-                # 插入交易记录
+                # 批量插入交易记录和持仓记录，与回测结果在同一事务中提交
                 if trades:
-                    for trade in trades:
-                        cursor.execute(
-                            """
-                            INSERT INTO backtest_trades 
-                            (backtest_id, trade_time, trade_type, price, shares, amount, commission)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s)
-                            """,
-                            (backtest_id, trade['time'], trade['type'], 
-                             trade['price'], trade['shares'], trade['amount'],
-                             trade['commission'])
-                        )
-                
-                # 插入持仓记录
+                    write_trades(cursor, backtest_id, trades)
                 if positions:
-                    for position in positions:
-                        cursor.execute(
-                            """
-                            INSERT INTO backtest_positions 
-                            (backtest_id, position_time, shares, cost, market_value)
-                            VALUES (%s, %s, %s, %s, %s)
-                            """,
-                            (backtest_id, position['time'], position['shares'], 
-                             position['cost'], position['market_value'])
-                        )
+                    write_positions(cursor, backtest_id, positions)
                 
                 conn.commit()
                 print(f"成功保存回测结果，ID: {backtest_id}")
@@ -202,37 +146,10 @@ class BacktestDataManager:
                 conn = self.db_connector.get_connection()
                 cursor = conn.cursor()
                 
-                # 准备批量插入的数据
-                trade_data = []
-                for trade in trades:
-                    trade_data.append((
-                        self.backtest_id,
-                        trade['time'],
-                        trade['type'],
-                        trade['price'],
-                        trade['amount'],
-                        trade['value'],
-                        trade.get('level'),
-                        trade.get('grid_type'),
-                        trade.get('band_profit'),
-                        trade.get('band_profit_rate'),
-                        trade.get('remaining')
-                    ))
-                
-                # 批量插入
-                execute_values(
-                    cursor,
-                    """
-                    INSERT INTO backtest_trades
-                    (backtest_id, trade_time, trade_type, price, amount, trade_value, 
-                     level, grid_type, band_profit, band_profit_rate, remaining)
-                    VALUES %s
-                    """,
-                    trade_data
-                )
+                count = write_trades(cursor, self.backtest_id, trades)
                 
                 conn.commit()
-                print(f"保存交易记录成功，数量: {len(trade_data)}")
+                print(f"保存交易记录成功，数量: {count}")
                 return True
                 
             except Exception as e:
@@ -269,78 +186,54 @@ class BacktestDataManager:
                 conn = self.db_connector.get_connection()
                 cursor = conn.cursor()
                 
-                # 准备批量插入的数据
-                paired_trade_data = []
+                # 将配对字典展开为配对交易记录
+                records = []
                 for key, pair in paired_trades.items():
                     buy_record = pair.get('buy')
                     sell_record = pair.get('sell')
-                    status = pair.get('status', '进行中')
+                    if not buy_record:
+                        continue
                     
-                    if buy_record:
-                        # 解析key中的level和grid_type
-                        key_parts = key.split('_')
-                        level = int(key_parts[0]) if key_parts[0].isdigit() else None
-                        grid_type = key_parts[1] if len(key_parts) > 1 else None
-                        
-                        # 构建记录
-                        record = [
-                            self.backtest_id,
-                            level,
-                            grid_type,
-                            buy_record['time'],
-                            buy_record['price'],
-                            buy_record['amount'],
-                            buy_record['value'],
-                            None,  # sell_time
-                            None,  # sell_price
-                            None,  # sell_amount
-                            None,  # sell_value
-                            buy_record['amount'],  # remaining (旧字段)
-                            buy_record['amount'],  # remaining_shares (新字段)
-                            None,  # band_profit
-                            None,  # band_profit_rate (旧字段)
-                            None,  # sell_band_profit_rate (新字段)
-                            status
-                        ]
-                        
-                        # 添加卖出信息（如果有）
-                        if sell_record:
-                            record[7] = sell_record['time']  # sell_time
-                            record[8] = sell_record['price']  # sell_price
-                            record[9] = sell_record['amount']  # sell_amount
-                            record[10] = sell_record['value']  # sell_value
-                            record[11] = sell_record.get('remaining', buy_record['amount'] - sell_record['amount'])  # remaining
-                            # 计算正确的剩余份额
-                            remaining_shares = buy_record['amount'] - sell_record['amount']
-                            record.append(remaining_shares)  # remaining_shares
-                            record[12] = sell_record.get('band_profit')  # band_profit
-                            record[13] = sell_record.get('band_profit_rate')  # band_profit_rate
-                            # 卖出部分的收益率
-                            sell_band_profit_rate = sell_record.get('sell_band_profit_rate', sell_record.get('band_profit_rate'))
-                            record.append(sell_band_profit_rate)  # sell_band_profit_rate
-                        
-                        paired_trade_data.append(tuple(record))
-                
-                # 批量插入
-                if paired_trade_data:
-                    execute_values(
-                        cursor,
-                        """
-                        INSERT INTO backtest_paired_trades
-                        (backtest_id, level, grid_type, buy_time, buy_price, buy_amount, buy_value,
-                         sell_time, sell_price, sell_amount, sell_value, remaining, remaining_shares, band_profit, 
-                         band_profit_rate, sell_band_profit_rate, status)
-                        VALUES %s
-                        """,
-                        paired_trade_data
-                    )
+                    # 解析key中的level和grid_type
+                    key_parts = key.split('_')
+                    record = {
+                        'level': int(key_parts[0]) if key_parts[0].isdigit() else None,
+                        'grid_type': key_parts[1] if len(key_parts) > 1 else None,
+                        'buy_time': buy_record['time'],
+                        'buy_price': buy_record['price'],
+                        'buy_amount': buy_record['amount'],
+                        'buy_value': buy_record['value'],
+                        'remaining': buy_record['amount'],
+                        'remaining_shares': buy_record['amount'],
+                        'status': pair.get('status', '进行中')
+                    }
                     
-                    conn.commit()
-                    print(f"保存配对交易记录成功，数量: {len(paired_trade_data)}")
-                    return True
-                else:
+                    # 添加卖出信息（如果有）
+                    if sell_record:
+                        remaining_shares = buy_record['amount'] - sell_record['amount']
+                        record.update({
+                            'sell_time': sell_record['time'],
+                            'sell_price': sell_record['price'],
+                            'sell_amount': sell_record['amount'],
+                            'sell_value': sell_record['value'],
+                            'remaining': sell_record.get('remaining', remaining_shares),
+                            'remaining_shares': remaining_shares,
+                            'band_profit': sell_record.get('band_profit'),
+                            'band_profit_rate': sell_record.get('band_profit_rate'),
+                            'sell_band_profit_rate': sell_record.get('sell_band_profit_rate',
+                                                                     sell_record.get('band_profit_rate'))
+                        })
+                    records.append(record)
+                
+                if not records:
                     print("没有可保存的配对交易记录")
                     return True
+                
+                count = write_paired_trades(cursor, self.backtest_id, records)
+                refresh_backtest_stats(cursor, [self.backtest_id])
+                conn.commit()
+                print(f"保存配对交易记录成功，数量: {count}")
+                return True
                     
             except Exception as e:
                 print(f"保存配对交易记录失败: {str(e)}")
@@ -386,14 +279,12 @@ class BacktestDataManager:
                 cursor = conn.cursor()
                 
                 # 插入持仓记录
-                cursor.execute(
-                    """
-                    INSERT INTO backtest_positions
-                    (backtest_id, position_amount, position_cost, last_price, position_value)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """,
-                    (self.backtest_id, position_amount, position_cost, last_price, position_value)
-                )
+                write_positions(cursor, self.backtest_id, [{
+                    'position_amount': position_amount,
+                    'position_cost': position_cost,
+                    'last_price': last_price,
+                    'position_value': position_value
+                }])
                 
                 conn.commit()
                 print(f"保存持仓信息成功")
@@ -437,26 +328,12 @@ class BacktestDataManager:
                 conn = self.db_connector.get_connection()
                 cursor = conn.cursor()
                 
-                # 准备批量插入的数据
-                nav_data = []
-                for time, row in nav_df.iterrows():
-                    # 将NumPy类型转换为Python原生类型
-                    nav_value = self._convert_numpy_types(row['nav'])
-                    nav_data.append((self.backtest_id, time, nav_value))
-                
-                # 批量插入
-                execute_values(
-                    cursor,
-                    """
-                    INSERT INTO backtest_nav
-                    (backtest_id, time, nav)
-                    VALUES %s
-                    """,
-                    nav_data
-                )
+                count = write_nav(cursor, self.backtest_id, nav_df)
+                # 净值只影响最大回撤，不需要重新计算XIRR
+                refresh_backtest_stats(cursor, [self.backtest_id], with_xirr=False)
                 
                 conn.commit()
-                print(f"保存净值数据成功，点数: {len(nav_data)}")
+                print(f"保存净值数据成功，点数: {count}")
                 return True
                 
             except Exception as e:
@@ -510,6 +387,13 @@ class BacktestDataManager:
                 for row in cursor.fetchall():
                     results.append(dict(zip(columns, row)))
                 
+                # 合并已移出数据库、只保存在归档文件中的回测
+                known_ids = {result['id'] for result in results}
+                for archived in list_archives(stock_code):
+                    if archived['id'] not in known_ids:
+                        results.append(archived)
+                results.sort(key=lambda result: result['backtest_time'], reverse=True)
+                
                 return results
                 
             except Exception as e:
@@ -541,6 +425,8 @@ class BacktestDataManager:
                     'position': 持仓信息,
                     'nav_data': 净值数据DataFrame
                 }
+                数据库中没有该回测记录(已移到冷存储)、或归档与数据库记录一致时读取归档，
+                不再逐表查询数据库
         """
         self.backtest_id = backtest_id
         
@@ -585,6 +471,15 @@ class BacktestDataManager:
                         'backtest_time': row[8]
                     }
                 
+                # 数据库记录不存在或与归档一致时读取归档，避免使用过期的归档
+                path = find_archive(backtest_id)
+                if path and (result['results'] is None or archive_is_current(path, result['results'])):
+                    try:
+                        return bundle_to_backtest_data(load_bundle(path))
+                    except Exception as e:
+                        print(f"读取回测归档失败，改为从数据库加载: {str(e)}")
+                        traceback.print_exc()
+                
                 # 2. 加载交易记录
                 cursor.execute(
                     """
@@ -983,71 +878,18 @@ class BacktestDataManager:
                 # 处理股票代码，去掉可能的市场后缀
                 code = stock_code.split('.')[0]
                 
-                # 检查统一的股票数据表是否存在
+                # 从统一行情表查询数据
                 cursor.execute(
                     """
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = 'stock_quotes'
-                    );
-                    """
+                    SELECT date AS time, open, high, low, close, volume, amount
+                    FROM stock_quotes
+                    WHERE fund_code = %s AND data_level = %s
+                    AND date BETWEEN %s AND %s
+                    ORDER BY date
+                    """,
+                    (code, data_granularity, start_date, end_date)
                 )
                 
-                table_exists = cursor.fetchone()[0]
-                if not table_exists:
-                    print("数据表 stock_quotes 不存在")
-                    
-                    # 尝试查询旧表格式
-                    table_name = f"stock_{data_granularity}_{code}"
-                    if data_granularity == "day":
-                        table_name = f"stock_day_{code}"
-                    elif data_granularity == "week":
-                        table_name = f"stock_week_{code}"
-                    elif data_granularity == "month":
-                        table_name = f"stock_month_{code}"
-                    else:
-                        table_name = f"stock_{data_granularity}_{code}"
-                    
-                    cursor.execute(
-                        """
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.tables 
-                            WHERE table_schema = 'public' 
-                            AND table_name = %s
-                        );
-                        """,
-                        (table_name,)
-                    )
-                    
-                    old_table_exists = cursor.fetchone()[0]
-                    if not old_table_exists:
-                        print(f"旧数据表 {table_name} 也不存在")
-                        return None
-                    
-                    # 使用旧表查询数据
-                    cursor.execute(
-                        f"""
-                        SELECT date AS time, open, high, low, close, volume, amount
-                        FROM {table_name}
-                        WHERE date BETWEEN %s AND %s
-                        ORDER BY date
-                        """,
-                        (start_date, end_date)
-                    )
-                else:
-                    # 从统一表查询数据
-                    cursor.execute(
-                        """
-                        SELECT date AS time, open, high, low, close, volume, amount
-                        FROM stock_quotes
-                        WHERE fund_code = %s AND data_level = %s
-                        AND date BETWEEN %s AND %s
-                        ORDER BY date
-                        """,
-                        (code, data_granularity, start_date, end_date)
-                    )
-                
                 # 获取结果
                 rows = cursor.fetchall()
                 if not rows:
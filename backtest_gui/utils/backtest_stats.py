@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回测统计模块 - 维护每个回测的预计算统计表backtest_stats
+
+保存回测(配对交易、净值)时在同一事务中调用refresh_backtest_stats，用一条INSERT ... SELECT
+按回测聚合配对交易和净值并写入统计表，报表和命令行列表直接读取，不再扫描配对交易。
+统计口径:
+- buy_count/sell_count: 配对交易数、有卖出的配对交易数
+- avg_cost: 剩余底仓的平均买入价
+- max_capital_used: 按时间顺序累计资金占用事件(见CAPITAL_EVENTS_SQL)的最大值
+- max_drawdown: 净值的最大回撤(百分比)；没有保存净值时(界面后台保存只写配对交易)
+  改用按成交价估值的权益曲线(见TRADE_EQUITY_EVENTS_SQL)计算，只在成交时点估值，没有成交时为空
+- turnover: 买入和卖出成交金额之和 / 初始资金
+- xirr_value: 交易专用XIRR(百分比)，与backtest_xirr同步更新
+
+backtest_paired_trades和backtest_nav上的语句级触发器在增删改时删除受影响回测的统计记录，
+修复脚本直接修改配对交易后，回测汇总查询发现统计缺失会自动补算，不会显示新旧混合的数字。
+也可以用命令行立即重建:
+    python -m backtest_gui.utils.backtest_stats refresh [回测ID ...]
+    python -m backtest_gui.utils.backtest_stats refresh --all
+"""
+import os
+import sys
+import argparse
+import traceback
+
+# 添加父级目录到系统路径，以便在命令行中直接运行
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_dir = os.path.dirname(os.path.dirname(current_dir))
+if project_dir not in sys.path:
+    sys.path.append(project_dir)
+
+from backtest_gui.utils.xirr_batch import solve_trades_only_xirr, upsert_xirr_results
+
+# 资金占用事件: 买入时增加买入金额，卖出时释放卖出部分的成本(卖出数量×买入价，全部卖出时为买入金额)。
+# 同一时刻先释放后占用(kind 0在1之前)。{where}为配对交易的过滤条件
+CAPITAL_EVENTS_SQL = """
+    SELECT backtest_id, buy_time AS ts, 1 AS kind, COALESCE(buy_value, 0) AS delta
+    FROM backtest_paired_trades
+    WHERE {where}
+    UNION ALL
+    SELECT backtest_id, sell_time AS ts, 0 AS kind,
+           -CASE WHEN remaining > 0 THEN COALESCE(sell_amount, 0) * buy_price
+                 ELSE COALESCE(buy_value, 0) END AS delta
+    FROM backtest_paired_trades
+    WHERE {where} AND sell_time IS NOT NULL
+"""
+
+# 权益事件: 买入增加份额、减少现金，卖出减少份额、增加现金，按该笔成交价给持仓估值。
+# 同一时刻先卖后买(kind 0在1之前)。{where}为配对交易的过滤条件
+TRADE_EQUITY_EVENTS_SQL = """
+    SELECT backtest_id, buy_time AS ts, 1 AS kind, buy_price AS price,
+           COALESCE(buy_amount, 0) AS shares, -COALESCE(buy_value, 0) AS cash
+    FROM backtest_paired_trades
+    WHERE {where}
+    UNION ALL
+    SELECT backtest_id, sell_time AS ts, 0 AS kind, sell_price AS price,
+           -COALESCE(sell_amount, 0) AS shares, COALESCE(sell_value, 0) AS cash
+    FROM backtest_paired_trades
+    WHERE {where} AND sell_time IS NOT NULL
+"""
+
+STATS_COLUMNS = ['buy_count', 'sell_count', 'completed_trades', 'open_trades', 'total_buy_value',
+                 'total_sell_value', 'remaining_shares', 'avg_cost', 'max_capital_used', 'max_drawdown',
+                 'turnover']
+
+# 统计失效触发器: 配对交易或净值被增删改时删除受影响回测的统计记录，由汇总查询补算
+STATS_INVALIDATE_FUNCTION = 'backtest_stats_invalidate'
+
+STATS_INVALIDATE_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION {STATS_INVALIDATE_FUNCTION}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        DELETE FROM backtest_stats WHERE backtest_id IN (SELECT backtest_id FROM new_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        DELETE FROM backtest_stats
+        WHERE backtest_id IN (SELECT backtest_id FROM new_rows UNION SELECT backtest_id FROM old_rows);
+    ELSE
+        DELETE FROM backtest_stats WHERE backtest_id IN (SELECT backtest_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# 安装失效触发器的表
+STATS_SOURCE_TABLES = ['backtest_paired_trades', 'backtest_nav']
+
+REFRESH_STATS_SQL = f"""
+INSERT INTO backtest_stats (backtest_id, {', '.join(STATS_COLUMNS)}, xirr_value, updated_at)
+SELECT
+    br.id,
+    COALESCE(pt.trade_count, 0),
+    COALESCE(pt.sell_count, 0),
+    COALESCE(pt.completed_trades, 0),
+    COALESCE(pt.open_trades, 0),
+    COALESCE(pt.total_buy_value, 0),
+    COALESCE(pt.total_sell_value, 0),
+    COALESCE(pt.remaining_shares, 0),
+    COALESCE(pt.remaining_cost / NULLIF(pt.remaining_shares, 0), 0),
+    COALESCE(mc.max_capital_used, 0),
+    COALESCE(dd.max_drawdown, td.max_drawdown),
+    (COALESCE(pt.total_buy_value, 0) + COALESCE(pt.total_sell_value, 0)) / NULLIF(br.initial_capital, 0),
+    (SELECT x.xirr_value FROM backtest_xirr x WHERE x.backtest_id = br.id AND x.xirr_type = 'trades_only'),
+    NOW()
+FROM backtest_results br
+LEFT JOIN LATERAL (
+    SELECT
+        COUNT(*) AS trade_count,
+        COUNT(sell_time) AS sell_count,
+        COUNT(*) FILTER (WHERE status = '已完成') AS completed_trades,
+        COUNT(*) FILTER (WHERE status = '进行中') AS open_trades,
+        SUM(buy_value) AS total_buy_value,
+        SUM(sell_value) AS total_sell_value,
+        SUM(remaining) FILTER (WHERE remaining > 0) AS remaining_shares,
+        SUM(remaining * buy_price) FILTER (WHERE remaining > 0) AS remaining_cost
+    FROM backtest_paired_trades
+    WHERE backtest_id = br.id
+) pt ON TRUE
+LEFT JOIN LATERAL (
+    SELECT MAX(capital_used) AS max_capital_used
+    FROM (
+        SELECT SUM(delta) OVER (ORDER BY ts, kind ROWS UNBOUNDED PRECEDING) AS capital_used
+        FROM ({CAPITAL_EVENTS_SQL.format(where='backtest_id = br.id')}) events
+    ) levels
+) mc ON TRUE
+LEFT JOIN LATERAL (
+    SELECT MAX(1 - nav / NULLIF(peak, 0)) * 100 AS max_drawdown
+    FROM (
+        SELECT nav, MAX(nav) OVER (ORDER BY time ROWS UNBOUNDED PRECEDING) AS peak
+        FROM backtest_nav
+        WHERE backtest_id = br.id
+    ) navs
+) dd ON TRUE
+LEFT JOIN LATERAL (
+    SELECT MAX(1 - equity / NULLIF(peak, 0)) * 100 AS max_drawdown
+    FROM (
+        SELECT equity,
+               GREATEST(br.initial_capital, MAX(equity) OVER (ORDER BY ts, kind ROWS UNBOUNDED PRECEDING)) AS peak
+        FROM (
+            SELECT ts, kind,
+                   br.initial_capital + SUM(cash) OVER w + SUM(shares) OVER w * price AS equity
+            FROM ({TRADE_EQUITY_EVENTS_SQL.format(where='backtest_id = br.id')}) events
+            WINDOW w AS (ORDER BY ts, kind ROWS UNBOUNDED PRECEDING)
+        ) curve
+    ) peaks
+) td ON TRUE
+WHERE br.id = ANY(%(ids)s)
+ON CONFLICT (backtest_id) DO UPDATE SET
+    {', '.join(f'{column} = EXCLUDED.{column}' for column in STATS_COLUMNS)},
+    updated_at = EXCLUDED.updated_at
+"""
+
+
+def install_stats_triggers(cursor):
+    """在配对交易表和净值表上安装(或重建)统计失效触发器
+
+    Args:
+        cursor: 数据库游标
+    """
+    cursor.execute(STATS_INVALIDATE_FUNCTION_SQL)
+    transitions = {
+        'ins': "INSERT {table} REFERENCING NEW TABLE AS new_rows",
+        'upd': "UPDATE {table} REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+        'del': "DELETE {table} REFERENCING OLD TABLE AS old_rows",
+    }
+    for table in STATS_SOURCE_TABLES:
+        for suffix, event in transitions.items():
+            name = f"{table}_stats_{suffix}"
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON {table}")
+            cursor.execute(f"CREATE TRIGGER {name} AFTER {event.format(table=f'ON {table}')} "
+                           f"FOR EACH STATEMENT EXECUTE FUNCTION {STATS_INVALIDATE_FUNCTION}()")
+
+
+def refresh_backtest_stats(cursor, backtest_ids, with_xirr=True, workers=1):
+    """在当前事务中重新计算并写入回测统计，不提交
+
+    Args:
+        cursor: 数据库游标
+        backtest_ids: 回测ID列表
+        with_xirr: 是否同时计算交易专用XIRR并写入backtest_xirr和统计表
+        workers: XIRR求解进程数，见xirr_batch.solve_many；默认1，保存线程中不启动进程池
+
+    Returns:
+        int: 更新的回测数
+    """
+    ids = list(dict.fromkeys(int(backtest_id) for backtest_id in backtest_ids))
+    if not ids:
+        return 0
+    cursor.execute(REFRESH_STATS_SQL, {'ids': ids})
+    count = cursor.rowcount
+    if with_xirr:
+        results = solve_trades_only_xirr(cursor, ids, workers)
+        upsert_xirr_results(cursor, results)
+    return count
+
+
+def missing_stats_ids(cursor, backtest_ids):
+    """返回还没有统计记录的回测ID"""
+    cursor.execute("""
+        SELECT br.id FROM backtest_results br
+        WHERE br.id = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM backtest_stats s WHERE s.backtest_id = br.id)
+    """, ([int(backtest_id) for backtest_id in backtest_ids],))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def rebuild_backtest_stats(db_connector, backtest_ids=None, workers=None):
+    """重建回测统计并提交
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器
+        backtest_ids: 回测ID列表，None时重建全部回测
+        workers: XIRR求解进程数，见xirr_batch.solve_many
+
+    Returns:
+        int: 更新的回测数，失败返回None
+    """
+    conn = None
+    try:
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        if backtest_ids is None:
+            cursor.execute("SELECT id FROM backtest_results ORDER BY id")
+            backtest_ids = [row[0] for row in cursor.fetchall()]
+        count = refresh_backtest_stats(cursor, backtest_ids, workers=workers)
+        conn.commit()
+        cursor.close()
+        return count
+    except Exception as e:
+        print(f"重建回测统计失败: {str(e)}")
+        traceback.print_exc()
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description='回测统计表维护')
+    subparsers = parser.add_subparsers(dest='command')
+    refresh_parser = subparsers.add_parser('refresh', help='重建回测统计')
+    refresh_parser.add_argument('backtest_ids', nargs='*', type=int, help='回测ID')
+    refresh_parser.add_argument('--all', action='store_true', help='重建全部回测')
+    args = parser.parse_args()
+
+    if args.command != 'refresh' or not (args.all or args.backtest_ids):
+        parser.print_help()
+        return 1
+
+    from backtest_gui.utils.db_connector import DBConnector
+    count = rebuild_backtest_stats(DBConnector(), None if args.all else args.backtest_ids)
+    if count is None:
+        return 1
+    print(f"已更新 {count} 个回测的统计")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
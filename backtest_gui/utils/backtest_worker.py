@@ -7,22 +7,26 @@ import traceback
 import time
 import numpy as np
 import pandas as pd
-import threading
 from PyQt5.QtCore import QThread, pyqtSignal, QCoreApplication, QEventLoop, QTimer, Qt
 from PyQt5.QtWidgets import QApplication
 
+from backtest_gui.utils.persistence_queue import create_backtest_job, get_persistence_queue
+from backtest_gui.utils.backtest_cache import (
+    get_data_version, compute_fingerprint, find_cached_backtest, load_cached_signals
+)
+
 class BacktestWorker(QThread):
     """回测工作线程，用于在后台执行回测任务"""
     
     # 定义信号
     progress_signal = pyqtSignal(int, int, str)  # 进度信号(当前进度, 总进度, 描述)
     chart_update_signal = pyqtSignal(object, object, int, list, list)  # 图表更新信号(模块, 数据, 当前索引, 买入信号, 卖出信号)
-    completed_signal = pyqtSignal(object, object, list, list, float, float, int)  # 完成信号(模块, 数据, 买入信号, 卖出信号, 总收益率, 总收益, 回测ID)
+    completed_signal = pyqtSignal(object, object, list, list, float, float, int)  # 完成信号(模块, 数据, 买入信号, 卖出信号, 总收益率, 总收益, 回测ID，后台保存完成前为0)
     error_signal = pyqtSignal(str)  # 错误信号
     status_signal = pyqtSignal(str)  # 状态信号，用于更新状态栏
     
     def __init__(self, module, stock_data, band_strategy, db_connector, 
-                 pure_code, start_date, end_date, strategy_id, strategy_name):
+                 pure_code, start_date, end_date, strategy_id, strategy_name, force_rerun=False):
         """初始化回测工作线程
         
         Args:
@@ -35,6 +39,7 @@ class BacktestWorker(QThread):
             end_date: 结束日期
             strategy_id: 策略ID
             strategy_name: 策略名称
+            force_rerun: 是否忽略相同输入的已有回测结果，强制重新计算
         """
         super().__init__()
         self.module = module
@@ -48,9 +53,14 @@ class BacktestWorker(QThread):
         self.end_date = end_date
         self.strategy_id = strategy_id
         self.strategy_name = strategy_name
+        self.initial_capital = 1000000.0  # 初始资金100万
         self.is_cancelled = False
         self.total_records = None  # 数据库中的总记录数
         self.last_date = None  # 上一批次的最后日期
+        self.persist_job_key = None  # 后台持久化任务键，保存完成后由持久化队列通知回测ID
+        self.force_rerun = force_rerun
+        self.input_hash = None  # 回测输入指纹
+        self.reused_backtest_id = None  # 复用已有回测结果时的回测ID
         
         # 设置线程优先级为低，避免与UI线程竞争
         self.setPriority(QThread.LowPriority)
@@ -189,7 +199,7 @@ class BacktestWorker(QThread):
             sell_signals = []
             
             # 初始化资金和持仓
-            initial_capital = 1000000  # 初始资金100万
+            initial_capital = self.initial_capital
             current_capital = initial_capital
             position = 0  # 当前持仓数量
             
@@ -230,6 +240,12 @@ class BacktestWorker(QThread):
             if self.band_strategy:
                 self.band_strategy.init_strategy()
             
+            # 计算回测输入指纹，相同输入的回测已保存时直接复用其结果
+            self.input_hash = self._compute_input_hash()
+            if self.input_hash and not self.force_rerun and self._reuse_cached_result(data):
+                self.is_running = False
+                return
+            
             # 记录第一个价格点，用于计算相对收益
             first_price = data.iloc[0]['close'] if len(data) > 0 and 'close' in data.columns else None
             
@@ -364,7 +380,7 @@ class BacktestWorker(QThread):
                 self._update_chart(all_data_points, buy_signals, sell_signals, first_price, total_data_points, final_update=True)
                 
                 # 计算回测结果
-                initial_capital = 1000000.0  # 初始资金100万
+                initial_capital = self.initial_capital
                 final_capital = initial_capital
                 total_profit = 0.0
                 total_profit_rate = 0.0
@@ -383,61 +399,50 @@ class BacktestWorker(QThread):
                 print(f"生成买入信号: {len(buy_signals)} 个, 卖出信号: {len(sell_signals)} 个")
                 print(f"总收益: {total_profit:.2f}, 收益率: {total_profit_rate:.2f}%")
                 
-                # 保存回测结果到数据库
-                backtest_id = self._save_backtest_results(
-                    self.pure_code, 
-                    self.start_date, 
-                    self.end_date, 
-                    initial_capital, 
-                    final_capital, 
-                    total_profit, 
-                    total_profit_rate, 
-                    self.strategy_id, 
-                    self.strategy_name,
+                # 将回测结果交给后台持久化队列，不等待数据库写入即可绘制图表
+                self.persist_job_key = self._submit_backtest_results(
+                    initial_capital,
+                    final_capital,
+                    total_profit,
+                    total_profit_rate,
                     len(buy_signals),
                     len(sell_signals)
                 )
                 
-                # 如果成功保存了回测结果，保存配对交易记录
-                if backtest_id:
-                    self.band_strategy.save_paired_trades_to_db(backtest_id)
-                    
-                    # 创建一个包含所有价格点的DataFrame作为最终结果
-                    if all_data_points:
-                        final_data = pd.DataFrame(all_data_points)
-                        print(f"准备发送完成信号: 数据点数量={len(final_data)}, 买入信号={len(buy_signals)}, 卖出信号={len(sell_signals)}")
-                    else:
-                        final_data = pd.DataFrame()
-                        print("警告: 没有数据点可用于最终图表")
-                    
-                    # 确保数据不为空且包含必要的列
-                    if not final_data.empty:
-                        # 确保数据按日期排序
-                        if 'date' in final_data.columns:
-                            final_data = final_data.sort_values('date')
-                            
-                        # 打印数据样本以便调试
-                        print(f"最终数据样本: {final_data.head(3)}")
-                        print(f"数据列: {final_data.columns.tolist()}")
-                    
-                    # 发出完成信号
-                    self.completed_signal.emit(
-                        self.module,
-                        final_data,
-                        buy_signals,
-                        sell_signals,
-                        total_profit_rate,
-                        total_profit,
-                        backtest_id
-                    )
-                    
-                    # 更新状态栏
-                    self.status_signal.emit(f"回测完成: 买入信号 {len(buy_signals)} 个，卖出信号 {len(sell_signals)} 个，收益率 {total_profit_rate:.2f}%")
-                    
-                    # 确保主线程有机会处理信号
-                    self.process_events()
+                # 创建一个包含所有价格点的DataFrame作为最终结果
+                if all_data_points:
+                    final_data = pd.DataFrame(all_data_points)
+                    print(f"准备发送完成信号: 数据点数量={len(final_data)}, 买入信号={len(buy_signals)}, 卖出信号={len(sell_signals)}")
                 else:
-                    self.error_signal.emit("保存回测结果失败")
+                    final_data = pd.DataFrame()
+                    print("警告: 没有数据点可用于最终图表")
+                
+                # 确保数据不为空且包含必要的列
+                if not final_data.empty:
+                    # 确保数据按日期排序
+                    if 'date' in final_data.columns:
+                        final_data = final_data.sort_values('date')
+                        
+                    # 打印数据样本以便调试
+                    print(f"最终数据样本: {final_data.head(3)}")
+                    print(f"数据列: {final_data.columns.tolist()}")
+                
+                # 发出完成信号
+                self.completed_signal.emit(
+                    self.module,
+                    final_data,
+                    buy_signals,
+                    sell_signals,
+                    total_profit_rate,
+                    total_profit,
+                    0
+                )
+                
+                # 更新状态栏
+                self.status_signal.emit(f"回测完成: 买入信号 {len(buy_signals)} 个，卖出信号 {len(sell_signals)} 个，收益率 {total_profit_rate:.2f}%")
+                
+                # 确保主线程有机会处理信号
+                self.process_events()
                     
             # 重置运行标志
             self.is_running = False
@@ -663,141 +668,120 @@ class BacktestWorker(QThread):
             empty_df.attrs['data_level'] = self.data_level if hasattr(self, 'data_level') else "1min"
             return empty_df
     
-    def _save_backtest_results(self, fund_code, start_date, end_date, initial_capital, 
-                              final_capital, total_profit, total_profit_rate, strategy_id, strategy_name,
-                              num_buy_signals, num_sell_signals):
-        """保存回测结果到数据库
+    def _compute_input_hash(self):
+        """计算回测输入指纹
+        
+        Returns:
+            str: 输入指纹，无法计算时返回None
+        """
+        if not self.db_connector or not self.band_strategy:
+            return None
+            
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            data_version = get_data_version(cursor, self.pure_code, self.data_level,
+                                            self.start_date, self.end_date)
+            conn.rollback()
+            cursor.close()
+            return compute_fingerprint(self.pure_code, self.data_level, self.start_date, self.end_date,
+                                       data_version, self.band_strategy.grid_levels,
+                                       self.strategy_id, self.initial_capital)
+        except Exception as e:
+            print(f"计算回测输入指纹失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return None
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+    
+    def _reuse_cached_result(self, data):
+        """查找相同输入指纹的已有回测，找到时直接发出完成信号
+        
+        Args:
+            data: 回测行情数据，用于绘制图表
+            
+        Returns:
+            bool: 是否复用了已有结果
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            cached = find_cached_backtest(cursor, self.input_hash)
+            if not cached:
+                conn.rollback()
+                return False
+            buy_signals, sell_signals = load_cached_signals(cursor, cached['id'])
+            conn.rollback()
+            cursor.close()
+        except Exception as e:
+            print(f"查找已有回测结果失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+        
+        self.reused_backtest_id = cached['id']
+        print(f"复用相同输入的回测结果，ID: {cached['id']}，回测时间: {cached['backtest_time']}")
+        
+        final_data = data.sort_values('date') if 'date' in data.columns else data
+        self.completed_signal.emit(
+            self.module,
+            final_data,
+            buy_signals,
+            sell_signals,
+            cached['total_profit_rate'],
+            cached['total_profit'],
+            cached['id']
+        )
+        self.status_signal.emit(f"复用已有回测结果 (ID: {cached['id']})：买入信号 {len(buy_signals)} 个，"
+                                f"卖出信号 {len(sell_signals)} 个，收益率 {cached['total_profit_rate']:.2f}%")
+        self.process_events()
+        return True
+    
+    def _submit_backtest_results(self, initial_capital, final_capital, total_profit, total_profit_rate,
+                                 num_buy_signals, num_sell_signals):
+        """将回测结果和配对交易提交到后台持久化队列
         
         Args:
-            fund_code: 基金代码
-            start_date: 开始日期
-            end_date: 结束日期
             initial_capital: 初始资金
             final_capital: 最终资金
             total_profit: 总收益
             total_profit_rate: 总收益率
-            strategy_id: 策略ID
-            strategy_name: 策略名称
             num_buy_signals: 买入信号数量
             num_sell_signals: 卖出信号数量
             
         Returns:
-            int: 回测ID，如果保存失败则返回None
+            str: 持久化任务键，提交失败返回None
         """
         try:
-            import time
-            import threading
-            
-            # 更新状态信息
-            self.status_signal.emit("正在保存回测结果...")
-            
             if not self.db_connector:
                 print("无法保存回测结果：数据库连接器未初始化")
                 return None
                 
-            # 创建一个锁，避免多个线程同时访问数据库
-            db_lock = threading.Lock()
+            job = create_backtest_job(
+                self.pure_code, self.start_date, self.end_date,
+                initial_capital, final_capital, total_profit, total_profit_rate,
+                self.strategy_id, self.strategy_name,
+                num_buy_signals, num_sell_signals,
+                self.band_strategy.get_all_paired_trades() if self.band_strategy else [],
+                self.input_hash
+            )
+            job_key = get_persistence_queue(self.db_connector).submit(job)
+            self.status_signal.emit("回测结果已提交后台保存")
+            return job_key
             
-            # 使用锁保护数据库操作
-            with db_lock:
-                conn = None
-                try:
-                    # 获取连接并设置超时
-                    start_time = time.time()
-                    timeout = 10  # 10秒超时
-                    
-                    while not conn and time.time() - start_time < timeout:
-                        conn = self.db_connector.get_connection()
-                        if not conn:
-                            print("等待数据库连接...")
-                            time.sleep(0.5)
-                    
-                    if not conn:
-                        print("无法获取数据库连接：超时")
-                        return None
-                    
-                    # 设置游标
-                    cursor = conn.cursor()
-                    
-                    # 首先检查表是否已经存在所需的列
-                    has_count_columns = False
-                    try:
-                        cursor.execute("""
-                            SELECT column_name 
-                            FROM information_schema.columns 
-                            WHERE table_name='backtest_results' 
-                            AND (column_name='buy_count' OR column_name='sell_count')
-                        """)
-                        has_count_columns = len(cursor.fetchall()) >= 2
-                    except Exception as e:
-                        print(f"检查表结构失败: {str(e)}")
-                        # 继续执行，使用默认列
-                    
-                    # 准备基本数据
-                    params = [fund_code, start_date, end_date, initial_capital, final_capital,
-                              total_profit, total_profit_rate, strategy_id, strategy_name]
-                    
-                    # 根据表结构选择SQL
-                    if has_count_columns:
-                        # 添加买卖信号数量
-                        params.extend([num_buy_signals, num_sell_signals])
-                        
-                        # 构建SQL
-                        sql = """
-                            INSERT INTO backtest_results 
-                            (stock_code, start_date, end_date, initial_capital, final_capital, 
-                            total_profit, total_profit_rate, backtest_time, strategy_id, strategy_name,
-                            buy_count, sell_count)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), %s, %s, %s, %s)
-                            RETURNING id
-                        """
-                    else:
-                        # 使用基本列
-                        sql = """
-                            INSERT INTO backtest_results 
-                            (stock_code, start_date, end_date, initial_capital, final_capital, 
-                            total_profit, total_profit_rate, backtest_time, strategy_id, strategy_name)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), %s, %s)
-                            RETURNING id
-                        """
-                    
-                    # 执行SQL并获取ID
-                    self.status_signal.emit("执行数据库插入...")
-                    cursor.execute(sql, params)
-                    
-                    # 获取新插入的回测ID
-                    result = cursor.fetchone()
-                    if not result:
-                        print("插入成功但未返回ID")
-                        conn.rollback()
-                        return None
-                        
-                    backtest_id = result[0]
-                    
-                    # 提交事务
-                    self.status_signal.emit("提交数据库事务...")
-                    conn.commit()
-                    
-                    print(f"成功保存回测结果，ID: {backtest_id}")
-                    return backtest_id
-                    
-                except Exception as e:
-                    if conn:
-                        conn.rollback()
-                    print(f"保存回测结果失败: {str(e)}")
-                    import traceback
-                    traceback.print_exc()
-                    return None
-                finally:
-                    if conn:
-                        self.db_connector.release_connection(conn)
-                    self.status_signal.emit("回测结果保存完成")
-                    
         except Exception as e:
-            print(f"保存回测结果过程中出错: {str(e)}")
-            import traceback
+            print(f"提交回测结果失败: {str(e)}")
             traceback.print_exc()
-            return None 
+            return None
 
     def _load_all_data(self):
         """一次性加载所有数据"""
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+K线合成模块 - 由1分钟K线按A股交易时段(09:30-11:30, 13:00-15:00)合成
+5/15/30/60分钟、日线、周线和月线
+
+分钟K线沿用QMT的标记方式：时间为K线结束时刻(右闭右标)，09:30的集合竞价K线并入第一根K线，
+例如60分钟K线为10:30、11:30、14:00、15:00四根。
+"""
+import argparse
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from backtest_gui.utils.time_utils import convert_datetimes_to_timestamps, convert_timestamps_to_datetime
+
+# 可由1分钟K线合成的级别及对应分钟数
+MINUTE_LEVELS = {'5min': 5, '15min': 15, '30min': 30, '60min': 60}
+DERIVED_LEVELS = ['5min', '15min', '30min', '60min', 'day', 'week', 'month']
+
+# 交易时段(当日分钟数)
+MORNING_OPEN = 9 * 60 + 30
+MORNING_CLOSE = 11 * 60 + 30
+AFTERNOON_OPEN = 13 * 60
+AFTERNOON_CLOSE = 15 * 60
+MORNING_MINUTES = MORNING_CLOSE - MORNING_OPEN
+SESSION_MINUTES = MORNING_MINUTES + (AFTERNOON_CLOSE - AFTERNOON_OPEN)
+
+# 周线/月线对应的pandas周期
+PERIOD_FREQ = {'week': 'W', 'month': 'M'}
+
+OHLCV_AGG = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'volume': 'sum',
+    'amount': 'sum',
+}
+
+
+def _session_offsets(dates):
+    """计算每根1分钟K线在交易时段内的分钟序号(1-240)
+
+    集合竞价(09:30及之前)归入第1分钟，午休期间归入上午最后一分钟，15:00之后归入最后一分钟
+    """
+    minute_of_day = dates.dt.hour.values * 60 + dates.dt.minute.values
+    offsets = np.where(
+        minute_of_day <= MORNING_CLOSE,
+        minute_of_day - MORNING_OPEN,
+        np.where(minute_of_day <= AFTERNOON_OPEN,
+                 MORNING_MINUTES,
+                 minute_of_day - AFTERNOON_OPEN + MORNING_MINUTES)
+    )
+    return np.clip(offsets, 1, SESSION_MINUTES)
+
+
+def _offset_to_clock(offsets):
+    """交易时段内的分钟序号转换为当日时刻(距零点的分钟数)"""
+    return np.where(offsets <= MORNING_MINUTES,
+                    MORNING_OPEN + offsets,
+                    AFTERNOON_OPEN + offsets - MORNING_MINUTES)
+
+
+def resample_bars(df, target_level):
+    """由1分钟K线合成指定级别的K线
+
+    Args:
+        df: 1分钟K线，包含date(北京时间，不带时区)及open/high/low/close/volume/amount列
+        target_level: 目标级别，'5min'/'15min'/'30min'/'60min'/'day'/'week'/'month'
+
+    Returns:
+        DataFrame: 合成后的K线，包含date, time及OHLCV列，time为毫秒时间戳
+    """
+    if target_level not in DERIVED_LEVELS:
+        raise ValueError(f"不支持合成的数据级别: {target_level}")
+
+    columns = ['date', 'time'] + list(OHLCV_AGG)
+    if df is None or len(df) == 0:
+        return pd.DataFrame(columns=columns)
+
+    bars = df[['date'] + list(OHLCV_AGG)].copy()
+    bars['date'] = pd.to_datetime(bars['date'])
+    if getattr(bars['date'].dt, 'tz', None) is not None:
+        bars['date'] = bars['date'].dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
+    if 'amount' in bars:
+        bars['amount'] = bars['amount'].fillna(0.0)
+    bars = bars.sort_values('date', kind='stable')
+
+    day = bars['date'].dt.normalize()
+
+    if target_level in MINUTE_LEVELS:
+        minutes = MINUTE_LEVELS[target_level]
+        # 向上取整到K线结束的分钟序号
+        end_offsets = np.ceil(_session_offsets(bars['date']) / minutes).astype(np.int64) * minutes
+        end_offsets = np.minimum(end_offsets, SESSION_MINUTES)
+        label = day + pd.to_timedelta(_offset_to_clock(end_offsets), unit='m')
+    elif target_level == 'day':
+        label = day
+    else:
+        # 周线/月线以该周期内最后一个交易日标记，周期未结束时标记会随新数据后移，
+        # 写入时用period_bounds整体替换这些周期的K线
+        period = day.dt.to_period(PERIOD_FREQ[target_level])
+        label = day.groupby(period.values).transform('max')
+
+    result = bars.groupby(label.values, sort=True).agg(OHLCV_AGG)
+    result.index.name = 'date'
+    result = result.reset_index()
+    result['time'] = convert_datetimes_to_timestamps(result['date'])
+    return result[columns]
+
+
+def period_bounds(dates, target_level):
+    """周线/月线K线覆盖的整周期时间范围
+
+    Args:
+        dates: 源K线的日期序列
+        target_level: 'week'或'month'
+
+    Returns:
+        tuple: (第一个周期的开始时间, 最后一个周期之后的周期开始时间)，左闭右开
+    """
+    periods = pd.to_datetime(pd.Series(dates)).dt.to_period(PERIOD_FREQ[target_level])
+    return (periods.min().start_time.to_pydatetime(), (periods.max() + 1).start_time.to_pydatetime())
+
+
+class BarResampler:
+    """K线合成器
+
+    从stock_quotes读取1分钟K线，合成更高级别后写回stock_quotes(同时更新覆盖索引)，
+    也可以对本地文件数据源进行合成。
+    """
+
+    def __init__(self, db_connector=None, source_level='1min'):
+        """初始化K线合成器
+
+        Args:
+            db_connector: 提供get_connection/release_connection的数据库连接器
+            source_level: 合成所用的源级别
+        """
+        from backtest_gui.utils.quote_writer import QuoteWriter
+        self.writer = QuoteWriter(db_connector)
+        self.db_connector = self.writer.db_connector
+        self.source_level = source_level
+
+    def load_source_bars(self, fund_code, start_date=None, end_date=None):
+        """读取源级别K线，按整日边界截取
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            start_date: 开始日期，None表示不限制
+            end_date: 结束日期(含当日)，None表示不限制
+
+        Returns:
+            DataFrame: 包含date及OHLCV列
+        """
+        conn = None
+        try:
+            query = """
+            SELECT date, open, high, low, close, volume, amount
+            FROM stock_quotes
+            WHERE fund_code = %s AND data_level = %s
+            """
+            params = [fund_code, self.source_level]
+            if start_date is not None:
+                query += " AND date >= %s"
+                params.append(pd.Timestamp(start_date).normalize().to_pydatetime())
+            if end_date is not None:
+                query += " AND date < %s"
+                params.append((pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)).to_pydatetime())
+            query += " ORDER BY date"
+
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+
+            df = pd.DataFrame(rows, columns=['date'] + list(OHLCV_AGG))
+            for col in OHLCV_AGG:
+                df[col] = pd.to_numeric(df[col], errors='coerce')
+            return df
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def resample_range(self, fund_code, target_levels=None, start_date=None, end_date=None):
+        """批量合成：读取区间内的1分钟K线，合成各级别并写入数据库
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            target_levels: 目标级别列表，默认全部可合成级别
+            start_date: 开始日期
+            end_date: 结束日期
+
+        Returns:
+            dict: {级别: 写入记录数}
+        """
+        target_levels = target_levels or DERIVED_LEVELS
+        source = self.load_source_bars(fund_code, start_date, end_date)
+        print(f"读取 {fund_code} {self.source_level} K线 {len(source)} 条，开始合成 {', '.join(target_levels)}")
+
+        results = {}
+        for level in target_levels:
+            try:
+                bars = resample_bars(source, level)
+                # 周期未结束时周线/月线的标记日期会变化，先删除这些周期的旧K线，避免同一周期留下两根
+                replace_range = period_bounds(source['date'], level) if level in PERIOD_FREQ else None
+                written = 0
+                if len(bars) > 0:
+                    written = self.writer.write(fund_code, level, bars, replace_range=replace_range)
+                results[level] = written
+            except Exception as e:
+                print(f"合成 {fund_code} {level} K线失败: {str(e)}")
+                traceback.print_exc()
+                results[level] = None
+        return results
+
+    def update_incremental(self, fund_code, new_bars, target_levels=None):
+        """增量合成：根据新入库的1分钟K线，重新合成受影响的交易日/周/月
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            new_bars: 新入库的1分钟K线，需包含date或time列
+            target_levels: 目标级别列表，默认全部可合成级别
+
+        Returns:
+            dict: {级别: 写入记录数}
+        """
+        if new_bars is None or len(new_bars) == 0:
+            return {}
+
+        target_levels = target_levels or DERIVED_LEVELS
+        if 'date' in new_bars:
+            dates = pd.to_datetime(new_bars['date'])
+            if getattr(dates.dt, 'tz', None) is not None:
+                dates = dates.dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
+        else:
+            dates = convert_timestamps_to_datetime(new_bars['time'], naive=True)
+        dates = dates.dropna()
+        if len(dates) == 0:
+            return {}
+        first_day = dates.min().normalize()
+        last_day = dates.max().normalize()
+
+        # 周线/月线需要整周/整月的分钟数据
+        if 'month' in target_levels:
+            first_day = first_day.replace(day=1)
+        elif 'week' in target_levels:
+            first_day = first_day - pd.Timedelta(days=first_day.weekday())
+        if 'month' in target_levels:
+            last_day = last_day + pd.offsets.MonthEnd(0)
+        elif 'week' in target_levels:
+            last_day = last_day + pd.Timedelta(days=6 - last_day.weekday())
+
+        return self.resample_range(fund_code, target_levels, first_day, last_day)
+
+
+def resample_local_file(source, symbol, target_levels=None):
+    """对本地文件数据源中的1分钟K线进行合成，结果保存到对应周期的文件
+
+    Args:
+        source: LocalFileDataSource实例
+        symbol: 带市场后缀的代码
+        target_levels: 目标级别列表，默认全部可合成级别
+
+    Returns:
+        dict: {级别: 文件路径}
+    """
+    minute_df = source.fetch_bars(symbol, '1min', '', '')
+    minute_df['date'] = convert_timestamps_to_datetime(minute_df['time'], naive=True)
+
+    paths = {}
+    for level in target_levels or DERIVED_LEVELS:
+        bars = resample_bars(minute_df, level)
+        paths[level] = source.save_bars(symbol, level, bars)
+    return paths
+
+
+def parse_arguments():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='由1分钟K线合成高级别K线并写入数据库')
+
+    parser.add_argument('fund_codes', type=str, help='逗号分隔的基金代码，如510300,159920')
+    parser.add_argument('--levels', type=str, default=','.join(DERIVED_LEVELS), help='逗号分隔的目标级别')
+    parser.add_argument('--start', type=str, help='开始日期YYYYMMDD，默认全部')
+    parser.add_argument('--end', type=str, help='结束日期YYYYMMDD，默认全部')
+
+    return parser.parse_args()
+
+
+def main():
+    """主函数"""
+    args = parse_arguments()
+    levels = [l.strip() for l in args.levels.split(',') if l.strip()]
+    from backtest_gui.db.migrations import ensure_schema
+    resampler = BarResampler()
+    ensure_schema(resampler.writer.db_connector)
+    for fund_code in args.fund_codes.split(','):
+        pure_code = fund_code.strip().split('.')[0]
+        results = resampler.resample_range(pure_code, levels, args.start, args.end)
+        print(f"{pure_code} 合成结果: {results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回测结果批量写入模块 - 将交易、配对交易和持仓记录按列整体转换后批量写入
+
+记录列表先整体转换为DataFrame，按列完成时间和NumPy类型到Python原生类型的转换，
+再用execute_values在调用方的事务中批量插入，不再逐行执行INSERT。
+"""
+import pandas as pd
+from psycopg2 import extras
+
+DEFAULT_PAGE_SIZE = 5000
+
+# 列定义: (数据库列名, 记录字段名, 后备字段名, 默认值)
+# 记录中缺少字段或字段为空时依次使用后备字段和默认值
+TRADE_COLUMNS = [
+    ('trade_time', 'time', None, None),
+    ('trade_type', 'type', None, None),
+    ('price', 'price', None, None),
+    ('amount', 'amount', None, None),
+    ('trade_value', 'value', None, None),
+    ('level', 'level', None, None),
+    ('grid_type', 'grid_type', None, None),
+    ('band_profit', 'band_profit', None, None),
+    ('band_profit_rate', 'band_profit_rate', None, None),
+    ('remaining', 'remaining', None, None),
+]
+
+PAIRED_TRADE_COLUMNS = [
+    ('level', 'level', None, 0),
+    ('grid_type', 'grid_type', None, 'UNKNOWN'),
+    ('buy_time', 'buy_time', None, None),
+    ('buy_price', 'buy_price', None, None),
+    ('buy_amount', 'buy_amount', None, None),
+    ('buy_value', 'buy_value', None, None),
+    ('sell_time', 'sell_time', None, None),
+    ('sell_price', 'sell_price', None, None),
+    ('sell_amount', 'sell_amount', None, None),
+    ('sell_value', 'sell_value', None, None),
+    ('remaining', 'remaining', None, None),
+    ('remaining_shares', 'remaining_shares', 'remaining', None),
+    ('band_profit', 'band_profit', None, None),
+    ('band_profit_rate', 'band_profit_rate', None, None),
+    ('sell_band_profit_rate', 'sell_band_profit_rate', 'band_profit_rate', None),
+    ('status', 'status', None, '进行中'),
+]
+
+NAV_COLUMNS = [
+    ('time', 'time', None, None),
+    ('nav', 'nav', None, None),
+]
+
+POSITION_COLUMNS = [
+    ('position_amount', 'position_amount', 'shares', None),
+    ('position_cost', 'position_cost', 'cost', None),
+    ('last_price', 'last_price', 'price', None),
+    ('position_value', 'position_value', 'market_value', None),
+]
+
+
+def _column_values(frame, field, fallback, default, size):
+    """取出一列并转换为Python原生值列表，空值按后备字段和默认值补齐"""
+    if field in frame:
+        column = frame[field]
+    else:
+        column = pd.Series([None] * size, index=frame.index, dtype=object)
+
+    if fallback is not None and fallback in frame:
+        column = column.where(column.notna(), frame[fallback])
+
+    if pd.api.types.is_datetime64_any_dtype(column):
+        # 带时区的时间转为北京时间后去掉时区，与数据库TIMESTAMP列一致
+        if getattr(column.dt, 'tz', None) is not None:
+            column = column.dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
+        values = list(column.dt.to_pydatetime())
+        mask = column.isna().tolist()
+    else:
+        values = column.tolist()
+        mask = column.isna().tolist()
+
+    # tolist()已将NumPy标量转为Python原生类型，这里只需处理空值
+    return [default if missing else value for value, missing in zip(values, mask)]
+
+
+def records_to_rows(records, columns, constants=None):
+    """将字典记录列表按列整体转换为插入用的元组列表
+
+    Args:
+        records: 记录列表(每个记录为字典)或DataFrame
+        columns: 列定义列表，见TRADE_COLUMNS
+        constants: 放在每行最前面的常量值(如backtest_id)
+
+    Returns:
+        list: 元组列表，列顺序为constants加columns
+    """
+    if records is None or len(records) == 0:
+        return []
+
+    if isinstance(records, pd.DataFrame):
+        frame = records.reset_index(drop=True)
+    else:
+        frame = pd.DataFrame.from_records(list(records))
+    size = len(frame)
+    column_values = [[value] * size for value in (constants or [])]
+    for _, field, fallback, default in columns:
+        column_values.append(_column_values(frame, field, fallback, default, size))
+    return list(zip(*column_values))
+
+
+def bulk_insert(cursor, table, columns, records, constants=None, constant_columns=None,
+                page_size=DEFAULT_PAGE_SIZE):
+    """批量插入记录，不提交事务
+
+    Args:
+        cursor: 数据库游标
+        table: 表名
+        columns: 列定义列表
+        records: 记录列表(每个记录为字典)或DataFrame
+        constants: 每行前置的常量值
+        constant_columns: 常量值对应的列名
+        page_size: execute_values每条语句携带的行数
+
+    Returns:
+        int: 插入的行数
+    """
+    rows = records_to_rows(records, columns, constants)
+    if not rows:
+        return 0
+
+    column_names = list(constant_columns or []) + [column[0] for column in columns]
+    extras.execute_values(
+        cursor,
+        f"INSERT INTO {table} ({', '.join(column_names)}) VALUES %s",
+        rows,
+        page_size=page_size
+    )
+    return len(rows)
+
+
+def write_trades(cursor, backtest_id, trades, page_size=DEFAULT_PAGE_SIZE):
+    """批量写入backtest_trades
+
+    Args:
+        cursor: 数据库游标
+        backtest_id: 回测ID
+        trades: 交易记录列表，字段为time/type/price/amount/value/level/grid_type/...
+        page_size: execute_values每条语句携带的行数
+
+    Returns:
+        int: 插入的行数
+    """
+    return bulk_insert(cursor, 'backtest_trades', TRADE_COLUMNS, trades,
+                       [backtest_id], ['backtest_id'], page_size)
+
+
+def write_paired_trades(cursor, backtest_id, paired_trades, page_size=DEFAULT_PAGE_SIZE):
+    """批量写入backtest_paired_trades
+
+    Args:
+        cursor: 数据库游标
+        backtest_id: 回测ID
+        paired_trades: 配对交易记录列表，字段同BandStrategy.get_all_paired_trades
+        page_size: execute_values每条语句携带的行数
+
+    Returns:
+        int: 插入的行数
+    """
+    return bulk_insert(cursor, 'backtest_paired_trades', PAIRED_TRADE_COLUMNS, paired_trades,
+                       [backtest_id], ['backtest_id'], page_size)
+
+
+def write_positions(cursor, backtest_id, positions, page_size=DEFAULT_PAGE_SIZE):
+    """批量写入backtest_positions
+
+    Args:
+        cursor: 数据库游标
+        backtest_id: 回测ID
+        positions: 持仓记录列表，字段为position_amount/position_cost/last_price/position_value，
+            也兼容shares/cost/price/market_value
+        page_size: execute_values每条语句携带的行数
+
+    Returns:
+        int: 插入的行数
+    """
+    return bulk_insert(cursor, 'backtest_positions', POSITION_COLUMNS, positions,
+                       [backtest_id], ['backtest_id'], page_size)
+
+
+def write_nav(cursor, backtest_id, nav_df, page_size=DEFAULT_PAGE_SIZE):
+    """批量写入backtest_nav
+
+    Args:
+        cursor: 数据库游标
+        backtest_id: 回测ID
+        nav_df: 净值数据DataFrame，索引为时间，包含nav列
+        page_size: execute_values每条语句携带的行数
+
+    Returns:
+        int: 插入的行数
+    """
+    frame = pd.DataFrame({'time': nav_df.index, 'nav': nav_df['nav'].to_numpy()})
+    return bulk_insert(cursor, 'backtest_nav', NAV_COLUMNS, frame,
+                       [backtest_id], ['backtest_id'], page_size)
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据库连接池服务 - 进程内共享的线程安全连接池
+
+所有数据库客户端(Database、DBConnector、DataLoader等)都通过get_pool()获取同一个连接池：
+- 基于psycopg2的ThreadedConnectionPool，可在多线程中安全使用
+- 连接耗尽时阻塞等待，超时抛出PoolTimeoutError，而不是立即失败
+- 取出空闲较久的连接时先执行健康检查，失效连接自动丢弃并重建
+- 统计等待时间、使用中连接数和连接占用时长
+"""
+import os
+import time
+import threading
+import traceback
+from contextlib import contextmanager
+
+from psycopg2 import pool
+
+from backtest_gui import settings
+
+
+class PoolTimeoutError(Exception):
+    """在超时时间内没有可用的数据库连接"""
+
+
+def default_db_config():
+    """从settings读取默认数据库配置
+
+    Returns:
+        dict: 包含host, port, dbname, user, password
+    """
+    return {
+        'host': getattr(settings, 'DB_HOST', 'localhost'),
+        'port': getattr(settings, 'DB_PORT', 5432),
+        'dbname': getattr(settings, 'DB_NAME', 'huice'),
+        'user': getattr(settings, 'DB_USER', 'postgres'),
+        'password': getattr(settings, 'DB_PASSWORD', 'postgres'),
+    }
+
+
+class ConnectionPoolService:
+    """带阻塞获取、健康检查和统计信息的线程安全连接池"""
+
+    def __init__(self, config, min_conn=None, max_conn=None, timeout=None, health_check_interval=None):
+        """初始化连接池服务，连接在第一次获取时才建立
+
+        Args:
+            config: 数据库配置字典，包含host, port, dbname, user, password
+            min_conn: 最小连接数
+            max_conn: 最大连接数
+            timeout: 默认获取超时时间(秒)
+            health_check_interval: 连接空闲超过该时间(秒)后，取出前先检查是否可用
+        """
+        self.config = dict(config)
+        self.min_conn = min_conn if min_conn is not None else getattr(settings, 'DB_POOL_MIN_CONN', 1)
+        self.max_conn = max_conn if max_conn is not None else getattr(settings, 'DB_POOL_MAX_CONN', 32)
+        self.timeout = timeout if timeout is not None else getattr(settings, 'DB_POOL_TIMEOUT', 30)
+        self.health_check_interval = (health_check_interval if health_check_interval is not None
+                                      else getattr(settings, 'DB_POOL_HEALTH_CHECK_INTERVAL', 60))
+
+        self._pool = None
+        self._pid = os.getpid()
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_conn)
+        self._checkout_times = {}
+        self._last_used = {}
+        self._stats = {
+            'acquired': 0,
+            'released': 0,
+            'timeouts': 0,
+            'discarded': 0,
+            'in_use': 0,
+            'peak_in_use': 0,
+            'wait_total': 0.0,
+            'wait_max': 0.0,
+            'checkout_total': 0.0,
+            'checkout_max': 0.0,
+        }
+
+    @property
+    def maxconn(self):
+        """最大连接数，兼容psycopg2连接池的属性名"""
+        return self.max_conn
+
+    def _ensure_pool(self):
+        """按需创建底层ThreadedConnectionPool"""
+        if self._pool is not None:
+            return self._pool
+        with self._init_lock:
+            if self._pool is None:
+                self._pool = pool.ThreadedConnectionPool(self.min_conn, self.max_conn, **self.config)
+                print(f"数据库连接池初始化完成，连接数: {self.min_conn}-{self.max_conn}")
+        return self._pool
+
+    def _is_healthy(self, conn):
+        """检查连接是否可用，空闲时间较短的连接不重复检查"""
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.time() - last_used < self.health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception as e:
+            print(f"数据库连接健康检查失败，丢弃该连接: {str(e)}")
+            return False
+
+    def getconn(self, timeout=None):
+        """获取一个连接，连接池耗尽时阻塞等待
+
+        Args:
+            timeout: 等待超时时间(秒)，None使用默认值
+
+        Returns:
+            connection: 数据库连接
+
+        Raises:
+            PoolTimeoutError: 超时仍无可用连接
+        """
+        timeout = self.timeout if timeout is None else timeout
+        wait_start = time.time()
+        if not self._slots.acquire(timeout=timeout):
+            with self._stats_lock:
+                self._stats['timeouts'] += 1
+            raise PoolTimeoutError(f"等待数据库连接超时({timeout}秒)，使用中连接数: {self._stats['in_use']}")
+
+        try:
+            db_pool = self._ensure_pool()
+            conn = db_pool.getconn()
+            if not self._is_healthy(conn):
+                db_pool.putconn(conn, close=True)
+                self._last_used.pop(id(conn), None)
+                with self._stats_lock:
+                    self._stats['discarded'] += 1
+                conn = db_pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        wait = time.time() - wait_start
+        with self._stats_lock:
+            stats = self._stats
+            stats['acquired'] += 1
+            stats['in_use'] += 1
+            stats['peak_in_use'] = max(stats['peak_in_use'], stats['in_use'])
+            stats['wait_total'] += wait
+            stats['wait_max'] = max(stats['wait_max'], wait)
+            self._checkout_times[id(conn)] = time.time()
+        return conn
+
+    def putconn(self, conn, close=False):
+        """归还连接，已关闭的连接直接丢弃
+
+        Args:
+            conn: 数据库连接
+            close: 是否关闭该连接而不放回连接池
+        """
+        if conn is None or self._pool is None:
+            return
+        checkout_start = self._checkout_times.pop(id(conn), None)
+        if checkout_start is None:
+            # 不是从本连接池取出的连接，或已归还过
+            return
+
+        try:
+            close = close or conn.closed
+            self._pool.putconn(conn, close=close)
+            if close:
+                self._last_used.pop(id(conn), None)
+            else:
+                self._last_used[id(conn)] = time.time()
+        except Exception as e:
+            print(f"归还数据库连接失败: {str(e)}")
+        finally:
+            duration = time.time() - checkout_start
+            with self._stats_lock:
+                stats = self._stats
+                stats['released'] += 1
+                stats['in_use'] -= 1
+                stats['checkout_total'] += duration
+                stats['checkout_max'] = max(stats['checkout_max'], duration)
+                if close:
+                    stats['discarded'] += 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """以上下文管理器方式使用连接，退出时自动归还
+
+        Args:
+            timeout: 等待超时时间(秒)
+        """
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def check_health(self, timeout=None):
+        """取出一个连接执行SELECT 1，检查数据库是否可用
+
+        Returns:
+            bool: 数据库是否可用
+        """
+        try:
+            with self.connection(timeout) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1")
+                result = cursor.fetchone()
+                cursor.close()
+                conn.rollback()
+                return result[0] == 1
+        except Exception as e:
+            print(f"数据库健康检查失败: {str(e)}")
+            return False
+
+    def get_metrics(self):
+        """获取连接池统计信息
+
+        Returns:
+            dict: 获取/归还次数、超时次数、丢弃连接数、使用中连接数、等待时间和占用时长
+        """
+        with self._stats_lock:
+            metrics = dict(self._stats)
+        metrics['max_conn'] = self.max_conn
+        metrics['wait_avg'] = metrics['wait_total'] / metrics['acquired'] if metrics['acquired'] else 0.0
+        metrics['checkout_avg'] = metrics['checkout_total'] / metrics['released'] if metrics['released'] else 0.0
+        return metrics
+
+    def log_metrics(self):
+        """打印连接池统计信息"""
+        m = self.get_metrics()
+        print(f"连接池统计: 使用中 {m['in_use']}/{m['max_conn']} (峰值 {m['peak_in_use']}), "
+              f"获取 {m['acquired']} 次, 超时 {m['timeouts']} 次, 丢弃 {m['discarded']} 个, "
+              f"平均等待 {m['wait_avg'] * 1000:.1f}ms (最大 {m['wait_max'] * 1000:.1f}ms), "
+              f"平均占用 {m['checkout_avg'] * 1000:.1f}ms (最大 {m['checkout_max'] * 1000:.1f}ms)")
+
+    def closeall(self):
+        """关闭所有连接"""
+        with self._init_lock:
+            if self._pool is not None:
+                try:
+                    self._pool.closeall()
+                except Exception as e:
+                    print(f"关闭数据库连接池失败: {str(e)}")
+                self._pool = None
+            self._checkout_times.clear()
+            self._last_used.clear()
+            self._slots = threading.BoundedSemaphore(self.max_conn)
+            with self._stats_lock:
+                self._stats['in_use'] = 0
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _config_key(config):
+    return tuple(sorted((k, str(v)) for k, v in config.items()))
+
+
+def get_pool(config=None, **kwargs):
+    """获取进程内共享的连接池，相同配置只创建一次
+
+    子进程(fork)中会重新创建连接池，不复用父进程的连接。
+
+    Args:
+        config: 数据库配置字典，None使用settings中的配置
+        **kwargs: 首次创建时传给ConnectionPoolService的参数
+
+    Returns:
+        ConnectionPoolService: 连接池服务
+    """
+    config = config or default_db_config()
+    key = _config_key(config)
+    with _pools_lock:
+        service = _pools.get(key)
+        if service is None or service._pid != os.getpid():
+            service = ConnectionPoolService(config, **kwargs)
+            _pools[key] = service
+        return service
+
+
+def close_all_pools():
+    """关闭当前进程中的所有连接池"""
+    with _pools_lock:
+        services = list(_pools.values())
+        _pools.clear()
+    for service in services:
+        try:
+            service.log_metrics()
+            service.closeall()
+        except Exception as e:
+            print(f"关闭连接池失败: {str(e)}")
+            traceback.print_exc()
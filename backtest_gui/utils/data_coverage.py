@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+数据覆盖索引模块 - 记录每个(基金代码, 数据级别)已有数据的交易日，
+并根据交易日历计算缺失的日期区间，实现增量获取
+"""
+import traceback
+from datetime import datetime, date, time as dt_time, timedelta
+
+import pandas as pd
+from psycopg2 import extras
+
+from backtest_gui.utils.time_utils import convert_timestamps_to_datetime
+
+# 覆盖索引表，由db.migrations在进程启动时创建
+FUND_DATA_COVERAGE_DDL = """
+CREATE TABLE IF NOT EXISTS fund_data_coverage (
+    fund_code VARCHAR(20) NOT NULL,
+    data_level VARCHAR(10) NOT NULL,
+    trade_date DATE NOT NULL,
+    bar_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (fund_code, data_level, trade_date)
+)
+"""
+
+# 收盘后留出数据源生成完整K线的时间，此后当日才算已完成的交易日
+SESSION_SETTLE_TIME = dt_time(15, 30)
+
+# 周线/月线一根K线跨越多个交易日，无法按交易日判断覆盖情况，只做尾部增量
+TAIL_ONLY_LEVELS = ('week', 'month', '1w', '1mon')
+
+
+def _to_date(value):
+    """将'YYYYMMDD'字符串、datetime等转换为date对象"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return pd.to_datetime(str(value)).date()
+
+
+def last_complete_day(now=None):
+    """最后一个已收盘的日期
+
+    收盘(SESSION_SETTLE_TIME)之后为今天，之前为昨天。当天盘中获取的数据不完整，
+    未来日期也不可能有数据，这些日期都不能记为已覆盖，否则以后不会再获取。
+
+    Args:
+        now: 当前时间，默认datetime.now()
+
+    Returns:
+        date: 最后一个已收盘的日期
+    """
+    now = now or datetime.now()
+    today = now.date()
+    return today if now.time() >= SESSION_SETTLE_TIME else today - timedelta(days=1)
+
+
+def compute_missing_ranges(trading_days, covered_days):
+    """根据交易日列表和已覆盖日期计算缺失区间
+
+    连续缺失的交易日(中间没有已覆盖的交易日)合并为一个区间
+
+    Args:
+        trading_days: 交易日列表(date对象，升序)
+        covered_days: 已覆盖日期集合(date对象)
+
+    Returns:
+        list: [(开始日期, 结束日期), ...]，日期格式为'YYYYMMDD'
+    """
+    ranges = []
+    range_start = None
+    range_end = None
+
+    for day in trading_days:
+        if day in covered_days:
+            if range_start is not None:
+                ranges.append((range_start.strftime('%Y%m%d'), range_end.strftime('%Y%m%d')))
+                range_start = None
+            continue
+
+        if range_start is None:
+            range_start = day
+        range_end = day
+
+    if range_start is not None:
+        ranges.append((range_start.strftime('%Y%m%d'), range_end.strftime('%Y%m%d')))
+
+    return ranges
+
+
+class TradingCalendar:
+    """交易日历
+
+    优先使用QMT的get_trading_dates获取交易日，不可用时退化为工作日日历
+    (可通过holidays参数排除节假日)。退化模式下节假日会被当作缺失日请求一次，
+    返回空数据后由覆盖索引记为已检查，之后不再重复请求。
+    """
+
+    def __init__(self, xtdata=None, market='SH', holidays=None):
+        """初始化交易日历
+
+        Args:
+            xtdata: xtquant.xtdata模块，为None时使用工作日日历
+            market: 市场代码，'SH'或'SZ'
+            holidays: 额外排除的节假日集合
+        """
+        self.xtdata = xtdata
+        self.market = market
+        self.holidays = set(_to_date(d) for d in (holidays or []))
+        self._cache = {}
+
+    def get_trading_days(self, start_date, end_date):
+        """获取指定区间内的交易日
+
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+
+        Returns:
+            list: 交易日列表(date对象，升序)
+        """
+        start = _to_date(start_date)
+        end = _to_date(end_date)
+        if start is None or end is None or start > end:
+            return []
+
+        key = (start, end)
+        if key in self._cache:
+            return self._cache[key]
+
+        days = None
+        if self.xtdata is not None and hasattr(self.xtdata, 'get_trading_dates'):
+            try:
+                timestamps = self.xtdata.get_trading_dates(
+                    self.market, start.strftime('%Y%m%d'), end.strftime('%Y%m%d')
+                )
+                if timestamps:
+                    days = sorted(d.date() for d in convert_timestamps_to_datetime(timestamps, naive=True))
+            except Exception as e:
+                print(f"从QMT获取交易日历失败，使用工作日日历: {str(e)}")
+
+        if days is None:
+            days = [d.date() for d in pd.bdate_range(start, end)]
+
+        days = [d for d in days if d not in self.holidays]
+        self._cache[key] = days
+        return days
+
+
+class DataCoverageIndex:
+    """数据覆盖索引
+
+    在fund_data_coverage表中按(基金代码, 数据级别, 交易日)记录已入库的K线数量。
+    bar_count为0表示该日已请求过但数据源没有数据(如停牌或节假日)。
+    """
+
+    def __init__(self, db_connector=None):
+        """初始化覆盖索引
+
+        Args:
+            db_connector: 提供get_connection/release_connection的数据库连接器
+        """
+        if db_connector is None:
+            from backtest_gui.utils.db_connector import DBConnector
+            db_connector = DBConnector()
+        self.db_connector = db_connector
+
+    def rebuild(self, fund_code, data_level):
+        """根据stock_quotes中的现有数据重建覆盖索引
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            data_level: 数据级别
+
+        Returns:
+            int: 覆盖的交易日数量，失败返回None
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+            INSERT INTO fund_data_coverage (fund_code, data_level, trade_date, bar_count, updated_at)
+            SELECT fund_code, data_level, date::date, COUNT(*), NOW()
+            FROM stock_quotes
+            WHERE fund_code = %s AND data_level = %s AND date::date <= %s
+            GROUP BY fund_code, data_level, date::date
+            ON CONFLICT (fund_code, data_level, trade_date) DO UPDATE SET
+                bar_count = EXCLUDED.bar_count,
+                updated_at = NOW()
+            """, (fund_code, data_level, last_complete_day()))
+            count = cursor.rowcount
+            conn.commit()
+            cursor.close()
+            print(f"已重建 {fund_code} {data_level} 的覆盖索引，共 {count} 个交易日")
+            return count
+        except Exception as e:
+            print(f"重建覆盖索引失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return None
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def record(self, fund_code, data_level, dates, checked_days=None):
+        """记录新入库数据的覆盖情况
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            data_level: 数据级别
+            dates: 新入库K线的日期序列
+            checked_days: 已请求过的交易日，没有数据的日期记为bar_count=0
+
+        只记录last_complete_day及之前的日期: 当天盘中的部分K线和未来日期不记为已覆盖。
+
+        Returns:
+            bool: 是否成功
+        """
+        conn = None
+        try:
+            day_index = pd.DatetimeIndex(pd.to_datetime(pd.Series(dates)))
+            if day_index.tz is not None:
+                day_index = day_index.tz_localize(None)
+            counts = pd.Series(day_index.normalize()).value_counts()
+            cutoff = last_complete_day()
+            bar_counts = {ts.date(): int(n) for ts, n in counts.items() if ts.date() <= cutoff}
+
+            # 仅对已请求但没有数据的日期补0，不覆盖已有的计数
+            empty_days = [d for d in (checked_days or []) if d not in bar_counts and _to_date(d) <= cutoff]
+
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+
+            if bar_counts:
+                extras.execute_values(cursor, """
+                INSERT INTO fund_data_coverage (fund_code, data_level, trade_date, bar_count, updated_at)
+                VALUES %s
+                ON CONFLICT (fund_code, data_level, trade_date) DO UPDATE SET
+                    bar_count = GREATEST(fund_data_coverage.bar_count, EXCLUDED.bar_count),
+                    updated_at = NOW()
+                """, [(fund_code, data_level, d, n) for d, n in bar_counts.items()],
+                    template="(%s, %s, %s, %s, NOW())")
+
+            if empty_days:
+                extras.execute_values(cursor, """
+                INSERT INTO fund_data_coverage (fund_code, data_level, trade_date, bar_count, updated_at)
+                VALUES %s
+                ON CONFLICT (fund_code, data_level, trade_date) DO NOTHING
+                """, [(fund_code, data_level, d) for d in empty_days],
+                    template="(%s, %s, %s, 0, NOW())")
+
+            conn.commit()
+            cursor.close()
+            print(f"已更新 {fund_code} {data_level} 的覆盖索引: {len(bar_counts)} 个有数据的交易日, "
+                  f"{len(empty_days)} 个无数据的交易日")
+            return True
+        except Exception as e:
+            print(f"更新覆盖索引失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def clear(self, fund_code, data_level, cursor=None):
+        """删除指定基金和级别的覆盖记录
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            data_level: 数据级别
+            cursor: 可选的外部游标，传入时由调用方负责提交事务
+        """
+        if cursor is not None:
+            cursor.execute("""
+            DELETE FROM fund_data_coverage WHERE fund_code = %s AND data_level = %s
+            """, (fund_code, data_level))
+            return
+
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            self.clear(fund_code, data_level, cursor)
+            conn.commit()
+            cursor.close()
+        except Exception as e:
+            print(f"删除覆盖索引失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def get_covered_days(self, fund_code, data_level, start_date, end_date):
+        """获取区间内已覆盖(含已检查无数据)的交易日
+
+        若该基金和级别尚无覆盖记录，会先根据stock_quotes重建一次。
+        last_complete_day之后的记录(旧版本在盘中写入的)不算已覆盖。
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            data_level: 数据级别
+            start_date: 开始日期
+            end_date: 结束日期
+
+        Returns:
+            dict: {date: bar_count}
+        """
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            conn.commit()
+
+            cursor.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM fund_data_coverage WHERE fund_code = %s AND data_level = %s
+            )
+            """, (fund_code, data_level))
+            has_index = cursor.fetchone()[0]
+            cursor.close()
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+                conn = None
+
+        if not has_index:
+            self.rebuild(fund_code, data_level)
+
+        try:
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+            SELECT trade_date, bar_count FROM fund_data_coverage
+            WHERE fund_code = %s AND data_level = %s
+              AND trade_date BETWEEN %s AND %s
+              AND trade_date <= %s
+            """, (fund_code, data_level, _to_date(start_date), _to_date(end_date), last_complete_day()))
+            covered = {row[0]: row[1] for row in cursor.fetchall()}
+            cursor.close()
+            return covered
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    def get_summary(self, fund_code, data_level, start_date, end_date, calendar=None):
+        """统计区间内的覆盖情况
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            data_level: 数据级别
+            start_date: 开始日期
+            end_date: 结束日期
+            calendar: 交易日历，默认使用工作日日历
+
+        Returns:
+            dict: 包含trading_days、covered_days、bar_count、missing_ranges
+        """
+        calendar = calendar or TradingCalendar()
+        trading_days = calendar.get_trading_days(start_date, end_date)
+        covered = self.get_covered_days(fund_code, data_level, start_date, end_date)
+        return {
+            'trading_days': len(trading_days),
+            'covered_days': sum(1 for d in trading_days if d in covered),
+            'bar_count': sum(covered.values()),
+            'missing_ranges': compute_missing_ranges(trading_days, covered),
+        }
+
+    def find_missing_ranges(self, fund_code, data_level, start_date, end_date, calendar=None):
+        """计算需要从数据源获取的缺失区间
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            data_level: 数据级别
+            start_date: 开始日期，格式"YYYYMMDD"
+            end_date: 结束日期，格式"YYYYMMDD"
+            calendar: 交易日历，默认使用工作日日历
+
+        Returns:
+            list: [(开始日期, 结束日期), ...]，出错时返回完整区间
+        """
+        try:
+            covered = self.get_covered_days(fund_code, data_level, start_date, end_date)
+
+            if data_level in TAIL_ONLY_LEVELS:
+                # 周线/月线从最后一根已有K线开始重新获取(最后一根可能尚未走完)
+                if not covered:
+                    return [(_to_date(start_date).strftime('%Y%m%d'), _to_date(end_date).strftime('%Y%m%d'))]
+                last_day = max(covered)
+                if last_day >= _to_date(end_date):
+                    return []
+                return [(last_day.strftime('%Y%m%d'), _to_date(end_date).strftime('%Y%m%d'))]
+
+            calendar = calendar or TradingCalendar()
+            trading_days = calendar.get_trading_days(start_date, end_date)
+            return compute_missing_ranges(trading_days, covered)
+        except Exception as e:
+            print(f"计算缺失区间失败，将获取完整区间: {str(e)}")
+            traceback.print_exc()
+            return [(_to_date(start_date).strftime('%Y%m%d'), _to_date(end_date).strftime('%Y%m%d'))]
@@ -6,12 +6,12 @@
 import os
 import sys
 import psycopg2
-from psycopg2 import pool
 import pandas as pd
 import traceback
 from datetime import datetime
 from backtest_gui import settings
-from backtest_gui.utils.time_utils import convert_timestamp_to_datetime
+from backtest_gui.utils.time_utils import convert_timestamps_to_datetime
+from backtest_gui.utils.connection_pool import get_pool, close_all_pools
 
 # 获取项目根目录
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -105,10 +105,10 @@ def create_stock_table(conn, fund_code, level):
         )
         """)
         
-        # 创建索引
+        # 创建覆盖索引，回测区间加载可走Index Only Scan
         cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_stock_quotes_fund_date 
-        ON stock_quotes(fund_code, data_level, date)
+        CREATE INDEX IF NOT EXISTS idx_stock_quotes_range_covering 
+        ON stock_quotes(fund_code, data_level, date) INCLUDE (open, high, low, close, volume, amount)
         """)
         
         # 提交事务
@@ -137,7 +137,7 @@ def save_to_database(conn, df, fund_code, table_name, level):
             # 检查time列的类型
             if df['time'].dtype == 'int64' or df['time'].dtype == 'float64':
                 # 时间戳格式转换为datetime，注意QMT返回的时间戳是毫秒级的
-                df['date'] = df['time'].apply(convert_timestamp_to_datetime)
+                df['date'] = convert_timestamps_to_datetime(df['time'])
                 print(f"转换时间戳示例: {df['time'].iloc[0]} -> {df['date'].iloc[0]}")
         
         # 准备数据插入
@@ -185,7 +185,7 @@ def save_to_database(conn, df, fund_code, table_name, level):
         conn.rollback()
 
 class DBConnector:
-    """数据库连接器类，管理PostgreSQL数据库连接池"""
+    """数据库连接器类，从进程内共享的连接池获取PostgreSQL连接"""
     
     def __init__(self, config=None):
         """初始化数据库连接器
@@ -197,33 +197,24 @@ class DBConnector:
         
         self._connection_pool = None
         
-    def init_pool(self, min_conn=1, max_conn=5):
-        """初始化连接池
+    def init_pool(self, min_conn=None, max_conn=None):
+        """初始化连接池，同一配置在进程内只创建一个共享连接池
         
         Args:
-            min_conn: 最小连接数
-            max_conn: 最大连接数
+            min_conn: 最小连接数，仅在首次创建连接池时生效
+            max_conn: 最大连接数，仅在首次创建连接池时生效
             
         Returns:
             bool: 是否成功初始化
         """
         try:
-            self._connection_pool = pool.ThreadedConnectionPool(
-                min_conn,
-                max_conn,
-                host=self.config['host'],
-                port=self.config['port'],
-                dbname=self.config['dbname'],
-                user=self.config['user'],
-                password=self.config['password']
-            )
-            print(f"数据库连接池初始化完成，连接数: {max_conn}")
+            self._connection_pool = get_pool(self.config, min_conn=min_conn, max_conn=max_conn)
             return True
         except Exception as e:
             print(f"初始化数据库连接池失败: {str(e)}")
             return False
     
-    def init_connection_pool(self, min_conn=1, max_conn=5):
+    def init_connection_pool(self, min_conn=None, max_conn=None):
         """初始化连接池(别名方法)
         
         Args:
@@ -235,19 +226,23 @@ class DBConnector:
         """
         return self.init_pool(min_conn, max_conn)
             
-    def get_connection(self):
-        """获取数据库连接
+    def get_connection(self, timeout=None):
+        """获取数据库连接，连接池耗尽时阻塞等待
+        
+        Args:
+            timeout: 等待超时时间(秒)，None使用settings.DB_POOL_TIMEOUT
         
         Returns:
             connection: 数据库连接对象
         
         Raises:
-            Exception: 如果连接池未初始化或无法获取连接
+            PoolTimeoutError: 超时仍无可用连接
+            Exception: 无法建立数据库连接
         """
         if self._connection_pool is None:
             self.init_connection_pool()
             
-        return self._connection_pool.getconn()
+        return self._connection_pool.getconn(timeout)
         
     def release_connection(self, connection):
         """归还连接到连接池
@@ -262,12 +257,21 @@ class DBConnector:
     def return_connection(self, connection):
         """归还连接到连接池(别名方法)"""
         self.release_connection(connection)
+    
+    def get_pool_metrics(self):
+        """获取连接池统计信息
+        
+        Returns:
+            dict: 等待时间、使用中连接数、连接占用时长等统计
+        """
+        if self._connection_pool is None:
+            self.init_connection_pool()
+        return self._connection_pool.get_metrics()
             
     def close_all(self):
-        """关闭所有连接和连接池"""
-        if self._connection_pool is not None:
-            self._connection_pool.closeall()
-            self._connection_pool = None
+        """关闭进程内所有连接池，应在程序退出时调用"""
+        self._connection_pool = None
+        close_all_pools()
             
     def test_connection(self):
         """测试数据库连接
@@ -275,26 +279,6 @@ class DBConnector:
         Returns:
             bool: 是否连接成功
         """
-        try:
-            # 尝试建立临时连接
-            conn = psycopg2.connect(
-                host=self.config['host'],
-                port=self.config['port'],
-                dbname=self.config['dbname'],
-                user=self.config['user'],
-                password=self.config['password']
-            )
-            
-            # 执行简单查询
-            cursor = conn.cursor()
-            cursor.execute('SELECT 1')
-            result = cursor.fetchone()
-            
-            # 关闭连接
-            cursor.close()
-            conn.close()
-            
-            return result[0] == 1
-        except Exception as e:
-            print(f"测试数据库连接失败: {str(e)}")
-            return False 
\ No newline at end of file
+        if self._connection_pool is None:
+            self.init_connection_pool()
+        return self._connection_pool.check_health()
@@ -12,6 +12,7 @@ CREATE TABLE IF NOT EXISTS backtest_results (
     strategy_id INTEGER,                           -- 关联的波段策略ID
     strategy_name VARCHAR(100),                    -- 策略名称，冗余存储以便查询
     strategy_version_id INTEGER,                   -- 波段回测版本ID
+    input_hash VARCHAR(64),                        -- 回测输入指纹
     UNIQUE (stock_code, start_date, end_date, backtest_time)
 );
 
@@ -154,5 +155,17 @@ BEGIN
         -- 添加strategy_version_id字段
         ALTER TABLE backtest_results ADD COLUMN strategy_version_id INTEGER;
     END IF;
+    
+    -- 检查input_hash字段是否存在(回测输入指纹，用于复用相同输入的回测结果)
+    IF NOT EXISTS (
+        SELECT 1 
+        FROM information_schema.columns 
+        WHERE table_name='backtest_results' AND column_name='input_hash'
+    ) THEN
+        -- 添加input_hash字段
+        ALTER TABLE backtest_results ADD COLUMN input_hash VARCHAR(64);
+    END IF;
 END
-$$; 
\ No newline at end of file
+$$;
+
+CREATE INDEX IF NOT EXISTS idx_backtest_results_input_hash ON backtest_results(input_hash); 
\ No newline at end of file
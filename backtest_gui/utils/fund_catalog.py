@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+基金数据目录模块 - 维护fund_data_ranges表(每个基金每个级别的起止时间和记录数)
+
+目录由stock_quotes上的语句级触发器在入库时维护：
+- INSERT: 按本条语句新增的记录聚合，合并到目录的起止时间并累加记录数
+- DELETE: 重新统计受影响的基金和级别，记录数为0时删除目录项
+ON CONFLICT DO UPDATE覆盖已有K线不改变起止时间和记录数，因此不需要UPDATE触发器。
+TRUNCATE分区不会触发DELETE触发器，调用方需要用refresh_entry或remove_entry更新目录。
+
+界面上的基金、数据级别和日期范围选择只读取这张小表，不再扫描stock_quotes。
+"""
+import traceback
+
+FUND_DATA_RANGES_DDL = """
+CREATE TABLE IF NOT EXISTS fund_data_ranges (
+    id SERIAL PRIMARY KEY,
+    fund_code VARCHAR(20) NOT NULL,
+    data_level VARCHAR(10) NOT NULL,
+    start_date TIMESTAMP,
+    end_date TIMESTAMP,
+    record_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (fund_code, data_level)
+)
+"""
+
+CATALOG_INSERT_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION fund_data_ranges_on_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO fund_data_ranges (fund_code, data_level, start_date, end_date, record_count, updated_at)
+    SELECT fund_code, data_level, MIN(date), MAX(date), COUNT(*), NOW()
+    FROM new_rows
+    GROUP BY fund_code, data_level
+    ON CONFLICT (fund_code, data_level) DO UPDATE SET
+        start_date = LEAST(fund_data_ranges.start_date, EXCLUDED.start_date),
+        end_date = GREATEST(fund_data_ranges.end_date, EXCLUDED.end_date),
+        record_count = fund_data_ranges.record_count + EXCLUDED.record_count,
+        updated_at = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+CATALOG_DELETE_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION fund_data_ranges_on_delete() RETURNS trigger AS $$
+BEGIN
+    UPDATE fund_data_ranges r SET
+        start_date = s.min_date,
+        end_date = s.max_date,
+        record_count = s.cnt,
+        updated_at = NOW()
+    FROM (
+        SELECT a.fund_code, a.data_level, q.min_date, q.max_date, q.cnt
+        FROM (SELECT DISTINCT fund_code, data_level FROM old_rows) a
+        CROSS JOIN LATERAL (
+            SELECT MIN(date) AS min_date, MAX(date) AS max_date, COUNT(*) AS cnt
+            FROM stock_quotes
+            WHERE fund_code = a.fund_code AND data_level = a.data_level
+        ) q
+    ) s
+    WHERE r.fund_code = s.fund_code AND r.data_level = s.data_level;
+
+    DELETE FROM fund_data_ranges WHERE record_count = 0;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+CATALOG_TRIGGERS = {
+    'stock_quotes_catalog_insert': (
+        "CREATE TRIGGER stock_quotes_catalog_insert AFTER INSERT ON stock_quotes "
+        "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+        "EXECUTE FUNCTION fund_data_ranges_on_insert()"
+    ),
+    'stock_quotes_catalog_delete': (
+        "CREATE TRIGGER stock_quotes_catalog_delete AFTER DELETE ON stock_quotes "
+        "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT "
+        "EXECUTE FUNCTION fund_data_ranges_on_delete()"
+    ),
+}
+
+RANGE_STATS_SQL = """
+SELECT fund_code, data_level, MIN(date), MAX(date), COUNT(*), NOW()
+FROM stock_quotes
+{where}
+GROUP BY fund_code, data_level
+"""
+
+UPSERT_FROM_STATS_SQL = """
+INSERT INTO fund_data_ranges (fund_code, data_level, start_date, end_date, record_count, updated_at)
+{stats}
+ON CONFLICT (fund_code, data_level) DO UPDATE SET
+    start_date = EXCLUDED.start_date,
+    end_date = EXCLUDED.end_date,
+    record_count = EXCLUDED.record_count,
+    updated_at = NOW()
+"""
+
+
+def install_triggers(cursor):
+    """在stock_quotes上安装目录维护触发器(已存在则跳过)
+
+    Args:
+        cursor: 数据库游标
+
+    Returns:
+        list: 新安装的触发器名
+    """
+    cursor.execute(CATALOG_INSERT_FUNCTION_SQL)
+    cursor.execute(CATALOG_DELETE_FUNCTION_SQL)
+    cursor.execute("""
+    SELECT tgname FROM pg_trigger
+    WHERE tgrelid = to_regclass('stock_quotes') AND NOT tgisinternal
+    """)
+    existing = {row[0] for row in cursor.fetchall()}
+
+    installed = []
+    for name, create_sql in CATALOG_TRIGGERS.items():
+        if name not in existing:
+            cursor.execute(create_sql)
+            installed.append(name)
+    return installed
+
+
+def rebuild_catalog(cursor, fund_code=None, data_level=None):
+    """根据stock_quotes全量重建目录，可限定基金和级别
+
+    Args:
+        cursor: 数据库游标
+        fund_code: 基金代码，None表示全部
+        data_level: 数据级别，None表示全部
+
+    Returns:
+        int: 更新的目录项数量
+    """
+    conditions, params = [], []
+    if fund_code is not None:
+        conditions.append("fund_code = %s")
+        params.append(fund_code)
+    if data_level is not None:
+        conditions.append("data_level = %s")
+        params.append(data_level)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    stats = RANGE_STATS_SQL.format(where=where)
+    cursor.execute(UPSERT_FROM_STATS_SQL.format(stats=stats), params)
+    count = cursor.rowcount
+
+    # 删除stock_quotes中已没有数据的目录项
+    conditions = [f"r.{condition}" for condition in conditions]
+    conditions.append("""NOT EXISTS (
+        SELECT 1 FROM stock_quotes q WHERE q.fund_code = r.fund_code AND q.data_level = r.data_level
+    )""")
+    cursor.execute(f"DELETE FROM fund_data_ranges r WHERE {' AND '.join(conditions)}", params)
+    return count
+
+
+def ensure_catalog(cursor):
+    """确保目录表和触发器存在，目录为空而行情表有数据时全量重建一次
+
+    Args:
+        cursor: 数据库游标
+    """
+    cursor.execute(FUND_DATA_RANGES_DDL)
+    cursor.execute("SELECT to_regclass('stock_quotes') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return
+
+    installed = install_triggers(cursor)
+    if installed:
+        print(f"已安装基金数据目录触发器: {', '.join(installed)}")
+
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM fund_data_ranges)")
+    if not cursor.fetchone()[0]:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM stock_quotes)")
+        if cursor.fetchone()[0]:
+            count = rebuild_catalog(cursor)
+            print(f"已根据stock_quotes重建基金数据目录，共 {count} 项")
+
+
+def install_catalog(db_connector):
+    """从连接器获取连接并执行ensure_catalog
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器
+
+    Returns:
+        bool: 是否成功
+    """
+    conn = None
+    try:
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        ensure_catalog(cursor)
+        conn.commit()
+        cursor.close()
+        return True
+    except Exception as e:
+        print(f"初始化基金数据目录失败: {str(e)}")
+        traceback.print_exc()
+        if conn:
+            conn.rollback()
+        return False
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
+
+
+def refresh_entry(cursor, fund_code, data_level):
+    """重新统计一个基金一个级别的目录项
+
+    Args:
+        cursor: 数据库游标
+        fund_code: 基金代码(不带市场后缀)
+        data_level: 数据级别
+    """
+    rebuild_catalog(cursor, fund_code, data_level)
+
+
+def remove_entry(cursor, fund_code, data_level):
+    """删除一个基金一个级别的目录项
+
+    Args:
+        cursor: 数据库游标
+        fund_code: 基金代码(不带市场后缀)
+        data_level: 数据级别
+    """
+    cursor.execute("DELETE FROM fund_data_ranges WHERE fund_code = %s AND data_level = %s",
+                   (fund_code, data_level))
+
+
+def get_catalog(cursor):
+    """获取全部目录项
+
+    Args:
+        cursor: 数据库游标
+
+    Returns:
+        list: [(fund_code, data_level, start_date, end_date, record_count)]，按基金代码和级别排序
+    """
+    cursor.execute("""
+    SELECT fund_code, data_level, start_date, end_date, record_count
+    FROM fund_data_ranges
+    WHERE record_count > 0
+    ORDER BY fund_code, data_level
+    """)
+    return cursor.fetchall()
+
+
+def get_fund_codes(cursor):
+    """获取有行情数据的基金代码
+
+    Returns:
+        list: 基金代码列表
+    """
+    cursor.execute("SELECT DISTINCT fund_code FROM fund_data_ranges WHERE record_count > 0 ORDER BY fund_code")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_levels(cursor, fund_code):
+    """获取基金已有数据的级别
+
+    Args:
+        cursor: 数据库游标
+        fund_code: 基金代码(不带市场后缀)
+
+    Returns:
+        list: 数据级别列表
+    """
+    cursor.execute("""
+    SELECT data_level FROM fund_data_ranges
+    WHERE fund_code = %s AND record_count > 0
+    ORDER BY data_level
+    """, (fund_code,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def get_range(cursor, fund_code, data_level):
+    """获取基金某个级别的数据范围
+
+    Args:
+        cursor: 数据库游标
+        fund_code: 基金代码(不带市场后缀)
+        data_level: 数据级别
+
+    Returns:
+        tuple: (start_date, end_date, record_count)，没有数据时返回None
+    """
+    cursor.execute("""
+    SELECT start_date, end_date, record_count FROM fund_data_ranges
+    WHERE fund_code = %s AND data_level = %s AND record_count > 0
+    """, (fund_code, data_level))
+    return cursor.fetchone()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回测结果后台持久化队列 - 回测计算完成后立即交付结果，由专用线程写入数据库
+
+- 提交的任务先写入本地日志目录，程序意外退出后下次启动时按原顺序重放
+- 单个持久化线程按提交顺序逐个处理，回测结果和配对交易在同一事务中写入
+- 回测结果记录任务键(唯一)，提交成功但日志未删除或提交确认丢失后重放时不会重复写入
+- 数据库连接失败、连接池超时等暂时性错误按指数退避重试，其他错误标记为失败
+- 每个任务的状态(pending/saving/saved/failed)通过state_signal通知界面
+"""
+import os
+import glob
+import time
+import uuid
+import queue
+import pickle
+import threading
+import traceback
+
+import psycopg2
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from backtest_gui import settings
+from backtest_gui.utils.backtest_stats import refresh_backtest_stats
+from backtest_gui.utils.bulk_writer import write_paired_trades
+from backtest_gui.utils.connection_pool import PoolTimeoutError
+
+STATE_PENDING = 'pending'
+STATE_SAVING = 'saving'
+STATE_SAVED = 'saved'
+STATE_FAILED = 'failed'
+
+# 可以重试的暂时性错误(连接断开、死锁/序列化失败、连接池等待超时)
+TRANSIENT_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolTimeoutError)
+
+INSERT_RESULT_SQL = """
+INSERT INTO backtest_results
+(stock_code, start_date, end_date, initial_capital, final_capital,
+ total_profit, total_profit_rate, backtest_time, strategy_id, strategy_name, input_hash,
+ buy_count, sell_count, job_key)
+VALUES (%s, %s, %s, %s, %s, %s, %s, NOW(), %s, %s, %s, %s, %s, %s)
+ON CONFLICT (job_key) DO NOTHING
+RETURNING id
+"""
+
+
+def create_backtest_job(stock_code, start_date, end_date, initial_capital, final_capital,
+                        total_profit, total_profit_rate, strategy_id, strategy_name,
+                        buy_count, sell_count, paired_trades, input_hash=None):
+    """构建一个回测结果持久化任务
+
+    配对交易记录会被复制，后续策略重置不影响已提交的任务。
+
+    Args:
+        stock_code: 基金代码
+        start_date: 开始日期
+        end_date: 结束日期
+        initial_capital: 初始资金
+        final_capital: 最终资金
+        total_profit: 总收益
+        total_profit_rate: 总收益率
+        strategy_id: 策略ID
+        strategy_name: 策略名称
+        buy_count: 买入信号数量
+        sell_count: 卖出信号数量
+        paired_trades: 配对交易记录列表
+        input_hash: 回测输入指纹，见backtest_cache
+
+    Returns:
+        dict: 持久化任务
+    """
+    return {
+        'job_key': uuid.uuid4().hex,
+        'created_at': time.time(),
+        'result': {
+            'stock_code': stock_code,
+            'start_date': start_date,
+            'end_date': end_date,
+            'initial_capital': float(initial_capital),
+            'final_capital': float(final_capital),
+            'total_profit': float(total_profit),
+            'total_profit_rate': float(total_profit_rate),
+            'strategy_id': strategy_id,
+            'strategy_name': strategy_name,
+            'buy_count': int(buy_count),
+            'sell_count': int(sell_count),
+            'input_hash': input_hash,
+        },
+        'paired_trades': [dict(trade) for trade in (paired_trades or [])],
+    }
+
+
+def write_backtest_job(cursor, job):
+    """在当前事务中写入回测结果、配对交易和预计算统计，不提交
+
+    任务已经写入过(任务键已存在)时不再写入，直接返回已有的回测ID。
+
+    Args:
+        cursor: 数据库游标
+        job: create_backtest_job构建的任务
+
+    Returns:
+        int: 回测ID
+    """
+    result = job['result']
+    params = [result['stock_code'], result['start_date'], result['end_date'],
+              result['initial_capital'], result['final_capital'], result['total_profit'],
+              result['total_profit_rate'], result['strategy_id'], result['strategy_name'],
+              result.get('input_hash'), result['buy_count'], result['sell_count'], job['job_key']]
+    cursor.execute(INSERT_RESULT_SQL, params)
+    row = cursor.fetchone()
+    if row is None:
+        # 回测结果和配对交易在同一事务中提交，任务键存在说明整个任务已经保存
+        cursor.execute("SELECT id FROM backtest_results WHERE job_key = %s", (job['job_key'],))
+        backtest_id = cursor.fetchone()[0]
+        print(f"回测持久化任务 {job['job_key']} 已保存过，回测ID: {backtest_id}")
+        return backtest_id
+    backtest_id = row[0]
+    write_paired_trades(cursor, backtest_id, job['paired_trades'])
+    refresh_backtest_stats(cursor, [backtest_id])
+    return backtest_id
+
+
+class BacktestPersistenceQueue(QObject):
+    """回测结果写后队列，由一个后台线程按提交顺序持久化"""
+
+    # 状态信号(任务键, 状态, 回测ID, 说明)
+    state_signal = pyqtSignal(str, str, object, str)
+
+    def __init__(self, db_connector, journal_dir=None, max_retries=None, retry_delay=None):
+        """初始化持久化队列
+
+        Args:
+            db_connector: 提供get_connection/release_connection的数据库连接器
+            journal_dir: 任务日志目录，None时使用settings.PERSIST_QUEUE_DIR
+            max_retries: 暂时性错误的最大重试次数
+            retry_delay: 首次重试的等待秒数，之后每次翻倍
+        """
+        super().__init__()
+        self.db_connector = db_connector
+        self.journal_dir = journal_dir or getattr(settings, 'PERSIST_QUEUE_DIR', './data/persist_queue')
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'PERSIST_MAX_RETRIES', 5)
+        self.retry_delay = retry_delay if retry_delay is not None else getattr(settings, 'PERSIST_RETRY_DELAY', 2)
+
+        self._queue = queue.Queue()
+        self._states = {}
+        self._backtest_ids = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._stopping = threading.Event()
+        self._thread = None
+
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self._replay_journal()
+
+        self._thread = threading.Thread(target=self._run, name='BacktestPersistence', daemon=True)
+        self._thread.start()
+
+    def submit(self, job):
+        """提交持久化任务，写入日志后立即返回
+
+        Args:
+            job: create_backtest_job构建的任务
+
+        Returns:
+            str: 任务键
+        """
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        path = os.path.join(self.journal_dir, f"{seq:012d}_{job['job_key']}.pkl")
+        try:
+            with open(path, 'wb') as f:
+                pickle.dump(job, f)
+        except Exception as e:
+            # 日志写入失败不影响本次持久化，只是失去崩溃后重放的能力
+            print(f"写入持久化任务日志失败: {str(e)}")
+            path = None
+
+        self._set_state(job['job_key'], STATE_PENDING)
+        self._queue.put((job, path))
+        return job['job_key']
+
+    def get_state(self, job_key):
+        """获取任务状态
+
+        Returns:
+            tuple: (状态, 回测ID)，未知任务返回(None, None)
+        """
+        with self._lock:
+            return self._states.get(job_key), self._backtest_ids.get(job_key)
+
+    def pending_count(self):
+        """获取尚未完成的任务数量"""
+        with self._lock:
+            return sum(1 for state in self._states.values() if state in (STATE_PENDING, STATE_SAVING))
+
+    def wait_idle(self, timeout=None):
+        """等待所有已提交任务处理完毕
+
+        Args:
+            timeout: 最长等待秒数，None表示一直等待
+
+        Returns:
+            bool: 是否全部处理完毕
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.pending_count() > 0:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stop(self, timeout=10):
+        """等待队列处理完毕后停止持久化线程，未完成的任务保留在日志中下次重放
+
+        Args:
+            timeout: 最长等待秒数
+        """
+        self.wait_idle(timeout)
+        self._stopping.set()
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _replay_journal(self):
+        """按顺序重新提交上次未完成的任务"""
+        paths = sorted(glob.glob(os.path.join(self.journal_dir, '*.pkl')))
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    job = pickle.load(f)
+                seq = int(os.path.basename(path).split('_')[0])
+            except Exception as e:
+                print(f"读取持久化任务日志失败 {path}: {str(e)}")
+                continue
+            self._seq = max(self._seq, seq)
+            self._states[job['job_key']] = STATE_PENDING
+            self._queue.put((job, path))
+        if paths:
+            print(f"重放未完成的回测持久化任务: {len(paths)} 个")
+
+    def _set_state(self, job_key, state, backtest_id=None, message=''):
+        with self._lock:
+            self._states[job_key] = state
+            if backtest_id is not None:
+                self._backtest_ids[job_key] = backtest_id
+        self.state_signal.emit(job_key, state, backtest_id, message)
+
+    def _run(self):
+        """持久化线程主循环"""
+        while not self._stopping.is_set():
+            item = self._queue.get()
+            if item is None:
+                break
+            job, path = item
+            self._process(job, path)
+
+    def _process(self, job, path):
+        """处理一个任务，暂时性错误按指数退避重试"""
+        job_key = job['job_key']
+        self._set_state(job_key, STATE_SAVING)
+
+        attempt = 0
+        while True:
+            try:
+                backtest_id = self._save(job)
+                break
+            except TRANSIENT_ERRORS as e:
+                attempt += 1
+                if attempt > self.max_retries or self._stopping.is_set():
+                    print(f"保存回测结果失败，已重试 {attempt - 1} 次: {str(e)}")
+                    # 保留日志文件，下次启动时重放
+                    self._set_state(job_key, STATE_FAILED, message=str(e))
+                    return
+                delay = self.retry_delay * (2 ** (attempt - 1))
+                print(f"保存回测结果遇到暂时性错误，{delay} 秒后第 {attempt} 次重试: {str(e)}")
+                time.sleep(delay)
+            except Exception as e:
+                print(f"保存回测结果失败: {str(e)}")
+                traceback.print_exc()
+                self._discard_journal(path)
+                self._set_state(job_key, STATE_FAILED, message=str(e))
+                return
+
+        self._discard_journal(path)
+        print(f"成功保存回测结果，ID: {backtest_id}，配对交易 {len(job['paired_trades'])} 条")
+        self._set_state(job_key, STATE_SAVED, backtest_id)
+
+    def _save(self, job):
+        """在一个事务中写入任务，返回回测ID"""
+        conn = None
+        try:
+            conn = self.db_connector.get_connection()
+            if not conn:
+                raise psycopg2.OperationalError("无法获取数据库连接")
+            cursor = conn.cursor()
+            backtest_id = write_backtest_job(cursor, job)
+            conn.commit()
+            cursor.close()
+            return backtest_id
+        except Exception:
+            if conn and not conn.closed:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    pass
+            raise
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
+
+    @staticmethod
+    def _discard_journal(path):
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"删除持久化任务日志失败 {path}: {str(e)}")
+
+
+_queue_instance = None
+_queue_lock = threading.Lock()
+
+
+def get_persistence_queue(db_connector=None):
+    """获取进程内共享的持久化队列，首次调用时创建并启动
+
+    Args:
+        db_connector: 数据库连接器，首次创建时使用，None时创建DBConnector
+
+    Returns:
+        BacktestPersistenceQueue: 持久化队列
+    """
+    global _queue_instance
+    with _queue_lock:
+        if _queue_instance is None:
+            if db_connector is None:
+                from backtest_gui.utils.db_connector import DBConnector
+                db_connector = DBConnector()
+            _queue_instance = BacktestPersistenceQueue(db_connector)
+        return _queue_instance
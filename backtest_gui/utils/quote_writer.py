@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+行情数据写入模块 - 将K线DataFrame批量写入stock_quotes表并更新覆盖索引
+"""
+import time
+import traceback
+
+import numpy as np
+import pandas as pd
+from psycopg2 import extras
+
+from backtest_gui.utils.data_coverage import DataCoverageIndex
+from backtest_gui.utils.time_utils import convert_timestamps_to_datetime, convert_datetimes_to_timestamps
+
+QUOTE_COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'amount']
+
+UPSERT_QUOTES_SQL = """
+INSERT INTO stock_quotes
+(fund_code, data_level, date, time, open, high, low, close, volume, amount, created_at)
+VALUES %s
+ON CONFLICT (fund_code, data_level, date) DO UPDATE SET
+time = EXCLUDED.time,
+open = EXCLUDED.open,
+high = EXCLUDED.high,
+low = EXCLUDED.low,
+close = EXCLUDED.close,
+volume = EXCLUDED.volume,
+amount = EXCLUDED.amount,
+created_at = CURRENT_TIMESTAMP
+"""
+
+
+def prepare_quote_frame(df):
+    """整理K线数据为stock_quotes的列格式
+
+    time列为毫秒时间戳，date列为北京时间(不带时区)。缺少date列时由time列转换。
+
+    Args:
+        df: 原始K线数据，至少包含time或date列以及OHLCV列
+
+    Returns:
+        DataFrame: 包含date, time, open, high, low, close, volume, amount列
+    """
+    out = pd.DataFrame(index=df.index)
+
+    if 'time' in df.columns:
+        out['time'] = pd.to_numeric(df['time'], errors='coerce')
+
+    if 'date' in df.columns:
+        dates = pd.to_datetime(df['date'])
+        if getattr(dates.dt, 'tz', None) is not None:
+            dates = dates.dt.tz_convert('Asia/Shanghai').dt.tz_localize(None)
+        out['date'] = dates
+    else:
+        out['date'] = convert_timestamps_to_datetime(out['time'], naive=True)
+
+    if 'time' not in out.columns:
+        out['time'] = convert_datetimes_to_timestamps(out['date'])
+
+    for col in QUOTE_COLUMNS:
+        values = df[col] if col in df.columns else 0.0
+        out[col] = pd.to_numeric(values, errors='coerce')
+    out['amount'] = out['amount'].fillna(0.0)
+
+    out = out.dropna(subset=['date', 'time', 'open', 'high', 'low', 'close', 'volume'])
+    out = out.drop_duplicates(subset=['date'], keep='last').sort_values('date')
+    return out[['date', 'time'] + QUOTE_COLUMNS]
+
+
+class QuoteWriter:
+    """行情写入器
+
+    每次写入在一个事务中用execute_values批量upsert，写入成功后更新覆盖索引。
+    """
+
+    def __init__(self, db_connector=None, page_size=5000):
+        """初始化行情写入器
+
+        Args:
+            db_connector: 提供get_connection/release_connection的数据库连接器
+            page_size: execute_values每条语句携带的行数
+        """
+        if db_connector is None:
+            from backtest_gui.utils.db_connector import DBConnector
+            db_connector = DBConnector()
+        self.db_connector = db_connector
+        self.page_size = page_size
+        self.coverage = DataCoverageIndex(db_connector)
+
+    def write(self, fund_code, data_level, df, checked_days=None, replace_range=None):
+        """写入一个基金一个级别的K线数据
+
+        Args:
+            fund_code: 基金代码(不带市场后缀)
+            data_level: 数据级别
+            df: K线数据
+            checked_days: 本次已请求的交易日，用于更新覆盖索引
+            replace_range: (开始时间, 结束时间)，给出时先在同一事务中删除该级别在[开始, 结束)内的
+                已有K线再写入，用于标记日期可能变化的周线/月线
+
+        Returns:
+            int: 写入的记录数，失败返回None
+        """
+        conn = None
+        try:
+            start_time = time.time()
+            quotes = prepare_quote_frame(df)
+            if quotes.empty:
+                self.coverage.record(fund_code, data_level, [], checked_days)
+                return 0
+
+            # 一次性转换为Python原生类型，避免逐行类型判断
+            dates = quotes['date'].dt.to_pydatetime()
+            times = quotes['time'].astype(np.int64).tolist()
+            values = quotes[QUOTE_COLUMNS].astype(float).values.tolist()
+            rows = [
+                (fund_code, data_level, d, t, *v)
+                for d, t, v in zip(dates, times, values)
+            ]
+
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            if replace_range is not None:
+                cursor.execute("""
+                DELETE FROM stock_quotes
+                WHERE fund_code = %s AND data_level = %s AND date >= %s AND date < %s
+                """, (fund_code, data_level, *replace_range))
+            extras.execute_values(
+                cursor, UPSERT_QUOTES_SQL, rows,
+                template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)",
+                page_size=self.page_size
+            )
+            conn.commit()
+            cursor.close()
+
+            elapsed = time.time() - start_time
+            print(f"已写入 {fund_code} {data_level} 共 {len(rows)} 条记录，耗时 {elapsed:.2f}秒")
+
+            self.coverage.record(fund_code, data_level, quotes['date'], checked_days)
+            return len(rows)
+        except Exception as e:
+            print(f"写入 {fund_code} {data_level} 行情数据失败: {str(e)}")
+            traceback.print_exc()
+            if conn:
+                conn.rollback()
+            return None
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
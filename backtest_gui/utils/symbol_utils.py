@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+证券代码与数据周期工具模块
+"""
+
+# 界面数据级别到QMT周期的映射
+QMT_PERIOD_MAP = {
+    '1min': '1m',
+    '5min': '5m',
+    '15min': '15m',
+    '30min': '30m',
+    '60min': '60m',
+    '1h': '60m',
+    'day': '1d',
+    '1d': '1d',
+    'week': '1w',
+    'month': '1mon',
+}
+
+
+def normalize_symbol(symbol):
+    """规范化证券代码，6位纯数字代码根据首位补充市场后缀
+
+    Args:
+        symbol: 证券代码，如"510300"或"510300.SH"
+
+    Returns:
+        str: 带市场后缀的代码，如"510300.SH"
+    """
+    symbol = symbol.strip().upper()
+    if len(symbol) == 6 and symbol.isdigit():
+        first_digit = symbol[0]
+        if first_digit in ['5', '6', '9']:
+            return symbol + '.SH'
+        if first_digit in ['0', '1', '2', '3']:
+            return symbol + '.SZ'
+    return symbol
+
+
+def to_pure_code(symbol):
+    """去掉市场后缀，返回stock_quotes中使用的纯代码
+
+    Args:
+        symbol: 证券代码
+
+    Returns:
+        str: 纯代码，如"510300"
+    """
+    return symbol.split('.')[0] if '.' in symbol else symbol
+
+
+def get_market(symbol, default='SH'):
+    """获取证券代码的市场后缀
+
+    Args:
+        symbol: 证券代码
+        default: 没有后缀时的默认市场
+
+    Returns:
+        str: 市场代码，如"SH"
+    """
+    return symbol.split('.')[-1] if '.' in symbol else default
+
+
+def to_qmt_period(data_level):
+    """将数据级别转换为QMT周期格式
+
+    Args:
+        data_level: 数据级别，如"1min"、"day"
+
+    Returns:
+        str: QMT周期，如"1m"、"1d"
+    """
+    return QMT_PERIOD_MAP.get(data_level, data_level)
@@ -4,20 +4,96 @@
 时间工具模块，提供统一的时间戳转换函数
 """
 
+import numpy as np
 import pandas as pd
 import datetime
 import pytz
 
+# 行情数据统一使用的时区
+CHINA_TZ = 'Asia/Shanghai'
+
+# 大于该值的时间戳视为毫秒级
+MILLISECOND_THRESHOLD = 10000000000
+
+_EPOCH = pd.Timestamp('1970-01-01', tz='UTC')
+
+
+def normalize_timestamps_to_ms(timestamps):
+    """
+    将秒级/毫秒级混合的时间戳数组统一为毫秒级，逐元素检测单位
+    
+    Args:
+        timestamps: 时间戳序列(Series、ndarray、list)
+        
+    Returns:
+        ndarray: float64毫秒时间戳，无效值为NaN
+    """
+    values = pd.to_numeric(pd.Series(np.asarray(timestamps).ravel()), errors='coerce').to_numpy(dtype=np.float64)
+    return np.where(values > MILLISECOND_THRESHOLD, values, values * 1000.0)
+
+
+def convert_timestamps_to_datetime(timestamps, tz=CHINA_TZ, naive=False):
+    """
+    批量将时间戳转换为datetime64，一次完成单位检测、转换和时区换算
+    
+    Args:
+        timestamps: 时间戳序列，可能是秒级或毫秒级
+        tz: 目标时区，默认北京时间
+        naive: 为True时返回去掉时区信息的本地时间
+        
+    Returns:
+        输入为Series时返回同索引的Series，否则返回DatetimeIndex；无效值为NaT
+    """
+    ms = normalize_timestamps_to_ms(timestamps)
+    dates = pd.to_datetime(ms, unit='ms', utc=True).tz_convert(tz)
+    if naive:
+        dates = dates.tz_localize(None)
+    if isinstance(timestamps, pd.Series):
+        return pd.Series(dates, index=timestamps.index, name=timestamps.name)
+    return dates
+
+
+def convert_datetimes_to_timestamps(dates, tz=CHINA_TZ, unit='ms'):
+    """
+    批量将datetime转换为时间戳，不带时区的日期按tz指定的本地时间处理
+    
+    Args:
+        dates: 日期序列(Series、DatetimeIndex、list)或字符串序列
+        tz: 不带时区的日期所属时区，默认北京时间
+        unit: 'ms'返回毫秒级，'s'返回秒级
+        
+    Returns:
+        输入为Series时返回同索引的Series，否则返回ndarray；
+        全部有效时为int64，存在NaT时为float64(对应位置为NaN)
+    """
+    index = pd.DatetimeIndex(pd.to_datetime(dates))
+    if index.tz is None:
+        index = index.tz_localize(tz, ambiguous='NaT', nonexistent='NaT')
+    step = pd.Timedelta(milliseconds=1) if unit == 'ms' else pd.Timedelta(seconds=1)
+    
+    result = np.asarray((index.tz_convert('UTC') - _EPOCH) // step)
+    if not np.isnan(result.astype(np.float64)).any():
+        result = result.astype(np.int64)
+    
+    if isinstance(dates, pd.Series):
+        return pd.Series(result, index=dates.index, name=dates.name)
+    return result
+
+
 def convert_timestamp_to_datetime(timestamp):
     """
     将时间戳转换为datetime对象，自动检测毫秒级时间戳
     
+    传入Series/数组时使用convert_timestamps_to_datetime批量转换
+    
     Args:
         timestamp: 时间戳，可能是秒级或毫秒级
         
     Returns:
         datetime: 转换后的datetime对象
     """
+    if isinstance(timestamp, (pd.Series, pd.Index, np.ndarray, list, tuple)):
+        return convert_timestamps_to_datetime(timestamp)
     try:
         # 检测是否为毫秒级时间戳（大于10000000000）
         if timestamp > 10000000000:
@@ -43,11 +119,13 @@ def convert_datetime_to_timestamp(dt):
     将datetime对象转换为毫秒级时间戳
     
     Args:
-        dt: datetime对象
+        dt: datetime对象，传入序列时批量转换
         
     Returns:
         int: 毫秒级时间戳
     """
+    if isinstance(dt, (pd.Series, pd.Index, np.ndarray, list, tuple)):
+        return convert_datetimes_to_timestamps(dt)
     if isinstance(dt, datetime.datetime):
         # 转换为毫秒级时间戳
         return int(dt.timestamp() * 1000)
@@ -164,6 +242,12 @@ def test_time_utils():
     current_dt = convert_timestamp_to_datetime(current_ts)
     print(f"当前时间戳: {current_ts} -> {current_dt}")
     
+    # 测试批量转换
+    series = pd.Series([1716998400000, 1716998400, 1717084800000])
+    dates = convert_timestamps_to_datetime(series)
+    print(f"批量转换: {series.tolist()} -> {[str(d) for d in dates]}")
+    print(f"批量反向转换: {convert_datetimes_to_timestamps(dates).tolist()}")
+    
     # 测试获取日期范围
     date_range = get_date_range("20240501", "20240510")
     print(f"日期范围: {date_range}")
@@ -7,6 +7,39 @@ import pandas as pd
 import traceback
 from datetime import datetime
 
+from backtest_gui.utils.backtest_stats import CAPITAL_EVENTS_SQL, refresh_backtest_stats
+from backtest_gui.utils.xirr_batch import get_trades_only_xirr_values
+
+PAIRED_TRADES_SELECT = """
+    SELECT 
+        pt.id, pt.backtest_id, pt.level, pt.grid_type, 
+        pt.buy_time, pt.buy_price, pt.buy_amount, pt.buy_value,
+        pt.sell_time, pt.sell_price, pt.sell_amount, pt.sell_value, 
+        pt.remaining, pt.remaining_shares, pt.band_profit, 
+        pt.band_profit_rate, pt.sell_band_profit_rate, pt.status,
+        br.stock_code, br.strategy_id, br.strategy_name,
+        fi.fund_name, fi.fund_type, fi.manager, fi.company
+    FROM 
+        backtest_paired_trades pt
+    JOIN 
+        backtest_results br ON pt.backtest_id = br.id
+    LEFT JOIN 
+        fund_info fi ON br.stock_code = fi.fund_code
+    WHERE 1=1
+"""
+
+# 多个回测的最高占用资金: 按时间顺序累计资金占用事件，取累计值的最大值
+MAX_CAPITAL_USED_SQL = f"""
+    SELECT backtest_id, MAX(capital_used)
+    FROM (
+        SELECT backtest_id,
+               SUM(delta) OVER (PARTITION BY backtest_id ORDER BY ts, kind
+                                ROWS UNBOUNDED PRECEDING) AS capital_used
+        FROM ({CAPITAL_EVENTS_SQL.format(where='backtest_id = ANY(%(ids)s)')}) events
+    ) levels
+    GROUP BY backtest_id
+"""
+
 
 class TradeQuery:
     """交易查询工具类"""
@@ -19,7 +52,71 @@ class TradeQuery:
         """
         self.db_connector = db_connector
         
-    def get_paired_trades(self, fund_code=None, strategy_id=None, start_date=None, end_date=None, level=None, status=None):
+    def _paired_trades_conditions(self, fund_code=None, strategy_id=None, start_date=None, end_date=None,
+                                  level=None, status=None, backtest_id=None):
+        """构建配对交易查询的过滤条件
+        
+        Returns:
+            tuple: (以AND开头的条件SQL, 参数列表)
+        """
+        conditions = []
+        params = []
+        
+        if backtest_id:
+            conditions.append("pt.backtest_id = %s")
+            params.append(backtest_id)
+            
+        if fund_code:
+            conditions.append("br.stock_code = %s")
+            params.append(fund_code)
+            
+        if strategy_id:
+            conditions.append("br.strategy_id = %s")
+            params.append(strategy_id)
+            
+        if start_date:
+            conditions.append("pt.buy_time >= %s")
+            params.append(start_date)
+            
+        if end_date:
+            conditions.append("(pt.sell_time <= %s OR pt.sell_time IS NULL)")
+            params.append(end_date)
+            
+        if level:
+            conditions.append("pt.level = %s")
+            params.append(level)
+            
+        if status:
+            conditions.append("pt.status = %s")
+            params.append(status)
+            
+        return "".join(f" AND {condition}" for condition in conditions), params
+    
+    def _fetch_paired_trades(self, query, params):
+        """执行配对交易查询并转换为DataFrame，失败返回None"""
+        if not self.db_connector:
+            print("无法查询配对交易：数据库连接器未初始化")
+            return None
+            
+        conn = self.db_connector.get_connection()
+        if not conn:
+            print("无法获取数据库连接")
+            return None
+            
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            columns = [desc[0] for desc in cursor.description]
+            return pd.DataFrame(cursor.fetchall(), columns=columns)
+        except Exception as e:
+            print(f"查询配对交易记录失败: {str(e)}")
+            traceback.print_exc()
+            return None
+        finally:
+            self.db_connector.release_connection(conn)
+    
+    def get_paired_trades(self, fund_code=None, strategy_id=None, start_date=None, end_date=None, level=None, status=None,
+                          backtest_id=None):
         """查询配对交易记录
         
         Args:
@@ -29,100 +126,86 @@ class TradeQuery:
             end_date: 结束日期，可选
             level: 网格级别，可选
             status: 交易状态，可选
+            backtest_id: 回测ID，可选
             
         Returns:
             DataFrame: 配对交易记录
         """
         try:
-            if not self.db_connector:
-                print("无法查询配对交易：数据库连接器未初始化")
-                return None
-                
-            conn = self.db_connector.get_connection()
-            if not conn:
-                print("无法获取数据库连接")
-                return None
-                
-            try:
-                cursor = conn.cursor()
-                
-                # 构建查询SQL
-                query = """
-                    SELECT 
-                        pt.id, pt.backtest_id, pt.level, pt.grid_type, 
-                        pt.buy_time, pt.buy_price, pt.buy_amount, pt.buy_value,
-                        pt.sell_time, pt.sell_price, pt.sell_amount, pt.sell_value, 
-                        pt.remaining, pt.remaining_shares, pt.band_profit, 
-                        pt.band_profit_rate, pt.sell_band_profit_rate, pt.status,
-                        br.stock_code, br.strategy_id, br.strategy_name,
-                        fi.fund_name, fi.fund_type, fi.manager, fi.company
-                    FROM 
-                        backtest_paired_trades pt
-                    JOIN 
-                        backtest_results br ON pt.backtest_id = br.id
-                    LEFT JOIN 
-                        fund_info fi ON br.stock_code = fi.fund_code
-                    WHERE 1=1
-                """
-                
-                params = []
-                
-                # 添加查询条件
-                if fund_code:
-                    query += " AND br.stock_code = %s"
-                    params.append(fund_code)
-                    
-                if strategy_id:
-                    query += " AND br.strategy_id = %s"
-                    params.append(strategy_id)
-                    
-                if start_date:
-                    query += " AND pt.buy_time >= %s"
-                    params.append(start_date)
-                    
-                if end_date:
-                    query += " AND (pt.sell_time <= %s OR pt.sell_time IS NULL)"
-                    params.append(end_date)
-                    
-                if level:
-                    query += " AND pt.level = %s"
-                    params.append(level)
-                    
-                if status:
-                    query += " AND pt.status = %s"
-                    params.append(status)
-                    
-                # 添加排序
-                query += " ORDER BY pt.buy_time DESC, pt.level"
-                
-                # 执行查询
-                cursor.execute(query, params)
-                
-                # 获取结果
-                columns = [desc[0] for desc in cursor.description]
-                results = cursor.fetchall()
-                
-                # 转换为DataFrame
-                if results:
-                    df = pd.DataFrame(results, columns=columns)
-                    print(f"查询到 {len(df)} 条配对交易记录")
-                    return df
-                else:
-                    print("未查询到配对交易记录")
-                    return pd.DataFrame()
-                    
-            except Exception as e:
-                print(f"查询配对交易记录失败: {str(e)}")
-                traceback.print_exc()
-                return None
-            finally:
-                if conn:
-                    self.db_connector.release_connection(conn)
-                    
+            conditions, params = self._paired_trades_conditions(fund_code, strategy_id, start_date, end_date,
+                                                                level, status, backtest_id)
+            query = PAIRED_TRADES_SELECT + conditions + " ORDER BY pt.buy_time DESC, pt.level"
+            df = self._fetch_paired_trades(query, params)
+            if df is not None:
+                print(f"查询到 {len(df)} 条配对交易记录")
+            return df
         except Exception as e:
             print(f"查询配对交易记录过程中出错: {str(e)}")
             traceback.print_exc()
             return None
+    
+    def get_paired_trades_page(self, fund_code=None, strategy_id=None, start_date=None, end_date=None, level=None,
+                               status=None, backtest_id=None, page_size=500, after=None):
+        """按(buy_time, id)倒序分页查询配对交易记录
+        
+        使用键集分页: 下一页从上一页最后一条记录的(buy_time, id)之后开始，翻页代价与页码无关。
+        
+        Args:
+            fund_code, strategy_id, start_date, end_date, level, status, backtest_id: 过滤条件，同get_paired_trades
+            page_size: 每页条数
+            after: 上一页返回的翻页键，None表示第一页
+            
+        Returns:
+            tuple: (本页DataFrame, 下一页的翻页键)，没有下一页时翻页键为None；失败返回(None, None)
+        """
+        try:
+            conditions, params = self._paired_trades_conditions(fund_code, strategy_id, start_date, end_date,
+                                                                level, status, backtest_id)
+            if after is not None:
+                conditions += " AND (pt.buy_time, pt.id) < (%s, %s)"
+                params.extend(after)
+            query = PAIRED_TRADES_SELECT + conditions + " ORDER BY pt.buy_time DESC, pt.id DESC LIMIT %s"
+            # 多取一条用于判断是否还有下一页
+            df = self._fetch_paired_trades(query, params + [page_size + 1])
+            if df is None:
+                return None, None
+            if len(df) <= page_size:
+                return df, None
+            df = df.iloc[:page_size]
+            last = df.iloc[-1]
+            return df, (pd.Timestamp(last['buy_time']).to_pydatetime(), int(last['id']))
+        except Exception as e:
+            print(f"分页查询配对交易记录出错: {str(e)}")
+            traceback.print_exc()
+            return None, None
+    
+    def count_paired_trades(self, fund_code=None, strategy_id=None, start_date=None, end_date=None, level=None,
+                            status=None, backtest_id=None):
+        """统计符合条件的配对交易记录数
+        
+        Returns:
+            int: 记录数，失败返回None
+        """
+        conn = None
+        try:
+            conditions, params = self._paired_trades_conditions(fund_code, strategy_id, start_date, end_date,
+                                                                level, status, backtest_id)
+            conn = self.db_connector.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COUNT(*)
+                FROM backtest_paired_trades pt
+                JOIN backtest_results br ON pt.backtest_id = br.id
+                WHERE 1=1
+            """ + conditions, params)
+            return int(cursor.fetchone()[0])
+        except Exception as e:
+            print(f"统计配对交易记录数失败: {str(e)}")
+            traceback.print_exc()
+            return None
+        finally:
+            if conn:
+                self.db_connector.release_connection(conn)
             
     def get_grid_levels_for_fund(self, fund_code):
         """查询基金的网格级别配置
@@ -212,7 +295,8 @@ class TradeQuery:
             backtest_id: 回测ID，可选
             
         Returns:
-            DataFrame: 回测汇总信息
+            DataFrame: 回测汇总信息，包含backtest_stats中的交易次数、买入/卖出次数、
+                最高占用资金(max_capital_used)、剩余底仓成本价(avg_cost)、最大回撤、换手率和XIRR
         """
         try:
             if not self.db_connector:
@@ -234,13 +318,22 @@ class TradeQuery:
                         br.initial_capital, br.final_capital, br.total_profit, br.total_profit_rate,
                         br.backtest_time, br.strategy_id, br.strategy_name,
                         fi.fund_name, fi.fund_type, fi.manager, fi.company,
-                        (SELECT COUNT(*) FROM backtest_paired_trades WHERE backtest_id = br.id) as trade_count,
-                        (SELECT COUNT(*) FROM backtest_paired_trades WHERE backtest_id = br.id AND status = '已完成') as completed_trades,
-                        (SELECT COUNT(*) FROM backtest_paired_trades WHERE backtest_id = br.id AND status = '进行中') as open_trades
+                        COALESCE(bs.buy_count, 0) as trade_count,
+                        COALESCE(bs.completed_trades, 0) as completed_trades,
+                        COALESCE(bs.open_trades, 0) as open_trades,
+                        COALESCE(bs.buy_count, 0) as buy_count,
+                        COALESCE(bs.sell_count, 0) as sell_count,
+                        COALESCE(bs.max_capital_used, 0) as max_capital_used,
+                        COALESCE(bs.avg_cost, 0) as avg_cost,
+                        bs.remaining_shares, bs.max_drawdown, bs.turnover,
+                        bs.xirr_value as stats_xirr_value,
+                        bs.backtest_id IS NULL as stats_missing
                     FROM 
                         backtest_results br
                     LEFT JOIN 
                         fund_info fi ON br.stock_code = fi.fund_code
+                    LEFT JOIN 
+                        backtest_stats bs ON bs.backtest_id = br.id
                     WHERE 1=1
                 """
                 
@@ -277,6 +370,16 @@ class TradeQuery:
                 columns = [desc[0] for desc in cursor.description]
                 results = cursor.fetchall()
                 
+                # 统计表上线前保存的回测、以及配对交易或净值被修改后统计已被触发器删除的回测，补算后重新查询
+                missing_column = columns.index('stats_missing')
+                missing = [row[0] for row in results if row[missing_column]]
+                if missing:
+                    print(f"补算 {len(missing)} 个回测的统计")
+                    refresh_backtest_stats(cursor, missing, workers=None)
+                    conn.commit()
+                    cursor.execute(query, params)
+                    results = cursor.fetchall()
+                
                 # 转换为DataFrame
                 if results:
                     df = pd.DataFrame(results, columns=columns)
@@ -308,74 +411,38 @@ class TradeQuery:
         Returns:
             float: 最高占用资金
         """
+        return self.get_max_capital_used_many([backtest_id]).get(int(backtest_id), 0.0)
+    
+    def get_max_capital_used_many(self, backtest_ids):
+        """一次查询获取多个回测的最高占用资金
+        
+        买入和卖出作为两类事件按时间排序，在数据库中用窗口函数累计资金占用并取最大值。
+        
+        Args:
+            backtest_ids: 回测ID列表
+            
+        Returns:
+            dict: {回测ID: 最高占用资金}，没有配对交易的回测不在其中
+        """
+        ids = [int(backtest_id) for backtest_id in backtest_ids]
+        if not ids:
+            return {}
+        conn = None
         try:
             conn = self.db_connector.get_connection()
             if not conn:
                 print("无法获取数据库连接")
-                return 0.0
+                return {}
                 
             cursor = conn.cursor()
-            
-            # 获取所有配对交易记录，按时间排序
-            cursor.execute("""
-                SELECT id, buy_time, buy_value, sell_time, sell_value, remaining
-                FROM backtest_paired_trades
-                WHERE backtest_id = %s
-                ORDER BY buy_time
-            """, (backtest_id,))
-            
-            trades = cursor.fetchall()
-            if not trades:
-                return 0.0
-                
-            # 跟踪每个时间点的资金占用
-            time_points = []  # 时间点列表
-            capital_used = []  # 对应的资金占用
-            
-            # 初始资金占用为0
-            current_capital_used = 0.0
-            
-            # 处理每笔交易
-            for trade in trades:
-                trade_id = trade[0]
-                buy_time = trade[1]
-                buy_value = float(trade[2]) if trade[2] is not None else 0.0
-                sell_time = trade[3]
-                sell_value = float(trade[4]) if trade[4] is not None else 0.0
-                remaining = int(trade[5]) if trade[5] is not None else 0
-                
-                # 买入时增加资金占用
-                current_capital_used += buy_value
-                time_points.append(buy_time)
-                capital_used.append(current_capital_used)
-                
-                # 卖出时减少资金占用
-                if sell_time:
-                    # 如果有剩余股数，只减去卖出部分的资金占用
-                    if remaining > 0:
-                        # 计算卖出比例
-                        sell_ratio = sell_value / buy_value
-                        # 减去卖出部分的资金占用
-                        current_capital_used -= buy_value * sell_ratio
-                    else:
-                        # 全部卖出，减去全部买入金额
-                        current_capital_used -= buy_value
-                    
-                    time_points.append(sell_time)
-                    capital_used.append(current_capital_used)
-            
-            # 找出最大资金占用
-            if capital_used:
-                max_capital_used = max(capital_used)
-                print(f"回测ID {backtest_id} 的最高资金占用: {max_capital_used:.2f}")
-                return max_capital_used
-            else:
-                return 0.0
+            cursor.execute(MAX_CAPITAL_USED_SQL, {'ids': ids})
+            return {backtest_id: float(value) if value is not None else 0.0
+                    for backtest_id, value in cursor.fetchall()}
             
         except Exception as e:
             print(f"获取最高占用资金失败: {str(e)}")
             traceback.print_exc()
-            return 0.0
+            return {}
         finally:
             if conn:
                 self.db_connector.release_connection(conn)
@@ -501,6 +568,8 @@ class TradeQuery:
     def get_xirr_value(self, backtest_id):
         """获取回测的交易专用XIRR值
         
+        已保存的结果只有输入哈希与当前配对交易一致时才会使用，否则重新计算并保存
+        
         Args:
             backtest_id: 回测ID
             
@@ -508,41 +577,8 @@ class TradeQuery:
             float: XIRR百分比值
         """
         try:
-            # 尝试从数据库中获取已计算的XIRR值
-            conn = self.db_connector.get_connection()
-            if not conn:
-                print("无法获取数据库连接")
-                return None
-                
-            cursor = conn.cursor()
-            
-            # 查询XIRR值
-            cursor.execute("""
-                SELECT xirr_value FROM backtest_xirr 
-                WHERE backtest_id = %s AND xirr_type = 'trades_only'
-                ORDER BY calculation_time DESC
-                LIMIT 1
-            """, (backtest_id,))
-            
-            result = cursor.fetchone()
-            if result and result[0] is not None:
-                return float(result[0])  # 返回百分比形式的XIRR值
-                
-            # 如果数据库中没有，则尝试计算
-            print(f"数据库中没有回测ID={backtest_id}的XIRR值，尝试计算...")
-            from backtest_gui.utils.xirr_calculator_trades_only import XIRRCalculatorTradesOnly
-            calculator = XIRRCalculatorTradesOnly(self.db_connector)
-            result = calculator.calculate_backtest_xirr(backtest_id)
-            
-            if result and 'xirr_value' in result and result['xirr_value'] is not None:
-                return float(result['xirr_value'])  # 返回百分比形式的XIRR值
-                
-            return None
-            
+            return get_trades_only_xirr_values(self.db_connector, [backtest_id]).get(int(backtest_id))
         except Exception as e:
             print(f"获取XIRR值失败: {str(e)}")
             traceback.print_exc()
-            return None
-        finally:
-            if conn:
-                self.db_connector.release_connection(conn) 
\ No newline at end of file
+            return None
\ No newline at end of file
@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+批量XIRR计算模块 - 一次计算多个回测的交易专用XIRR
+
+- 所有回测的数据每张表用一条查询取出，在内存中按backtest_id拆分
+- 现金流由xirr_core.TradesOnlyCashflowModel构建，与XIRRCalculatorTradesOnly一致
+- 回测数量较多时在多个进程中并行求解
+- 全部结果用一条INSERT ... ON CONFLICT语句写入backtest_xirr
+- 每条结果记录输入哈希(配对交易版本号、估值价格、计算方式)，在数据库中计算，
+  读取缓存时只有哈希与当前数据一致的结果才会被使用，配对交易被修改后自动重新计算
+- 配对交易版本号(backtest_results.trades_version)由backtest_paired_trades上的语句级触发器维护，
+  任何增删改(包括修复脚本直接修改)都会使版本号加一，校验缓存时不需要扫描配对交易
+"""
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from psycopg2 import extras
+
+from backtest_gui.utils.xirr_core import TradesOnlyCashflowModel, load_backtest_inputs_many
+
+# 回测数量达到该值时才启用多进程，少量回测的求解耗时远小于进程启动开销
+PARALLEL_MIN_BACKTESTS = 32
+
+TRADES_ONLY_MODEL = TradesOnlyCashflowModel()
+
+UPSERT_XIRR_SQL = """
+INSERT INTO backtest_xirr
+    (backtest_id, xirr, xirr_value, xirr_type, total_buy_value, total_sell_value,
+     remaining_shares, remaining_value, total_cash_flow, calculation_time,
+     has_incomplete_trades, notes, input_hash)
+VALUES %s
+ON CONFLICT (backtest_id) DO UPDATE SET
+    xirr = EXCLUDED.xirr,
+    xirr_value = EXCLUDED.xirr_value,
+    xirr_type = EXCLUDED.xirr_type,
+    total_buy_value = EXCLUDED.total_buy_value,
+    total_sell_value = EXCLUDED.total_sell_value,
+    remaining_shares = EXCLUDED.remaining_shares,
+    remaining_value = EXCLUDED.remaining_value,
+    total_cash_flow = EXCLUDED.total_cash_flow,
+    calculation_time = EXCLUDED.calculation_time,
+    has_incomplete_trades = EXCLUDED.has_incomplete_trades,
+    notes = EXCLUDED.notes,
+    input_hash = EXCLUDED.input_hash
+"""
+UPSERT_XIRR_TEMPLATE = "(%s, %s, %s, 'trades_only', %s, %s, %s, %s, %s, NOW(), %s, %s, %s)"
+
+# 预计算统计表(backtest_stats)中的XIRR与backtest_xirr保持一致
+UPDATE_STATS_XIRR_SQL = """
+UPDATE backtest_stats s SET xirr_value = v.xirr_value
+FROM (VALUES %s) AS v(backtest_id, xirr_value)
+WHERE s.backtest_id = v.backtest_id
+"""
+
+# 计算输入哈希: 计算方式、结束日期、持仓最新价和配对交易版本号，
+# 只读取每个回测的一行结果和持仓，不扫描配对交易
+INPUT_HASH_SQL = """
+SELECT r.id AS backtest_id, md5(ROW(
+    %s::text,
+    r.end_date,
+    (SELECT max(p.last_price) FROM backtest_positions p WHERE p.backtest_id = r.id),
+    r.trades_version
+)::text) AS input_hash
+FROM backtest_results r
+WHERE r.id = ANY(%s)
+"""
+
+# 配对交易版本号维护: 语句级触发器通过转换表取出受影响的回测，每条语句每个回测只更新一次
+TRADES_VERSION_FUNCTION = 'backtest_paired_trades_bump_version'
+
+TRADES_VERSION_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION {TRADES_VERSION_FUNCTION}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE backtest_results r SET trades_version = r.trades_version + 1
+        WHERE r.id IN (SELECT backtest_id FROM new_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE backtest_results r SET trades_version = r.trades_version + 1
+        WHERE r.id IN (SELECT backtest_id FROM new_rows UNION SELECT backtest_id FROM old_rows);
+    ELSE
+        UPDATE backtest_results r SET trades_version = r.trades_version + 1
+        WHERE r.id IN (SELECT backtest_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+TRADES_VERSION_TRIGGERS = {
+    'backtest_paired_trades_version_ins': "AFTER INSERT ON backtest_paired_trades REFERENCING NEW TABLE AS new_rows",
+    'backtest_paired_trades_version_upd': ("AFTER UPDATE ON backtest_paired_trades "
+                                           "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+    'backtest_paired_trades_version_del': "AFTER DELETE ON backtest_paired_trades REFERENCING OLD TABLE AS old_rows",
+}
+
+CACHED_XIRR_SQL = f"""
+WITH current_hash AS ({INPUT_HASH_SQL})
+SELECT x.backtest_id, x.xirr_value
+FROM backtest_xirr x
+JOIN current_hash h ON h.backtest_id = x.backtest_id AND h.input_hash = x.input_hash
+WHERE x.xirr_type = %s AND x.xirr_value IS NOT NULL
+"""
+
+
+def install_trades_version_triggers(cursor):
+    """在backtest_paired_trades上安装(或重建)维护trades_version的语句级触发器
+
+    Args:
+        cursor: 数据库游标
+    """
+    cursor.execute(TRADES_VERSION_FUNCTION_SQL)
+    for name, timing in TRADES_VERSION_TRIGGERS.items():
+        cursor.execute(f"DROP TRIGGER IF EXISTS {name} ON backtest_paired_trades")
+        cursor.execute(f"CREATE TRIGGER {name} {timing} "
+                       f"FOR EACH STATEMENT EXECUTE FUNCTION {TRADES_VERSION_FUNCTION}()")
+
+
+def input_hashes(cursor, backtest_ids, mode=TRADES_ONLY_MODEL.name):
+    """计算多个回测当前XIRR输入的哈希
+
+    Args:
+        cursor: 数据库游标
+        backtest_ids: 回测ID列表
+        mode: 计算方式，即现金流模型名称
+
+    Returns:
+        dict: {回测ID: md5字符串}
+    """
+    cursor.execute(INPUT_HASH_SQL, (mode, [int(backtest_id) for backtest_id in backtest_ids]))
+    return dict(cursor.fetchall())
+
+
+def load_cached_xirr_values(cursor, backtest_ids, mode=TRADES_ONLY_MODEL.name):
+    """读取输入哈希与当前数据一致的已保存XIRR
+
+    Args:
+        cursor: 数据库游标
+        backtest_ids: 回测ID列表
+        mode: 计算方式，即现金流模型名称
+
+    Returns:
+        dict: {回测ID: XIRR百分比值}，没有结果或结果已过期的回测不在其中
+    """
+    cursor.execute(CACHED_XIRR_SQL, (mode, [int(backtest_id) for backtest_id in backtest_ids], mode))
+    return {backtest_id: float(xirr_value) for backtest_id, xirr_value in cursor.fetchall()}
+
+
+def _solve_task(task):
+    """求解一个回测的XIRR(供进程池调用，必须是模块级函数)
+
+    Args:
+        task: (回测ID, 现金流日期数组, 现金流金额数组)
+
+    Returns:
+        tuple: (回测ID, XIRR值或None)
+    """
+    backtest_id, dates, amounts = task
+    return backtest_id, TRADES_ONLY_MODEL.solve(dates, amounts)
+
+
+def solve_many(tasks, workers=None):
+    """求解多个回测的XIRR，数量较多时使用多进程
+
+    Args:
+        tasks: _solve_task的任务列表
+        workers: 进程数，None时使用CPU核数，1表示不启用多进程
+
+    Returns:
+        dict: {回测ID: XIRR值或None}
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) >= PARALLEL_MIN_BACKTESTS:
+        try:
+            chunksize = max(1, len(tasks) // (workers * 4))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                return dict(executor.map(_solve_task, tasks, chunksize=chunksize))
+        except Exception as e:
+            print(f"多进程求解XIRR失败，改为单进程: {str(e)}")
+    return dict(_solve_task(task) for task in tasks)
+
+
+def upsert_xirr_results(cursor, results):
+    """用一条语句写入或更新backtest_xirr，同时更新backtest_stats中的XIRR，不提交
+
+    Args:
+        cursor: 数据库游标
+        results: {回测ID: 结果字典}，字段见compute_trades_only_xirr，input_hash可省略
+
+    Returns:
+        int: 写入的行数
+    """
+    rows = [(
+        int(backtest_id),
+        float(result['xirr']),
+        float(result['xirr_value']),
+        float(result['total_buy_value']),
+        float(result['total_sell_value']),
+        int(result['remaining_shares']),
+        float(result['remaining_value']),
+        float(result['total_cash_flow']),
+        bool(result['has_incomplete_trades']),
+        f"交易专用XIRR计算，剩余股数{result['remaining_shares']}，Excel兼容计算方式",
+        result.get('input_hash'),
+    ) for backtest_id, result in results.items()]
+    if not rows:
+        return 0
+    extras.execute_values(cursor, UPSERT_XIRR_SQL, rows, template=UPSERT_XIRR_TEMPLATE, page_size=len(rows))
+    extras.execute_values(cursor, UPDATE_STATS_XIRR_SQL, [(row[0], row[2]) for row in rows],
+                          template="(%s, %s::numeric)", page_size=len(rows))
+    return len(rows)
+
+
+def solve_trades_only_xirr(cursor, backtest_ids, workers=None):
+    """在当前事务中读取数据并计算多个回测的交易专用XIRR，不写入
+
+    Args:
+        cursor: 数据库游标
+        backtest_ids: 回测ID列表
+        workers: 求解进程数，见solve_many
+
+    Returns:
+        dict: 见compute_trades_only_xirr
+    """
+    # 先取哈希再读数据，两者之间数据被修改时保存的哈希是旧的，下次读取会重新计算
+    hashes = input_hashes(cursor, backtest_ids)
+    inputs = load_backtest_inputs_many(cursor, backtest_ids)
+
+    summaries = {}
+    tasks = []
+    for backtest_id, backtest_inputs in inputs.items():
+        if backtest_inputs['trades'].empty:
+            continue
+        flows = TRADES_ONLY_MODEL.build(backtest_inputs)
+        summaries[backtest_id] = flows['summary']
+        tasks.append((backtest_id, flows['dates'], flows['amounts']))
+
+    solved = solve_many(tasks, workers)
+
+    results = {}
+    for backtest_id, summary in summaries.items():
+        # 与单个计算器一致，求解失败时记为0
+        xirr = solved.get(backtest_id) or 0.0
+        results[backtest_id] = dict(summary, xirr=xirr, xirr_value=xirr * 100,
+                                    input_hash=hashes.get(backtest_id))
+    return results
+
+
+def compute_trades_only_xirr(db_connector, backtest_ids, workers=None, save=True):
+    """批量计算交易专用XIRR
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器
+        backtest_ids: 回测ID列表
+        workers: 求解进程数，见solve_many
+        save: 是否写入backtest_xirr
+
+    Returns:
+        dict: {回测ID: {'xirr', 'xirr_value', 'total_buy_value', 'total_sell_value',
+            'remaining_shares', 'remaining_value', 'total_cash_flow', 'has_incomplete_trades', 'input_hash'}}，
+            没有配对交易的回测不在结果中
+    """
+    backtest_ids = list(dict.fromkeys(int(backtest_id) for backtest_id in backtest_ids))
+    if not backtest_ids:
+        return {}
+
+    conn = None
+    try:
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        results = solve_trades_only_xirr(cursor, backtest_ids, workers)
+
+        if save and results:
+            upsert_xirr_results(cursor, results)
+            conn.commit()
+        else:
+            conn.rollback()
+        cursor.close()
+        print(f"批量计算交易专用XIRR完成: {len(results)}/{len(backtest_ids)} 个回测")
+        return results
+    except Exception as e:
+        print(f"批量计算XIRR失败: {str(e)}")
+        traceback.print_exc()
+        if conn:
+            conn.rollback()
+        return {}
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
+
+
+def get_trades_only_xirr_values(db_connector, backtest_ids, workers=None):
+    """获取多个回测的交易专用XIRR百分比值，数据库中没有或已过期的批量计算并保存
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器
+        backtest_ids: 回测ID列表
+        workers: 求解进程数，见solve_many
+
+    Returns:
+        dict: {回测ID: XIRR百分比值}，无法计算的回测不在结果中
+    """
+    backtest_ids = [int(backtest_id) for backtest_id in backtest_ids]
+    if not backtest_ids:
+        return {}
+
+    values = {}
+    conn = None
+    try:
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        values = load_cached_xirr_values(cursor, backtest_ids)
+        conn.rollback()
+        cursor.close()
+    except Exception as e:
+        print(f"查询已保存的XIRR失败: {str(e)}")
+        traceback.print_exc()
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
+
+    missing = [backtest_id for backtest_id in backtest_ids if backtest_id not in values]
+    if missing:
+        computed = compute_trades_only_xirr(db_connector, missing, workers)
+        values.update({backtest_id: result['xirr_value'] for backtest_id, result in computed.items()})
+    return values
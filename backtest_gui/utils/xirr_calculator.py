@@ -2,16 +2,21 @@
 # -*- coding: utf-8 -*-
 """
 XIRR计算模块 - 计算回测交易的年化收益率
+
+现金流为开始日期投入初始资金、结束日期取回最终资金，由xirr_core的CapitalCashflowModel构建和求解。
 """
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 import traceback
-# 移除 scipy 依赖
-# from scipy import optimize
+
+from backtest_gui.utils import xirr_core
+from backtest_gui.utils.xirr_solver import xnpv, year_fractions
 
 class XIRRCalculator:
     """XIRR计算器，用于计算回测交易的年化收益率"""
+
+    model = xirr_core.CapitalCashflowModel()
     
     def __init__(self, db_connector=None):
         """初始化XIRR计算器
@@ -31,58 +36,9 @@ class XIRRCalculator:
         Returns:
             float: XNPV值
         """
-        chron_order = sorted(cashflows, key=lambda x: x[0])
-        t0 = chron_order[0][0]  # 使用第一个现金流的时间作为基准时间
-        return sum(float(cf) / (1 + float(rate)) ** ((t - t0).days / 365.0) for t, cf in chron_order)
-    
-    def _secant_method(self, f, x0, x1, max_iterations=100, tolerance=1e-6):
-        """使用割线法求解函数f(x)=0
-        
-        Args:
-            f: 目标函数
-            x0: 初始猜测值1
-            x1: 初始猜测值2
-            max_iterations: 最大迭代次数
-            tolerance: 收敛容差
-            
-        Returns:
-            float: 函数的根
-        """
-        # 确保初始值为浮点数
-        x0 = float(x0)
-        x1 = float(x1)
-        # 确保初始值为浮点数
-        x0 = float(x0)
-        x1 = float(x1)
-        f0 = f(x0)
-        
-        for i in range(max_iterations):
-            f1 = f(x1)
-            
-            # 检查是否收敛
-            if abs(f1) < tolerance:
-                return x1
-                
-            # 计算下一个x值
-            try:
-                # 防止除以零
-                if f1 - f0 == 0:
-                    return x1
-                    
-                x_new = x1 - f1 * (x1 - x0) / (f1 - f0)
-                
-                # 如果x_new超出了合理范围，尝试其他值
-                if x_new <= -1 or x_new > 1000:
-                    x_new = (x0 + x1) / 2  # 折半
-            except:
-                x_new = (x0 + x1) / 2  # 出错时尝试折半
-                
-            # 更新值
-            x0, f0 = x1, f1
-            x1 = x_new
-            
-        # 如果达到最大迭代次数，返回最后一次的估计值
-        return x1
+        dates = [cf[0] for cf in cashflows]
+        values = np.array([float(cf[1]) for cf in cashflows], dtype=np.float64)
+        return xnpv(float(rate), values, year_fractions(dates))
     
     def _xirr(self, cashflows, guess=0.1):
         """计算XIRR (扩展内部收益率)
@@ -112,28 +68,19 @@ class XIRRCalculator:
             if not (pos and neg):
                 return 0.0
                 
-            # 使用自定义的割线法求解
-            f = lambda r: self._xnpv(r, cashflows)
-            result = self._secant_method(f, guess, guess + 0.1)
-            
-            # 限制XIRR的合理范围
-            if result is not None:
-                # 如果XIRR大于10（即1000%）或小于-0.9（即-90%），视为计算错误
-                if result > 10 or result < -0.9:
-                    print(f"XIRR计算结果超出合理范围: {result}, 视为计算错误")
-                    return None
-            
-            return result
+            # 同一天的现金流先合并再求解，超出合理范围(-90%~1000%)视为计算错误
+            return self.model.solve([cf[0] for cf in cashflows], values, guess)
         except Exception as e:
             # 如果计算失败，返回None
             print(f"XIRR计算异常: {str(e)}")
             return None
         
-    def calculate_backtest_xirr(self, backtest_id):
+    def calculate_backtest_xirr(self, backtest_id, inputs=None):
         """计算指定回测的XIRR
         
         Args:
             backtest_id: 回测ID
+            inputs: 已读取的回测数据(见xirr_core.load_backtest_inputs)，None时从数据库读取
             
         Returns:
             dict: XIRR计算结果，包含以下字段：
@@ -143,140 +90,40 @@ class XIRRCalculator:
                 - backtest_info: 回测基本信息
         """
         try:
-            if not self.db_connector:
-                print("无法计算XIRR：数据库连接器未初始化")
-                return None
-                
-            conn = self.db_connector.get_connection()
-            if not conn:
-                print("无法获取数据库连接")
-                return None
-            
-            cursor = conn.cursor()
-            
-            # 获取回测基本信息
-            cursor.execute(
-                """
-                SELECT id, stock_code, start_date, end_date, initial_capital, 
-                       final_capital, total_profit, total_profit_rate, 
-                       backtest_time, strategy_name
-                FROM backtest_results
-                WHERE id = %s
-                """,
-                (backtest_id,)
-            )
-            backtest_info = cursor.fetchone()
-            
-            if not backtest_info:
+            if inputs is None:
+                if not self.db_connector:
+                    print("无法计算XIRR：数据库连接器未初始化")
+                    return None
+                    
+                conn = self.db_connector.get_connection()
+                if not conn:
+                    print("无法获取数据库连接")
+                    return None
+                try:
+                    cursor = conn.cursor()
+                    inputs = xirr_core.load_backtest_inputs(cursor, backtest_id)
+                    conn.rollback()
+                    cursor.close()
+                finally:
+                    self.db_connector.release_connection(conn)
+            
+            if not inputs:
                 print(f"找不到回测记录：backtest_id={backtest_id}")
                 return None
-                
-            # 获取配对交易记录
-            cursor.execute(
-                """
-                SELECT id, level, grid_type, buy_time, buy_price, buy_amount, buy_value,
-                       sell_time, sell_price, sell_amount, sell_value, remaining, 
-                       band_profit, band_profit_rate, status
-                FROM backtest_paired_trades
-                WHERE backtest_id = %s
-                ORDER BY buy_time
-                """,
-                (backtest_id,)
-            )
-            paired_trades = cursor.fetchall()
-            
-            # 获取持仓信息
-            cursor.execute(
-                """
-                SELECT position_amount, position_cost, last_price, position_value
-                FROM backtest_positions
-                WHERE backtest_id = %s
-                """,
-                (backtest_id,)
-            )
-            position = cursor.fetchone()
-            
-            # 释放数据库连接
-            self.db_connector.release_connection(conn)
-            
-            # 转换回测信息
-            backtest_info_dict = {
-                'id': backtest_info[0],
-                'stock_code': backtest_info[1],
-                'start_date': backtest_info[2],
-                'end_date': backtest_info[3],
-                'initial_capital': float(backtest_info[4]) if backtest_info[4] is not None else 0.0,
-                'final_capital': float(backtest_info[5]) if backtest_info[5] is not None else 0.0,
-                'total_profit': float(backtest_info[6]) if backtest_info[6] is not None else 0.0,
-                'total_profit_rate': float(backtest_info[7]) if backtest_info[7] is not None else 0.0,
-                'backtest_time': backtest_info[8],
-                'strategy_name': backtest_info[9]
-            }
-            
-            # 构建现金流（优化版本）
-            cashflows = []
             
-            # 添加初始资金（作为负现金流）
-            # 使用回测初始日期
-            start_date = backtest_info_dict['start_date']
-            initial_capital = float(backtest_info_dict['initial_capital'])  # 确保是浮点数
-            cashflows.append((start_date, -initial_capital))
+            flows = self.model.build(inputs)
+            df_cashflows = pd.DataFrame({'date': pd.to_datetime(flows['dates']), 'amount': flows['amounts']})
+            cashflows = list(zip(df_cashflows['date'], df_cashflows['amount']))
             
-            # 处理配对交易
-            has_incomplete_trades = False
-            completed_trades_value = 0.0  # 已完成交易的价值
-            pending_trades_value = 0.0    # 未完成交易的买入价值
-            
-            for trade in paired_trades:
-                try:
-                    buy_time = trade[3]
-                    buy_value = float(trade[6]) if trade[6] is not None else 0.0
-                    status = trade[14]
-                    
-                    # 累计买入价值
-                    if status == '进行中':
-                        pending_trades_value += buy_value
-                        has_incomplete_trades = True
-                    
-                    # 如果有卖出，累计已完成交易价值
-                    sell_time = trade[7]
-                    if sell_time:
-                        sell_value = float(trade[10]) if trade[10] is not None else 0.0
-                        completed_trades_value += sell_value
-                except Exception as e:
-                    print(f"处理交易记录异常: {str(e)}")
-                    continue
-            
-            # 添加最终资金（作为正现金流）
-            # 如果有持仓，考虑持仓价值
-            end_date = backtest_info_dict['end_date']
-            
-            # 计算最终现金流 = 最终资金
-            final_value = float(backtest_info_dict['final_capital'])  # 确保是浮点数
-            
-            if position and position[0] and float(position[0]) > 0:
-                # 如果有持仓信息，添加持仓价值
-                position_value = float(position[3]) if position[3] is not None else 0.0
-                # 最终资金已经包含了持仓价值，不需要再加
-                has_incomplete_trades = True
-                
-            cashflows.append((end_date, final_value))
-            
-            # 创建现金流DataFrame
-            df_cashflows = pd.DataFrame(cashflows, columns=['date', 'amount'])
-            
-            # 计算XIRR
-            xirr_value = None
-            if len(cashflows) >= 2:  # 至少需要两个现金流才能计算XIRR
-                xirr_value = self._xirr(cashflows)
-                if xirr_value is not None:
-                    xirr_value = float(xirr_value) * 100  # 转换为百分比
+            xirr_value = self._xirr(cashflows)
+            if xirr_value is not None:
+                xirr_value = float(xirr_value) * 100  # 转换为百分比
             
             return {
                 'xirr': xirr_value,
                 'cashflows': df_cashflows,
-                'has_incomplete_trades': has_incomplete_trades,
-                'backtest_info': backtest_info_dict
+                'has_incomplete_trades': flows['summary']['has_incomplete_trades'],
+                'backtest_info': inputs['info']
             }
                 
         except Exception as e:
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+XIRR计算核心 - 统一的回测数据读取、现金流模型和求解
+
+三个XIRR计算器(XIRRCalculator、XIRRCalculatorSimple、XIRRCalculatorTradesOnly)和批量计算
+都通过本模块读取回测数据、构建现金流并调用xirr_solver求解，区别只在现金流模型:
+- CapitalCashflowModel: 初始资金在开始日期流出，最终资金在结束日期流入
+- TradesOnlyCashflowModel: 只计实际买卖，剩余底仓按最后一次卖出价格在结束日期计入
+- MarkToMarketCashflowModel: 只计实际买卖，持有份额按指定价格(默认持仓最新价)在结束日期计入
+
+现金流模型的build方法返回字典:
+    {'dates': 日期数组, 'amounts': 金额数组, 'remarks': 备注数组, 'summary': 汇总字典}
+"""
+import numpy as np
+import pandas as pd
+
+from backtest_gui.utils.xirr_solver import aggregate_daily, solve_xirr, year_fractions
+
+PAIRED_TRADE_FIELDS = ['id', 'backtest_id', 'level', 'grid_type', 'buy_time', 'buy_price', 'buy_amount',
+                       'buy_value', 'sell_time', 'sell_price', 'sell_amount', 'sell_value', 'remaining',
+                       'status']
+
+BACKTEST_INFO_FIELDS = ['id', 'stock_code', 'start_date', 'end_date', 'initial_capital', 'final_capital',
+                        'total_profit', 'total_profit_rate', 'backtest_time', 'strategy_name']
+
+POSITION_FIELDS = ['backtest_id', 'position_amount', 'position_cost', 'last_price', 'position_value']
+
+
+def load_backtest_infos(cursor, backtest_ids):
+    """读取多个回测的基本信息
+
+    Returns:
+        dict: {回测ID: 基本信息字典}，金额字段为float
+    """
+    cursor.execute(f"SELECT {', '.join(BACKTEST_INFO_FIELDS)} FROM backtest_results WHERE id = ANY(%s)",
+                   ([int(backtest_id) for backtest_id in backtest_ids],))
+    infos = {}
+    for row in cursor.fetchall():
+        info = dict(zip(BACKTEST_INFO_FIELDS, row))
+        for key in ('initial_capital', 'final_capital', 'total_profit', 'total_profit_rate'):
+            info[key] = float(info[key]) if info[key] is not None else 0.0
+        infos[info['id']] = info
+    return infos
+
+
+def load_paired_trades(cursor, backtest_ids):
+    """一次查询读取多个回测的配对交易
+
+    Returns:
+        DataFrame: 列见PAIRED_TRADE_FIELDS，按backtest_id、buy_time排序；
+            价格和金额为float64，数量为int64(空值为0)，时间为datetime64
+    """
+    cursor.execute(f"""
+        SELECT {', '.join(PAIRED_TRADE_FIELDS)}
+        FROM backtest_paired_trades
+        WHERE backtest_id = ANY(%s)
+        ORDER BY backtest_id, buy_time, id
+    """, ([int(backtest_id) for backtest_id in backtest_ids],))
+    trades = pd.DataFrame.from_records(cursor.fetchall(), columns=PAIRED_TRADE_FIELDS)
+    for column in ('buy_price', 'buy_value', 'sell_price', 'sell_value'):
+        trades[column] = pd.to_numeric(trades[column], errors='coerce').astype('float64')
+    for column in ('buy_amount', 'sell_amount', 'remaining'):
+        trades[column] = pd.to_numeric(trades[column], errors='coerce').fillna(0).astype('int64')
+    for column in ('buy_time', 'sell_time'):
+        trades[column] = pd.to_datetime(trades[column])
+    return trades
+
+
+def load_positions(cursor, backtest_ids):
+    """读取多个回测的持仓信息
+
+    Returns:
+        dict: {回测ID: 持仓字典}
+    """
+    cursor.execute(f"SELECT {', '.join(POSITION_FIELDS)} FROM backtest_positions WHERE backtest_id = ANY(%s)",
+                   ([int(backtest_id) for backtest_id in backtest_ids],))
+    positions = {}
+    for row in cursor.fetchall():
+        position = {key: float(value) if value is not None else 0.0
+                    for key, value in zip(POSITION_FIELDS[1:], row[1:])}
+        positions.setdefault(row[0], position)
+    return positions
+
+
+def load_backtest_inputs_many(cursor, backtest_ids):
+    """读取多个回测计算XIRR所需的全部数据，每张表一次查询
+
+    Returns:
+        dict: {回测ID: {'info': 基本信息, 'trades': 配对交易DataFrame, 'position': 持仓字典或None}}，
+            不存在的回测不在结果中
+    """
+    infos = load_backtest_infos(cursor, backtest_ids)
+    if not infos:
+        return {}
+    trades = load_paired_trades(cursor, list(infos))
+    positions = load_positions(cursor, list(infos))
+    groups = {int(backtest_id): group.reset_index(drop=True)
+              for backtest_id, group in trades.groupby('backtest_id', sort=False)}
+    return {
+        backtest_id: {
+            'info': info,
+            'trades': groups.get(backtest_id, trades.iloc[0:0]),
+            'position': positions.get(backtest_id),
+        }
+        for backtest_id, info in infos.items()
+    }
+
+
+def load_backtest_inputs(cursor, backtest_id):
+    """读取单个回测计算XIRR所需的全部数据
+
+    Returns:
+        dict: 见load_backtest_inputs_many，回测不存在时返回None
+    """
+    return load_backtest_inputs_many(cursor, [backtest_id]).get(int(backtest_id))
+
+
+def has_open_position(position):
+    """持仓信息中是否有持仓"""
+    return bool(position and position.get('position_amount', 0) > 0)
+
+
+class CashflowModel:
+    """现金流模型基类"""
+
+    # 模型名称，对应backtest_xirr.xirr_type
+    name = ''
+    # 求解初始值
+    guess = 0.1
+    # 可接受的XIRR范围(开区间)，超出视为计算失败
+    valid_range = (-1.0, 100.0)
+    # 现金流合计为零时是否视为无法计算
+    reject_zero_total = False
+
+    def build(self, inputs):
+        """构建现金流
+
+        Args:
+            inputs: load_backtest_inputs返回的回测数据
+
+        Returns:
+            dict: {'dates', 'amounts', 'remarks', 'summary'}
+        """
+        raise NotImplementedError
+
+    def solve(self, dates, amounts, guess=None):
+        """按日合并现金流后求解XIRR
+
+        Args:
+            dates: 现金流日期数组
+            amounts: 现金流金额数组
+            guess: 初始值，None时使用模型默认值
+
+        Returns:
+            float: XIRR(小数形式)，无法求解或超出valid_range时返回None
+        """
+        if len(amounts) < 2:
+            return None
+        days, totals = aggregate_daily(dates, amounts)
+        if self.reject_zero_total and totals.sum() == 0:
+            return None
+        if not ((totals > 0).any() and (totals < 0).any()):
+            return None
+        result = solve_xirr(totals, year_fractions(days), self.guess if guess is None else guess,
+                            tol=0.0000001)
+        low, high = self.valid_range
+        if result is None or not (low < result < high):
+            return None
+        return result
+
+
+class CapitalCashflowModel(CashflowModel):
+    """按初始资金和最终资金计算的现金流模型"""
+
+    name = 'standard'
+    guess = 0.1
+    valid_range = (-0.9, 10.0)
+
+    def __init__(self, exclude_position_value=False):
+        """初始化模型
+
+        Args:
+            exclude_position_value: 有持仓时最终资金是否扣除持仓市值(简化版计算器的口径)
+        """
+        self.exclude_position_value = exclude_position_value
+
+    def build(self, inputs):
+        info = inputs['info']
+        trades = inputs['trades']
+        position = inputs['position']
+
+        final_value = info['final_capital']
+        has_incomplete_trades = bool((trades['status'] == '进行中').any())
+        if has_open_position(position):
+            has_incomplete_trades = True
+            if self.exclude_position_value:
+                final_value -= position['position_value']
+
+        return {
+            'dates': np.array([info['start_date'], info['end_date']], dtype='datetime64[ns]'),
+            'amounts': np.array([-info['initial_capital'], final_value], dtype=np.float64),
+            'remarks': np.array(['初始资金', '最终资金'], dtype=object),
+            'summary': {'has_incomplete_trades': has_incomplete_trades},
+        }
+
+
+class TradesOnlyCashflowModel(CashflowModel):
+    """只计实际买卖的现金流模型，剩余底仓按最后一次卖出价格估值"""
+
+    name = 'trades_only'
+    guess = 0.06
+    valid_range = (-1.0, 100.0)
+    reject_zero_total = True
+
+    def valuation_price(self, inputs):
+        """剩余底仓的估值价格: 最后一次卖出的价格"""
+        trades = inputs['trades']
+        priced = trades[trades['sell_price'].notna() & trades['sell_time'].notna()]
+        if priced.empty:
+            return None
+        return float(priced.loc[priced['sell_time'].idxmax(), 'sell_price'])
+
+    def terminal_shares(self, trades):
+        """结束日期计入的底仓份额
+
+        Returns:
+            list: [(份额, 备注前缀)]
+        """
+        remaining = trades['remaining']
+        sell_amount = trades['sell_amount']
+        partially_sold_shares = int(remaining[(sell_amount > 0) & (remaining > 0)].sum())
+        unsold_shares = int(trades.loc[sell_amount == 0, 'buy_amount'].sum())
+        return [(partially_sold_shares, '买入卖出后剩余底仓'), (unsold_shares, '买入未卖出底仓')]
+
+    def remaining_shares(self, trades):
+        """汇总中报告的剩余股数: 有剩余的交易加上完全未卖出的交易"""
+        remaining = trades['remaining']
+        return int(remaining[remaining > 0].sum() + trades.loc[trades['sell_time'].isna(), 'buy_amount'].sum())
+
+    def build(self, inputs):
+        trades = inputs['trades']
+        sold = trades['sell_time'].notna()
+        sell_value = trades['sell_value'].fillna(0.0)
+        has_sell_flow = sold & (sell_value > 0)
+
+        dates = np.concatenate([trades['buy_time'].to_numpy(dtype='datetime64[ns]'),
+                                trades.loc[has_sell_flow, 'sell_time'].to_numpy(dtype='datetime64[ns]')])
+        amounts = np.concatenate([-trades['buy_value'].to_numpy(dtype=np.float64),
+                                  sell_value[has_sell_flow].to_numpy(dtype=np.float64)])
+        remarks = np.array(['买入'] * len(trades) + ['卖出'] * int(has_sell_flow.sum()), dtype=object)
+
+        remaining_shares = self.remaining_shares(trades)
+        price = self.valuation_price(inputs)
+        remaining_value = 0.0
+        if remaining_shares > 0 and price:
+            remaining_value = remaining_shares * price
+            end_date = np.datetime64(pd.Timestamp(inputs['info']['end_date']), 'ns')
+            for shares, label in self.terminal_shares(trades):
+                if shares > 0:
+                    dates = np.append(dates, end_date)
+                    amounts = np.append(amounts, shares * price)
+                    remarks = np.append(remarks, f"{label}: {shares} 份额 (价格: {price:.4f})")
+
+        total_buy_value = float(trades['buy_value'].sum())
+        total_sell_value = float(sell_value.sum())
+        return {
+            'dates': dates,
+            'amounts': amounts,
+            'remarks': remarks,
+            'summary': {
+                'total_buy_value': total_buy_value,
+                'total_sell_value': total_sell_value,
+                'remaining_shares': remaining_shares,
+                'held_shares': int((trades['buy_amount'] - trades['sell_amount']).sum()),
+                'last_price': price,
+                'remaining_value': remaining_value,
+                'total_cash_flow': total_sell_value + remaining_value - total_buy_value,
+                'has_incomplete_trades': bool((trades['remaining'] > 0).any() or (~sold).any()),
+            },
+        }
+
+
+class MarkToMarketCashflowModel(TradesOnlyCashflowModel):
+    """只计实际买卖的现金流模型，持有份额(买入减卖出)按指定价格估值"""
+
+    name = 'mark_to_market'
+
+    def __init__(self, price=None):
+        """初始化模型
+
+        Args:
+            price: 估值价格，None时使用持仓最新价，没有持仓信息时使用最后一次卖出价格
+        """
+        self.price = price
+
+    def valuation_price(self, inputs):
+        if self.price:
+            return float(self.price)
+        position = inputs['position']
+        if position and position.get('last_price'):
+            return float(position['last_price'])
+        return super().valuation_price(inputs)
+
+    def terminal_shares(self, trades):
+        return [(self.remaining_shares(trades), '持仓市值')]
+
+    def remaining_shares(self, trades):
+        return max(int((trades['buy_amount'] - trades['sell_amount']).sum()), 0)
+
+
+def calculate(model, inputs, guess=None):
+    """用指定现金流模型计算一个回测的XIRR
+
+    Args:
+        model: CashflowModel实例
+        inputs: load_backtest_inputs返回的回测数据
+        guess: 求解初始值，None时使用模型默认值
+
+    Returns:
+        dict: 模型汇总字段，加上xirr(小数形式或None)和cashflows(按日期排序的现金流DataFrame，
+            列为date/amount/remark)
+    """
+    flows = model.build(inputs)
+    xirr = model.solve(flows['dates'], flows['amounts'], guess)
+    cashflows = pd.DataFrame({
+        'date': pd.to_datetime(flows['dates']),
+        'amount': flows['amounts'],
+        'remark': flows['remarks'],
+    }).sort_values('date', kind='stable').reset_index(drop=True)
+    return dict(flows['summary'], xirr=xirr, cashflows=cashflows)
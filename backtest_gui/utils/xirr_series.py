@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+XIRR时间序列模块 - 计算回测期间每个观察日的交易专用XIRR
+
+观察日可以是每个月末或每个交易日。每个观察日的现金流为:
+- 观察日及之前的买入(负)和卖出(正)现金流
+- 观察日持有的份额按当日收盘价(没有行情时用最近成交价)估值，作为观察日的正现金流，
+  即在每个观察日应用xirr_core.MarkToMarketCashflowModel的口径
+
+现金流先按自然日合并并只转换一次为年数数组，各观察日只取前缀再追加持仓估值，
+持仓份额和估值价格用searchsorted整体对齐；求解时以上一个观察日的结果作为初始值，
+相邻观察日的XIRR通常很接近，牛顿法几步即可收敛。
+"""
+import traceback
+
+import numpy as np
+import pandas as pd
+
+from backtest_gui.utils.xirr_core import load_backtest_inputs
+from backtest_gui.utils.xirr_solver import solve_xirr
+
+FREQ_MONTH = 'M'
+FREQ_TRADE = 'trade'
+
+
+def _to_days(values):
+    """转换为datetime64[D]数组"""
+    return pd.to_datetime(pd.Index(values)).values.astype('datetime64[D]')
+
+
+def daily_flows(trades):
+    """按自然日合并配对交易的现金流和份额变化
+
+    Args:
+        trades: 配对交易DataFrame，列见xirr_core.PAIRED_TRADE_FIELDS
+
+    Returns:
+        DataFrame: 索引为datetime64[D]日期(升序)，列为amount(净现金流，求解用)、
+            buy(买入金额合计)、sell(卖出金额合计)、shares(份额变化)
+    """
+    sold = trades['sell_time'].notna()
+    sell_value = trades['sell_value'].fillna(0.0)
+    sell_amount = trades['sell_amount'].fillna(0)
+    has_sell_flow = sold & (sell_value > 0)
+
+    buy_value = trades['buy_value'].to_numpy(dtype=np.float64)
+    sell_flow = np.where(has_sell_flow[sold], sell_value[sold], 0.0)
+    frame = pd.DataFrame({
+        'day': np.concatenate([_to_days(trades['buy_time']), _to_days(trades.loc[sold, 'sell_time'])]),
+        'amount': np.concatenate([-buy_value, sell_flow]),
+        'buy': np.concatenate([buy_value, np.zeros(len(sell_flow))]),
+        'sell': np.concatenate([np.zeros(len(buy_value)), sell_flow]),
+        'shares': np.concatenate([trades['buy_amount'].to_numpy(dtype=np.float64),
+                                  -sell_amount[sold].to_numpy(dtype=np.float64)]),
+    })
+    return frame.groupby('day', sort=True)[['amount', 'buy', 'sell', 'shares']].sum()
+
+
+def trade_prices(trades):
+    """由成交价格构建每日最后成交价，作为没有行情时的估值价格
+
+    Returns:
+        Series: 索引为datetime64[D]日期(升序)
+    """
+    sold = trades['sell_time'].notna() & trades['sell_price'].notna()
+    frame = pd.DataFrame({
+        'time': pd.concat([trades['buy_time'], trades.loc[sold, 'sell_time']], ignore_index=True),
+        'price': pd.concat([trades['buy_price'], trades.loc[sold, 'sell_price']], ignore_index=True),
+    }).sort_values('time', kind='stable')
+    frame['day'] = _to_days(frame['time'])
+    return frame.groupby('day', sort=True)['price'].last().astype('float64')
+
+
+def observation_days(first_day, end_date, freq=FREQ_MONTH, flow_days=None):
+    """生成观察日
+
+    Args:
+        first_day: 第一笔现金流的日期
+        end_date: 回测结束日期，总是作为最后一个观察日
+        freq: FREQ_MONTH每个月末，FREQ_TRADE每个有现金流的日期
+        flow_days: 有现金流的日期数组，freq为FREQ_TRADE时使用
+
+    Returns:
+        np.ndarray: datetime64[D]观察日数组(升序、去重)
+    """
+    first_day = np.datetime64(pd.Timestamp(first_day).date(), 'D')
+    end_day = np.datetime64(pd.Timestamp(end_date).date(), 'D')
+    if freq == FREQ_TRADE:
+        days = np.asarray(flow_days, dtype='datetime64[D]')
+    else:
+        months = pd.period_range(pd.Timestamp(first_day), pd.Timestamp(end_day), freq='M')
+        days = months.to_timestamp(how='end').normalize().values.astype('datetime64[D]')
+    days = np.append(days[(days >= first_day) & (days <= end_day)], end_day)
+    return np.unique(days)
+
+
+def _asof(index_days, values, days):
+    """取各观察日及之前最近一天的值，没有时为NaN"""
+    positions = np.searchsorted(index_days, days, side='right') - 1
+    result = np.full(len(days), np.nan)
+    valid = positions >= 0
+    result[valid] = np.asarray(values, dtype=np.float64)[positions[valid]]
+    return result
+
+
+def trades_only_xirr_series(trades, end_date, prices=None, freq=FREQ_MONTH):
+    """计算交易专用XIRR时间序列
+
+    Args:
+        trades: 配对交易DataFrame，列见xirr_core.PAIRED_TRADE_FIELDS
+        end_date: 回测结束日期
+        prices: 收盘价Series(索引为日期)，None时只用成交价估值
+        freq: FREQ_MONTH或FREQ_TRADE
+
+    Returns:
+        DataFrame: 索引为观察日，列为xirr(百分比，无法计算为NaN)、invested(累计买入)、
+            proceeds(累计卖出)、shares(持有份额)、price(估值价格)、market_value(持仓市值)
+    """
+    columns = ['xirr', 'invested', 'proceeds', 'shares', 'price', 'market_value']
+    if trades is None or trades.empty:
+        return pd.DataFrame(columns=columns)
+
+    flows = daily_flows(trades)
+    flow_days = flows.index.values.astype('datetime64[D]')
+    amounts = flows['amount'].to_numpy()
+    years = (flow_days - flow_days[0]).astype(np.int64) / 365.0
+
+    days = observation_days(flow_days[0], end_date, freq, flow_days)
+    counts = np.searchsorted(flow_days, days, side='right')
+    day_years = (days - flow_days[0]).astype(np.int64) / 365.0
+
+    shares = _asof(flow_days, np.cumsum(flows['shares'].to_numpy()), days)
+    # 累计买入和卖出按当日买卖金额合计，不用当日净现金流(同一天有买有卖时净额会相互抵消)
+    invested = _asof(flow_days, np.cumsum(flows['buy'].to_numpy()), days)
+    proceeds = _asof(flow_days, np.cumsum(flows['sell'].to_numpy()), days)
+
+    fallback = trade_prices(trades)
+    price = _asof(fallback.index.values.astype('datetime64[D]'), fallback.to_numpy(), days)
+    if prices is not None and len(prices) > 0:
+        quotes = pd.Series(prices).sort_index()
+        quoted = _asof(_to_days(quotes.index), quotes.to_numpy(dtype=np.float64), days)
+        price = np.where(np.isnan(quoted), price, quoted)
+    market_value = np.where(shares > 0, shares * np.nan_to_num(price), 0.0)
+
+    xirr = np.full(len(days), np.nan)
+    guess = 0.06
+    for i, count in enumerate(counts):
+        values = amounts[:count]
+        times = years[:count]
+        if market_value[i] > 0:
+            values = np.append(values, market_value[i])
+            times = np.append(times, day_years[i])
+        if len(values) < 2 or not ((values > 0).any() and (values < 0).any()):
+            continue
+        result = solve_xirr(values, times, guess=guess, tol=0.0000001)
+        if result is not None and -1.0 < result < 100.0:
+            xirr[i] = result * 100
+            # 用本次结果作为下一个观察日的初始值
+            guess = result
+
+    return pd.DataFrame({
+        'xirr': xirr,
+        'invested': invested,
+        'proceeds': proceeds,
+        'shares': shares,
+        'price': price,
+        'market_value': market_value,
+    }, index=pd.DatetimeIndex(days, name='date'))
+
+
+def load_daily_closes(cursor, stock_code, start_date, end_date):
+    """读取每日最后一根K线的收盘价(不区分数据级别)
+
+    Args:
+        cursor: 数据库游标
+        stock_code: 基金代码，可带市场后缀
+        start_date: 开始日期
+        end_date: 结束日期
+
+    Returns:
+        Series: 索引为日期的收盘价
+    """
+    cursor.execute("""
+        SELECT DISTINCT ON (date::date) date::date, close
+        FROM stock_quotes
+        WHERE fund_code = %s AND date BETWEEN %s AND %s
+        ORDER BY date::date, date DESC
+    """, (stock_code.split('.')[0], start_date, end_date))
+    rows = cursor.fetchall()
+    if not rows:
+        return pd.Series(dtype='float64')
+    return pd.Series([float(close) for _, close in rows],
+                     index=pd.to_datetime([day for day, _ in rows]), dtype='float64')
+
+
+def compute_backtest_xirr_series(db_connector, backtest_id, freq=FREQ_MONTH):
+    """计算指定回测的交易专用XIRR时间序列
+
+    Args:
+        db_connector: 提供get_connection/release_connection的数据库连接器
+        backtest_id: 回测ID
+        freq: FREQ_MONTH或FREQ_TRADE
+
+    Returns:
+        DataFrame: 见trades_only_xirr_series，失败返回None
+    """
+    conn = None
+    try:
+        conn = db_connector.get_connection()
+        cursor = conn.cursor()
+        inputs = load_backtest_inputs(cursor, backtest_id)
+        if not inputs:
+            print(f"未找到回测ID: {backtest_id}")
+            return None
+        info = inputs['info']
+        stock_code, start_date, end_date = info['stock_code'], info['start_date'], info['end_date']
+
+        prices = load_daily_closes(cursor, stock_code, start_date, end_date)
+        conn.rollback()
+        cursor.close()
+        return trades_only_xirr_series(inputs['trades'], end_date, prices, freq)
+    except Exception as e:
+        print(f"计算XIRR时间序列失败: {str(e)}")
+        traceback.print_exc()
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if conn:
+            db_connector.release_connection(conn)
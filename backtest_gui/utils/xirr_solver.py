@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+XIRR求解模块 - 向量化XNPV和带保护区间的牛顿法
+
+现金流日期只在求解前转换一次为年数数组(按自然日计算天数/365，与Excel的XIRR一致)，
+每次迭代用一次NumPy向量运算同时得到XNPV及其对利率的导数:
+    f(r)  = Σ a_i (1+r)^(-t_i)
+    f'(r) = -Σ t_i a_i (1+r)^(-t_i-1)
+能找到异号区间时，牛顿步越出区间就改用二分，保证收敛；否则退化为限制步长的牛顿法。
+
+XNPV只依赖现金流所在的自然日，求解前先把同一天的现金流合并，
+分钟级网格回测的数万笔现金流通常只分布在几百个交易日，问题规模缩小约两个数量级，结果不变。
+"""
+import numpy as np
+import pandas as pd
+
+# 求解区间，与原先brentq的下限和可接受结果的上限一致
+RATE_LOWER = -0.999999
+RATE_UPPER = 100.0
+DEFAULT_TOLERANCE = 1e-7
+DEFAULT_MAX_ITERATIONS = 100
+
+
+def day_offsets(dates):
+    """计算各日期距最早日期的自然日天数
+
+    Args:
+        dates: 日期序列(datetime/Timestamp/date列表或datetime64数组)
+
+    Returns:
+        np.ndarray: float64天数数组
+    """
+    days = pd.to_datetime(pd.Index(dates)).values.astype('datetime64[D]')
+    return (days - days.min()).astype(np.int64).astype(np.float64)
+
+
+def year_fractions(dates):
+    """计算各日期距最早日期的年数(天数/365)
+
+    Args:
+        dates: 日期序列
+
+    Returns:
+        np.ndarray: float64年数数组
+    """
+    return day_offsets(dates) / 365.0
+
+
+def aggregate_daily(dates, amounts):
+    """按自然日合并现金流
+
+    Args:
+        dates: 现金流日期序列
+        amounts: 现金流金额序列
+
+    Returns:
+        tuple: (datetime64[D]日期数组(升序), 对应的float64金额合计数组)
+    """
+    days = pd.to_datetime(pd.Index(dates)).values.astype('datetime64[D]')
+    totals = pd.Series(np.asarray(amounts, dtype=np.float64)).groupby(days, sort=True).sum()
+    return totals.index.values.astype('datetime64[D]'), totals.to_numpy()
+
+
+def xnpv(rate, amounts, years):
+    """向量化计算XNPV
+
+    Args:
+        rate: 折现率
+        amounts: 现金流金额数组
+        years: 年数数组，见year_fractions
+
+    Returns:
+        float: XNPV值，rate<=-1时返回inf
+    """
+    if rate <= -1.0:
+        return float('inf')
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        return float(np.dot(amounts, np.power(1.0 + rate, -years)))
+
+
+def xnpv_and_derivative(rate, amounts, years, weighted=None):
+    """一次向量运算同时计算XNPV及其对折现率的导数
+
+    Args:
+        rate: 折现率
+        amounts: 现金流金额数组
+        years: 年数数组
+        weighted: 预先计算的amounts*years，可省略
+
+    Returns:
+        tuple: (XNPV值, 导数值)
+    """
+    if weighted is None:
+        weighted = amounts * years
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        discount = np.power(1.0 + rate, -years)
+        value = float(np.dot(amounts, discount))
+        derivative = -float(np.dot(weighted, discount)) / (1.0 + rate)
+    return value, derivative
+
+
+def solve_xirr(amounts, years, guess=0.1, tol=DEFAULT_TOLERANCE, max_iterations=DEFAULT_MAX_ITERATIONS,
+               lower=RATE_LOWER, upper=RATE_UPPER):
+    """用带保护区间的牛顿法求解XNPV=0
+
+    Args:
+        amounts: 现金流金额数组
+        years: 年数数组
+        guess: 初始猜测值
+        tol: 利率收敛容差
+        max_iterations: 最大迭代次数
+        lower: 求解区间下限
+        upper: 求解区间上限
+
+    Returns:
+        float: XIRR值，无法求解时返回None
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    years = np.asarray(years, dtype=np.float64)
+    weighted = amounts * years
+
+    f_low = xnpv(lower, amounts, years)
+    f_high = xnpv(upper, amounts, years)
+    bracketed = (np.isfinite(f_low) and np.isfinite(f_high)
+                 and np.sign(f_low) != np.sign(f_high) and f_low != 0 and f_high != 0)
+    low, high = lower, upper
+
+    rate = min(max(float(guess), lower), upper)
+    for _ in range(max_iterations):
+        value, derivative = xnpv_and_derivative(rate, amounts, years, weighted)
+        if value == 0.0:
+            return rate
+        if not np.isfinite(value):
+            if not bracketed:
+                return None
+            new_rate = (low + high) / 2.0
+        else:
+            if bracketed:
+                # 用当前点收缩异号区间
+                if np.sign(value) == np.sign(f_low):
+                    low, f_low = rate, value
+                else:
+                    high = rate
+
+            if derivative != 0.0 and np.isfinite(derivative):
+                new_rate = rate - value / derivative
+            else:
+                new_rate = np.nan
+
+            if bracketed:
+                if not (low < new_rate < high):
+                    new_rate = (low + high) / 2.0
+            elif not np.isfinite(new_rate) or new_rate > upper:
+                return None
+            elif new_rate <= -1.0:
+                # 无区间时不允许越过-100%，向-1方向折半
+                new_rate = (rate - 1.0) / 2.0
+
+        if abs(new_rate - rate) <= tol * max(1.0, abs(new_rate)):
+            return float(new_rate)
+        rate = new_rate
+
+    return None
+
+
+def xirr(dates, amounts, guess=0.1, tol=DEFAULT_TOLERANCE, max_iterations=DEFAULT_MAX_ITERATIONS):
+    """计算XIRR
+
+    Args:
+        dates: 现金流日期序列
+        amounts: 现金流金额序列
+        guess: 初始猜测值
+        tol: 利率收敛容差
+        max_iterations: 最大迭代次数
+
+    Returns:
+        float: XIRR值(小数形式)，现金流不足或按日合并后没有同时包含正负值时返回None
+    """
+    if len(amounts) < 2 or len(amounts) != len(dates):
+        return None
+    days, totals = aggregate_daily(dates, amounts)
+    if not ((totals > 0).any() and (totals < 0).any()):
+        return None
+    return solve_xirr(totals, year_fractions(days), guess, tol, max_iterations)
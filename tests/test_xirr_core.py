@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+xirr_core测试 - 各现金流模型的build结果和求解
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_gui.utils import xirr_core
+from backtest_gui.utils.xirr_calculator import XIRRCalculator
+from backtest_gui.utils.xirr_calculator_simple import XIRRCalculatorSimple
+from backtest_gui.utils.xirr_solver import xirr
+
+START_DATE = datetime(2024, 1, 1)
+END_DATE = datetime(2024, 6, 30)
+
+
+def make_trades():
+    """构造与xirr_core.load_paired_trades返回格式一致的配对交易
+
+    - 1档: 全部卖出
+    - 2档: 卖出一半，剩余1000份
+    - 3档: 未卖出
+    """
+    trades = pd.DataFrame([
+        [1, 1, 1, 'normal', datetime(2024, 1, 2, 10), 1.0, 1000, 1000.0,
+         datetime(2024, 2, 1, 14), 1.1, 1000, 1100.0, 0, '已完成'],
+        [2, 1, 2, 'normal', datetime(2024, 1, 10, 10), 0.9, 2000, 1800.0,
+         datetime(2024, 3, 1, 14), 1.2, 1000, 1200.0, 1000, '进行中'],
+        [3, 1, 3, 'normal', datetime(2024, 3, 5, 10), 0.95, 500, 475.0,
+         None, None, None, None, None, '进行中'],
+    ], columns=xirr_core.PAIRED_TRADE_FIELDS)
+    for column in ('buy_price', 'buy_value', 'sell_price', 'sell_value'):
+        trades[column] = pd.to_numeric(trades[column], errors='coerce').astype('float64')
+    for column in ('buy_amount', 'sell_amount', 'remaining'):
+        trades[column] = pd.to_numeric(trades[column], errors='coerce').fillna(0).astype('int64')
+    for column in ('buy_time', 'sell_time'):
+        trades[column] = pd.to_datetime(trades[column])
+    return trades
+
+
+def make_inputs(position=None):
+    """构造与xirr_core.load_backtest_inputs返回格式一致的回测数据"""
+    return {
+        'info': {
+            'id': 1,
+            'stock_code': '159915',
+            'start_date': START_DATE,
+            'end_date': END_DATE,
+            'initial_capital': 10000.0,
+            'final_capital': 10500.0,
+        },
+        'trades': make_trades(),
+        'position': position,
+    }
+
+
+POSITION = {'position_amount': 1500.0, 'position_cost': 1.0, 'last_price': 1.3, 'position_value': 1950.0}
+
+
+def test_capital_model_build():
+    """初始资金在开始日期流出，最终资金在结束日期流入"""
+    flows = xirr_core.CapitalCashflowModel().build(make_inputs(POSITION))
+    assert list(flows['dates']) == [np.datetime64(START_DATE, 'ns'), np.datetime64(END_DATE, 'ns')]
+    assert list(flows['amounts']) == [-10000.0, 10500.0]
+    assert list(flows['remarks']) == ['初始资金', '最终资金']
+    assert flows['summary'] == {'has_incomplete_trades': True}
+
+
+def test_capital_model_excludes_position_value():
+    """简化版口径: 有持仓时最终资金扣除持仓市值"""
+    flows = xirr_core.CapitalCashflowModel(exclude_position_value=True).build(make_inputs(POSITION))
+    assert list(flows['amounts']) == [-10000.0, 10500.0 - 1950.0]
+
+
+def test_capital_model_without_position():
+    """没有持仓时两种口径相同"""
+    inputs = make_inputs()
+    standard = xirr_core.CapitalCashflowModel().build(inputs)
+    simple = xirr_core.CapitalCashflowModel(exclude_position_value=True).build(inputs)
+    assert list(standard['amounts']) == list(simple['amounts']) == [-10000.0, 10500.0]
+    # 2档和3档的状态为进行中
+    assert standard['summary']['has_incomplete_trades'] is True
+
+
+def test_trades_only_model_build():
+    """只计实际买卖，剩余底仓按最后一次卖出价格(1.2)在结束日期计入"""
+    flows = xirr_core.TradesOnlyCashflowModel().build(make_inputs(POSITION))
+    assert list(flows['amounts']) == pytest.approx([-1000.0, -1800.0, -475.0, 1100.0, 1200.0, 1200.0, 600.0])
+    assert list(flows['dates'][-2:]) == [np.datetime64(END_DATE, 'ns')] * 2
+    assert list(flows['remarks'][:5]) == ['买入', '买入', '买入', '卖出', '卖出']
+    assert flows['remarks'][5].startswith('买入卖出后剩余底仓: 1000 份额')
+    assert flows['remarks'][6].startswith('买入未卖出底仓: 500 份额')
+
+    summary = flows['summary']
+    assert summary['total_buy_value'] == pytest.approx(3275.0)
+    assert summary['total_sell_value'] == pytest.approx(2300.0)
+    assert summary['remaining_shares'] == 1500
+    assert summary['held_shares'] == 1500
+    assert summary['last_price'] == pytest.approx(1.2)
+    assert summary['remaining_value'] == pytest.approx(1800.0)
+    assert summary['total_cash_flow'] == pytest.approx(825.0)
+    assert summary['has_incomplete_trades'] is True
+
+
+def test_mark_to_market_model_uses_position_price():
+    """持有份额按持仓最新价在结束日期一次计入"""
+    flows = xirr_core.MarkToMarketCashflowModel().build(make_inputs(POSITION))
+    assert list(flows['amounts']) == pytest.approx([-1000.0, -1800.0, -475.0, 1100.0, 1200.0, 1950.0])
+    assert flows['dates'][-1] == np.datetime64(END_DATE, 'ns')
+    assert flows['remarks'][-1].startswith('持仓市值: 1500 份额')
+    assert flows['summary']['last_price'] == pytest.approx(1.3)
+    assert flows['summary']['remaining_value'] == pytest.approx(1950.0)
+
+
+def test_mark_to_market_model_price_override_and_fallback():
+    """指定价格优先；没有持仓信息时退回最后一次卖出价格"""
+    priced = xirr_core.MarkToMarketCashflowModel(price=1.5).build(make_inputs(POSITION))
+    assert priced['amounts'][-1] == pytest.approx(2250.0)
+
+    fallback = xirr_core.MarkToMarketCashflowModel().build(make_inputs())
+    assert fallback['amounts'][-1] == pytest.approx(1800.0)
+
+
+@pytest.mark.parametrize('model', [
+    xirr_core.CapitalCashflowModel(),
+    xirr_core.CapitalCashflowModel(exclude_position_value=True),
+    xirr_core.TradesOnlyCashflowModel(),
+    xirr_core.MarkToMarketCashflowModel(),
+])
+def test_calculate_matches_solver(model):
+    """calculate的结果与直接对现金流求解一致，现金流按日期排序"""
+    inputs = make_inputs(POSITION)
+    flows = model.build(inputs)
+    result = xirr_core.calculate(model, inputs)
+
+    expected = xirr(flows['dates'], flows['amounts'], guess=model.guess)
+    assert result['xirr'] is not None
+    assert result['xirr'] == pytest.approx(expected, abs=1e-9)
+    assert result['cashflows']['date'].is_monotonic_increasing
+    assert result['cashflows']['amount'].sum() == pytest.approx(flows['amounts'].sum())
+
+
+def test_solve_rejects_out_of_range():
+    """超出模型valid_range的结果视为无法计算"""
+    dates = [datetime(2024, 1, 1), datetime(2024, 1, 31)]
+    # 一个月翻倍，年化远超1000%
+    assert xirr_core.CapitalCashflowModel().solve(dates, [-100.0, 200.0]) is None
+    assert xirr_core.CapitalCashflowModel().solve(dates, [-100.0, 101.0]) is not None
+
+
+def test_calculators_differ_only_in_model():
+    """简化版计算器沿用XIRRCalculator的求解，只更换现金流模型"""
+    assert XIRRCalculatorSimple._xirr is XIRRCalculator._xirr
+    assert XIRRCalculatorSimple.model.exclude_position_value is True
+    assert XIRRCalculator.model.exclude_position_value is False
+
+    cashflows = [(datetime(2021, 1, 1), -100.0), (datetime(2022, 1, 1), 110.0)]
+    assert XIRRCalculatorSimple()._xirr(cashflows) == pytest.approx(0.1, abs=1e-9)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+xirr_series测试 - 按日合并的现金流和累计买入/卖出
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from backtest_gui.utils import xirr_core
+from backtest_gui.utils.xirr_series import FREQ_TRADE, daily_flows, trades_only_xirr_series
+
+
+def make_trades(rows):
+    """构造与xirr_core.load_paired_trades返回格式一致的配对交易"""
+    trades = pd.DataFrame(rows, columns=xirr_core.PAIRED_TRADE_FIELDS)
+    for column in ('buy_price', 'buy_value', 'sell_price', 'sell_value'):
+        trades[column] = pd.to_numeric(trades[column], errors='coerce').astype('float64')
+    for column in ('buy_amount', 'sell_amount', 'remaining'):
+        trades[column] = pd.to_numeric(trades[column], errors='coerce').fillna(0).astype('int64')
+    for column in ('buy_time', 'sell_time'):
+        trades[column] = pd.to_datetime(trades[column])
+    return trades
+
+
+# 1月2日上午买入1000、下午卖出1100；1月10日再买入500未卖出
+TRADES = make_trades([
+    [1, 1, 1, 'normal', datetime(2024, 1, 2, 10), 1.0, 1000, 1000.0,
+     datetime(2024, 1, 2, 14), 1.1, 1000, 1100.0, 0, '已完成'],
+    [2, 1, 2, 'normal', datetime(2024, 1, 10, 10), 1.0, 500, 500.0,
+     None, None, None, None, None, '进行中'],
+])
+
+
+def test_daily_flows_keeps_gross_buys_and_sells():
+    """同一天有买有卖时，amount为净额，buy/sell为各自合计"""
+    flows = daily_flows(TRADES)
+    first = flows.iloc[0]
+    assert first['amount'] == pytest.approx(100.0)
+    assert first['buy'] == pytest.approx(1000.0)
+    assert first['sell'] == pytest.approx(1100.0)
+    assert first['shares'] == pytest.approx(0.0)
+    assert flows['buy'].sum() == pytest.approx(1500.0)
+    assert flows['sell'].sum() == pytest.approx(1100.0)
+
+
+def test_series_invested_and_proceeds_are_gross():
+    """累计买入和卖出不受同日买卖相互抵消的影响"""
+    series = trades_only_xirr_series(TRADES, datetime(2024, 3, 31), freq=FREQ_TRADE)
+    first = series.iloc[0]
+    assert first['invested'] == pytest.approx(1000.0)
+    assert first['proceeds'] == pytest.approx(1100.0)
+
+    last = series.iloc[-1]
+    assert last['invested'] == pytest.approx(1500.0)
+    assert last['proceeds'] == pytest.approx(1100.0)
+    assert last['shares'] == pytest.approx(500.0)
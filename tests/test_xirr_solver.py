@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+xirr_solver测试 - 与Excel XIRR的已知结果、scipy.brentq的结果对照，以及按日合并前后结果一致
+"""
+from datetime import datetime
+
+import numpy as np
+import pytest
+from scipy.optimize import brentq
+
+from backtest_gui.utils.xirr_solver import aggregate_daily, solve_xirr, xirr, xnpv, year_fractions
+
+# Excel帮助文档中XIRR函数的示例，结果为0.373362535
+EXCEL_DATES = [datetime(2008, 1, 1), datetime(2008, 3, 1), datetime(2008, 10, 30),
+               datetime(2009, 2, 15), datetime(2009, 4, 1)]
+EXCEL_AMOUNTS = [-10000, 2750, 4250, 3250, 2750]
+EXCEL_XIRR = 0.373362535
+
+
+def test_excel_example():
+    """与Excel XIRR示例结果一致"""
+    assert xirr(EXCEL_DATES, EXCEL_AMOUNTS) == pytest.approx(EXCEL_XIRR, abs=1e-8)
+
+
+def test_excel_example_xnpv_is_zero():
+    """Excel结果处的XNPV接近零(天数/365口径)"""
+    years = year_fractions(EXCEL_DATES)
+    assert xnpv(EXCEL_XIRR, np.array(EXCEL_AMOUNTS, dtype=np.float64), years) == pytest.approx(0.0, abs=1e-4)
+
+
+def test_simple_one_year_return():
+    """一年(365天)后取回110%，XIRR为10%"""
+    assert xirr([datetime(2021, 1, 1), datetime(2022, 1, 1)], [-100.0, 110.0]) == pytest.approx(0.1, abs=1e-9)
+
+
+def test_negative_return():
+    """亏损时XIRR为负"""
+    assert xirr([datetime(2021, 1, 1), datetime(2022, 1, 1)], [-100.0, 80.0]) == pytest.approx(-0.2, abs=1e-9)
+
+
+@pytest.mark.parametrize('amounts', [
+    [100.0, 50.0, 20.0],
+    [-100.0, -50.0, -20.0],
+    [0.0, 0.0, 0.0],
+])
+def test_no_sign_change_returns_none(amounts):
+    """现金流没有同时包含正负值时无法求解"""
+    dates = [datetime(2021, 1, 1), datetime(2021, 6, 1), datetime(2022, 1, 1)]
+    assert xirr(dates, amounts) is None
+
+
+def test_sign_change_cancelled_by_daily_aggregation():
+    """同一天的正负现金流合并后不再异号时无法求解"""
+    dates = [datetime(2021, 1, 1, 10), datetime(2021, 1, 1, 14), datetime(2022, 1, 1)]
+    assert xirr(dates, [-100.0, 150.0, 20.0]) is None
+
+
+def test_too_few_cashflows_returns_none():
+    """少于两笔现金流或日期与金额数量不一致时返回None"""
+    assert xirr([datetime(2021, 1, 1)], [-100.0]) is None
+    assert xirr([datetime(2021, 1, 1)], [-100.0, 110.0]) is None
+
+
+def test_multiple_roots():
+    """多个根时返回初始值附近的根，且该处XNPV为零
+
+    -100, +230, -132 (间隔365天)的根为10%和20%。
+    """
+    dates = [datetime(2021, 1, 1), datetime(2022, 1, 1), datetime(2023, 1, 1)]
+    amounts = np.array([-100.0, 230.0, -132.0])
+    years = year_fractions(dates)
+
+    low_root = solve_xirr(amounts, years, guess=0.05)
+    high_root = solve_xirr(amounts, years, guess=0.3)
+    assert low_root == pytest.approx(0.1, abs=1e-7)
+    assert high_root == pytest.approx(0.2, abs=1e-7)
+    for root in (low_root, high_root):
+        assert xnpv(root, amounts, years) == pytest.approx(0.0, abs=1e-6)
+
+
+def _intraday_flows(seed=7, days=60, per_day=20):
+    """构造分钟级网格回测式的现金流: 每天多笔买卖，最后一天取回全部资金"""
+    rng = np.random.default_rng(seed)
+    dates = []
+    amounts = []
+    start = np.datetime64('2023-01-03T09:30')
+    for day in range(days):
+        for trade in range(per_day):
+            dates.append(start + np.timedelta64(day, 'D') + np.timedelta64(int(rng.integers(0, 330)), 'm'))
+            amounts.append(float(rng.normal(-50.0, 200.0)))
+    dates.append(start + np.timedelta64(days + 30, 'D'))
+    amounts.append(-sum(amounts) * 1.05)
+    return np.array(dates, dtype='datetime64[ns]'), np.array(amounts, dtype=np.float64)
+
+
+def test_aggregated_equals_unaggregated():
+    """按日合并现金流前后求得的XIRR相同"""
+    dates, amounts = _intraday_flows()
+    unaggregated = solve_xirr(amounts, year_fractions(dates))
+
+    days, totals = aggregate_daily(dates, amounts)
+    assert len(days) < len(dates)
+    assert totals.sum() == pytest.approx(amounts.sum())
+    aggregated = solve_xirr(totals, year_fractions(days))
+
+    assert unaggregated is not None
+    assert aggregated == pytest.approx(unaggregated, abs=1e-9)
+    assert xirr(dates, amounts) == pytest.approx(unaggregated, abs=1e-9)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3, 4, 5])
+def test_agrees_with_brentq(seed):
+    """与scipy.brentq在异号区间内求得的根一致"""
+    dates, amounts = _intraday_flows(seed=seed)
+    days, totals = aggregate_daily(dates, amounts)
+    years = year_fractions(days)
+
+    expected = brentq(lambda rate: xnpv(rate, totals, years), -0.99, 10.0, xtol=1e-12)
+    assert solve_xirr(totals, years) == pytest.approx(expected, abs=1e-7)
+
+
+def test_excel_example_agrees_with_brentq():
+    """Excel示例与scipy.brentq结果一致"""
+    amounts = np.array(EXCEL_AMOUNTS, dtype=np.float64)
+    years = year_fractions(EXCEL_DATES)
+    expected = brentq(lambda rate: xnpv(rate, amounts, years), -0.99, 10.0, xtol=1e-12)
+    assert solve_xirr(amounts, years) == pytest.approx(expected, abs=1e-8)
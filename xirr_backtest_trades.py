@@ -21,7 +21,7 @@ def parse_arguments():
     parser = argparse.ArgumentParser(description='计算回测交易的XIRR(年化收益率)')
     
     # 必选参数：回测ID
-    parser.add_argument('backtest_id', type=int, help='回测ID')
+    parser.add_argument('backtest_id', type=int, nargs='?', help='回测ID，使用--list时可省略')
     
     # 可选参数：输出Excel文件路径
     parser.add_argument('-o', '--output', type=str, help='输出Excel文件路径')
@@ -50,9 +50,11 @@ def list_backtests(db_connector):
             """
             SELECT br.id, br.stock_code, br.start_date, br.end_date, 
                    br.initial_capital, br.final_capital, br.total_profit, br.total_profit_rate,
-                   br.backtest_time, br.strategy_name, fi.fund_name
+                   br.backtest_time, br.strategy_name, fi.fund_name,
+                   bs.buy_count, bs.sell_count, bs.max_capital_used, bs.max_drawdown, bs.xirr_value
             FROM backtest_results br
             LEFT JOIN fund_info fi ON br.stock_code = fi.fund_code
+            LEFT JOIN backtest_stats bs ON bs.backtest_id = br.id
             ORDER BY br.backtest_time DESC
             """
         )
@@ -68,9 +70,10 @@ def list_backtests(db_connector):
             
         # 打印回测列表
         print("\n所有回测记录：")
-        print("-" * 120)
-        print(f"{'ID':<5} {'基金代码':<12} {'基金名称':<25} {'开始日期':<20} {'结束日期':<20} {'初始资金':<12} {'总收益率':<8} {'策略名称':<15} {'回测时间'}")
-        print("-" * 120)
+        print("-" * 180)
+        print(f"{'ID':<5} {'基金代码':<12} {'基金名称':<25} {'开始日期':<20} {'结束日期':<20} {'初始资金':<12} {'总收益率':<8} "
+              f"{'买入':<6} {'卖出':<6} {'最高占用资金':<14} {'最大回撤':<8} {'XIRR':<8} {'策略名称':<15} {'回测时间'}")
+        print("-" * 180)
         
         for bt in backtests:
             backtest_id = bt[0]
@@ -82,10 +85,17 @@ def list_backtests(db_connector):
             strategy_name = bt[9] or ''
             backtest_time = bt[8].strftime('%Y-%m-%d %H:%M:%S') if bt[8] else ''
             fund_name = bt[10] or ''
+            # 预计算统计(backtest_stats)，没有统计记录的回测显示为空
+            buy_count = str(bt[11]) if bt[11] is not None else ''
+            sell_count = str(bt[12]) if bt[12] is not None else ''
+            max_capital_used = f"{bt[13]:,.2f}" if bt[13] is not None else ''
+            max_drawdown = f"{bt[14]:.2f}%" if bt[14] is not None else ''
+            xirr_value = f"{bt[15]:.2f}%" if bt[15] is not None else ''
             
-            print(f"{backtest_id:<5} {stock_code:<12} {fund_name[:25]:<25} {start_date:<20} {end_date:<20} {initial_capital:<12} {profit_rate:<8} {strategy_name[:15]:<15} {backtest_time}")
+            print(f"{backtest_id:<5} {stock_code:<12} {fund_name[:25]:<25} {start_date:<20} {end_date:<20} {initial_capital:<12} {profit_rate:<8} "
+                  f"{buy_count:<6} {sell_count:<6} {max_capital_used:<14} {max_drawdown:<8} {xirr_value:<8} {strategy_name[:15]:<15} {backtest_time}")
             
-        print("-" * 120)
+        print("-" * 180)
         return True
         
     except Exception as e:
@@ -105,6 +115,10 @@ def main():
     if args.list:
         list_backtests(db_connector)
         return
+    
+    if args.backtest_id is None:
+        print("请指定回测ID，或使用--list列出所有回测")
+        return
         
     # 创建XIRR计算器
     calculator = XIRRCalculator(db_connector)